@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+#
+# Run: python ./examples/check_hstack_order.py
+#
+# Check for the stored samples in the reducer (lib_fx_stack.hstack_new_samples()): the order of the stations changes
+#  between records (and stations appear and disappear), the stored samples for every station must be the
+#  concatenation of its records, with and without reducer stream buffers.
+#
+from __future__ import print_function
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),"..","src"))
+import lib_fx_stack
+
+
+def run_records(records,use_buffers):
+    """
+    Store the samples of all the records, return dictionary with the stored samples for each station.
+    """
+    F_buf=lib_fx_stack.init_stream_buffers() if use_buffers else None
+    [F1_partial,F_ind_partial,F_lti,F_stack_shift]=[[],[],[],[]]
+    for (F_ind,F1) in records:
+        F_first_sample=[0]*len(F_ind)
+        [F1_partial,F_ind_partial,F_refs,F_stack_shift,F_lti,F1_unused]=lib_fx_stack.hstack_new_samples(F1_partial,\
+                                                    F_ind_partial,F_ind,F1,[],F_stack_shift,F_lti,F_first_sample,"f",[],F_buf)
+    return(dict([(F_ind_i,np.copy(F1_i)) for (F_ind_i,F1_i) in zip(F_ind_partial,F1_partial) if F_ind_i!=-1]))
+
+
+def main():
+    n=8
+    samples=dict([(st,[np.arange(k*n,(k+1)*n)+1000*s for k in range(3)]) for (s,st) in enumerate(["A.0","B.0","C.0"])])
+    records=[[["A.0","B.0"],[samples["A.0"][0],samples["B.0"][0]]],\
+             [["C.0","A.0"],[samples["C.0"][1],samples["A.0"][1]]],\
+             [["A.0","C.0"],[samples["A.0"][2],samples["C.0"][2]]]]
+    expected={"A.0":np.hstack(samples["A.0"]),"C.0":np.hstack(samples["C.0"][1:])}
+    for use_buffers in [0,1]:
+        stored=run_records(records,use_buffers)
+        same=(sorted(stored.keys())==sorted(expected.keys())) and \
+             all([np.array_equal(stored[st],expected[st]) for st in expected])
+        print("REDUCER_STREAM_BUFFER="+str(use_buffers)+": "+("same samples" if same else "DIFFERENT samples "+str(stored)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,20 @@
+#!/bin/bash
+# Run: source ./examples/check_stream_buffer.sh
+#
+# Regression check for the reducer input buffers: runs the example with the default configuration and
+#  with REDUCER_STREAM_BUFFER=0 (from a temporary copy of src and conf), outputs must be identical.
+#
+CX_CHECK_DIR=$(mktemp -d)
+for CX_CHECK_BUF in 1 0; do
+    mkdir -p $CX_CHECK_DIR/b$CX_CHECK_BUF
+    cp -r src conf $CX_CHECK_DIR/b$CX_CHECK_BUF/
+    sed -i "s/^REDUCER_STREAM_BUFFER = .*/REDUCER_STREAM_BUFFER = $CX_CHECK_BUF/" $CX_CHECK_DIR/b$CX_CHECK_BUF/src/const_performance.py
+    python $CX_CHECK_DIR/b$CX_CHECK_BUF/src/mapred_cx.py -c $CX_CHECK_DIR/b$CX_CHECK_BUF/conf/correlx.ini \
+           -f exper=$PWD/examples/test_dataset_vgos,out=$CX_CHECK_DIR/b$CX_CHECK_BUF/output,serial=1,parallel=0 > $CX_CHECK_DIR/b$CX_CHECK_BUF.log 2>&1
+done
+if cmp $CX_CHECK_DIR/b1/output/*/OUT_s0_v0.out $CX_CHECK_DIR/b0/output/*/OUT_s0_v0.out; then
+    echo "REDUCER_STREAM_BUFFER=0: same output"
+    rm -rf $CX_CHECK_DIR
+else
+    echo "REDUCER_STREAM_BUFFER=0: DIFFERENT output, logs in $CX_CHECK_DIR"
+fi
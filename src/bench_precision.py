@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# <nbformat>3.0</nbformat>
+
+# <codecell>
+
+#!/usr/bin/env python
+#
+#The MIT CorrelX Correlator
+#
+#https://github.com/MITHaystack/CorrelX
+#Contact: correlX@haystack.mit.edu
+#Project leads: Victor Pankratius, Pedro Elosegui Project developer: A.J. Vazquez Alvarez
+#
+#Copyright 2017 MIT Haystack Observatory
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+#------------------------------
+#------------------------------
+#Project: CorrelX.
+#File: bench_precision.py.
+#Author: agent (agent@local)
+#Description: 
+"""
+Script for benchmarking accuracy vs. speed of single precision (complex64) correlation with respect to
+ double precision (complex128), for the different accumulators (see X_ACCUMULATOR in const_performance.py).
+
+"""
+#History:
+#initial version: 2026.10 agent
+#MIT Haystack Observatory
+
+from __future__ import print_function
+import argparse
+import timeit
+import numpy as np
+
+import const_performance
+import lib_quant
+import lib_fft
+import lib_fx_stack
+
+
+# Modes: [name,single_precision,accumulator]
+MODES = [["double",0,const_performance.X_ACCUMULATOR_NATIVE],\
+         ["single",1,const_performance.X_ACCUMULATOR_NATIVE],\
+         ["single-f64acc",1,const_performance.X_ACCUMULATOR_FLOAT64],\
+         ["single-kahan",1,const_performance.X_ACCUMULATOR_KAHAN]]
+
+
+def correlate(samples_quant,bits_per_sample,n_sp,fft_size,phases,single_precision,accumulator):
+    """
+    Dequantization, fringe rotation, FFT and multiply-accumulate for all the blocks in samples_quant.
+    
+    Parameters
+    ----------
+     samples_quant : list of numpy 2D arrays
+         quantized samples (uint8) [station-polarizations x bytes] for each block (accumulation).
+     bits_per_sample : int
+         number of bits per sample component.
+     n_sp : int
+         number of station-polarizations.
+     fft_size : int
+         number of coefficients in the FFT.
+     phases : numpy 2D array
+         phases for the fringe rotation (in cycles, as in lib_fx_stack.get_exp()) [station-polarizations x samples].
+     single_precision : int
+         1 for complex64, 0 for complex128.
+     accumulator : int
+         X_ACCUMULATOR_* for the accumulation matrix.
+    
+    Returns
+    -------
+     acc_mat : numpy 3D array
+         normalized accumulation matrix (see lib_fx_stack.normalize_mat()).
+    """
+    dtype_complex = np.complex64 if single_precision else np.complex128
+    saved_accumulator = lib_fx_stack.X_ACCUMULATOR
+    lib_fx_stack.X_ACCUMULATOR = accumulator
+    acc_comp = None
+    if single_precision and accumulator==const_performance.X_ACCUMULATOR_KAHAN:
+        acc_comp = lib_fx_stack.init_acc_compensation()
+    rotators = [lib_fx_stack.get_exp(phases[sp],dtype_complex)[0] for sp in range(n_sp)]
+    acc_mat = None
+    count_acc = 0
+    for block in samples_quant:
+        F1 = [lib_quant.get_samples(block[sp],bits_per_sample,'c',-1,single_precision) for sp in range(n_sp)]
+        for sp in range(n_sp):
+            np.multiply(F1[sp],rotators[sp],F1[sp])
+        F1_fft = lib_fft.compute_fft(np.reshape(np.vstack(F1),(n_sp,-1,fft_size)),reuse_output=1)
+        [acc_mat,count_acc,count_sub_acc,n_sp] = lib_fx_stack.compute_x_all(F1_fft,None,count_acc,acc_mat,-1,\
+                                                                            dtype_complex,acc_comp)
+    lib_fx_stack.X_ACCUMULATOR = saved_accumulator
+    return(lib_fx_stack.normalize_mat(acc_mat,count_acc))
+
+
+def main():
+
+    cparser = argparse.ArgumentParser(description='Benchmark for single vs. double precision correlation')
+    cparser.add_argument('-s', action="store",\
+                         dest="stations",default="8",\
+                         help="Number of station-polarizations.")
+    
+    cparser.add_argument('-f', action="store",\
+                         dest="fft_size",default="1024",\
+                         help="FFT size.")
+    
+    cparser.add_argument('-w', action="store",\
+                         dest="num_windows",default="32",\
+                         help="Number of FFT windows per block.")
+    
+    cparser.add_argument('-a', action="store",\
+                         dest="blocks",default="50,500",\
+                         help="Numbers of blocks accumulated (integration length, comma separated).")
+    
+    cparser.add_argument('-b', action="store",\
+                         dest="bits_per_sample",default="2",\
+                         help="Bits per sample component.")
+    
+    cparser.add_argument('-r', action="store",\
+                         dest="repetitions",default="3",\
+                         help="Number of repetitions (minimum time is displayed).")
+
+    args =            cparser.parse_args()
+    n_sp =            int(args.stations)
+    fft_size =        int(args.fft_size)
+    num_windows =     int(args.num_windows)
+    blocks =          list(map(int,args.blocks.split(",")))
+    bits_per_sample = int(args.bits_per_sample)
+    repetitions =     int(args.repetitions)
+    
+    # Complex samples: two components per sample
+    n_samples = fft_size*num_windows
+    n_bytes = (2*n_samples*bits_per_sample)//8
+    phases = np.cumsum(np.full((n_sp,n_samples),1e-4),axis=1)+np.arange(n_sp).reshape(-1,1)*0.1
+    
+    print("Station-polarizations: "+str(n_sp)+", FFT size: "+str(fft_size)+", windows per block: "+str(num_windows)+\
+          ", bits per sample: "+str(bits_per_sample))
+    print("Times in ms per block (minimum of "+str(repetitions)+"), errors relative to the maximum visibility magnitude")
+    print("blocks".rjust(7)+"mode".rjust(15)+"time".rjust(10)+"speedup".rjust(9)+"max-error".rjust(12)+"rms-error".rjust(12))
+    for n_blocks in blocks:
+        # Common signal for all station-polarizations plus independent noise
+        common = np.random.randint(0,256,(n_blocks,1,n_bytes)).astype(np.uint8)
+        noise = np.random.randint(0,256,(n_blocks,n_sp,n_bytes)).astype(np.uint8)
+        mask = (np.random.random((n_blocks,n_sp,n_bytes))<0.5)
+        samples_quant = list(np.where(mask,common,noise).astype(np.uint8))
+        
+        results = []
+        times = []
+        for [name,single_precision,accumulator] in MODES:
+            correlation = lambda: correlate(samples_quant,bits_per_sample,n_sp,fft_size,phases,single_precision,accumulator)
+            results.append(correlation())
+            times.append(min(timeit.repeat(correlation,number=1,repeat=repetitions))/n_blocks)
+        
+        reference = results[0]
+        scale = np.max(np.abs(reference))
+        for i in range(len(MODES)):
+            error = np.abs(results[i]-reference)/scale
+            print(str(n_blocks).rjust(7)+MODES[i][0].rjust(15)+("%.3f" % (1e3*times[i])).rjust(10)+\
+                  ("%.2f" % (times[0]/times[i])).rjust(9)+\
+                  ("%.1e" % np.max(error)).rjust(12)+("%.1e" % np.sqrt(np.mean(error**2))).rjust(12))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# <nbformat>3.0</nbformat>
+
+# <codecell>
+
+#!/usr/bin/env python
+#
+#The MIT CorrelX Correlator
+#
+#https://github.com/MITHaystack/CorrelX
+#Contact: correlX@haystack.mit.edu
+#Project leads: Victor Pankratius, Pedro Elosegui Project developer: A.J. Vazquez Alvarez
+#
+#Copyright 2017 MIT Haystack Observatory
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+#------------------------------
+#------------------------------
+#Project: CorrelX.
+#File: bench_rotator.py.
+#Author: agent (agent@local)
+#Description: 
+"""
+Script for benchmarking fringe rotators: exact (exponential for each sample, FULL_TIMESCALE=1) vs. phase 
+ recurrence (FULL_TIMESCALE=3), with the phase error of the recurrence with respect to the exact rotators.
+
+"""
+#History:
+#initial version: 2026.10 agent
+#MIT Haystack Observatory
+
+from __future__ import print_function
+import argparse
+import timeit
+import numpy as np
+
+import lib_fx_stack
+
+
+def get_params_rows(n_streams,fs,freq_channel):
+    """
+    Delay polynomials (see lib_fx_stack.get_delays_rows()) with delays up to 20 ms and rates up to 3 us/s.
+    """
+    params_rows=np.zeros([n_streams,9])
+    params_rows[:,0]=np.random.random(n_streams)                       # seconds offset
+    params_rows[:,1]=10.0                                              # seconds reference
+    params_rows[:,3]=np.random.uniform(-2e-2,2e-2,n_streams)           # delay
+    params_rows[:,4]=np.random.uniform(-3e-6,3e-6,n_streams)           # rate
+    params_rows[:,5]=np.random.uniform(-1e-10,1e-10,n_streams)         # acceleration
+    params_rows[:,8]=freq_channel-fs                                   # fringe frequency (LSB complex)
+    return(params_rows)
+
+
+def main():
+
+    cparser = argparse.ArgumentParser(description='Benchmark for fringe rotators (exact vs. phase recurrence)')
+    cparser.add_argument('-n', action="store",\
+                         dest="num_samples",default="262144",\
+                         help="Number of samples.")
+    
+    cparser.add_argument('-s', action="store",\
+                         dest="streams",default="4",\
+                         help="Number of streams (unique rotators).")
+    
+    cparser.add_argument('-b', action="store",\
+                         dest="block_sizes",default="256,1024,4096",\
+                         help="Numbers of samples between seeds (comma separated).")
+    
+    cparser.add_argument('-f', action="store",\
+                         dest="freq_channel",default="10e9",\
+                         help="Channel frequency [Hz].")
+    
+    cparser.add_argument('-r', action="store",\
+                         dest="repetitions",default="3",\
+                         help="Number of repetitions (minimum time is displayed).")
+
+    args =          cparser.parse_args()
+    num_samples =   int(args.num_samples)
+    n_streams =     int(args.streams)
+    block_sizes =   list(map(int,args.block_sizes.split(",")))
+    freq_channel =  float(args.freq_channel)
+    repetitions =   int(args.repetitions)
+    
+    fs = 64e6
+    timescale = np.arange(num_samples,dtype=float)*(1/fs)
+    samples = np.arange(num_samples)
+    params_rows = get_params_rows(n_streams,fs,freq_channel)
+    
+    print("Streams: "+str(n_streams)+", samples: "+str(num_samples)+", times in ms (minimum of "+str(repetitions)+")")
+    print("Errors: maximum phase [rad] and magnitude differences with respect to the exact rotators (complex128)")
+    print("type".rjust(10)+"block".rjust(7)+"time".rjust(10)+"speedup".rjust(9)+"phase-err".rjust(12)+"mag-err".rjust(12))
+    exact_128 = lib_fx_stack.get_exp(params_rows[:,-1:]*lib_fx_stack.get_delays_rows(params_rows,timescale),np.complex128)[0]
+    for dtype_complex in [np.complex128,np.complex64]:
+        exact = lambda: lib_fx_stack.get_exp(params_rows[:,-1:]*lib_fx_stack.get_delays_rows(params_rows,timescale),\
+                                             dtype_complex)[0]
+        t_exact = min(timeit.repeat(exact,number=1,repeat=repetitions))
+        print(np.dtype(dtype_complex).name.rjust(10)+"exact".rjust(7)+("%.2f" % (1e3*t_exact)).rjust(10))
+        for block_size in block_sizes:
+            recurrence = lambda: lib_fx_stack.get_rotators_recurrence(params_rows,timescale,samples,dtype_complex,\
+                                                                      block_size)
+            rotators = recurrence()
+            phase_error = np.max(np.abs(np.angle(rotators*np.conj(exact_128))))
+            mag_error = np.max(np.abs(np.abs(rotators)-1))
+            t_recurrence = min(timeit.repeat(recurrence,number=1,repeat=repetitions))
+            print(np.dtype(dtype_complex).name.rjust(10)+str(block_size).rjust(7)+\
+                  ("%.2f" % (1e3*t_recurrence)).rjust(10)+("%.1f" % (t_exact/t_recurrence)).rjust(9)+\
+                  ("%.1e" % phase_error).rjust(12)+("%.1e" % mag_error).rjust(12))
+
+if __name__ == '__main__':
+    main()
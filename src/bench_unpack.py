@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+# <nbformat>3.0</nbformat>
+
+# <codecell>
+
+#!/usr/bin/env python
+#
+#The MIT CorrelX Correlator
+#
+#https://github.com/MITHaystack/CorrelX
+#Contact: correlX@haystack.mit.edu
+#Project leads: Victor Pankratius, Pedro Elosegui Project developer: A.J. Vazquez Alvarez
+#
+#Copyright 2017 MIT Haystack Observatory
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+#------------------------------
+#------------------------------
+#Project: CorrelX.
+#File: bench_unpack.py.
+#Author: agent (agent@local)
+#Description: 
+"""
+Script for benchmarking the sample unpackers (shift-and-mask vs. lookup table).
+
+"""
+#History:
+#initial version: 2026.10 agent
+#MIT Haystack Observatory
+
+from __future__ import print_function
+import argparse
+import timeit
+import numpy as np
+
+import lib_vdif
+import lib_quant
+
+
+def time_call(function,repetitions):
+    """
+    Minimum execution time [s] for repetitions calls to function.
+    """
+    return(min(timeit.repeat(function,number=1,repeat=repetitions)))
+
+
+def bench_bits_per_sample(words,bits_per_sample,repetitions):
+    """
+    Benchmark unpacking for one number of bits per sample.
+    
+    Parameters
+    ----------
+     words : numpy 1D array of np.uint32
+         payload.
+     bits_per_sample : int
+         number of bits per sample.
+     repetitions : int
+         number of repetitions (minimum time is taken).
+    
+    Returns
+    -------
+     times : list of float
+         [shift (mapper),lut (mapper),shift+take (reducer),lut (reducer)] times in seconds. Reducer times
+          are None for more than 8 bits per sample.
+    """
+    words_bytes = words.view(np.uint8)
+    codes_shift = lib_vdif.read_samples_from_raw_shift(words,bits_per_sample)
+    codes_lut = lib_vdif.read_samples_from_raw(words,bits_per_sample)
+    if not(np.array_equal(codes_shift,codes_lut)):
+        print(" Error: different samples for "+str(bits_per_sample)+" bits per sample")
+    
+    t_map_shift = time_call(lambda: lib_vdif.read_samples_from_raw_shift(words,bits_per_sample),repetitions)
+    t_map_lut = time_call(lambda: lib_vdif.read_samples_from_raw(words,bits_per_sample),repetitions)
+    
+    t_red_shift = None
+    t_red_lut = None
+    if bits_per_sample<=8:
+        levels = np.array(lib_quant.get_quant_levels(bits_per_sample),dtype=np.complex128)
+        t_red_shift = time_call(lambda: lib_quant.sub_pack_complex_samples(lib_quant.np_take_samples(levels,\
+                                        lib_quant.decode_samples_red(words_bytes,bits_per_sample)),bits_per_sample),repetitions)
+        t_red_lut = time_call(lambda: lib_quant.get_samples(words_bytes,bits_per_sample,'c'),repetitions)
+    
+    return([t_map_shift,t_map_lut,t_red_shift,t_red_lut])
+
+
+def main():
+
+    cparser = argparse.ArgumentParser(description='Benchmark for sample unpacking')
+    cparser.add_argument('-w', action="store",\
+                         dest="num_words",default="1000000",\
+                         help="Number of 32-bit words in the payload.")
+    
+    cparser.add_argument('-r', action="store",\
+                         dest="repetitions",default="5",\
+                         help="Number of repetitions (minimum time is displayed).")
+
+    args =          cparser.parse_args()
+    num_words =     int(args.num_words)
+    repetitions =   int(args.repetitions)
+    
+    words = np.random.randint(0,2**16,size=2*num_words).astype(np.uint16).view(np.uint32)
+    
+    print("Payload: "+str(num_words)+" words, times in ms (minimum of "+str(repetitions)+")")
+    print("bps".rjust(4)+"map-shift".rjust(12)+"map-lut".rjust(12)+"speedup".rjust(9)+\
+          "red-shift".rjust(12)+"red-lut".rjust(12)+"speedup".rjust(9))
+    for bits_per_sample in [1,2,4,8,16,32]:
+        [t_map_shift,t_map_lut,t_red_shift,t_red_lut] = bench_bits_per_sample(words,bits_per_sample,repetitions)
+        line = str(bits_per_sample).rjust(4)+\
+               ("%.2f" % (1e3*t_map_shift)).rjust(12)+("%.2f" % (1e3*t_map_lut)).rjust(12)+\
+               ("%.1f" % (t_map_shift/t_map_lut)).rjust(9)
+        if t_red_lut is not None:
+            line += ("%.2f" % (1e3*t_red_shift)).rjust(12)+("%.2f" % (1e3*t_red_lut)).rjust(12)+\
+                    ("%.1f" % (t_red_shift/t_red_lut)).rjust(9)
+        print(line)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# <nbformat>3.0</nbformat>
+
+# <codecell>
+
+#!/usr/bin/env python
+#
+#The MIT CorrelX Correlator
+#
+#https://github.com/MITHaystack/CorrelX
+#Contact: correlX@haystack.mit.edu
+#Project leads: Victor Pankratius, Pedro Elosegui Project developer: A.J. Vazquez Alvarez
+#
+#Copyright 2017 MIT Haystack Observatory
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+#------------------------------
+#------------------------------
+#Project: CorrelX.
+#File: bench_xengine.py.
+#Author: agent (agent@local)
+#Description: 
+"""
+Script for benchmarking the X-engine (loop on station-polarizations vs. batched matrix product).
+
+"""
+#History:
+#initial version: 2026.10 agent
+#MIT Haystack Observatory
+
+from __future__ import print_function
+import argparse
+import timeit
+import numpy as np
+
+import lib_fx_stack
+
+
+def time_call(function,repetitions):
+    """
+    Minimum execution time [s] for repetitions calls to function.
+    """
+    return(min(timeit.repeat(function,number=1,repeat=repetitions)))
+
+
+def compute_x_loop(F1_fft,F2_fft,acc_mat):
+    """
+    X-engine iterating on station-polarizations (see lib_fx_stack.compute_x_all() with X_ENGINE_MATMUL=0).
+    """
+    if F2_fft is None:
+        F2_fft = np.conj(F1_fft)
+    for i1 in range(F1_fft.shape[0]):
+        acc_mat[i1,i1:]+=np.sum(np.multiply(F1_fft[i1,:],F2_fft[i1:,:]),axis=1)
+    return(acc_mat)
+
+
+def bench_stations(n_sp,n_windows,n_bins,repetitions):
+    """
+    Benchmark X-engine for one number of station-polarizations.
+    
+    Parameters
+    ----------
+     n_sp : int
+         number of station-polarizations.
+     n_windows : int
+         number of FFT windows.
+     n_bins : int
+         number of frequency bins.
+     repetitions : int
+         number of repetitions (minimum time is taken).
+    
+    Returns
+    -------
+     times : list of float
+         [loop,matmul] times in seconds.
+     max_error : float
+         maximum absolute difference between results relative to the maximum absolute value of the results.
+    """
+    shape = (n_sp,n_windows,n_bins)
+    F1_fft = np.random.standard_normal(shape)+1j*np.random.standard_normal(shape)
+    # As in the reducer (right term is the conjugate of the left term)
+    F2_fft = None
+    zeros = lambda: np.zeros([n_sp,n_sp,n_bins],dtype=complex)
+    
+    acc_loop = compute_x_loop(F1_fft,F2_fft,zeros())
+    acc_matmul = lib_fx_stack.compute_x_matmul(F1_fft,F2_fft,zeros())
+    max_error = np.max(np.abs(acc_loop-acc_matmul))/np.max(np.abs(acc_loop))
+    
+    t_loop = time_call(lambda: compute_x_loop(F1_fft,F2_fft,zeros()),repetitions)
+    t_matmul = time_call(lambda: lib_fx_stack.compute_x_matmul(F1_fft,F2_fft,zeros()),repetitions)
+    
+    return([[t_loop,t_matmul],max_error])
+
+
+def main():
+
+    cparser = argparse.ArgumentParser(description='Benchmark for the X-engine (cross-multiplication and accumulation)')
+    cparser.add_argument('-w', action="store",\
+                         dest="num_windows",default="64",\
+                         help="Number of FFT windows.")
+    
+    cparser.add_argument('-b', action="store",\
+                         dest="num_bins",default="1024",\
+                         help="Number of frequency bins.")
+    
+    cparser.add_argument('-s', action="store",\
+                         dest="stations",default="2,4,8,16,32",\
+                         help="Numbers of station-polarizations (comma separated).")
+    
+    cparser.add_argument('-r', action="store",\
+                         dest="repetitions",default="5",\
+                         help="Number of repetitions (minimum time is displayed).")
+
+    args =          cparser.parse_args()
+    num_windows =   int(args.num_windows)
+    num_bins =      int(args.num_bins)
+    stations =      list(map(int,args.stations.split(",")))
+    repetitions =   int(args.repetitions)
+    
+    print("Windows: "+str(num_windows)+", bins: "+str(num_bins)+", times in ms (minimum of "+str(repetitions)+")")
+    print("sp".rjust(4)+"loop".rjust(12)+"matmul".rjust(12)+"speedup".rjust(9)+"rel-error".rjust(12))
+    for n_sp in stations:
+        [[t_loop,t_matmul],max_error] = bench_stations(n_sp,num_windows,num_bins,repetitions)
+        print(str(n_sp).rjust(4)+\
+              ("%.2f" % (1e3*t_loop)).rjust(12)+("%.2f" % (1e3*t_matmul)).rjust(12)+\
+              ("%.1f" % (t_loop/t_matmul)).rjust(9)+("%.1e" % max_error).rjust(12))
+
+if __name__ == '__main__':
+    main()
@@ -137,6 +137,12 @@ C_CONF_OTHER_ONE_BASELINE =     'One baseline per task'
 C_CONF_OTHER_SCALING_STATIONS = 'Task scaling stations'
 C_CONF_OTHER_TIMEOUT_STOP_NODES ='Timeout stop nodes [s]'
 C_CONF_OTHER_SINGLE_PRECISION = 'Single precision'
+C_CONF_OTHER_FFT_ENGINE =       'FFT engine'
+C_CONF_OTHER_FFT_THREADS =      'FFT threads'
+C_CONF_OTHER_FFT_WISDOM =       'FFTW wisdom file'
+C_CONF_OTHER_REDUCER_THREADS =  'Reducer threads'
+C_CONF_OTHER_REDUCER_PROCESSES ='Reducer processes'
+C_CONF_OTHER_PIPELINE_REDUCERS ='Pipeline reducers'
 
 
 C_CONF_EXP =                    "Experiment"
@@ -202,6 +208,11 @@ C_ARG_DELETEOUTPUT =            "deleteoutput"       # Delete output file (bench
 C_ARG_SCALEST =                 "scalest"            # Linear scaling stations                    (N/A)                "display_in_help
 C_ARG_MEDIASUFFIX =             "mediasuffix"        # Suffix for media folder                    str     _16st        "display_in_help
 C_ARG_SINGLEPRECISION =         "singleprecision"    # Single precision in computations           int     0            "display_in_help
+C_ARG_FFTENGINE =               "fftengine"          # FFT engine (scipy,numpy,scipy.fft,fftw)    str     fftw         "display_in_help
+C_ARG_FFTTHREADS =              "fftthreads"         # Number of threads for FFT engine           int     4            "display_in_help
+C_ARG_REDUCERTHREADS =          "reducerthreads"     # Number of threads per reducer              int     4            "display_in_help
+C_ARG_REDUCERPROCESSES =        "reducerprocesses"   # Number of processes per reducer (py>=3.8)  int     0            "display_in_help
+C_ARG_PIPELINEREDUCERS =        "pipelinereducers"   # Number of reducers in pipeline mode        int     4            "display_in_help
 C_ARG_EXPER =                   "exper"              # Experiment folder                          str     ./ini_vgos_4st "display_in_help
 C_ARG_OUT =                     "out"                # Output folder                              str     ./cx_out     "display_in_help
 C_ARG_APP =                     "app"                # Application sources folder                 str     ./correlx/src "display_in_help
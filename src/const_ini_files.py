@@ -242,3 +242,11 @@ DELAY_MODEL_DI_MARKER="di."     # TO DO: DELETE? delay info (aiming to avoid ove
 DELAY_MODEL_SIM_MARKER="si."    # header in delay model (for debugging)
 
 
+
+
+# Configuration snapshot [generated automatically]
+#  Indexed configuration (see lib_ini_files.serial_params_to_array()) for the ini files used by the mapper, 
+#  written once at initialization (see lib_ini_files.write_config_snapshot()) into the configuration folder of the
+#  run (together with the scripts for the mapper and reducer).
+C_INI_SNAPSHOT_SUFFIX="_snapshot.pkl"
+C_INI_SNAPSHOT_NONE="none"      # no snapshot, ini files are parsed by every task
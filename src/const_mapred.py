@@ -131,6 +131,23 @@ DATA_TYPE_LIST = ['r','c']
 #ENCODE_INT=0
 ENCODE_B64=1
 
+# Intermediate format between mapper and reducer (see lib_mapred_io.py)
+#   0: text lines with key, metadata and samples encoded in base64 (ENCODE_B64).
+#   1: binary records (typed bytes) with key, metadata (META_BIN_FORMAT) and packed samples
+#       (pipeline mode only, the partitioner and comparator in Hadoop split the keys in text fields).
+INTERMEDIATE_BINARY=0
+
+# Output format of the reducer (see lib_mapred_io.py)
+#   0: text lines with key, metadata and visibilities.
+#   1: binary records (typed bytes) with key, metadata and raw visibilities, converted into text lines
+#       after the reducer (pipeline mode only, Hadoop expects text output).
+OUTPUT_BINARY=0
+
+# Layout of the metadata in binary records (same order as INDEX_*):
+#   station, polarization, shift, 14 floats (frac delay to diff frac), num samples, fs, bits per sample,
+#   first sample, data type, n bins pcal, pcal freq, channel index, channel freq, acc time, encoding, sideband.
+META_BIN_FORMAT=">HHq14dqqBqcqqidd8sc"
+
 # Padding for sample number in key (fixed length, padding with zeros for sorting)
 # This is to avoid requiring numerical sorting in Hadoop
 PAD_S=14
@@ -35,6 +35,69 @@
 #MIT Haystack Observatory
 
 # -------------------------------------------------------------------------------------------------- Application layer
+#                                                                                                            Input
+###########################################################
+#           Media index and splits
+###########################################################
+
+# Frame index: scan the headers of every VDIF file once and store the offset, time, thread, etc. of all its frames
+#   into an index file (see lib_vdif.get_vdif_index()). Used to count frames and samples, and to split the media
+#   files at the beginning of accumulation periods.
+#   0 to estimate the number of frames from the size of the file, and to split files every fixed number of bytes.
+VDIF_FRAME_INDEX = 1
+
+# Folder for the index files, "" for the temporary folder of the system. Index files are named after the path, size
+#   and modification time of the media files (see lib_vdif.get_vdif_index_filename()), media folders are not modified.
+VDIF_INDEX_DIR = ""
+
+# Pipeline splits: target number of frames for the input of each mapper in pipeline mode (see lib_mapredcorr.pipeline_app()).
+#   Splits are aligned with the accumulation periods (requires VDIF_FRAME_INDEX).
+#   0 for one mapper per media file.
+PIPELINE_FRAMES_PER_SPLIT = 0
+
+# Pipeline executor (see lib_pipeline.py): mappers, shuffle and reducers are run from Python as concurrent processes.
+#   PIPELINE_EXECUTOR: 1 to use the executor, 0 for a single shell command (cat|sort|reduce). The shell command is 
+#                      used anyway when profiling the mapper or the reducer.
+#   PIPELINE_MAPPERS: maximum number of mappers running at the same time, 0 for the number of cores of the node.
+#   PIPELINE_REDUCERS: number of reducers, overriden by "Pipeline reducers" in the configuration file.
+#   PIPELINE_PARTITION_ACCS: number of consecutive accumulation periods of the same band and channel that go into 
+#                            the same reducer, 0 to partition with the same key fields as in Hadoop.
+PIPELINE_EXECUTOR =       1
+PIPELINE_MAPPERS =        0
+PIPELINE_REDUCERS =       1
+PIPELINE_PARTITION_ACCS = 1
+
+# Sort of the mapper outputs in pipeline mode (see lib_mapred_io.sort_external()): only the keys and the positions
+#   of the lines/records are sorted, and the payloads are copied once into the reducer inputs.
+#   SORT_RUN_RECORDS: maximum number of lines/records sorted in memory, larger inputs are sorted in runs written into
+#                     disk and then merged.
+#   SORT_MERGE_BLOCK: number of entries read at a time from each run when merging.
+SORT_RUN_RECORDS =        1048576
+SORT_MERGE_BLOCK =        65536
+
+# Local emulation of Hadoop (see lib_hadoop_local.py): the Hadoop job is run on this node with the same input splits,
+#   partitioner and sorted reducer inputs, without starting Hadoop nor moving the media into HDFS.
+#   HADOOP_LOCAL: 1 to emulate the job when running Hadoop ("Run hadoop" in the configuration file), 0 to run it in
+#                 the cluster.
+#   HADOOP_LOCAL_SLOTS: maximum number of tasks running at the same time, 0 for the number of cores of the node.
+#   HADOOP_LOCAL_SWEEP_PACKETS: list of values for "Packets per HDFS block" (frames per split), the job is run for 
+#                               every combination with HADOOP_LOCAL_SWEEP_REDUCERS. [] for the configured value.
+#   HADOOP_LOCAL_SWEEP_REDUCERS: list of values for "Adjust reducers" (negative for a fixed number of reducers, see
+#                                lib_mapredcorr.run_mapreduce_sh()). [] for the configured value.
+HADOOP_LOCAL =                0
+HADOOP_LOCAL_SLOTS =          0
+HADOOP_LOCAL_SWEEP_PACKETS =  []
+HADOOP_LOCAL_SWEEP_REDUCERS = []
+
+# Staging of the media into HDFS/Lustre (see lib_hadoop_hdfs.copy_files_to_hdfs()): the pieces are read directly from
+#   the media files (without temporary copies) and sent concurrently.
+#   STAGING_WORKERS: maximum number of pieces sent at the same time.
+#   STAGING_SKIP_UNCHANGED: 1 to keep the pieces already in HDFS/Lustre with the same size and checksum as when they 
+#                           were sent, 0 to delete the destination folder and send all the pieces.
+STAGING_WORKERS =             4
+STAGING_SKIP_UNCHANGED =      1
+
+
 #                                                                                                            Map
 ###########################################################
 #           Mapper general optimzations
@@ -46,6 +109,27 @@
 #NUM_FRAMES_PER_LINE = 10
 NUM_FRAMES_PER_LINE = -1 # Keep -1. Needs debugging for >1
 
+# Batched VDIF reader: decode headers for multiple frames at once (see lib_vdif.iter_vdif_frames())
+#   Input is memory-mapped if it is a regular file, otherwise it is read in blocks into a reusable buffer.
+#   -1 to read frame by frame (lib_vdif.read_vdif_frame()).
+MAPPER_FRAMES_PER_BATCH = 256
+
+# Time window: skip the frames outside the scan time window and the frame range before decoding their samples
+#   (see lib_vdif.iter_vdif_frames()). If the input is a regular file, the mapper seeks directly to the first frame in the
+#   window, otherwise frames are dismissed based on their headers.
+#   Requires MAPPER_FRAMES_PER_BATCH>0.
+MAPPER_TIME_WINDOW = 1
+# Margin [s] added to both sides of the window, has to be greater than the maximum delay.
+MAPPER_TIME_WINDOW_MARGIN = 1
+
+# Delay table: get delay information for all accumulation periods at startup (see msvf.get_delay_table()),
+#   instead of looking up the delay model ini file for every frame.
+MAPPER_DELAY_TABLE = 1
+
+# Output buffer for mapper and reducer: number of bytes accumulated before writing into stdout (see lib_mapred_io.get_writer()).
+#   0 to write every line immediately.
+OUTPUT_BUFFER_SIZE = 1048576
+
 
 
 #                                                                                                            Reduce
@@ -61,6 +145,14 @@ COMPUTE_FOR_SUB_ACC_PERIOD = -1 # Keep -1
 #COMPUTE_FOR_SUB_ACC_PERIOD = 100
 #COMPUTE_FOR_SUB_ACC_PERIOD = 400
 
+# Keep stored samples in preallocated buffers (one per stream) with read/write positions, instead of
+#   concatenating (np.hstack) and copying them for every new record.
+#   0 for previous implementation (np.hstack, np.copy)
+REDUCER_STREAM_BUFFER = 1
+
+# Initial size of the stream buffers in number of chunks (length of the first samples stored).
+REDUCER_STREAM_BUFFER_CHUNKS = 4
+
 
 
 # -------------------------------------------------------------------------------------------------- Libraries
@@ -73,6 +165,42 @@ COMPUTE_FOR_SUB_ACC_PERIOD = -1 # Keep -1
 #    TO DO: Keep 0, debug for 1
 SAVE_TIME_ROTATIONS = 0 # Keep 0. Needs debugging for 1
 
+# Fringe rotation for all the streams at once (see lib_fx_stack.fringe_rotation_batched()): delays and rotators 
+#   are evaluated as 2D arrays, only once for streams with the same delay (e.g. polarizations of the same station).
+#   0 for one stream at a time (fringe_rotation_work()).
+FRINGE_ROTATION_BATCHED = 1
+
+# Number of samples per block in the batched fringe rotation (size of the temporaries, and unit of work for the 
+#   reducer threads, see REDUCER_THREADS)
+FRINGE_ROTATION_BLOCK = 65536
+
+# Fused F-engine (see lib_fx_stack.compute_fx_blocks()): fringe rotation, windowing, FFT, fractional sample 
+#   correction and accumulation are done for one block of F_ENGINE_BLOCK samples (per stream) at a time, instead
+#   of each stage for all the samples. Only for complex samples and FRINGE_ROTATION_BATCHED=1.
+#   0 for one stage at a time (full-size intermediates).
+F_ENGINE_FUSED = 1
+F_ENGINE_BLOCK = 65536
+
+# Cross-multiplication and accumulation (X-engine) for all baselines
+#   Minimum number of station-polarizations to use a batched matrix product (one per frequency bin),
+#   see lib_fx_stack.compute_x_matmul(). Speedup is about 2x for few stations and 3x for 16-32
+#   station-polarizations (see bench_xengine.py).
+#   0 for always iterating on station-polarizations (np.multiply and np.sum)
+X_ENGINE_MATMUL = 2
+
+# Number of frequency bins for each block in the batched matrix product
+X_ENGINE_BINS_PER_BLOCK = 64
+
+# Accumulation matrix for single precision ("Single precision" in the configuration file), see bench_precision.py
+#   X_ACCUMULATOR_NATIVE:  complex64 (same type as the FFTs).
+#   X_ACCUMULATOR_FLOAT64: complex128 (products are computed in complex64 and added in double precision).
+#   X_ACCUMULATOR_KAHAN:   complex64 with Kahan compensated summation (for long integrations with no extra memory
+#                           bandwidth for the accumulation matrix, a compensation matrix of the same size is kept).
+X_ACCUMULATOR_NATIVE =  0
+X_ACCUMULATOR_FLOAT64 = 1
+X_ACCUMULATOR_KAHAN =   2
+X_ACCUMULATOR = X_ACCUMULATOR_FLOAT64
+
 
 ###########################################################
 #           FX library approximations
@@ -82,6 +210,21 @@ SAVE_TIME_ROTATIONS = 0 # Keep 0. Needs debugging for 1
 #FULL_TIMESCALE=0  # Evaluate delays only for the first sample
 FULL_TIMESCALE=1  # Evaluate delays for the full timescale
 #FULL_TIMESCALE=2  # Interpolate linearly based on delays for first and last samples
+#FULL_TIMESCALE=3  # Phase recurrence, re-seeded with the exact phase every ROTATOR_RECURRENCE_BLOCK samples
+#                   (only for FRINGE_ROTATION_BATCHED=1, otherwise same as 1), see bench_rotator.py
+
+# Number of samples between seeds for FULL_TIMESCALE=3 (see lib_fx_stack.get_rotators_recurrence())
+ROTATOR_RECURRENCE_BLOCK = 1024
+
+# Real-sampled data: real samples are kept as float (half memory), FFT of real samples (rfft), and fringe rotation 
+#   is applied in the frequency domain as one phase per FFT window (delay evaluated at the center of the window).
+#   0 for complex FFT after rotating all samples (complex128) in the time domain.
+#   The relative error with respect to REAL_FFT=0 is up to 0.5 times the phase drift of the fringe rotation between 
+#   consecutive windows (the maximum phase error within a window; 0.29 times for the rms error of the spectra, up to
+#   0.44 times measured for single channels on noise), time-domain rotation is used if this drift is larger than 
+#   REAL_FFT_MAX_PHASE [rad], thus the relative error is below 0.003.
+REAL_FFT = 1
+REAL_FFT_MAX_PHASE = 0.006
 
 
 ###########################################################
@@ -95,6 +238,18 @@ FULL_TIMESCALE=1  # Evaluate delays for the full timescale
 USE_FFTW =     0
 THREADS_FFTW = 1
 
+# FFT engine (see lib_fft.py)
+#   Overriden by "FFT engine", "FFT threads" and "FFTW wisdom file" in the configuration file (if not empty).
+FFT_ENGINE_SCIPY =     "scipy"      # scipy.fftpack
+FFT_ENGINE_NUMPY =     "numpy"      # numpy.fft
+FFT_ENGINE_SCIPY_FFT = "scipy.fft"  # scipy.fft (scipy>=1.4), multithreaded
+FFT_ENGINE_FFTW =      "fftw"       # pyfftw, with persistent plans and aligned buffers
+FFT_ENGINE =           FFT_ENGINE_FFTW if USE_FFTW else FFT_ENGINE_SCIPY
+FFT_THREADS =          THREADS_FFTW
+FFT_WISDOM_FILE =      ""           # FFTW wisdom file ("" for none)
+FFTW_PLANNER_EFFORT =  "FFTW_MEASURE"
+FFTW_MAX_PLANS =       32           # Maximum number of FFTW plans kept in memory
+
 # Numexpr
 #   (https://pypi.python.org/pypi/numexpr)
 #   TO DO: This is under development.
@@ -113,11 +268,24 @@ else:
 
 # Python multiprocessing.Pool
 #   (https://docs.python.org/2/library/multiprocessing.html#using-a-pool-of-workers)
-#   Use multi-threading, currently for fringe rotation.
+#   Use multi-threading, currently for fringe rotation (only for FRINGE_ROTATION_BATCHED=0, samples are
+#   pickled to the processes, consider REDUCER_THREADS instead).
 #   TO DO: This is under development.
 USE_MP =      0
 MP_THREADS =  1
 
+# Reducer workers (see lib_workers.py), created at reducer startup and kept for its lifetime.
+#   Overriden by "Reducer threads" and "Reducer processes" in the configuration file.
+#   REDUCER_THREADS: threads for numpy/FFT work: fringe rotation (blocks of samples), FFTs (split by
+#                     station-polarizations, except pyfftw that has its own threads) and X-engine (split by 
+#                     frequency bins). 0 for all the cores of the node.
+#   REDUCER_PROCESSES: processes for the X-engine (split by frequency bins, FFTs passed through shared memory, 
+#                       python>=3.8), 0 for none.
+#   REDUCER_MIN_BINS_PER_WORKER: minimum number of frequency bins for each worker in the X-engine.
+REDUCER_THREADS =             1
+REDUCER_PROCESSES =           0
+REDUCER_MIN_BINS_PER_WORKER = 64
+
 
 # <codecell>
 
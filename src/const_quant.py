@@ -34,6 +34,9 @@
 #initial version: 2016.11 ajva
 #MIT Haystack Observatory
 
+# Quantization levels 1 bit (first two levels of 2 bit, as in previous versions)
+QUANT_LEVELS_1BIT=[-3.336, -1]
+
 # Quantization levels 2 bit
 QUANT_LEVELS_2BIT=[-3.336, -1, 1, 3.336]
 
@@ -2147,7 +2147,7 @@ def cxpcal2d(doutput_folder,cxoutput_file,correlation_ini_file,media_ini_file,st
     serial_media=       serialize_config(sources_file=media_ini_file)
     
     params_array_correlation=          serial_params_to_array(serial_correlation)
-    params_array_stations=    np.array(serial_params_to_array(serial_stations))     # TO DO: np.array?
+    params_array_stations=             serial_params_to_array(serial_stations)
     params_array_media=                serial_params_to_array(serial_media)
     
     # Process ini files -                                                                             correlation.ini
@@ -2156,7 +2156,7 @@ def cxpcal2d(doutput_folder,cxoutput_file,correlation_ini_file,media_ini_file,st
     seconds_duration = float(get_val_vector(params_array_correlation,C_INI_CR_S_COMP, C_INI_CR_ACC)[0])
 
     # Process ini files -                                                                             stations.ini
-    stations_v = list([i.upper() for i in params_array_stations[:,0].flatten().tolist()])
+    stations_v = list([i.upper() for i in get_all_sections(params_array_stations)])
     
     if v==1:
         print(stations_v)
@@ -307,6 +307,18 @@ def get_configuration(file_log,config_file,timestamp_str,v=0):
         Number of seconds to  wait before terminating nodes during cluster stop routine.
      SINGLE_PRECISION : bool
         If 1 computations will be done in single precision.
+     FFT_ENGINE : str
+        FFT engine for the reducer ("" for default, see const_performance.py and lib_fft.py).
+     FFT_THREADS : int
+        Number of threads for the FFT engine (0 for default).
+     FFT_WISDOM_FILE : str
+        File to load/save FFTW wisdom ("" for none).
+     REDUCER_THREADS : int
+        Number of threads per reducer (0 for number of cores, -1 for default, see lib_workers.py).
+     REDUCER_PROCESSES : int
+        Number of processes per reducer with shared memory (-1 for default, see lib_workers.py).
+     PIPELINE_REDUCERS : int
+        Number of reducers in pipeline mode (-1 for default, see lib_pipeline.py).
      PROFILE_MAP: int
         | if 1 will generate call graphs with timing information for mapper (requires Python Call Graph package),
         | if 2 will use cProfile.
@@ -449,6 +461,24 @@ def get_configuration(file_log,config_file,timestamp_str,v=0):
     TASK_SCALING_STATIONS =  config.getboolean( C_CONF_OTHER, C_CONF_OTHER_SCALING_STATIONS)
     TIMEOUT_STOP =           config.getint(     C_CONF_OTHER, C_CONF_OTHER_TIMEOUT_STOP_NODES)
     SINGLE_PRECISION =       config.getboolean( C_CONF_OTHER, C_CONF_OTHER_SINGLE_PRECISION)
+    FFT_ENGINE =             ""
+    FFT_THREADS =            0
+    FFT_WISDOM_FILE =        ""
+    REDUCER_THREADS =        -1
+    REDUCER_PROCESSES =      -1
+    PIPELINE_REDUCERS =      -1
+    if config.has_option(C_CONF_OTHER, C_CONF_OTHER_FFT_ENGINE):
+        FFT_ENGINE =         config.get(        C_CONF_OTHER, C_CONF_OTHER_FFT_ENGINE)
+    if config.has_option(C_CONF_OTHER, C_CONF_OTHER_FFT_THREADS):
+        FFT_THREADS =        config.getint(     C_CONF_OTHER, C_CONF_OTHER_FFT_THREADS)
+    if config.has_option(C_CONF_OTHER, C_CONF_OTHER_FFT_WISDOM):
+        FFT_WISDOM_FILE =    config.get(        C_CONF_OTHER, C_CONF_OTHER_FFT_WISDOM)
+    if config.has_option(C_CONF_OTHER, C_CONF_OTHER_REDUCER_THREADS):
+        REDUCER_THREADS =    config.getint(     C_CONF_OTHER, C_CONF_OTHER_REDUCER_THREADS)
+    if config.has_option(C_CONF_OTHER, C_CONF_OTHER_REDUCER_PROCESSES):
+        REDUCER_PROCESSES =  config.getint(     C_CONF_OTHER, C_CONF_OTHER_REDUCER_PROCESSES)
+    if config.has_option(C_CONF_OTHER, C_CONF_OTHER_PIPELINE_REDUCERS):
+        PIPELINE_REDUCERS =  config.getint(     C_CONF_OTHER, C_CONF_OTHER_PIPELINE_REDUCERS)
     FFTS_PER_CHUNK =         -1                                                                # TO DO: remove
     MIN_MAPPER_CHUNK =       -1                                                                # TO DO: remove
     MAX_MAPPER_CHUNK =       -1                                                                # TO DO: remove
@@ -483,6 +513,12 @@ def get_configuration(file_log,config_file,timestamp_str,v=0):
         #    print(" (!) The packet has fewer samples than the size of the FFT",file=file_log)
    
         print(" FFT at mapper:\t\t\t" + str(int(FFT_AT_MAPPER)),file=file_log)
+        if FFT_ENGINE!="":
+            print(" FFT engine:\t\t\t" + FFT_ENGINE + " (threads: " + str(FFT_THREADS) + ")",file=file_log)
+        if (REDUCER_THREADS>=0)or(REDUCER_PROCESSES>=0):
+            print(" Reducer workers:\t\t" + "threads: " + str(REDUCER_THREADS) + ", processes: " + str(REDUCER_PROCESSES),file=file_log)
+        if PIPELINE_REDUCERS>=0:
+            print(" Pipeline reducers:\t\t" + str(PIPELINE_REDUCERS),file=file_log)
         print(" Hadoop delays: [initialization = " + str(HADOOP_START_DELAY) + " s], [termination = " + str(HADOOP_STOP_DELAY) + " s], [HDFS = " + str(HDFS_COPY_DELAY) + " s]",file=file_log)
         
         if MAX_SLAVES>0:
@@ -508,7 +544,8 @@ def get_configuration(file_log,config_file,timestamp_str,v=0):
             INTERNAL_LOG_MAPPER,INTERNAL_LOG_REDUCER,ADJUST_MAPPERS,ADJUST_REDUCERS,FFTS_PER_CHUNK,TEXT_MODE,\
             USE_NOHASH_PARTITIONER,USE_LUSTRE_PLUGIN,LUSTRE_USER_DIR,LUSTRE_PREFIX,ONE_BASELINE_PER_TASK,\
             MIN_MAPPER_CHUNK,MAX_MAPPER_CHUNK,TASK_SCALING_STATIONS,SORT_OUTPUT,BM_AVOID_COPY,\
-            BM_DELETE_OUTPUT,TIMEOUT_STOP,SINGLE_PRECISION,PROFILE_MAP,PROFILE_RED])
+            BM_DELETE_OUTPUT,TIMEOUT_STOP,SINGLE_PRECISION,PROFILE_MAP,PROFILE_RED,\
+            FFT_ENGINE,FFT_THREADS,FFT_WISDOM_FILE,REDUCER_THREADS,REDUCER_PROCESSES,PIPELINE_REDUCERS])
     
 
 
@@ -731,6 +768,21 @@ def override_configuration_parameters(forced_configuration_string,config_file,v=
             elif parameter==C_ARG_SINGLEPRECISION:                                               # Single precision in computations
                 forced_configuration_pairs+=[[C_CONF_OTHER_SINGLE_PRECISION+":",value]]
             
+            elif parameter==C_ARG_FFTENGINE:                                                     # FFT engine
+                forced_configuration_pairs+=[[C_CONF_OTHER_FFT_ENGINE+":",value]]
+            
+            elif parameter==C_ARG_FFTTHREADS:                                                    # Threads for FFT engine
+                forced_configuration_pairs+=[[C_CONF_OTHER_FFT_THREADS+":",value]]
+            
+            elif parameter==C_ARG_REDUCERTHREADS:                                                # Threads per reducer
+                forced_configuration_pairs+=[[C_CONF_OTHER_REDUCER_THREADS+":",value]]
+            
+            elif parameter==C_ARG_REDUCERPROCESSES:                                              # Processes per reducer
+                forced_configuration_pairs+=[[C_CONF_OTHER_REDUCER_PROCESSES+":",value]]
+            
+            elif parameter==C_ARG_PIPELINEREDUCERS:                                              # Reducers in pipeline mode
+                forced_configuration_pairs+=[[C_CONF_OTHER_PIPELINE_REDUCERS+":",value]]
+            
             #elif parameter==C_ARG_DATA:                                                          # Data directory
             #    list_value=value.split("/")
             #    value='\/'.join(map(str, list_value))
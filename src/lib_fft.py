@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+# <nbformat>3.0</nbformat>
+
+# <codecell>
+
+#!/usr/bin/env python
+#
+#The MIT CorrelX Correlator
+#
+#https://github.com/MITHaystack/CorrelX
+#Contact: correlX@haystack.mit.edu
+#Project leads: Victor Pankratius, Pedro Elosegui Project developer: A.J. Vazquez Alvarez
+#
+#Copyright 2017 MIT Haystack Observatory
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+#------------------------------
+#------------------------------
+#Project: CorrelX.
+#File: lib_fft.py.
+#Author: agent (agent@local)
+#Description: 
+"""
+FFT engines (scipy.fftpack, numpy.fft, scipy.fft and pyfftw).
+
+"""
+#History:
+#initial version: 2026.10 agent
+#MIT Haystack Observatory
+
+from __future__ import print_function,division
+import os
+import pickle
+import numpy as np
+import scipy.fftpack as scfft
+import imp
+
+import const_performance
+imp.reload(const_performance)
+from const_performance import *
+
+try:
+    import scipy.fft as scipy_fft                 # scipy>=1.4
+except ImportError:
+    scipy_fft = None
+
+try:
+    import pyfftw
+except ImportError:
+    pyfftw = None
+
+
+# Engine used by default (see set_fft_engine()).
+fft_engine_current = None
+
+
+###########################################
+#           Engine initialization
+########################################### 
+
+def init_fft_engine(engine_name=FFT_ENGINE,threads=FFT_THREADS,wisdom_file=FFT_WISDOM_FILE):
+    """
+    Initialize FFT engine.
+    
+    Parameters
+    ----------
+     engine_name : str
+         FFT_ENGINE_SCIPY, FFT_ENGINE_NUMPY, FFT_ENGINE_SCIPY_FFT or FFT_ENGINE_FFTW (see const_performance.py).
+         If "" the default engine (FFT_ENGINE) is used.
+     threads : int
+         number of threads (scipy.fft and pyfftw only). If <=0 the default value (FFT_THREADS) is used.
+     wisdom_file : str
+         path to file with FFTW wisdom (pyfftw only, "" for none). Wisdom is loaded here if the file exists, 
+          and saved with save_fft_wisdom().
+    
+    Returns
+    -------
+     fft_engine : list
+         [engine_name,threads,wisdom_file,plans,plans_keys], with plans the dictionary of FFTW objects
+          (pyfftw only) and plans_keys the list of their keys in order of creation.
+    
+    Notes
+    -----
+    |
+    | **Notes:**
+    |
+    |  If the engine is not available it falls back to scipy.fftpack (FFT_ENGINE_SCIPY).
+    """
+    if engine_name=="":
+        engine_name=FFT_ENGINE
+    if threads<=0:
+        threads=FFT_THREADS
+    
+    if engine_name not in [FFT_ENGINE_SCIPY,FFT_ENGINE_NUMPY,FFT_ENGINE_SCIPY_FFT,FFT_ENGINE_FFTW]:
+        print("zR\tWarning: unknown FFT engine "+engine_name+", using "+FFT_ENGINE_SCIPY)
+        engine_name=FFT_ENGINE_SCIPY
+    elif (engine_name==FFT_ENGINE_SCIPY_FFT and scipy_fft is None)or(engine_name==FFT_ENGINE_FFTW and pyfftw is None):
+        print("zR\tWarning: FFT engine "+engine_name+" not available, using "+FFT_ENGINE_SCIPY)
+        engine_name=FFT_ENGINE_SCIPY
+    
+    if engine_name==FFT_ENGINE_FFTW and wisdom_file!="" and os.path.isfile(wisdom_file):
+        try:
+            with open(wisdom_file,'rb') as f_wisdom:
+                pyfftw.import_wisdom(pickle.load(f_wisdom))
+        except (IOError,ValueError,EOFError,pickle.UnpicklingError):
+            print("zR\tWarning: could not load FFTW wisdom from "+wisdom_file)
+    
+    fft_engine=[engine_name,threads,wisdom_file,{},[]]
+    return(fft_engine)
+
+
+def save_fft_wisdom(fft_engine):
+    """
+    Save FFTW wisdom (accumulated while creating the plans) into the wisdom file of the engine, so that 
+     next jobs can skip planning. No effect if the engine is not pyfftw or if there is no wisdom file.
+    """
+    [engine_name,threads,wisdom_file,plans,plans_keys]=fft_engine
+    if engine_name==FFT_ENGINE_FFTW and wisdom_file!="":
+        # Write into temporary file and rename, as multiple reducers may be saving wisdom simultaneously
+        wisdom_file_tmp=wisdom_file+".tmp"+str(os.getpid())
+        try:
+            with open(wisdom_file_tmp,'wb') as f_wisdom:
+                pickle.dump(pyfftw.export_wisdom(),f_wisdom)
+            os.rename(wisdom_file_tmp,wisdom_file)
+        except (IOError,OSError):
+            print("zR\tWarning: could not save FFTW wisdom into "+wisdom_file)
+
+
+def set_fft_engine(fft_engine):
+    """
+    Set engine to be used by default in compute_fft().
+    """
+    global fft_engine_current
+    fft_engine_current=fft_engine
+
+
+def get_fft_engine():
+    """
+    Get engine used by default in compute_fft() (initialized with the configuration in const_performance.py
+     if not set previously).
+    """
+    if fft_engine_current is None:
+        set_fft_engine(init_fft_engine())
+    return(fft_engine_current)
+
+
+
+
+###########################################
+#           FFT
+########################################### 
+
+def get_fftw_plan(fft_engine,shape,dtype,real_input=0):
+    """
+    Get FFTW object (along the last dimension) for an input with the given shape and type, creating it 
+     (with its aligned input and output buffers) if it does not exist. If real_input is 1 dtype is the
+     type of the input (float) and the output has shape[-1]//2+1 complex coefficients.
+    
+    Notes
+    -----
+    |
+    | **Configuration:**
+    |
+    |  FFTW_PLANNER_EFFORT: planning flag (see pyfftw.FFTW).
+    |  FFTW_MAX_PLANS: maximum number of plans kept (the oldest is discarded).
+    """
+    [engine_name,threads,wisdom_file,plans,plans_keys]=fft_engine
+    key=(tuple(shape),np.dtype(dtype).str,real_input)
+    if key not in plans:
+        if len(plans_keys)>=FFTW_MAX_PLANS:
+            del plans[plans_keys.pop(0)]
+        fftw_input = pyfftw.empty_aligned(shape,dtype=dtype)
+        if real_input:
+            fftw_output = pyfftw.empty_aligned(tuple(shape[:-1])+(shape[-1]//2+1,),\
+                                               dtype=np.result_type(dtype,np.complex64))
+        else:
+            fftw_output = pyfftw.empty_aligned(shape,dtype=dtype)
+        plans[key] = pyfftw.FFTW(fftw_input,fftw_output,axes=(-1,),direction='FFTW_FORWARD',\
+                                 flags=(FFTW_PLANNER_EFFORT,),threads=threads)
+        plans_keys.append(key)
+    return(plans[key])
+
+
+def compute_fft(x,fft_engine=None,reuse_output=0):
+    """
+    FFT along the last dimension.
+    
+    Parameters
+    ----------
+     x : numpy array
+         input samples (real or complex).
+     fft_engine
+         engine (see init_fft_engine()), if None the default engine is used (see get_fft_engine()).
+     reuse_output : int
+         [pyfftw only] if 1 the output is the output buffer of the plan (no copy), that will be overwritten in the
+          next call for the same shape and type.
+    
+    Returns
+    -------
+     x_fft : numpy array
+         complex array with the same shape as x. Type is complex64 for float32/complex64 inputs and complex128 
+          otherwise (numpy.fft only supports double precision, so its result is converted for single precision).
+    """
+    if fft_engine is None:
+        fft_engine=get_fft_engine()
+    [engine_name,threads,wisdom_file,plans,plans_keys]=fft_engine
+    
+    if engine_name==FFT_ENGINE_FFTW:
+        plan = get_fftw_plan(fft_engine,x.shape,np.result_type(x.dtype,np.complex64))
+        plan.input_array[:] = x
+        plan.execute()
+        if reuse_output:
+            x_fft = plan.output_array
+        else:
+            x_fft = np.copy(plan.output_array)
+    elif engine_name==FFT_ENGINE_SCIPY_FFT:
+        x_fft = scipy_fft.fft(x,workers=threads)
+    elif engine_name==FFT_ENGINE_NUMPY:
+        x_fft = np.fft.fft(x).astype(np.result_type(x.dtype,np.complex64),copy=False)
+    else:
+        x_fft = scfft.fft(x)
+    return(x_fft)
+
+
+def compute_rfft(x,fft_engine=None,reuse_output=0):
+    """
+    FFT of real samples along the last dimension (non-negative frequencies only).
+    
+    Parameters
+    ----------
+     x : numpy array
+         input samples (float).
+     fft_engine
+         see compute_fft().
+     reuse_output
+         see compute_fft().
+    
+    Returns
+    -------
+     x_fft : numpy array
+         complex array with N//2+1 coefficients in the last dimension (N=x.shape[-1]), complex64 for float32 
+          inputs and complex128 otherwise.
+    
+    Notes
+    -----
+    |
+    | **Notes:**
+    |
+    |  scipy.fftpack.rfft returns a packed real array, so numpy.fft.rfft is used for FFT_ENGINE_SCIPY.
+    """
+    if fft_engine is None:
+        fft_engine=get_fft_engine()
+    [engine_name,threads,wisdom_file,plans,plans_keys]=fft_engine
+    
+    if engine_name==FFT_ENGINE_FFTW:
+        plan = get_fftw_plan(fft_engine,x.shape,x.dtype,real_input=1)
+        plan.input_array[:] = x
+        plan.execute()
+        if reuse_output:
+            x_fft = plan.output_array
+        else:
+            x_fft = np.copy(plan.output_array)
+    elif engine_name==FFT_ENGINE_SCIPY_FFT:
+        x_fft = scipy_fft.rfft(x,workers=threads)
+    else:
+        x_fft = np.fft.rfft(x).astype(np.result_type(x.dtype,np.complex64),copy=False)
+    return(x_fft)
+
+
+
+# <codecell>
+
+
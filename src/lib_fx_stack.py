@@ -60,10 +60,9 @@ imp.reload(const_performance)
 from const_performance import *
 
 
-if USE_FFTW:
-    import pyfftw 
-    pyfftw.interfaces.cache.enable()
-    #pyfftw.interfaces.cache.set_keepalive_time(20)
+import lib_fft
+imp.reload(lib_fft)
+from lib_fft import *
     
 
 # use numexpr
@@ -74,17 +73,201 @@ if USE_NE:
 # multiprocessing
 if USE_MP:
     import multiprocessing
+
+# Reducer workers
+import lib_workers
+imp.reload(lib_workers)
+
+
+# Persistent pool of processes for fringe rotation (see get_rotation_pool()).
+rotation_pool_mp = None
+    
+    
+
+    
+###########################################
+#        Stored samples buffers
+########################################### 
+
+def init_stream_buffers():
+    """
+    Initialize buffers for the stored samples (one contiguous block per stream).
     
+    Returns
+    -------
+     F_buf : list
+         [buffers,reads,writes] with buffers the list of preallocated 1D numpy arrays, and reads and writes the lists
+          with the positions of the first stored sample and after the last stored sample in each buffer.
     
+    Notes
+    -----
+    |
+    | **Procedure:**
+    |
+    |  -New samples are copied at the write position (append_stream_buffer()).
+    |  -Processed samples are released by moving the read position (consume_stream_buffer()), so the remainder is not
+    |    copied.
+    |  -The stored samples are moved to the beginning of the buffer only when there is no space left at the end, and the
+    |    buffer is reallocated (doubling its size) only if it is still not enough.
+    |
+    | **Configuration:**
+    |
+    |  REDUCER_STREAM_BUFFER_CHUNKS: initial size of the buffers in number of chunks (length of the first samples stored).
+    """
+    F_buf=[[],[],[]]
+    return(F_buf)
+
+
+def reset_stream_buffers(F_buf):
+    """
+    Discard all stored samples (buffers are kept for reuse).
+    """
+    for i in range(len(F_buf[0])):
+        F_buf[1][i]=0
+        F_buf[2][i]=0
+
 
+def get_stream_buffer(F_buf,i):
+    """
+    Get view of the stored samples for stream i.
+    """
+    return(F_buf[0][i][F_buf[1][i]:F_buf[2][i]])
+
+
+def get_stream_buffer_all(F_buf,n_streams):
+    """
+    Get list of views of the stored samples for the first n_streams streams.
+    """
+    return([get_stream_buffer(F_buf,i) for i in range(n_streams)])
+
+
+def append_stream_buffer(F_buf,i,samples,reset=0):
+    """
+    Add samples to the buffer for stream i.
+    
+    Parameters
+    ----------
+     F_buf : list
+         see init_stream_buffers().
+     i : int
+         stream index.
+     samples : 1D numpy array
+         new samples.
+     reset : int
+         if 1, discard stored samples before adding the new samples.
+    
+    Returns
+    -------
+     view : 1D numpy array
+         view of the stored samples for stream i (see get_stream_buffer()).
+    """
+    [buffers,reads,writes]=F_buf
+    n_new=len(samples)
+    while len(buffers)<=i:
+        buffers.append(np.zeros(0,dtype=samples.dtype))
+        reads.append(0)
+        writes.append(0)
+    if reset:
+        reads[i]=0
+        writes[i]=0
+    n_stored=writes[i]-reads[i]
+    if n_stored==0:
+        reads[i]=0
+        writes[i]=0
+    dtype_out=np.result_type(buffers[i].dtype,samples.dtype)
+    if buffers[i].dtype!=dtype_out:
+        # Different type (same as np.hstack()), reallocate
+        buffers[i]=buffers[i].astype(dtype_out)
+    if writes[i]+n_new>len(buffers[i]):
+        if n_stored+n_new<=len(buffers[i]):
+            # Move remainder to the beginning
+            buffers[i][:n_stored]=buffers[i][reads[i]:writes[i]]
+        else:
+            size_new=max(REDUCER_STREAM_BUFFER_CHUNKS*n_new,2*len(buffers[i]),n_stored+n_new)
+            buffer_new=np.empty(size_new,dtype=dtype_out)
+            buffer_new[:n_stored]=buffers[i][reads[i]:writes[i]]
+            buffers[i]=buffer_new
+        reads[i]=0
+        writes[i]=n_stored
+    buffers[i][writes[i]:writes[i]+n_new]=samples
+    writes[i]+=n_new
+    return(get_stream_buffer(F_buf,i))
+
+
+def consume_stream_buffer(F_buf,i,n_samples):
+    """
+    Release the first n_samples stored samples for stream i.
+    """
+    F_buf[1][i]=min(F_buf[2][i],F_buf[1][i]+n_samples)
+    if F_buf[1][i]==F_buf[2][i]:
+        F_buf[1][i]=0
+        F_buf[2][i]=0
+
+
+def cut_remainder_stream_buffers(F_buf,n_streams,fft_size_multiple):
+    """
+    Equivalent to cut_remainder_fft_size_multiple() for samples in buffers, with no copies.
+    
+    Returns
+    -------
+     F_partial_out
+         list of views with the first fft_size_multiple stored samples for each stream.
     
+    Notes
+    -----
+    |
+    | The samples in F_partial_out are released from the buffers, so the buffers keep only the remainder, that will be
+    |  returned by get_stream_buffer_all(). F_partial_out must be used before adding new samples.
+    """
+    F_partial_out=[]
+    for i in range(n_streams):
+        F_partial_out.append(get_stream_buffer(F_buf,i)[:fft_size_multiple])
+        consume_stream_buffer(F_buf,i,fft_size_multiple)
+    return(F_partial_out)
+
+
+
+
 ###########################################
 #           Samples stacking
 ########################################### 
 
 
+def get_hstack_slots(F_ind,F_ind_partial):
+    """
+    Get the index in the stored samples (see hstack_new_samples()) for each stream with new samples.
+    
+    Parameters
+    ----------
+     F_ind
+         list of station-polarization identifiers for the new samples.
+     F_ind_partial
+         list of station-polarization identifiers for the stored samples.
+    
+    Returns
+    -------
+     slots : list of int
+         for each element in F_ind, its index in F_ind_partial if it is stored, otherwise its own index if not
+          used by another stored stream that continues, or the first index not used.
+    
+    Notes
+    -----
+    |
+    | New streams never take the index of a stored stream that continues, so that the stored samples are not
+    |  overwritten if the order of the streams changes between records.
+    """
+    n_slots=max(len(F_ind),len(F_ind_partial))
+    slots=[F_ind_partial.index(F_ind_i) if F_ind_i in F_ind_partial else -1 for F_ind_i in F_ind]
+    used=set(slots)
+    for i in range(len(F_ind)):
+        if slots[i]==-1:
+            slots[i]=i if i not in used else min(set(range(n_slots))-used)
+            used.add(slots[i])
+    return(slots)
+
+
 def hstack_new_samples(F1_partial,F_ind_partial,F_ind,F1,F_adj_shift_partial,F_stack_shift,F_lti_in,F_first_sample,\
-                       mode_str="",F_frac_over_ind=[]):
+                       mode_str="",F_frac_over_ind=[],F_buf=None):
     """
     Concatenation of new samples with previously saved.
     
@@ -115,11 +298,14 @@ def hstack_new_samples(F1_partial,F_ind_partial,F_ind,F1,F_adj_shift_partial,F_s
      F_frac_over
          list with the number of positions of the samples added/dropped due to fractional sample correction overflow,
                               see get_frac_over_ind() and fix_frac_over() for more details.
+     F_buf
+         [None by default] buffers for the stored samples (see init_stream_buffers()), if None the samples are
+                              concatenated into new arrays.
                               
     Returns
     -------
      F1_partial_out
-         F1_partial with samples from F1 added.
+         F1_partial with samples from F1 added (views of the buffers if F_buf is not None).
      F_ind_partial_out
          station-polarization identifiers for the streams in F1_partial_out (same format as in keys).
      F_refs_out
@@ -140,6 +326,7 @@ def hstack_new_samples(F1_partial,F_ind_partial,F_ind,F1,F_adj_shift_partial,F_s
     |  If there are stored samples, iterate over list of stored samples:
     |   1. [currently disabled] Add zero padding if first sample does not match the expected first sample number.
     |   2. Concatenate new samples (accesed at F1 via F_ref) with stored samples.
+    |   3. Store samples of new streams in indices not used by the stored streams (see get_hstack_slots()).
     |  Otherwise initialize structures and store new samples.
     |
     |
@@ -186,6 +373,7 @@ def hstack_new_samples(F1_partial,F_ind_partial,F_ind,F1,F_adj_shift_partial,F_s
         
         if F_ind_partial!=[]:
             if F_ind_partial!=[]:
+                slots=get_hstack_slots(F_ind,F_ind_partial)
                 for i in range(len(F_ind)):
                     
                     # Check if missing data
@@ -217,11 +405,14 @@ def hstack_new_samples(F1_partial,F_ind_partial,F_ind,F1,F_adj_shift_partial,F_s
                         #    print("zR\Warning: Inserted "+str(diff_first)+" samples at ls "+str(last_sample)+" for st "+str(F_ind[i]))
                         #else:
                         
-                        try:
-                            F1_partial_out[index_in_partial]=np.hstack((F1_partial[index_in_partial],F1[i]))
-                        except IndexError:
-                            print("Failed hstack "+str(F_first_sample[i]))
-                            failed_hstack=1
+                        if F_buf is not None:
+                            F1_partial_out[index_in_partial]=append_stream_buffer(F_buf,index_in_partial,F1[i])
+                        else:
+                            try:
+                                F1_partial_out[index_in_partial]=np.hstack((F1_partial[index_in_partial],F1[i]))
+                            except IndexError:
+                                print("Failed hstack "+str(F_first_sample[i]))
+                                failed_hstack=1
                         
                         F_ind_partial_out[index_in_partial]=F_ind[i]
                         F_refs_out[index_in_partial]=i
@@ -234,7 +425,8 @@ def hstack_new_samples(F1_partial,F_ind_partial,F_ind,F1,F_adj_shift_partial,F_s
                         F_lti_out[index_in_partial][1]+=tot_samples
                     else:
                         # new record
-                        diff_first=F_first_sample[i]-(F_lti_out[i][0])
+                        slot=slots[i]
+                        diff_first=F_first_sample[i]-(F_lti_out[slot][0])
                         offset_frac=0
                         if F_frac_over_ind!=[]:
                             offset_frac=F_frac_over_ind[i][0]
@@ -242,7 +434,7 @@ def hstack_new_samples(F1_partial,F_ind_partial,F_ind,F1,F_adj_shift_partial,F_s
                             # This record does not exist yet
                             #diff_first-=F_lti[i][3]
                         
-                        F_lti_out[i][3]+=offset_frac
+                        F_lti_out[slot][3]+=offset_frac
                         
                         ##if diff_first>0:
                         ## HARDCODED: disabled padding...
@@ -252,16 +444,20 @@ def hstack_new_samples(F1_partial,F_ind_partial,F_ind,F1,F_adj_shift_partial,F_s
                         #    print("zR\Warning: Inserted "+str(diff_first)+" samples at ls "+str(last_sample)+" for st "+str(F_ind[i]))
                         #else:
                         
-                        F1_partial_out[i]=np.copy(F1[i])
+                        if F_buf is not None:
+                            F1_partial_out[slot]=append_stream_buffer(F_buf,slot,F1[i],reset=1)
+                        else:
+                            F1_partial_out[slot]=np.copy(F1[i])
                         
-                        F_ind_partial_out[i]=F_ind[i]
-                        F_refs_out[i]=i
+                        F_ind_partial_out[slot]=F_ind[i]
+                        F_refs_out[slot]=i
                 
                         if DEBUG_HSTACK:
-                            print_debug_r_hstack(mode_str,i,F_ind_partial[i],F_ind_partial_out[i],i,F_ind[i])
+                            print_debug_r_hstack(mode_str,slot,F_ind_partial[slot] if slot<len(F_ind_partial) else None,\
+                                                 F_ind_partial_out[slot],i,F_ind[i])
                     
-                        F_lti_out[i][0]=last_sample
-                        F_lti_out[i][1]+=tot_samples
+                        F_lti_out[slot][0]=last_sample
+                        F_lti_out[slot][1]+=tot_samples
                         #if F_frac_over_ind!=[]:
                         #    F_lti_out[index_in_partial][3]=offset_frac
 
@@ -307,7 +503,10 @@ def hstack_new_samples(F1_partial,F_ind_partial,F_ind,F1,F_adj_shift_partial,F_s
             #    F_lti_out[i][2]+=diff_first
             #else:
             
-            F1_partial_out[i]=np.copy(F1[i])
+            if F_buf is not None:
+                F1_partial_out[i]=append_stream_buffer(F_buf,i,F1[i],reset=1)
+            else:
+                F1_partial_out[i]=np.copy(F1[i])
             
             F_ind_partial_out[i]=F_ind[i]
             F_refs_out[i]=i
@@ -326,6 +525,12 @@ def hstack_new_samples(F1_partial,F_ind_partial,F_ind,F1,F_adj_shift_partial,F_s
         #else:
         #    F_stack_shift_out=[0]*len(F_adj_shift_partial)
 
+    if F_buf is not None:
+        # Stored samples for streams without new samples are discarded (as in F1_partial_out)
+        for i in range(len(F_ind_partial_out)):
+            if F_ind_partial_out[i]==-1 and i<len(F_buf[0]):
+                consume_stream_buffer(F_buf,i,F_buf[2][i])
+    
     if DEBUG_FRAC_OVER:
         print("zR"+KEY_SEP+"oao"+str(len(F_stack_shift_out)).rjust(10)+str(len(F_adj_shift_partial)).rjust(10))
     
@@ -540,13 +745,15 @@ def fix_frac_over(F1,F_frac_over_ind,F_ind,F_first_sample):
 
 
 
-def get_exp(x):
+def get_exp(x,dtype_complex=None):
     """
     Get exponential based on fractional part of input, see Output below for details.
     
     Parameters
     ----------
-     x : numpy array of float.
+     x : numpy array of float (for 2D arrays all the elements are computed, see Approximations below).
+     dtype_complex
+         [None by default] type of the rotators (e.g. np.complex64 for single precision), if None complex128.
      
     Returns
     -------
@@ -561,6 +768,8 @@ def get_exp(x):
     | **Precision:**
     |
     |  Integer part is removed to avoid problems with precision, rotation (j2pi).
+    |  For single precision the fractional part is computed from x (double) and then converted to float32, 
+    |   so that the exponential is computed in single precision.
     |
     |
     | **Approximations:**
@@ -571,8 +780,11 @@ def get_exp(x):
     """
     nr=0
     
+    # Fractional part in the precision of the rotators
+    dtype_real = np.float64 if dtype_complex is None else np.finfo(dtype_complex).dtype
+    
     # Check if it is only one element
-    if len(x)==1:
+    if np.ndim(x)==1 and len(x)==1:
         
         # Check if no rotation
         if x==0:
@@ -580,16 +792,16 @@ def get_exp(x):
             nr=1
         else:
             if USE_NE_EXP:
-                modf_val= np.modf(x)[0]
+                modf_val= np.modf(x)[0].astype(dtype_real,copy=False)
                 pi_val = np.pi
                 y=ne.evaluate("exp(1j*2*pi_val*modf_val)")
             else:
-                y=np.exp(1j*2*np.pi*np.modf(x)[0])
+                y=np.exp(1j*2*np.pi*np.modf(x)[0].astype(dtype_real,copy=False))
            
     
     # (!) Check if first, second and last sample are equal, if so, compute only once and repeat
     # TO DO: check this approach
-    elif x[0]==x[-1] and x[0]==x[1]:
+    elif np.ndim(x)==1 and x[0]==x[-1] and x[0]==x[1]:
         # Check if no rotation
         if x[0]==0:
             y=1+0j
@@ -601,6 +813,8 @@ def get_exp(x):
                 y=ne.evaluate("exp(1j*2*pi_val*modf_val)")
             else:
                 y=np.exp(1j*2*np.pi*np.modf(x[0])[0])
+            if dtype_complex is not None:
+                y=np.array(y,dtype=dtype_complex)
             
     
     # Otherwise compute for all samples
@@ -608,12 +822,16 @@ def get_exp(x):
 
     else:
         if USE_NE_EXP:
-            modf_val= np.modf(x)[0]
+            modf_val= np.modf(x)[0].astype(dtype_real,copy=False)
             pi_val = np.pi
             y=ne.evaluate("exp(1j*2*pi_val*modf_val)")
         else:
-            y=np.exp(1j*2*np.pi*np.modf(x)[0])
+            y=np.exp(1j*2*np.pi*np.modf(x)[0].astype(dtype_real,copy=False))
         nr=0
+    
+    if not(nr) and (dtype_complex is not None):
+        # numexpr computes in double precision
+        y=y.astype(dtype_complex,copy=False)
 
     return([y,nr])
     #return(np.exp(1j*2*np.pi*np.modf(x)[0]))
@@ -650,7 +868,7 @@ def get_rotator(x):
 
 
 
-def window_and_fft(v1_dequant,fft_size,windowing,flatten_chunks=1,dtype_complex=complex,rfft_data_type='c'):
+def window_and_fft(v1_dequant,fft_size,windowing,flatten_chunks=1,dtype_complex=complex,rfft_data_type='c',reuse_output=0):
     """
     Apply window and do FFT of set of samples, to be grouped into chunks of FFT size.
     
@@ -667,7 +885,9 @@ def window_and_fft(v1_dequant,fft_size,windowing,flatten_chunks=1,dtype_complex=
      dtype_complex
          complex type to be used in initialization of arrays.
      rfft_data_type
-         [unused] initially devised to use rfft, currently not used.
+         'c' for FFT (default), 'r' for FFT of real samples (only fft_size//2+1 coefficients, see lib_fft.compute_rfft()).
+     reuse_output
+         if 1 the output may be a buffer that will be overwritten in the next call (see lib_fft.compute_fft()).
      
     Returns
     -------
@@ -680,8 +900,9 @@ def window_and_fft(v1_dequant,fft_size,windowing,flatten_chunks=1,dtype_complex=
     |
     | **Performance:**
     |
-    |  Using scipy fft, which yielded the highest performance on preliminary benchmarking with single thread reducer.
-    |  PyFFTW implemented, but needs to be tested and benchmarked.
+    |  Using scipy fft by default, which yielded the highest performance on preliminary benchmarking with single
+    |   thread reducer. Other engines (numpy, scipy.fft, pyfftw) can be selected in the configuration file,
+    |   see lib_fft.py.
     |
     |
     | **TO DO: **
@@ -692,49 +913,40 @@ def window_and_fft(v1_dequant,fft_size,windowing,flatten_chunks=1,dtype_complex=
                    
     num_chunks1=len(v1_dequant)//fft_size
     len_v1_dequant=len(v1_dequant)
-    v1_dequant=np.vstack(v1_dequant)
+    if not(isinstance(v1_dequant,np.ndarray) and v1_dequant.ndim==2):
+        v1_dequant=np.vstack(v1_dequant)
     if flatten_chunks==1:
         # One-baseline-per-task 
         # Windowing:
         if windowing==C_INI_CR_WINDOW_HANNING:
             # -Hanning
             if num_chunks1==1:
-                window_v1=np.hanning(fft_size)
+                window_v1=np.hanning(fft_size).astype(v1_dequant.real.dtype)
                 if rfft_data_type=='c':
-                    v1fft=[scfft.fft(np.multiply(v1_dequant,window_v1))]
+                    v1fft=[compute_fft(np.multiply(v1_dequant,window_v1))]
                 else:
-                    v1fft=[scfft.rfft(np.multiply(v1_dequant,window_v1))]
+                    v1fft=[compute_rfft(np.multiply(v1_dequant,window_v1))]
             else:
-                window_v1=[np.hanning(fft_size)]*num_chunks1
+                window_v1=[np.hanning(fft_size).astype(v1_dequant.real.dtype)]*num_chunks1
                 if rfft_data_type=='c':
-                    v1fft=scfft.fft(np.multiply(np.reshape(v1_dequant,(-1,fft_size)),window_v1))
+                    v1fft=compute_fft(np.multiply(np.reshape(v1_dequant,(-1,fft_size)),window_v1))
                 else:
-                    v1fft=scfft.rfft(np.multiply(np.reshape(v1_dequant,(-1,fft_size)),window_v1))
+                    v1fft=compute_rfft(np.multiply(np.reshape(v1_dequant,(-1,fft_size)),window_v1))
         else:
             # -Square
             if num_chunks1==0:
                 v1fft=np.array([])
             elif num_chunks1==1:
-                if USE_FFTW==0:
-                    if rfft_data_type=='c':
-                        v1fft=np.array([scfft.fft(v1_dequant)])
-                    else:
-                        v1fft=np.array([scfft.rfft(v1_dequant)])
+                if rfft_data_type=='c':
+                    v1fft=np.array([compute_fft(v1_dequant)])
                 else:
-                    fftw_input = pyfftw.empty_aligned(v1_dequant.shape, dtype=dtype_complex)
-                    fftw_input[:] = v1_dequant
-                    v1fft = pyfftw.interfaces.numpy_fft.fft(fftw_input,threads=THREADS_FFTW)
+                    v1fft=np.array([compute_rfft(v1_dequant)])
             else:
                 reshaped_dequant = np.reshape(v1_dequant,(-1,fft_size))
-                if USE_FFTW==0:
-                    if rfft_data_type=='c':
-                        v1fft=scfft.fft(reshaped_dequant)
-                    else:
-                        v1fft=scfft.rfft(reshaped_dequant)
-                else:    
-                    fftw_input = pyfftw.empty_aligned(reshaped_dequant.shape, dtype=dtype_complex)
-                    fftw_input[:] = reshaped_dequant
-                    v1fft = pyfftw.interfaces.numpy_fft.fft(fftw_input,threads=THREADS_FFTW)
+                if rfft_data_type=='c':
+                    v1fft=compute_fft(reshaped_dequant)
+                else:
+                    v1fft=compute_rfft(reshaped_dequant)
 
     else:
         #TO DO: windowing untested for not flattened chunks (used if all baselines in same task)
@@ -748,19 +960,45 @@ def window_and_fft(v1_dequant,fft_size,windowing,flatten_chunks=1,dtype_complex=
         else:
             # TO DO: need to reshape, but based on ordering of first samples (currently padding sample number in key...)
             reshaped_dequant = np.reshape(v1_dequant,(len_v1_dequant,-1,fft_size))
-            if USE_FFTW==0:
-                if rfft_data_type=='c':
-                    v1fft=scfft.fft(reshaped_dequant)
-                else:
-                    v1fft=scfft.rfft(reshaped_dequant)
-            else:
-                fftw_input = pyfftw.empty_aligned(reshaped_dequant.shape, dtype=dtype_complex)
-                fftw_input[:] = reshaped_dequant
-                v1fft = pyfftw.interfaces.scipy_fftpack.fft(fftw_input,threads=THREADS_FFTW)
+            v1fft=compute_fft_rows(reshaped_dequant,rfft_data_type,reuse_output)
 
     return(v1fft)
 
 
+def compute_fft_rows(x,rfft_data_type='c',reuse_output=0):
+    """
+    FFT along the last dimension of x, with the rows of x (station-polarizations) split among the reducer threads
+     (see lib_workers.py).
+    
+    Parameters
+    ----------
+     x : numpy 3D array
+         samples [station-polarizations x windows x fft_size].
+     rfft_data_type
+         see window_and_fft().
+     reuse_output
+         see lib_fft.compute_fft(), only used if the rows are not split.
+    
+    Notes
+    -----
+    |
+    | **Notes:**
+    |
+    |  The rows are not split for pyfftw (the plans share their buffers, use "FFT threads" instead).
+    """
+    fft_function = compute_fft if rfft_data_type=='c' else compute_rfft
+    threads=lib_workers.get_workers()[0]
+    rows_parts=lib_workers.split_range(len(x),threads)
+    if len(rows_parts)<2 or get_fft_engine()[0]==FFT_ENGINE_FFTW:
+        return(fft_function(x,reuse_output=reuse_output))
+    n_coeffs = x.shape[-1] if rfft_data_type=='c' else x.shape[-1]//2+1
+    x_fft=np.empty(x.shape[:-1]+(n_coeffs,),dtype=np.result_type(x.dtype,np.complex64))
+    def fft_rows(rows):
+        x_fft[rows]=fft_function(x[rows])
+    lib_workers.map_threads(fft_rows,rows_parts)
+    return(x_fft)
+
+
 def multiply_accumulate(accu_prod,v1fft,v2fft):
     """
     [Only used in one-baseline-per-task mode.]
@@ -817,14 +1055,15 @@ def normalize_mat(acc_mat,count_acc,using_autocorrs=1):
         #acc_mat_out=np.divide(acc_mat,count_acc*acc_mat.shape[1])
         #acc_mat_norm=np.divide(acc_mat,count_acc*acc_mat.shape[1])
         acc_mat_out=acc_mat_norm
-        multiplier_mat=np.ones(acc_mat_norm.shape)
-        power_auto=np.zeros(acc_mat_norm.shape[0])
-        for i in range(acc_mat_norm.shape[0]):
-            power_auto[i]=np.sum(np.abs(acc_mat_norm[i,i]))
-        for i in range(acc_mat_norm.shape[0]):
-            for k in range(i,acc_mat_norm.shape[0]):
-                multiplier_mat[i,k]=1/np.sqrt(power_auto[i]*power_auto[k])
-        acc_mat_out=np.multiply(acc_mat_norm,multiplier_mat)
+        n_sp=acc_mat_norm.shape[0]
+        # Power of the auto-correlations (sum over the bins of the diagonal)
+        diag_sp=np.arange(n_sp)
+        power_auto=np.sum(np.abs(acc_mat_norm[diag_sp,diag_sp]).reshape(n_sp,-1),axis=1).astype(np.float64)
+        # Upper triangular (including diagonal) 1/sqrt(power_i*power_k), same precision as the accumulation matrix
+        multiplier_mat=np.ones(acc_mat_norm.shape[:2],dtype=acc_mat_norm.real.dtype)
+        [i_upper,k_upper]=np.triu_indices(n_sp)
+        multiplier_mat[i_upper,k_upper]=1/np.sqrt(power_auto[i_upper]*power_auto[k_upper])
+        acc_mat_out=np.multiply(acc_mat_norm,multiplier_mat.reshape(multiplier_mat.shape+(1,)*(acc_mat_norm.ndim-2)))
         #acc_mat_out=np.divide(np.multiply(acc_mat_norm,multiplier_mat),count_acc*acc_mat.shape[1])
     else:
         acc_mat_out=acc_mat
@@ -899,9 +1138,10 @@ def fringe_rotation_wrap(args):
 
 def fringe_rotation_work(clock_diff,poly_diff,seconds_ref_clock,delay_rate_ref,timescale,seconds_offset,n_samples,sideband,\
                              last_n_samples,str_st,last_str_st,data_type,last_data_type,first_iteration,freq_channel,fs,F1_i,\
-                             nr,rotation):
+                             nr,rotation,apply_rotation=1):
     """
-    Worker for fringe rotation, see fringe_rotation() for more details.
+    Worker for fringe rotation, see fringe_rotation() for more details. If apply_rotation is 0 the rotator is
+     computed but not applied to F1_i.
     """
     #os.system("taskset -p 0xff %d" % os.getpid())
     nr=0
@@ -941,7 +1181,7 @@ def fringe_rotation_work(clock_diff,poly_diff,seconds_ref_clock,delay_rate_ref,t
             first_iteration=0
 
         val=get_val_for_fringe_exp(sideband,data_type,freq_channel,fs,r_recalc) # get vector x
-        [ru,nr] = get_exp(val)                                                  # get vector e^j(2.pi.x)
+        [ru,nr] = get_exp(val,np.result_type(F1_i.dtype,np.complex64))         # get vector e^j(2.pi.x)
         if not(nr):
             #rotation=get_rotator([ru])
             rotation=ru
@@ -952,16 +1192,374 @@ def fringe_rotation_work(clock_diff,poly_diff,seconds_ref_clock,delay_rate_ref,t
     last_str_st=str_st
     
 
-    if not nr:
+    if not(nr) and apply_rotation:
         #if USE_NE_FRINGE:
         #    interm=F1[i]
         #F1[i]=ne.evaluate("interm*rotation") # not faster
         #else:
         np.multiply(F1_i,rotation,F1_i)
+    elif nr and not(apply_rotation):
+        # No rotation required
+        rotation=None
     return([F1_i,rotation,last_data_type,last_str_st,first_iteration,first_delay,last_delay,rate_interval,computed])
 
 
-def fringe_rotation(F1,F_first_sample,F_rates,freq_channel,F_fs,F_delays,F_refs,block_time,F_frac,F_adj_shift_partial,F_side,F_ind,F_lti):
+def get_rotation_pool():
+    """
+    Get persistent pool of MP_THREADS processes for fringe rotation (USE_MP=1, see fringe_rotation()), created in 
+     the first call and kept for the next calls.
+    """
+    global rotation_pool_mp
+    if rotation_pool_mp is None:
+        rotation_pool_mp = multiprocessing.Pool(MP_THREADS)
+    return(rotation_pool_mp)
+
+
+def get_delays_rows(params_rows,seconds):
+    """
+    Evaluate delay polynomials for multiple streams (equivalent to lib_delay_model.get_delay_val() for each row).
+    
+    Parameters
+    ----------
+     params_rows : numpy 2D array
+         one row per stream with [seconds_offset,seconds_ref_poly,seconds_ref_clock,poly_diff (3),clock_diff (2),...].
+     seconds : numpy 1D array
+         seconds (for evaluating polys), same for all the streams.
+    
+    Returns
+    -------
+     r_recalc : numpy 2D array
+         delays in seconds (model+clock) [streams x seconds].
+    """
+    seconds_offset=params_rows[:,0:1]
+    seconds_ref_poly=params_rows[:,1:2]
+    seconds_np=seconds+seconds_offset+seconds_ref_poly
+    
+    # Horner's scheme (as numpy.polyval)
+    r_recalc=np.zeros(seconds_np.shape)
+    for coeff in range(5,2,-1):
+        r_recalc=r_recalc*seconds_np+params_rows[:,coeff:coeff+1]
+    if DIFF_POLY==0:
+        c_delay=np.zeros(seconds_np.shape)
+        for coeff in range(7,5,-1):
+            c_delay=c_delay*seconds_np+params_rows[:,coeff:coeff+1]
+        r_recalc=-(r_recalc+c_delay)
+    return(r_recalc)
+
+
+def get_rotators_recurrence(params_rows,timescale,samples,dtype_complex,block_size=ROTATOR_RECURRENCE_BLOCK):
+    """
+    Compute rotators for multiple streams with a phase recurrence (FULL_TIMESCALE=3), re-seeded from the exact
+     phase every block_size samples.
+    
+    Parameters
+    ----------
+     params_rows : numpy 2D array
+         see get_rotators_rows().
+     timescale : numpy 1D array
+         timescale in seconds for all the samples (uniform, see fringe_rotation()).
+     samples : numpy 1D array of int
+         indices in timescale of the samples for the rotators (consecutive).
+     dtype_complex
+         type for the rotators.
+     block_size : int
+         number of samples between seeds.
+    
+    Returns
+    -------
+     rotators : numpy 2D array
+         rotators [streams x samples].
+    
+    Notes
+    -----
+    |
+    | **Procedure:**
+    |
+    |  The phase (cycles) is a second order polynomial in the sample number, for a block starting at sample n0:
+    |   phi(n0+k) = phi(n0) + a.k + b.k^2, with a and b given by the derivatives of the delay polynomials at n0.
+    |  1. Compute exp(j.2.pi.phi(n0)) with the exact phase (as get_exp()) for the first sample of each block (seeds).
+    |  2. Steps between consecutive samples: exp(j.2.pi.(a+b.(2k+1))) = exp(j.2.pi.a) * exp(j.2.pi.b.(2k+1)), with
+    |      one exponential per block for the first term and block_size exponentials for the second one 
+    |      (same for all blocks).
+    |  3. Cumulative product of the seed and the steps within each block.
+    |
+    |  Thus, instead of one exponential per sample, there are two complex multiplications per sample. 
+    |
+    |
+    | **Precision:**
+    |
+    |  The error of the cumulative product grows with the position in the block, and is reset at each seed. 
+    |  Maximum differences with respect to the exact rotators in complex128 (see bench_rotator.py, block_size=1024):
+    |   -complex128: phase 2e-7 rad for phases of 2e8 cycles, that is the rounding of the exact phase itself 
+    |     (independent of block_size), magnitude 6e-14.
+    |   -complex64: phase 2e-6 to 1e-5 rad, magnitude 3e-5 (growing with block_size).
+    """
+    Ts=timescale[1]-timescale[0]
+    n_samples=len(samples)
+    n_blocks=-(-n_samples//block_size)
+    seeds=samples[::block_size]
+    freq_rotation=params_rows[:,-1:]
+    
+    # Exact phase for the first sample of each block
+    val_seeds=freq_rotation*get_delays_rows(params_rows,timescale[seeds])
+    [rotators_seeds,nr_unused]=get_exp(val_seeds,dtype_complex)
+    
+    # Derivatives of the delay polynomials (with respect to the sample number) at the seeds
+    seconds_np=timescale[seeds]+params_rows[:,0:1]+params_rows[:,1:2]
+    delay_rate=(params_rows[:,4:5]+2*params_rows[:,5:6]*seconds_np)*Ts
+    delay_accel=params_rows[:,5:6]*Ts*Ts
+    if DIFF_POLY==0:
+        delay_rate=-(delay_rate+params_rows[:,7:8]*Ts)
+        delay_accel=-delay_accel
+    
+    # Steps: exp(j.2.pi.a) for each block times exp(j.2.pi.b.(2k+1)) for each sample in the block
+    [steps_blocks,nr_unused]=get_exp(freq_rotation*delay_rate,dtype_complex)
+    [steps_samples,nr_unused]=get_exp(freq_rotation*delay_accel*np.arange(1,2*block_size-2,2),dtype_complex)
+    
+    rotators=np.empty([len(params_rows),n_blocks,block_size],dtype=dtype_complex)
+    rotators[:,:,0]=rotators_seeds
+    np.multiply(steps_blocks[:,:,np.newaxis],steps_samples[:,np.newaxis,:],rotators[:,:,1:])
+    np.cumprod(rotators,axis=2,out=rotators)
+    rotators=np.reshape(rotators,(len(params_rows),-1))[:,:n_samples]
+    return(rotators)
+
+
+def get_rotators_rows(params_rows,timescale,n_samples,dtype_complex,columns=np.s_[:],recurrence=0):
+    """
+    Compute rotators for multiple streams.
+    
+    Parameters
+    ----------
+     params_rows : numpy 2D array
+         see get_delays_rows(), last column is the frequency for the fringe rotation (see get_val_for_fringe_exp()).
+     timescale : numpy 1D array
+         timescale in seconds (see fringe_rotation()).
+     n_samples : int
+         number of samples (only for FULL_TIMESCALE=2).
+     dtype_complex
+         type for the rotators.
+     columns : slice
+         [all by default] samples for the rotators.
+     recurrence : int
+         if 1 and FULL_TIMESCALE=3, the rotators are computed with a phase recurrence (see get_rotators_recurrence()),
+          otherwise FULL_TIMESCALE=3 is the same as FULL_TIMESCALE=1.
+    
+    Returns
+    -------
+     rotators : numpy 2D array
+         rotators [streams x samples].
+     nr : numpy 1D array of bool
+         do not rotate (True if all the rotators in the row are 1).
+    """
+    if FULL_TIMESCALE==3 and recurrence and len(timescale)>1:
+        rotators=get_rotators_recurrence(params_rows,timescale,np.arange(len(timescale))[columns],dtype_complex)
+        nr=np.logical_not(np.any(params_rows[:,-1:]*params_rows[:,3:8],axis=1))
+        return([rotators,nr])
+    elif FULL_TIMESCALE==2:
+        # Linear interpolation (delays for first and last sample)
+        r_ends=get_delays_rows(params_rows,timescale)
+        first_delay=r_ends[:,0:1]
+        step_delay=(r_ends[:,-1:]-first_delay)/float(n_samples)
+        base_recalc=np.arange(0,float(n_samples))[columns]
+        r_recalc=first_delay+base_recalc*step_delay
+    else:
+        r_recalc=get_delays_rows(params_rows,timescale[columns])
+    val=params_rows[:,-1:]*r_recalc
+    [rotators,nr_unused]=get_exp(val,dtype_complex)
+    nr=np.logical_not(np.any(val,axis=1))
+    return([rotators,nr])
+
+
+def fringe_rotation_batched(F1,F_first_sample,F_rates,freq_channel,F_fs,F_refs,F_side,timescale,timescale_windows,\
+                            n_samples,n_windows,fft_size=0):
+    """
+    Fringe rotation for all the streams at once, see fringe_rotation() for the parameters.
+    
+    Returns
+    -------
+     F1_stack : numpy 2D array
+         samples [streams x samples] with the rotation applied (except for real samples if fft_size>0).
+     F_rot : list
+         see fringe_rotation().
+    
+    Notes
+    -----
+    |
+    | **Procedure:**
+    |
+    |  1. Find the streams with the same delay polynomials, offsets and fringe frequency (e.g. polarizations of the
+    |      same station), and compute the rotators only once for each of them.
+    |  2. Evaluate the delays for all these streams as a 2D array [unique streams x samples], then the exponentials.
+    |  3. Rotate each stream (in place) in the stacked array.
+    |
+    |  The samples are processed in blocks of FRINGE_ROTATION_BLOCK samples to limit the size of the temporaries,
+    |   and with the reducer threads if there are multiple blocks (see lib_workers.py).
+    |  Results are the same as with fringe_rotation_work().
+    """
+    
+    if isinstance(F1,np.ndarray) and F1.ndim==2:
+        F1_stack=F1
+    else:
+        F1_stack=np.vstack(F1)
+    dtype_complex=np.result_type(F1_stack.dtype,np.complex64)
+    
+    # Real samples: rotation for each FFT window
+    rotate_windows=(fft_size>0)and(np.isrealobj(F1_stack))
+    
+    # Unique rotators
+    [params_rows,row_of_stream]=get_rotation_params(F_first_sample,F_rates,freq_channel,F_fs,F_refs,F_side,len(F1_stack))
+    
+    if rotate_windows:
+        [rotators,nr]=get_rotators_rows(params_rows,timescale_windows,n_windows,dtype_complex)
+        F_rot=[None if nr[row] else rotators[row] for row in row_of_stream]
+        return([F1_stack,F_rot])
+    
+    F_rot=[None]*len(F1_stack)
+    rotate_rows(F1_stack,params_rows,row_of_stream,timescale,n_samples,np.s_[0:n_samples])
+    
+    return([F1_stack,F_rot])
+
+
+def get_rotation_params(F_first_sample,F_rates,freq_channel,F_fs,F_refs,F_side,n_streams):
+    """
+    Get parameters for the rotators of each stream, only once for streams with the same delay (see 
+     fringe_rotation_batched()).
+    
+    Returns
+    -------
+     params_rows : numpy 2D array
+         parameters for each unique rotator (see get_rotators_rows()).
+     row_of_stream : list of int
+         row in params_rows for each stream.
+    """
+    params_unique=[]
+    row_of_stream=[]
+    for i in range(n_streams):
+        [delay_rate_0,delay_rate_1,delay_rate_2,delay_rate_ref,clock_rate_0,clock_rate_1,clock_abs_rate_0,\
+                                clock_abs_rate_1,clock_rate_ref,model_only_delay,clock_only_delay,diff_frac]=F_rates[F_refs[i]]
+        fs=F_fs[F_refs[i]]
+        Ts=1/fs
+        [sideband,data_type]=F_side[F_refs[i]]
+        freq_rotation=(freq_channel-fs) if (sideband=='L')and(data_type=='c') else freq_channel
+        params=[F_first_sample[i]*Ts,delay_rate_ref,clock_rate_ref,delay_rate_0,delay_rate_1,delay_rate_2,\
+                clock_rate_0,clock_rate_1,freq_rotation]
+        if params not in params_unique:
+            params_unique.append(params)
+        row_of_stream.append(params_unique.index(params))
+    params_rows=np.array(params_unique,dtype=float)
+    return([params_rows,row_of_stream])
+
+
+def get_max_phase_step_windows(params_rows,n_samples,fft_size,fs):
+    """
+    Get the maximum phase drift of the fringe rotation between consecutive FFT windows, evaluated analytically from
+     the delay polynomials (no rotators are computed), see fringe_rotation().
+    
+    Parameters
+    ----------
+     params_rows : numpy 2D array
+         see get_rotation_params().
+     n_samples : int
+         number of samples in the streams.
+     fft_size : int
+         number of samples in each FFT window.
+     fs : float
+         sampling frequency.
+    
+    Returns
+    -------
+     max_phase_step : float
+         maximum phase drift between consecutive windows [rad] (2.pi.fringe_rate.fft_size/fs).
+    
+    Notes
+    -----
+    |
+    | The delay polynomials are quadratic, so the maximum of the fringe rate in the block is at one of the ends.
+    """
+    if len(params_rows)==0:
+        return(0.0)
+    seconds_np=np.array([0,float(n_samples)/fs])+params_rows[:,0:1]+params_rows[:,1:2]
+    delay_rate=2*params_rows[:,5:6]*seconds_np+params_rows[:,4:5]
+    if DIFF_POLY==0:
+        delay_rate=-(delay_rate+params_rows[:,7:8])
+    fringe_rate=np.abs(params_rows[:,-1:]*delay_rate)
+    return(2*np.pi*np.max(fringe_rate)*fft_size/fs)
+
+
+def rotate_rows(F1_stack,params_rows,row_of_stream,timescale,n_samples,samples):
+    """
+    Apply fringe rotation (in place) to a range of samples of all the streams, in blocks of FRINGE_ROTATION_BLOCK 
+     samples (with the reducer threads if there are multiple blocks).
+    
+    Parameters
+    ----------
+     F1_stack : numpy 2D array
+         samples [streams x len(samples)], with the range "samples" of the streams.
+     params_rows,row_of_stream
+         see get_rotation_params().
+     timescale
+         timescale in seconds for the range "samples" (see get_timescale_rotation()).
+     n_samples : int
+         number of samples in the streams.
+     samples : slice
+         range of samples to be rotated (with start and stop).
+    """
+    dtype_complex=np.result_type(F1_stack.dtype,np.complex64)
+    blocks=[np.s_[block:min(block+FRINGE_ROTATION_BLOCK,samples.stop)] for block in \
+                                                        range(samples.start,samples.stop,FRINGE_ROTATION_BLOCK)]
+    
+    def rotate_block(columns):
+        columns_local=np.s_[columns.start-samples.start:columns.stop-samples.start]
+        # Same rotator for all the samples if FULL_TIMESCALE=0, interpolation over all the samples if FULL_TIMESCALE=2
+        if FULL_TIMESCALE==0:
+            columns_rotators=np.s_[:]
+        elif FULL_TIMESCALE==2:
+            columns_rotators=columns
+        else:
+            columns_rotators=columns_local
+        [rotators,nr]=get_rotators_rows(params_rows,timescale,n_samples,dtype_complex,columns_rotators,recurrence=1)
+        for i in range(len(F1_stack)):
+            row=row_of_stream[i]
+            if not(nr[row]):
+                np.multiply(F1_stack[i,columns_local],rotators[row],F1_stack[i,columns_local])
+    
+    lib_workers.map_threads(rotate_block,blocks)
+
+
+def get_timescale_rotation(n_samples,Ts,samples=None):
+    """
+    Get timescale in seconds for the fringe rotation (depending on FULL_TIMESCALE, see fringe_rotation()).
+    
+    Parameters
+    ----------
+     n_samples : int
+         number of samples in the streams.
+     Ts : float
+         sampling period [s].
+     samples : slice
+         [None by default] range of samples for FULL_TIMESCALE 1 and 3 (all the samples if None). For other values
+          of FULL_TIMESCALE the timescale does not depend on the range.
+    """
+    if FULL_TIMESCALE in [1,3]:
+        # Evaluate delay for all samples (in the range)
+        #timescale_base_no_offset=np.array(list(range(n_samples)),dtype=float)
+        if samples is None:
+            samples=np.s_[0:n_samples]
+        timescale_base_no_offset=np.arange(samples.start,samples.stop,dtype=float)
+
+        # Timescale in seconds
+        timescale=np.multiply(timescale_base_no_offset,Ts)
+    elif FULL_TIMESCALE==2:
+        # Interpolate (linear based on first and last sample)
+        timescale=np.array([0,float(n_samples)*Ts])
+    
+    else:
+        timescale=np.array([0])
+    return(timescale)
+
+
+def fringe_rotation(F1,F_first_sample,F_rates,freq_channel,F_fs,F_delays,F_refs,block_time,F_frac,F_adj_shift_partial,F_side,F_ind,F_lti,\
+                    fft_size=0):
     """
     Fringe rotation correction (previously doppler_correction()).
     
@@ -993,6 +1591,9 @@ def fringe_rotation(F1,F_first_sample,F_rates,freq_channel,F_fs,F_delays,F_refs,
          list with sideband for each of the streams in F1 ('l' for LSB, 'u' for USB) (access through F_refs).
      F_ind : list
          list of station identifiers in the format used in the key (e.g. 0.0, 0.1)
+     fft_size : int
+         [0 by default] number of samples of the FFT windows, if >0 the rotation is not applied to streams with 
+         real samples (float), see F_rot below.
     
     Returns
     -------
@@ -1000,6 +1601,10 @@ def fringe_rotation(F1,F_first_sample,F_rates,freq_channel,F_fs,F_delays,F_refs,
          F1 (input) with applied rotations if required.
      F_first_sample
          list with updated first samples (added number of samples in each element of F1).
+     F_rot
+         list with one element for each stream in F1: None if the rotation was applied (or if no rotation is required), 
+          otherwise (real samples) 1D array with the rotator for each FFT window (delay evaluated at the center of 
+          the window), to be applied after the FFT (see compute_f_all()).
     
     Notes
     -----
@@ -1013,6 +1618,25 @@ def fringe_rotation(F1,F_first_sample,F_rates,freq_channel,F_fs,F_delays,F_refs,
     |                                                         delays are computed for all the samples.
     |  FULL_TIMESCALE=2 -> Trade-off solution: delay is computed for the first and last sample, and a linear interpolation is 
     |                                                         done for obtaining the rest of delays. 
+    |  FULL_TIMESCALE=3 -> Phase recurrence: exact rotators every ROTATOR_RECURRENCE_BLOCK samples, and complex
+    |                                                         multiplications for the rest (see get_rotators_recurrence()).
+    |                                                         Only with FRINGE_ROTATION_BATCHED=1, same as 1 otherwise.
+    |
+    |  For real samples (REAL_FFT=1), delays are computed (or interpolated) only at the center of each FFT window, 
+    |   and the rotation is applied after the FFT (constant phase for each window). This neglects the phase drift 
+    |   within the window, that is a phase error of up to half the phase drift between consecutive windows
+    |   (2.pi.fringe_rate.fft_size/fs). The relative error in the visibilities is up to 0.5 times this drift (0.29 times
+    |   for the rms error of the spectra, up to 0.44 times measured for single channels on noise). This drift is 
+    |   evaluated from the delay polynomials before computing any rotators (see get_max_phase_step_windows()), if it is
+    |   larger than REAL_FFT_MAX_PHASE the samples are converted to complex and rotated in the time domain (same as 
+    |   REAL_FFT=0).
+    |
+    |
+    | **Performance:**
+    |
+    |  FRINGE_ROTATION_BATCHED=1 (default): rotators are computed for all the streams at once (see 
+    |   fringe_rotation_batched()), and F1 is returned as a 2D numpy array [streams x samples]. Otherwise the 
+    |   streams are processed one by one (fringe_rotation_work(), with a pool of processes if USE_MP=1).
     |
     |
     | **Approximations:**
@@ -1045,10 +1669,11 @@ def fringe_rotation(F1,F_first_sample,F_rates,freq_channel,F_fs,F_delays,F_refs,
     """
     nr=0
     rotation=np.array([])
-    if USE_MP:
+    batched=FRINGE_ROTATION_BATCHED and not(USE_MP) and not(DEBUG_DELAYS) and (len(set([F1_i.dtype for F1_i in F1]))==1)
+    if USE_MP and not(batched):
         jobs = []
         arg_list=[]
-        p = multiprocessing.Pool(MP_THREADS)
+        p = get_rotation_pool()
         
     
     F1_out=[]
@@ -1065,91 +1690,110 @@ def fringe_rotation(F1,F_first_sample,F_rates,freq_channel,F_fs,F_delays,F_refs,
     n_samples=len(F1[0])
     fs=F_fs[0]
     Ts=1/fs
-    if FULL_TIMESCALE==1:
-        # Evaluate delay for all samples
-        #timescale_base_no_offset=np.array(list(range(n_samples)),dtype=float)
-        timescale_base_no_offset=np.arange(n_samples,dtype=float)
-
-        # Timescale in seconds
-        timescale=np.multiply(timescale_base_no_offset,Ts)
-    elif FULL_TIMESCALE==2:
-        # Interpolate (linear based on first and last sample)
-        timescale=np.array([0,float(n_samples)*Ts])
-    
-    else:
-        timescale=np.array([0])
-    
+    timescale=get_timescale_rotation(n_samples,Ts)
+    
+    # Real samples: check phase drift between consecutive windows, rotate in the time domain if too large
+    if fft_size>0 and FULL_TIMESCALE>0 and any(np.isrealobj(F1_i) for F1_i in F1):
+        [params_rows,row_of_stream]=get_rotation_params(F_first_sample,F_rates,freq_channel,F_fs,F_refs,F_side,len(F1))
+        if n_samples//fft_size<2 or get_max_phase_step_windows(params_rows,n_samples,fft_size,fs)>REAL_FFT_MAX_PHASE:
+            F1=[F1_i.astype(np.result_type(F1_i.dtype,np.complex64)) if np.isrealobj(F1_i) else F1_i for F1_i in F1]
+            fft_size=0
+    
+    # Real samples: timescale at the center of each FFT window
+    n_windows=0
+    timescale_windows=timescale
+    if fft_size>0:
+        n_windows=n_samples//fft_size
+        if FULL_TIMESCALE in [1,3]:
+            timescale_windows=np.multiply(np.arange(n_windows,dtype=float)*fft_size+fft_size//2,Ts)
+        elif FULL_TIMESCALE==2:
+            timescale_windows=np.multiply(np.array([fft_size//2,n_windows*fft_size+fft_size//2],dtype=float),Ts)
+    F_rot=[]
     
   
-    for i in range(len(F1)):
-        str_st=F_ind[i].split('.')[0]
+    if batched:
+        # All streams at once
+        [F1,F_rot]=fringe_rotation_batched(F1,F_first_sample,F_rates,freq_channel,F_fs,F_refs,F_side,timescale,\
+                                           timescale_windows,n_samples,n_windows,fft_size)
+    else:
+        for i in range(len(F1)):
+            str_st=F_ind[i].split('.')[0]
 
-        first_sample=F_first_sample[i]
+            first_sample=F_first_sample[i]
         
-        last_sample=first_sample+n_samples
+            last_sample=first_sample+n_samples
         
-        # Delay polynomials for this station
-        [delay_rate_0,delay_rate_1,delay_rate_2,delay_rate_ref,clock_rate_0,clock_rate_1,clock_abs_rate_0,\
-                                clock_abs_rate_1,clock_rate_ref,model_only_delay,clock_only_delay,diff_frac]=F_rates[F_refs[i]]
-        [fractional_sample_correction,shift_delay]=F_frac[F_refs[i]]
+            # Delay polynomials for this station
+            [delay_rate_0,delay_rate_1,delay_rate_2,delay_rate_ref,clock_rate_0,clock_rate_1,clock_abs_rate_0,\
+                                    clock_abs_rate_1,clock_rate_ref,model_only_delay,clock_only_delay,diff_frac]=F_rates[F_refs[i]]
+            [fractional_sample_correction,shift_delay]=F_frac[F_refs[i]]
         
-        fs=F_fs[F_refs[i]]
-        Ts=1/fs
-        [sideband,data_type]=F_side[F_refs[i]]
+            fs=F_fs[F_refs[i]]
+            Ts=1/fs
+            [sideband,data_type]=F_side[F_refs[i]]
         
-        # Integer delay already applied (multiple of Ts)
-        shift_delay=0
-        error_f_frac=0
+            # Integer delay already applied (multiple of Ts)
+            shift_delay=0
+            error_f_frac=0
         
-        # Delays at each sample
-        first_sample_s=first_sample*Ts
+            # Delays at each sample
+            first_sample_s=first_sample*Ts
  
-        seconds_offset = first_sample_s
+            seconds_offset = first_sample_s
         
-        clock_diff = [clock_rate_0,clock_rate_1]
-        poly_diff = [delay_rate_0,delay_rate_1,delay_rate_2]
-        clock_abs = [clock_abs_rate_0,clock_abs_rate_1]
-        seconds_ref_clock=clock_rate_ref
+            clock_diff = [clock_rate_0,clock_rate_1]
+            poly_diff = [delay_rate_0,delay_rate_1,delay_rate_2]
+            clock_abs = [clock_abs_rate_0,clock_abs_rate_1]
+            seconds_ref_clock=clock_rate_ref
         
-        # clock_diff,poly_diff,seconds_ref_clock,delay_rate_ref,timescale,seconds_offset,
-        #   DEBUG_LIB_DELAY,DIFF_POLY,FULL_TIMESCALE
-        # n_samples,last_n_samples,str_st,last_str_st,data_type,last_data_type,first_iteration,freq_channel,fs,F1[i]
+            # clock_diff,poly_diff,seconds_ref_clock,delay_rate_ref,timescale,seconds_offset,
+            #   DEBUG_LIB_DELAY,DIFF_POLY,FULL_TIMESCALE
+            # n_samples,last_n_samples,str_st,last_str_st,data_type,last_data_type,first_iteration,freq_channel,fs,F1[i]
         
         
-        if not USE_MP:
-            # Serial execution
-            [F1[i],rotation,last_data_type,last_str_st,first_iteration,first_delay,last_delay,\
-                             rate_interval,computed] = fringe_rotation_work(clock_diff,poly_diff,\
-                                 seconds_ref_clock,delay_rate_ref,timescale,seconds_offset,n_samples,sideband,\
-                                 last_n_samples,str_st,last_str_st,data_type,last_data_type,first_iteration,\
-                                 freq_channel,fs,F1[i],nr,rotation)
-            #if SAVE_TIME_ROTATIONS:
-            #    first_iteration=0
+            # Real samples: rotation for each FFT window
+            rotate_windows=(fft_size>0)and(np.isrealobj(F1[i]))
+            if rotate_windows:
+                [timescale_i,n_samples_i]=[timescale_windows,n_windows]
+            else:
+                [timescale_i,n_samples_i]=[timescale,n_samples]
+        
+            if not USE_MP:
+                # Serial execution
+                [F1[i],rotation,last_data_type,last_str_st,first_iteration,first_delay,last_delay,\
+                                 rate_interval,computed] = fringe_rotation_work(clock_diff,poly_diff,\
+                                     seconds_ref_clock,delay_rate_ref,timescale_i,seconds_offset,n_samples_i,sideband,\
+                                     last_n_samples,str_st,last_str_st,data_type,last_data_type,first_iteration,\
+                                     freq_channel,fs,F1[i],nr,rotation,int(not(rotate_windows)))
+                if rotate_windows:
+                    F_rot.append(rotation)
+                else:
+                    F_rot.append(None)
+                #if SAVE_TIME_ROTATIONS:
+                #    first_iteration=0
 
         
-            if DEBUG_DELAYS:
-                print_debug_r_delays_d(i,F_refs[i],F_ind[i],first_sample,n_samples,timescale,timescale[0],timescale[-1],\
-                                         seconds_offset,first_delay,last_delay,rate_interval,fractional_sample_correction,\
-                                         diff_frac,computed,nr)
-        else:
-            # Parallel
-            arg_list.append([clock_diff,poly_diff,seconds_ref_clock,delay_rate_ref,timescale,seconds_offset,\
-                             n_samples,sideband,last_n_samples,str_st,last_str_st,data_type,last_data_type,\
-                             first_iteration,freq_channel,fs,F1[i],nr,rotation])
+                if DEBUG_DELAYS:
+                    print_debug_r_delays_d(i,F_refs[i],F_ind[i],first_sample,n_samples,timescale,timescale[0],timescale[-1],\
+                                             seconds_offset,first_delay,last_delay,rate_interval,fractional_sample_correction,\
+                                             diff_frac,computed,nr)
+            else:
+                # Parallel
+                arg_list.append([clock_diff,poly_diff,seconds_ref_clock,delay_rate_ref,timescale_i,seconds_offset,\
+                                 n_samples_i,sideband,last_n_samples,str_st,last_str_st,data_type,last_data_type,\
+                                 first_iteration,freq_channel,fs,F1[i],nr,rotation,int(not(rotate_windows))])
     
     
-    if USE_MP: 
-        F1_and_rotations = p.map(fringe_rotation_wrap,arg_list)
-        p.close()
-        p.join()
-        F1=[F1_and_rot[0] for F1_and_rot in F1_and_rotations]
- 
-     
-    return([F1,F_first_sample])
+        if USE_MP: 
+            F1_and_rotations = p.map(fringe_rotation_wrap,arg_list)
+            F1=[F1_and_rot[0] for F1_and_rot in F1_and_rotations]
+            F_rot=[F1_and_rotations[i][1] if arg_list[i][-1]==0 else None for i in range(len(arg_list))]
+    
+    return([F1,F_first_sample,F_rot])
 
 
 def compute_f_all(F1,fft_size,windowing,dtype_complex,F_frac=[],F_fs=[],F_refs=[],freq_channel=0,\
-                      F_first_sample=[],F_rates=[],F_pcal_fix=[],F_side=[],F_ind=[],F_lti=[]):
+                      F_first_sample=[],F_rates=[],F_pcal_fix=[],F_side=[],F_ind=[],F_lti=[],F_rot=[]):
     """
     Compute FFTs for all stations (all-baselines-per-task mode), and correct for fractional sample correction (linear phase).
 
@@ -1183,6 +1827,8 @@ def compute_f_all(F1,fft_size,windowing,dtype_complex,F_frac=[],F_fs=[],F_refs=[
      F_ind
          list of station-polarization identifiers corresponding to the streams in F1 (this actually corresponds
                to F1_ind_partial.
+     F_rot
+         list with rotators for each FFT window for streams with real samples (see fringe_rotation()).
     
     Returns
     -------
@@ -1208,6 +1854,9 @@ def compute_f_all(F1,fft_size,windowing,dtype_complex,F_frac=[],F_fs=[],F_refs=[
     |
     |  For each element in F1:
     |   1. Create an array of arrays with the FFTs of the samples grouped into arrays of fft_size samples.
+    |      For real samples (float, see REAL_FFT in const_performance.py), take the FFT of the real samples 
+    |       (non-negative frequencies), the coefficients for LSB are the conjugates of the positive frequencies 
+    |       in reverse order, and the fringe rotation is applied to each FFT window (see fringe_rotation()).
     |   2. Create a frequency scale of fft_size (linear from 0 to (n-1)/n).
     |   3a. If the computations have already been done for the same station, take the results.
     |   3b. Otherwise:
@@ -1237,10 +1886,24 @@ def compute_f_all(F1,fft_size,windowing,dtype_complex,F_frac=[],F_fs=[],F_refs=[
     first_iteration=1
     last_fractional_recalc=0
     last_str_st=""
-    F1_fft = window_and_fft(F1,fft_size,windowing,flatten_chunks=0,dtype_complex=dtype_complex) # ,rfft_data_type=data_type)
+    real_fft=(data_type=='r')and(np.isrealobj(F1[0]))
+    if real_fft:
+        # Real samples: FFT of real samples, and then fringe rotation for each window
+        F1_fft = window_and_fft(F1,fft_size,windowing,flatten_chunks=0,dtype_complex=dtype_complex,rfft_data_type='r',\
+                                reuse_output=1)
+        if sideband=='L':
+            # Negative frequencies: X[N-k]=conj(X[k]), k=N/2...1
+            F1_fft = np.conj(F1_fft[:,:,fft_size//2:0:-1])
+        else:
+            F1_fft = F1_fft[:,:,:fft_size//2]
+        for stpol in range(len(F_rot)):
+            if F_rot[stpol] is not None:
+                F1_fft[stpol]*=np.reshape(F_rot[stpol],(-1,1))
+    else:
+        F1_fft = window_and_fft(F1,fft_size,windowing,flatten_chunks=0,dtype_complex=dtype_complex,reuse_output=1) # ,rfft_data_type=data_type)
     
     # If real samples take only half FFT (LSB or USB as applicable)
-    if data_type=='r':
+    if data_type=='r' and not(real_fft):
         if sideband=='L':
             F1_fft = np.delete(F1_fft,np.s_[:fft_size//2],2) 
         else:
@@ -1248,20 +1911,10 @@ def compute_f_all(F1,fft_size,windowing,dtype_complex,F_frac=[],F_fs=[],F_refs=[
 
     shift_int=0
     # Fractional sample correction
-    F1_fft_rot=np.zeros(F1_fft.shape,dtype=dtype_complex)
     error_f_frac=1
     if F_rates!=[]:
         
-        if data_type=='c':
-            freqscale2 = np.arange(0,1,1/float(fft_size))
-            fft_size_comp=fft_size
-        else:
-            if sideband=='L':
-                freqscale2 = float(-1)*np.arange(0.5,0,float(-1)/float(fft_size)) # First half of the full vector (e.g. [-0.5 -0.375 -0.25 -0.125] with fft_size=8)
-            else:
-                freqscale2 = np.arange(0,1,1/float(fft_size))[:fft_size//2] # Second half the full vector (e.g. [ 0. 0.125 0.25 0.375] with fft_size=8)
-
-            fft_size_comp=fft_size//2
+        [freqscale2,fft_size_comp]=get_freqscale_frac(fft_size,data_type,sideband)
         
         # p363
 
@@ -1353,7 +2006,7 @@ def compute_f_all(F1,fft_size,windowing,dtype_complex,F_frac=[],F_fs=[],F_refs=[
                         #print(str_st)
                         #print(freqscale2*(fractional_recalc[row]))
 
-                        [fr6,nr]=get_exp(freqscale2*(fractional_recalc[row]))
+                        [fr6,nr]=get_exp(freqscale2*(fractional_recalc[row]),F1_fft.dtype)
                         
                         if not(nr):
                             #frtot=get_rotator([fr6])
@@ -1430,8 +2083,287 @@ def compute_f_all(F1,fft_size,windowing,dtype_complex,F_frac=[],F_fs=[],F_refs=[
     return([F1_fft,None,F_adj_shift_partial_out,F_adj_shift_pcal_out,F_pcal_fix_out,F_first_sample_out])
 
 
+def get_freqscale_frac(fft_size,data_type,sideband):
+    """
+    Get frequency scale for the fractional sample correction (see compute_f_all()).
+    
+    Returns
+    -------
+     freqscale2 : numpy 1D array
+         frequency for each coefficient, normalized to the sampling frequency.
+     fft_size_comp : int
+         number of coefficients (fft_size for complex data, half for real data).
+    """
+    if data_type=='c':
+        freqscale2 = np.arange(0,1,1/float(fft_size))
+        fft_size_comp=fft_size
+    else:
+        if sideband=='L':
+            freqscale2 = float(-1)*np.arange(0.5,0,float(-1)/float(fft_size)) # First half of the full vector (e.g. [-0.5 -0.375 -0.25 -0.125] with fft_size=8)
+        else:
+            freqscale2 = np.arange(0,1,1/float(fft_size))[:fft_size//2] # Second half the full vector (e.g. [ 0. 0.125 0.25 0.375] with fft_size=8)
+
+        fft_size_comp=fft_size//2
+    return([freqscale2,fft_size_comp])
+
+
+def get_frac_windows(F_first_sample,F_rates,F_fs,F_refs,fft_size,n_windows):
+    """
+    Get fractional sample delay at the first sample of each FFT window for each stream (as in compute_f_all()).
+    
+    Returns
+    -------
+     fractional_rows : numpy 2D array
+         fractional sample delay [streams x windows].
+    """
+    fractional_rows=np.zeros([len(F_refs),n_windows])
+    for stpol in range(len(F_refs)):
+        fs=F_fs[F_refs[stpol]]
+        Ts=1/fs
+        sample0=F_first_sample[F_refs[stpol]]
+        [delay_rate_0,delay_rate_1,delay_rate_2,delay_rate_ref,clock_rate_0,\
+               clock_rate_1,clock_abs_rate_0,clock_abs_rate_1,clock_rate_ref,\
+               model_only_delay,clock_only_delay,diff_frac]=F_rates[F_refs[stpol]]
+        total_timescale =Ts*(sample0+fft_size*np.arange(n_windows))
+        [r_recalc,m_unused,c_recalc,r_unused,a_unused] = get_delay_val(\
+                           clock_diff=[clock_rate_0,clock_rate_1],\
+                           poly_diff=[delay_rate_0,delay_rate_1,delay_rate_2],\
+                           seconds_ref_clock=clock_rate_ref,\
+                           seconds_ref_poly=delay_rate_ref,\
+                           seconds=total_timescale,\
+                           seconds_offset=0,\
+                           v=DEBUG_LIB_DELAY,diff_pol=DIFF_POLY)
+        [full_fractional_recalc,fractional_rows[stpol]] = get_full_frac_val(r_recalc,fs)
+    return(fractional_rows)
+
+
+def use_fx_blocks(F1,F_rates):
+    """
+    Check if the fused F-engine can be used for the stored samples F1 (see F_ENGINE_FUSED in const_performance.py).
+    """
+    fused=F_ENGINE_FUSED and FRINGE_ROTATION_BATCHED and not(USE_MP) and (F_rates!=[]) and \
+          not(DEBUG_DELAYS or DEBUG_LIB_DELAY or DEBUG_FRAC_OVER) and \
+          (len(set([F1_i.dtype for F1_i in F1]))==1) and np.iscomplexobj(F1[0])
+    return(fused)
+
+
+def compute_fx_blocks(F1,fft_size,windowing,dtype_complex,count_acc,acc_mat,index_scaling_pair=-1,acc_comp=None,\
+                      F_frac=[],F_fs=[],F_refs=[],freq_channel=0,F_first_sample=[],F_rates=[],F_pcal_fix=[],F_side=[],\
+                      block_size=F_ENGINE_BLOCK):
+    """
+    Fused F-engine: fringe rotation, windowing and FFT, fractional sample correction, and multiply-accumulate
+     for one block of samples at a time (equivalent to fringe_rotation(), compute_f_all() and compute_x_all()).
+    
+    Parameters
+    ----------
+     F1
+         stored samples (complex), list of 1D arrays or 2D array [streams x samples] with a number of samples that
+          is a multiple of fft_size.
+     block_size : int
+         number of samples per stream in each block (rounded to a multiple of fft_size).
+     others
+         see compute_fx_for_all() and compute_f_all().
+    
+    Returns
+    -------
+     acc_mat,count_acc,count_sub_acc,n_sp
+         see compute_x_all().
+     F_pcal_fix_out,F_first_sample_out
+         see compute_f_all().
+    
+    Notes
+    -----
+    |
+    | **Procedure:**
+    |
+    |  1. Parameters for the rotators (see get_rotation_params()), fractional sample delays for all the FFT windows
+    |      of each stream (see get_frac_windows()), and phase ramp for the first window of each stream.
+    |  2. For each block of samples:
+    |     2a. Copy the samples of the block of each stream into the block buffer, and rotate them (in place), with 
+    |          the timescale of the block.
+    |     2b. Windowing and FFT (into the output buffer of the FFT engine, see lib_fft.compute_fft()).
+    |     2c. Fractional sample correction: multiply by the phase ramp exp(j.2.pi.freqscale.frac) of the first window
+    |          and, for the streams where the fractional sample delay changes, by the ramp for the change in each
+    |          window (see get_frac_ramps()).
+    |     2d. Multiply-accumulate into acc_mat.
+    |
+    |  The block buffer and the temporaries (rotators, FFTs, phase ramps, cross products) are the size of one block, 
+    |   and the input is not modified. Each step is split among the reducer threads (see lib_workers.py).
+    |  Results are the same as with the separate stages, except for the rounding of the accumulation (sum for each
+    |   block, instead of for all the windows) and of the phase ramps.
+    """
+    n_streams=len(F1)
+    n_samples=len(F1[0])
+    n_windows=n_samples//fft_size
+    [sideband,data_type]=F_side[0]
+    
+    # Rotators and fractional sample correction
+    Ts=1/F_fs[0]
+    [params_rows,row_of_stream]=get_rotation_params(F_first_sample,F_rates,freq_channel,F_fs,F_refs,F_side,n_streams)
+    [freqscale2,fft_size_comp]=get_freqscale_frac(fft_size,data_type,sideband)
+    fractional_rows=get_frac_windows(F_first_sample,F_rates,F_fs,F_refs,fft_size,n_windows)
+    
+    # Phase ramps for the first window (computed with the first FFTs, in their precision), and changes in the
+    #  fractional sample delay for the next windows
+    ramps_first=None
+    nr_first=not(np.any(fractional_rows[:,:1]*freqscale2))
+    frac_delta=fractional_rows-fractional_rows[:,:1]
+    rows_delta=[stpol for stpol in range(n_streams) if np.any(frac_delta[stpol])]
+    freqscale_split=get_freqscale_split(freqscale2)
+    
+    # Block buffer
+    windows_per_block=max(1,min(block_size//fft_size,n_windows))
+    F_block=np.empty([n_streams,windows_per_block*fft_size],dtype=np.result_type(*[F1[i].dtype for i in range(n_streams)]))
+    
+    count_sub_acc=0
+    for window_start in range(0,n_windows,windows_per_block):
+        windows=np.s_[window_start:min(window_start+windows_per_block,n_windows)]
+        samples=np.s_[windows.start*fft_size:windows.stop*fft_size]
+        F1_block=F_block[:,:samples.stop-samples.start]
+        for stpol in range(n_streams):
+            F1_block[stpol]=F1[stpol][samples]
+        
+        # Fringe rotation
+        timescale=get_timescale_rotation(n_samples,Ts,samples)
+        rotate_rows(F1_block,params_rows,row_of_stream,timescale,n_samples,samples)
+        
+        # Windowing and FFT
+        F1_fft=window_and_fft(F1_block,fft_size,windowing,flatten_chunks=0,dtype_complex=dtype_complex,\
+                              reuse_output=1)
+        if data_type=='r':
+            # Real samples: only half FFT (LSB or USB as applicable)
+            F1_fft=F1_fft[:,:,fft_size//2:] if sideband=='L' else F1_fft[:,:,:fft_size//2]
+        
+        # Fractional sample correction
+        if not(nr_first):
+            if ramps_first is None:
+                [ramps_first,nr_unused]=get_exp(fractional_rows[:,:1]*freqscale2,F1_fft.dtype)
+            np.multiply(F1_fft,ramps_first[:,np.newaxis,:],F1_fft)
+        for stpol in rows_delta:
+            ramps_delta=get_frac_ramps(frac_delta[stpol,windows],freqscale_split,F1_fft.shape[-1],F1_fft.dtype)
+            np.multiply(F1_fft[stpol],ramps_delta,F1_fft[stpol])
+        
+        # Multiply-accumulate
+        [acc_mat,count_acc,count_sub_acc_block,n_sp] = compute_x_all(F1_fft,None,count_acc,acc_mat,\
+                                                                     index_scaling_pair,dtype_complex,acc_comp)
+        count_sub_acc+=count_sub_acc_block
+    
+    F_first_sample_out=[F_first_sample[F_refs[stpol]]+n_samples for stpol in range(n_streams)]
+    F_pcal_fix_out=[F_frac[F_refs[stpol]][1] for stpol in range(n_streams)]
+    if len(F_pcal_fix)>=len(F_pcal_fix_out):
+        F_pcal_fix_out=F_pcal_fix
+    
+    return([acc_mat,count_acc,count_sub_acc,n_sp,F_pcal_fix_out,F_first_sample_out])
+
+
+def get_freqscale_split(freqscale2):
+    """
+    Split the frequency scale for the fractional sample correction into two short scales (see get_frac_ramps()).
+    
+    Parameters
+    ----------
+     freqscale2 : numpy 1D array
+         frequency for each coefficient (uniform), see get_freqscale_frac().
+    
+    Returns
+    -------
+     freqscale_split : list
+         [freq_hi,freq_lo] with freqscale2[h*len(freq_lo)+l]=freq_hi[h]+freq_lo[l], each one with about 
+          sqrt(len(freqscale2)) elements.
+    """
+    n_coefs=len(freqscale2)
+    split=max(1,int(np.ceil(np.sqrt(n_coefs))))
+    step=(freqscale2[1]-freqscale2[0]) if n_coefs>1 else 0.
+    freq_hi=freqscale2[::split]
+    freq_lo=step*np.arange(split)
+    return([freq_hi,freq_lo])
+
 
-def compute_x_all(F1_fft,F2_fft,count_acc,acc_mat,index_scaling_pair=-1,dtype_complex=complex):
+def get_frac_ramps(frac,freqscale_split,n_coefs,dtype_complex):
+    """
+    Phase ramps exp(j.2.pi.freqscale.frac) for the fractional sample correction of several windows of one stream.
+    
+    Parameters
+    ----------
+     frac : numpy 1D array
+         fractional sample delay for each window.
+     freqscale_split : list
+         see get_freqscale_split().
+     n_coefs : int
+         number of coefficients.
+     dtype_complex
+         type for the ramps.
+    
+    Returns
+    -------
+     ramps : numpy 2D array
+         phase ramps [windows x coefficients].
+    
+    Notes
+    -----
+    |
+    | exp(j.2.pi.(freq_hi[h]+freq_lo[l]).frac) = exp(j.2.pi.freq_hi[h].frac) * exp(j.2.pi.freq_lo[l].frac), thus
+    |  there are about 2.sqrt(n_coefs) exponentials for each window (instead of n_coefs), and one multiplication
+    |  for each coefficient.
+    """
+    [freq_hi,freq_lo]=freqscale_split
+    [ramps_hi,nr_unused]=get_exp(frac[:,np.newaxis]*freq_hi,dtype_complex)
+    [ramps_lo,nr_unused]=get_exp(frac[:,np.newaxis]*freq_lo,dtype_complex)
+    ramps=np.multiply(ramps_hi[:,:,np.newaxis],ramps_lo[:,np.newaxis,:]).reshape(len(frac),-1)[:,:n_coefs]
+    return(ramps)
+
+
+
+def init_acc_compensation():
+    """
+    Initialize compensation for the accumulation matrix with Kahan summation (X_ACCUMULATOR_KAHAN).
+    
+    Returns
+    -------
+     acc_comp : list
+         [compensation] with compensation None, it is allocated in compute_x_all() together with the accumulation matrix.
+    """
+    acc_comp=[None]
+    return(acc_comp)
+
+
+def get_acc_dtype(dtype_complex,acc_comp=None):
+    """
+    Type of the accumulation matrix for FFTs of type dtype_complex (see X_ACCUMULATOR in const_performance.py).
+    """
+    if (acc_comp is None)and(X_ACCUMULATOR==X_ACCUMULATOR_FLOAT64):
+        return(np.result_type(dtype_complex,np.complex128))
+    return(np.dtype(dtype_complex))
+
+
+def accumulate_mat(acc_mat,index,values,acc_comp=None):
+    """
+    Add values into acc_mat[index] (in place).
+    
+    Parameters
+    ----------
+     acc_mat : numpy array
+         accumulation matrix.
+     index
+         index (or tuple of indices) for acc_mat.
+     values : numpy array
+         values to be added, with the shape of acc_mat[index].
+     acc_comp
+         [None by default] compensation for Kahan summation (see init_acc_compensation()), if None values
+          are simply added.
+    """
+    if acc_comp is None:
+        acc_mat[index]+=values
+    else:
+        # Kahan summation: the compensation keeps the low-order bits lost in the previous additions
+        compensation=acc_comp[0]
+        values_comp=values-compensation[index]
+        acc_new=acc_mat[index]+values_comp
+        compensation[index]=(acc_new-acc_mat[index])-values_comp
+        acc_mat[index]=acc_new
+
+
+def compute_x_all(F1_fft,F2_fft,count_acc,acc_mat,index_scaling_pair=-1,dtype_complex=complex,acc_comp=None):
     """
     Compute multiply-accumulate for all baselines (all-baselines-per-task-mode)
     
@@ -1448,7 +2380,10 @@ def compute_x_all(F1_fft,F2_fft,count_acc,acc_mat,index_scaling_pair=-1,dtype_co
      index_scaling_pair
          -1 for all-baselines-per-task mode, positive integer for other modes.
      dtype_complex
-         type to initialize accumulation matrix.
+         type to initialize accumulation matrix (see get_acc_dtype()).
+     acc_comp
+         [None by default] compensation for Kahan summation (see init_acc_compensation()), reset when the 
+          accumulation matrix is initialized.
      
     Returns
     -------
@@ -1467,35 +2402,179 @@ def compute_x_all(F1_fft,F2_fft,count_acc,acc_mat,index_scaling_pair=-1,dtype_co
     Notes
     -----
     |
+    | **Configuration:**
+    |
+    |  X_ENGINE_MATMUL in const_performance.py: minimum number of station-polarizations to reduce the FFT windows
+    |   with a matrix product for each frequency bin ([sp x windows] times [windows x sp], see compute_x_matmul()),
+    |   instead of iterating on the station-polarizations and summing a [sp x windows x bins] temporary for each of them.
+    |  X_ACCUMULATOR in const_performance.py: type of the accumulation matrix for single precision (complex64, 
+    |   complex128, or complex64 with Kahan summation if acc_comp is not None).
+    |  Frequency bins are split among the reducer threads (or processes), with at least REDUCER_MIN_BINS_PER_WORKER
+    |   bins per worker (see lib_workers.py).
+    |
     | **TO DO:**
     |
     |  Add counters for invalid data.
     """
     fft_size_comp=F1_fft.shape[2]
     
-    if F2_fft is None:
-        F2_fft = np.conj(F1_fft)
     n_sp=len(F1_fft)
+    use_matmul=(X_ENGINE_MATMUL>0)and(n_sp>=X_ENGINE_MATMUL)and(index_scaling_pair==-1)
+    if (F2_fft is None)and not(use_matmul):
+        F2_fft = np.conj(F1_fft)
     count_acc+=len(F1_fft[0])  
     count_sub_acc=len(F1_fft[0])
+    dtype_acc=get_acc_dtype(dtype_complex,acc_comp)
+    if acc_mat is None:
+        if index_scaling_pair==-1:
+            #All baselines per task
+            acc_mat=np.zeros([n_sp,n_sp,fft_size_comp],dtype=dtype_acc)
+        else:
+            # Linear-scaling-stations
+            acc_mat=np.zeros([n_sp,fft_size_comp],dtype=dtype_acc)
+        if acc_comp is not None:
+            acc_comp[0]=np.zeros_like(acc_mat)
+    
+    # Split frequency bins among the reducer workers
+    [threads,thread_pool,processes,process_pool]=lib_workers.get_workers()
+    if processes>0:
+        compute_x_processes(F1_fft,F2_fft,acc_mat,index_scaling_pair,use_matmul,acc_comp,processes)
+    else:
+        bins_parts=lib_workers.split_range(fft_size_comp,threads,REDUCER_MIN_BINS_PER_WORKER)
+        lib_workers.map_threads(lambda bins: compute_x_bins(F1_fft,F2_fft,acc_mat,index_scaling_pair,use_matmul,\
+                                                            acc_comp,bins),bins_parts)
+    
+    return([acc_mat,count_acc,count_sub_acc,n_sp])
+
+
+def compute_x_bins(F1_fft,F2_fft,acc_mat,index_scaling_pair,use_matmul,acc_comp=None,bins=np.s_[:]):
+    """
+    Multiply-accumulate for a range of frequency bins, see compute_x_all() for the parameters.
+    
+    Parameters
+    ----------
+     bins : slice
+         [all by default] frequency bins (last dimension of F1_fft, F2_fft and acc_mat).
+    """
+    F1_bins=F1_fft[:,:,bins]
+    F2_bins=None if F2_fft is None else F2_fft[:,:,bins]
+    acc_bins=acc_mat[...,bins]
+    acc_comp_bins=None if acc_comp is None else [acc_comp[0][...,bins]]
     if index_scaling_pair==-1:
         #All baselines per task
-        if acc_mat is None:
-            acc_mat=np.zeros([n_sp,n_sp,fft_size_comp],dtype=dtype_complex)
-        for i1 in range(n_sp):
-            acc_mat[i1,i1:]+=np.sum(np.multiply(F1_fft[i1,:],F2_fft[i1:,:]),axis=1)
+        if use_matmul:
+            compute_x_matmul(F1_bins,F2_bins,acc_bins,acc_comp=acc_comp_bins)
+        else:
+            for i1 in range(len(F1_bins)):
+                accumulate_mat(acc_bins,np.s_[i1,i1:],np.sum(np.multiply(F1_bins[i1,:],F2_bins[i1:,:]),axis=1),\
+                               acc_comp_bins)
     else:
         # Linear-scaling-stations
-        if acc_mat is None:
-            acc_mat=np.zeros([n_sp,fft_size_comp],dtype=dtype_complex)
-        acc_mat+=np.sum(np.multiply(F1_fft[index_scaling_pair,:],F2_fft),axis=1)
+        accumulate_mat(acc_bins,np.s_[:],np.sum(np.multiply(F1_bins[index_scaling_pair,:],F2_bins),axis=1),\
+                       acc_comp_bins)
+
+
+def compute_x_processes(F1_fft,F2_fft,acc_mat,index_scaling_pair,use_matmul,acc_comp,processes):
+    """
+    Multiply-accumulate with the frequency bins split among the reducer processes, see compute_x_all() for 
+     the parameters.
     
-    return([acc_mat,count_acc,count_sub_acc,n_sp])
+    Notes
+    -----
+    |
+    | **Procedure:**
+    |
+    |  1. Copy FFTs into shared memory, and create a matrix for the results in shared memory.
+    |  2. Each process computes the cross products for its bins (compute_x_shared()).
+    |  3. Add results into acc_mat.
+    """
+    shared=[lib_workers.share_array(F1_fft)]
+    if F2_fft is not None:
+        shared.append(lib_workers.share_array(F2_fft))
+    shared.append(lib_workers.share_array(np.zeros(acc_mat.shape,dtype=acc_mat.dtype)))
+    descriptors=[shared[0][2],None if F2_fft is None else shared[1][2],shared[-1][2]]
+    bins_parts=lib_workers.split_range(acc_mat.shape[-1],processes,REDUCER_MIN_BINS_PER_WORKER)
+    lib_workers.map_processes(compute_x_shared,[descriptors+[index_scaling_pair,use_matmul,bins] for bins in bins_parts])
+    accumulate_mat(acc_mat,np.s_[...],shared[-1][1],acc_comp)
+    for shared_i in shared:
+        shm=shared_i[0]
+        del shared_i[1:]
+        lib_workers.release_array(shm)
+
+
+def compute_x_shared(args):
+    """
+    Worker for compute_x_processes(), arrays are attached from shared memory (see lib_workers.share_array()).
+    """
+    [F1_desc,F2_desc,acc_desc,index_scaling_pair,use_matmul,bins]=args
+    attached=[lib_workers.attach_array(desc) for desc in [F1_desc,F2_desc,acc_desc] if desc is not None]
+    F1_fft=attached[0][1]
+    F2_fft=None if F2_desc is None else attached[1][1]
+    compute_x_bins(F1_fft,F2_fft,attached[-1][1],index_scaling_pair,use_matmul,None,bins)
+    del F1_fft,F2_fft
+    for attached_i in attached:
+        shm=attached_i[0]
+        del attached_i[1:]
+        shm.close()
 
 
 
 
 
+def compute_x_matmul(F1_fft,F2_fft,acc_mat,bins_per_block=X_ENGINE_BINS_PER_BLOCK,acc_comp=None):
+    """
+    Cross-multiply and accumulate all baselines (upper triangular matrix) with one matrix product per frequency bin.
+    
+    Parameters
+    ----------
+     F1_fft : 3D numpy array
+         FFTs (left term), [station-polarizations x windows x bins].
+     F2_fft : 3D numpy array or None
+         FFTs (right term), same dimensions as F1_fft. If None, the conjugate of F1_fft is used.
+     acc_mat : 3D numpy array
+         accumulation matrix [station-polarizations x station-polarizations x bins] (see compute_x_all()).
+     bins_per_block : int
+         number of frequency bins processed together.
+     acc_comp
+         [None by default] compensation for Kahan summation (see accumulate_mat()).
+    
+    Returns
+    -------
+     acc_mat
+         input accumulation matrix (updated in place) with the new results.
+    
+    Notes
+    -----
+    |
+    | **Procedure:**
+    |
+    |  For each block of bins:
+    |  1. Arrange FFTs as [bins x sp x windows] and [bins x windows x sp].
+    |  2. Batched matrix product, giving [bins x sp x sp] (the sum over the windows is done in the product).
+    |  3. Add upper triangular part (including auto-correlations) into acc_mat.
+    |
+    | **Notes:**
+    |
+    |  The lower triangular part is also computed (and discarded), but for a large number of station-polarizations
+    |   the product is still faster than iterating on the station-polarizations, and it does not need the
+    |   [sp x windows x bins] temporaries. Blocks of bins keep the rearranged FFTs in cache.
+    """
+    [n_sp,n_windows,n_bins]=F1_fft.shape
+    [i_upper,j_upper]=np.triu_indices(n_sp)
+    for bin_start in range(0,n_bins,bins_per_block):
+        bins=np.s_[bin_start:bin_start+bins_per_block]
+        F1_t=np.ascontiguousarray(F1_fft[:,:,bins].transpose(2,0,1))
+        if F2_fft is None:
+            F2_t=np.conj(F1_t).transpose(0,2,1)
+        else:
+            F2_t=np.ascontiguousarray(F2_fft[:,:,bins].transpose(2,1,0))
+        cross_power=np.matmul(F1_t,F2_t)
+        accumulate_mat(acc_mat,(i_upper,j_upper,bins),cross_power[:,i_upper,j_upper].T,acc_comp)
+    return(acc_mat)
+
+
+
+
 def shortest_row_F(F1):
     """
     Get the minimum and maximum length of the elements of F1.
@@ -1555,7 +2634,7 @@ def compute_fx_for_all(F1_partial,F_ind_partial,F1,fft_size,windowing,acc_mat,co
                        acc_pcal=None,pre_pcal=None,n_bins_pcal=0,count_acc_pcal=0,phase_calibration=None,\
                        bypass_fx=0,F_delays=[],F_rates=[],F_fs=[],freq_channel=0.0,F_first_sample=[],F_first_sample_partial=[],\
                        F_frac=[],block_time=0.0,F_adj_shift_partial=[],F_stack_shift=[],F_adj_shift_pcal=[],F_stack_shift_pcal=[],\
-                       F_pcal_fix=[],F_side=[],F_lti=[]):
+                       F_pcal_fix=[],F_side=[],F_lti=[],F_buf=None,F_buf_pcal=None,acc_comp=None):
     """
     Fringe rotation, FFTs, fractional sample correction for all station-polarizations, and 
          cross multiplication and accumulation for all baseline (all-baselines-per-task-mode)
@@ -1636,6 +2715,12 @@ def compute_fx_for_all(F1_partial,F_ind_partial,F1,fft_size,windowing,acc_mat,co
          single side band side corresponding to the streams in F1.
      F_lti
          list of last, total, invalid samples for each stream
+     F_buf
+         [None by default] buffers for the stored samples (see init_stream_buffers()).
+     F_buf_pcal
+         [None by default] buffers for the stored samples for phase calibration.
+     acc_comp
+         [None by default] compensation for Kahan summation in the accumulation matrix (see init_acc_compensation()).
      
     Returns
     -------
@@ -1691,6 +2776,14 @@ def compute_fx_for_all(F1_partial,F_ind_partial,F1,fft_size,windowing,acc_mat,co
     |     stored without further computation. E.g. if =100, computations will be by-passed 99 out 100 times before the end 
     |     of the integration period. This allows to take advantage of increased efficiency with long numpy arrays, and also
     |     to avoid some repeated computations in fringe_rotation() and compute_f_all().
+    |
+    |  Use the variable REDUCER_STREAM_BUFFER in const_performance.py to keep the stored samples in preallocated buffers
+    |     (F_buf, F_buf_pcal) instead of concatenating and copying them in every call. In this case F1_partial and pre_pcal
+    |     are views of the buffers.
+    |
+    |  Use the variable F_ENGINE_FUSED in const_performance.py to process the stored samples in blocks of F_ENGINE_BLOCK
+    |     samples from fringe rotation to accumulation (compute_fx_blocks()), instead of fringe_rotation(), compute_f_all()
+    |     and compute_x_all() for all the samples.
     | 
     |
     | **Limitations:**
@@ -1760,7 +2853,8 @@ def compute_fx_for_all(F1_partial,F_ind_partial,F1,fft_size,windowing,acc_mat,co
             # Do not drop/add samples for phase calibration
             # TO DO: currently updated based on clock model (?)
             [pre_pcal,F_ind_unused,F_refs,F_stack_shift_pcal,F_lti_unused,F_unused]=hstack_new_samples(pre_pcal,F_ind_partial,\
-                                                    F_ind,F1,F_adj_shift_pcal,F_stack_shift_pcal,F_lti,F_first_sample,"pcal",[])
+                                                    F_ind,F1,F_adj_shift_pcal,F_stack_shift_pcal,F_lti,F_first_sample,"pcal",[],\
+                                                    F_buf_pcal)
         
         # Note:
         #  F_first_sample is for F1 (new samples)
@@ -1773,7 +2867,8 @@ def compute_fx_for_all(F1_partial,F_ind_partial,F1,fft_size,windowing,acc_mat,co
         
         # Store new data on previous structures, relocating based on previous ordering
         [F1_partial,F_ind_partial,F_refs,F_stack_shift,F_lti,F1]=hstack_new_samples(F1_partial,F_ind_partial,F_ind,F1,\
-                                                F_adj_shift_partial,F_stack_shift,F_lti,F_first_sample,"f",F_frac_over_ind)
+                                                F_adj_shift_partial,F_stack_shift,F_lti,F_first_sample,"f",F_frac_over_ind,\
+                                                F_buf)
         
  
         index_scaling_pair=-1
@@ -1796,7 +2891,11 @@ def compute_fx_for_all(F1_partial,F_ind_partial,F1,fft_size,windowing,acc_mat,co
                     if shortest_row_pre_pcal>=n_bins_pcal:
                         if longest_row_pre_pcal>n_bins_pcal:
                             pcal_size_multiple = int((shortest_row_pre_pcal//n_bins_pcal)*n_bins_pcal)
-                            [pre_pcal,pre_pcal_rem]=cut_remainder_fft_size_multiple(pre_pcal,pcal_size_multiple)
+                            if F_buf_pcal is not None:
+                                pre_pcal_rem=len(pre_pcal)
+                                pre_pcal=cut_remainder_stream_buffers(F_buf_pcal,pre_pcal_rem,pcal_size_multiple)
+                            else:
+                                [pre_pcal,pre_pcal_rem]=cut_remainder_fft_size_multiple(pre_pcal,pcal_size_multiple)
                         else:
                             pre_pcal_rem=None
                         count_acc_pcal+=int(shortest_row_pre_pcal//n_bins_pcal)
@@ -1820,25 +2919,40 @@ def compute_fx_for_all(F1_partial,F_ind_partial,F1,fft_size,windowing,acc_mat,co
                     if longest_row_F1_partial>fft_size:
                         # Too many samples, save for next acc block
                         fft_size_multiple=int((shortest_row_F1_partial//fft_size)*fft_size)
-                        [F1_partial,F1_partial_rem]=cut_remainder_fft_size_multiple(F1_partial,fft_size_multiple)
+                        if F_buf is not None:
+                            F1_partial_rem=len(F1_partial)
+                            F1_partial=cut_remainder_stream_buffers(F_buf,F1_partial_rem,fft_size_multiple)
+                        else:
+                            [F1_partial,F1_partial_rem]=cut_remainder_fft_size_multiple(F1_partial,fft_size_multiple)
                     else:
                         F1_partial_rem=None
                     
-                    if fft_size_multiple>0:
+                    if fft_size_multiple>0 and use_fx_blocks(F1_partial,F_rates):
+                        
+                        # Fused F-engine, one block of samples at a time
+                        [acc_mat,count_acc,count_sub_acc,n_sp,\
+                                    F_pcal_fix_out,F_first_sample_partial] = compute_fx_blocks(F1_partial,fft_size,windowing,\
+                                                                      dtype_complex,count_acc,acc_mat,index_scaling_pair,\
+                                                                      acc_comp,F_frac,F_fs,F_refs,freq_channel,\
+                                                                      F_first_sample_partial,F_rates,F_pcal_fix,F_side)
+                        
+                        reset_inputs=1
+                        
+                    elif fft_size_multiple>0:
                         
-                        [F1_partial,F_first_sample_partial] = fringe_rotation(F1_partial,F_first_sample_partial,\
+                        [F1_partial,F_first_sample_partial,F_rot] = fringe_rotation(F1_partial,F_first_sample_partial,\
                                                        F_rates,freq_channel,F_fs,F_delays,F_refs,block_time,F_frac,\
-                                                       F_adj_shift_partial,F_side,F_ind_partial,F_lti)
+                                                       F_adj_shift_partial,F_side,F_ind_partial,F_lti,fft_size)
 
                         # This includes corrections in frequency domain (fractional sample...)
                         [F1_fft,F2_fft,F_adj_shift_partial,F_adj_shift_pcal,\
                                     F_pcal_fix_out,F_first_sample_partial] = compute_f_all(F1_partial,fft_size,windowing,\
                                                                          dtype_complex,F_frac,F_fs,\
                                                                       F_refs,freq_channel,F_first_sample_partial,F_rates,\
-                                                                      F_pcal_fix,F_side,F_ind_partial,F_lti)
+                                                                      F_pcal_fix,F_side,F_ind_partial,F_lti,F_rot)
                         
                         [acc_mat,count_acc,count_sub_acc,n_sp] = compute_x_all(F1_fft,F2_fft,count_acc,acc_mat,\
-                                                                    index_scaling_pair,dtype_complex)
+                                                                    index_scaling_pair,dtype_complex,acc_comp)
 
                         reset_inputs=1
 
@@ -1850,9 +2964,14 @@ def compute_fx_for_all(F1_partial,F_ind_partial,F1,fft_size,windowing,acc_mat,co
         #if normalize_after_compute:
         #    acc_mat = normalize_mat(acc_mat,count_acc)
             
+        # With buffers, *_rem is the number of streams (remainder already in the buffers)
         if reset_pcal:
             if pre_pcal_rem is None:
                 pre_pcal=np.array([])
+                if F_buf_pcal is not None:
+                    reset_stream_buffers(F_buf_pcal)
+            elif F_buf_pcal is not None:
+                pre_pcal=get_stream_buffer_all(F_buf_pcal,pre_pcal_rem)
             else:
                 pre_pcal=np.copy(pre_pcal_rem)
         
@@ -1860,6 +2979,10 @@ def compute_fx_for_all(F1_partial,F_ind_partial,F1,fft_size,windowing,acc_mat,co
             if F1_partial_rem is None:
                 F1_partial=np.array([])
                 #F_ind_partial=[]
+                if F_buf is not None:
+                    reset_stream_buffers(F_buf)
+            elif F_buf is not None:
+                F1_partial=get_stream_buffer_all(F_buf,F1_partial_rem)
             else:
                 F1_partial=np.copy(F1_partial_rem)
 
@@ -34,18 +34,28 @@ Functions for starting and stopping hadoop, and for sending files to HDFS (or co
 #initial version: 2015.12 ajva
 #MIT Haystack Observatory
 
-from __future__ import print_function
+from __future__ import print_function,division
 import os
 import time
 import sys
+import zlib
+import subprocess
+import multiprocessing.pool
 import imp
-from lib_vdif import get_vdif_stats
+from lib_vdif import get_vdif_stats,get_vdif_index,get_vdif_index_splits
 import numpy as np
 
 import const_hadoop
 imp.reload(const_hadoop)
 from const_hadoop import *
 
+from const_performance import VDIF_FRAME_INDEX,STAGING_WORKERS,STAGING_SKIP_UNCHANGED
+
+
+# Staging of the media: block size for reading the pieces, and manifest with the pieces sent (see copy_files_to_hdfs())
+C_STAGING_READ_BLOCK =  1<<22
+C_STAGING_MANIFEST =    "cx_staging_manifest.txt"
+
 
 
 
@@ -339,9 +349,269 @@ def cluster_stop(wait_time,hadoop_dir,hadoop_conf_dir,temp_log,timeout=-1,v=0,fi
 
 
 
+def get_hdfs_splits(filename,packets_per_hdfs_block,accumulation_time=-1,seconds_ref=-1):
+    """
+    Get the pieces into which a media file is split before being moved into HDFS/LustreFS (in text mode).
+
+    Parameters
+    ----------
+     filename : str
+         path to VDIF file.
+     packets_per_hdfs_block : int
+         Number of VDIF frames per file split.
+     accumulation_time : float
+         [default -1] accumulation period in seconds, see copy_files_to_hdfs().
+     seconds_ref : float
+         [default -1] start of the first accumulation period, see copy_files_to_hdfs().
+
+    Returns
+    -------
+     packet_size : int
+         frame size (from the first frame of the file).
+     blocksize : int
+         block size in the distributed filesystem.
+     splits : list of [offset,num_bytes]
+         byte offset and size of each split.
+
+    Notes
+    -----
+    |
+    | Same splits as in copy_files_to_hdfs(): complete accumulation periods if VDIF_FRAME_INDEX and accumulation_time>0
+    |  (and the number of frames per second is known), otherwise one split every blocksize bytes (as "split --bytes").
+    """
+    vdif_stats=get_vdif_stats(filename,packet_limit=1,offset_bytes=0,only_offset_once=0,v=0)
+    packet_size=vdif_stats[4]
+    blocksize = packet_size*packets_per_hdfs_block
+    splits = None
+    if VDIF_FRAME_INDEX and accumulation_time>0:
+        splits = get_vdif_index_splits(get_vdif_index(filename),packets_per_hdfs_block,accumulation_time,seconds_ref)
+        if splits is None:
+            print(" Warning: unknown number of frames per second in "+filename+", splits not aligned with accumulation periods")
+        elif splits!=[]:
+            blocksize *= int(np.ceil(max([split[1] for split in splits])/float(blocksize)))
+    if splits is None:
+        file_size = os.path.getsize(filename)
+        splits = [[offset,min(blocksize,file_size-offset)] for offset in range(0,file_size,blocksize)]
+    return([packet_size,blocksize,splits])
+
+
+
+def get_staging_pieces(input_files,data_dir,dest_dir,packets_per_hdfs_block,text_mode=1,accumulation_time=-1,\
+                       seconds_ref=-1):
+    """
+    Get the pieces of the media files to be sent into HDFS/LustreFS.
+
+    Parameters
+    ----------
+     input_files : list of str
+         names of the media files.
+     data_dir : str
+         Path (in local filesystem) to the folder hosting the media files.
+     dest_dir : str
+         Path (in HDFS/LustreFS) to host the pieces.
+     packets_per_hdfs_block : int
+         Number of VDIF frames per file split.
+     text_mode : int
+         [default 1] If 1 files are split (see get_hdfs_splits()), otherwise every file is sent as one piece.
+     accumulation_time : float
+         [default -1] see get_hdfs_splits().
+     seconds_ref : float
+         [default -1] see get_hdfs_splits().
+
+    Returns
+    -------
+     pieces : list
+         [filename,offset,num_bytes,dest_file,blocksize,packet_size] for each piece, with the byte range in the media
+          file and the path in HDFS/LustreFS (dest_dir+split_id+"/"+filename if split, dest_dir+filename otherwise).
+    """
+    pieces = []
+    for filename in input_files:
+        file_size = os.path.getsize(data_dir+filename)
+        [packet_size,blocksize,splits] = get_hdfs_splits(data_dir+filename,packets_per_hdfs_block,\
+                                                         accumulation_time,seconds_ref)
+        if text_mode:
+            for (i_split,[split_offset,split_bytes]) in enumerate(splits):
+                split_bytes = max(0,min(split_bytes,file_size-split_offset))
+                pieces.append([filename,split_offset,split_bytes,dest_dir+str(i_split)+"/"+filename,blocksize,packet_size])
+        else:
+            pieces.append([filename,0,file_size,dest_dir+filename,blocksize,packet_size])
+    return(pieces)
+
+
+def get_range_checksum(filename,offset,num_bytes,block_size=C_STAGING_READ_BLOCK):
+    """
+    Get CRC32 of a byte range of a file.
+    """
+    checksum = 0
+    with open(filename,'rb') as f_read:
+        f_read.seek(offset)
+        while num_bytes>0:
+            data = f_read.read(min(block_size,num_bytes))
+            if not data:
+                break
+            checksum = zlib.crc32(data,checksum)
+            num_bytes -= len(data)
+    return(checksum&0xffffffff)
+
+
+def get_staged_sizes(dest_dir,hdfs_cmd,temp_log,use_lustre_plugin=0,lustre_prefix=""):
+    """
+    Get the files already in the destination folder (HDFS/LustreFS).
+
+    Returns
+    -------
+     staged : dict
+         size of every file, indexed by its path (relative to lustre_prefix if use_lustre_plugin).
+    """
+    staged = {}
+    if use_lustre_plugin:
+        for (path,dirs,files) in os.walk(lustre_prefix+dest_dir):
+            for name in files:
+                dest_file = os.path.join(path,name)
+                staged[os.path.normpath(dest_file[len(lustre_prefix):])] = os.path.getsize(dest_file)
+    else:
+        os.system(hdfs_cmd+" -ls -R " + dest_dir + " > " + temp_log + " 2>/dev/null")
+        with open(temp_log, 'r') as f_tmp:
+            for line in f_tmp:
+                fields = line.split()
+                if len(fields)>=8 and line.startswith("-"):
+                    staged[os.path.normpath(fields[-1])] = int(fields[4])
+    return(staged)
+
+
+def read_staging_manifest(file_manifest):
+    """
+    Read the size and checksum of the pieces sent in previous executions (see write_staging_manifest()).
+    """
+    manifest = {}
+    if os.path.isfile(file_manifest):
+        with open(file_manifest, 'r') as f_manifest:
+            for line in f_manifest:
+                fields = line.split()
+                if len(fields)==3:
+                    manifest[fields[0]] = [int(fields[1]),int(fields[2])]
+    return(manifest)
+
+
+def write_staging_manifest(file_manifest,manifest):
+    """
+    Write the size and checksum of the pieces in HDFS/LustreFS (one line "path size checksum" per piece).
+    """
+    if not(os.path.isdir(os.path.dirname(file_manifest) or ".")):
+        os.makedirs(os.path.dirname(file_manifest))
+    with open(file_manifest, 'w') as f_manifest:
+        for dest_file in sorted(manifest):
+            print(dest_file+" "+" ".join(map(str,manifest[dest_file])),file=f_manifest)
+
+
+def remove_partial_piece(file_out,command):
+    """
+    Remove the destination of a piece that could not be sent completely.
+    
+    Parameters
+    ----------
+     file_out : str
+         destination file (LustreFS), None if the piece was sent with command.
+     command : list
+         command for HDFS (hdfs dfs ... -put -f - dest_file).
+    
+    Returns
+    -------
+     N/A
+    """
+    if file_out is None:
+        if "-put" in command:
+            command_rm = command[:command.index("-put")]+["-rm","-f",command[-1]]
+            try:
+                subprocess.call(command_rm)
+            except (IOError,OSError):
+                pass
+    elif os.path.isfile(file_out):
+        os.remove(file_out)
+
+
+
+def stage_piece(piece_task):
+    """
+    Send one piece into HDFS/LustreFS, unless it is unchanged.
+
+    Parameters
+    ----------
+     piece_task : list
+         [file_in,offset,num_bytes,file_out,command,checksum_staged] with:
+          |  file_in:         media file.
+          |  offset:          first byte of the piece.
+          |  num_bytes:       number of bytes of the piece.
+          |  file_out:        destination file (LustreFS), None to send the piece to the standard input of command.
+          |  command:         list with the command for HDFS (hdfs dfs -put - dest_file).
+          |  checksum_staged: None to send the piece, otherwise it is only sent if its checksum is different
+          |                   (-1 to skip it without computing its checksum).
+
+    Returns
+    -------
+     result : list
+         [bytes sent, checksum (-1 if not computed), return code, start time, end time, 1 if skipped].
+    
+    Notes
+    -----
+    |
+    | Errors (e.g. command not found, broken pipe) are reported and do not stop the other pieces: the partial
+    |  destination file is removed (see remove_partial_piece()) and the return code is non-zero.
+    """
+    [file_in,offset,num_bytes,file_out,command,checksum_staged] = piece_task
+    start_time = time.time()
+    if checksum_staged==-1:
+        return([0,-1,0,start_time,time.time(),1])
+    proc = None
+    f_write = None
+    checksum = 0
+    bytes_sent = 0
+    try:
+        if checksum_staged is not None:
+            if get_range_checksum(file_in,offset,num_bytes)==checksum_staged:
+                return([0,checksum_staged,0,start_time,time.time(),1])
+        if file_out is None:
+            proc = subprocess.Popen(command,stdin=subprocess.PIPE)
+            f_write = proc.stdin
+        else:
+            f_write = open(file_out,'wb')
+        with open(file_in,'rb') as f_read:
+            f_read.seek(offset)
+            while bytes_sent<num_bytes:
+                data = f_read.read(min(C_STAGING_READ_BLOCK,num_bytes-bytes_sent))
+                if not data:
+                    break
+                checksum = zlib.crc32(data,checksum)
+                f_write.write(data)
+                bytes_sent += len(data)
+        f_write.close()
+        return_code = 0
+        if file_out is None:
+            return_code = proc.wait()
+    except (IOError,OSError) as e:
+        print(" ERROR!: staging "+file_in+" ["+str(offset)+"+"+str(num_bytes)+"]: "+str(e))
+        return_code = 1
+        checksum = -1
+        if f_write is not None:
+            try:
+                f_write.close()
+            except (IOError,OSError):
+                pass
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+            proc.wait()
+    if return_code==0:
+        checksum &= 0xffffffff
+    else:
+        remove_partial_piece(file_out,command)
+    return([bytes_sent,checksum,return_code,start_time,time.time(),0])
+
+
+
 def copy_files_to_hdfs(replication,input_files,data_dir,data_dir_tmp,hadoop_dir,hadoop_conf_dir,hdfs_data_dir,\
                        packets_per_hdfs_block,temp_log,copy_delay=0,checksum_size=100,text_mode=1,\
-                       use_lustre_plugin=0,lustre_prefix="/nobackup1/ajva/hadoop",bm_avoid_copy=0,v=0,file_log=sys.stdout):        
+                       use_lustre_plugin=0,lustre_prefix="/nobackup1/ajva/hadoop",bm_avoid_copy=0,\
+                       accumulation_time=-1,seconds_ref=-1,v=0,file_log=sys.stdout):        
     """
     Copy files from local directories to HDFS. It returns the elapsed time for moving the files (including the applied delay).
     
@@ -354,7 +624,7 @@ def copy_files_to_hdfs(replication,input_files,data_dir,data_dir_tmp,hadoop_dir,
      data_dir : str
          Path (in local filesystem) to the folder hosting the files to be moved into HDFS/LustreFS.
      data_dir_tmp : str
-         Path (in local filesystem) to the folder for copy split input data before being moved into HDFS/LustreFS.
+         Path (in local filesystem) to the folder for the staging manifest (see notes below).
      hadoop_dir : str
          Hadoop home folder path (local filesystem).
      hadoop_conf_dir : str
@@ -376,8 +646,13 @@ def copy_files_to_hdfs(replication,input_files,data_dir,data_dir_tmp,hadoop_dir,
      lustre_prefix : str
          Path in Lustre to preceed "hdfs_data_dir" if using Lustre.
      bm_avoid_copy : int
-        [default 0] If 1 it will not split input files if "lustre_prefix"+"hdfs_data_dir" has already the data
-                        for the file in "input_files" from a previous execution. See notes below.
+        [default 0] If 1 it will not send pieces that are already in "lustre_prefix"+"hdfs_data_dir" with the same size,
+                        from a previous execution. See notes below.
+     accumulation_time : float
+         [default -1] accumulation period in seconds, if >0 (and VDIF_FRAME_INDEX) the files are split at the beginning
+                        of the accumulation periods (only if text_mode==1), see lib_vdif.get_vdif_index_splits().
+     seconds_ref : float
+         [default -1] start of the first accumulation period (seconds of the day, as in the VDIF headers).
      v : int
          1 for verbose.
      file_log : str
@@ -397,10 +672,11 @@ def copy_files_to_hdfs(replication,input_files,data_dir,data_dir_tmp,hadoop_dir,
     |
     | **Summary:**
     |
-    |  -Delete existing files in HDFS (to avoid errors on existing files)
-    |  TODO: consider overwritting files.
+    |  -Get the pieces of every file (see get_staging_pieces()).
+    |  -Delete existing files in HDFS that are not pieces of the input files (all files if not STAGING_SKIP_UNCHANGED).
     |  -Wait for delay if applicable.
-    |  -Move files to HDFS (with specified block size)
+    |  -Send the pieces to HDFS (with specified block size) or write them into LustreFS, with up to STAGING_WORKERS
+    |    pieces at the same time (see stage_piece()). Pieces are read directly from the media files.
     |  2015.12.1. packet_size is read from the first frame of the file.
     |
     |
@@ -414,23 +690,26 @@ def copy_files_to_hdfs(replication,input_files,data_dir,data_dir_tmp,hadoop_dir,
     |  -Regarding "bm_avoid_copy":
     |    Always 0 by default.
     |    After each execution, for each processed file there will be a folder in "lustre_prefix"+"hdfs_data_dir"+"file_name"+... with
-    |      the splits for that file. Setting this to 1 will avoid to re-split the file if it was already used previously. Use only 
-    |      for repeated benchmarking.
+    |      the splits for that file. Setting this to 1 will avoid to re-send pieces already there with the same size, without
+    |      checking their checksum. Use only for repeated benchmarking.
+    |
+    |  -Regarding unchanged pieces:
+    |    If STAGING_SKIP_UNCHANGED, the size and the checksum (CRC32) of every piece sent are stored into
+    |      data_dir_tmp+C_STAGING_MANIFEST. In the next execution, pieces found in HDFS/LustreFS with the same size, and
+    |      with the same checksum as in the manifest, are not sent again.
+    |
+    |  -Regarding splits:
+    |    If VDIF_FRAME_INDEX and accumulation_time>0, the splits contain complete accumulation periods with (approximately)
+    |      packets_per_hdfs_block frames each, and the block size is adjusted to fit the largest split. Otherwise
+    |      the files are split every packets_per_hdfs_block frames.
     """
     
-    # Split file manually into the size of the hdfs blocks
-    # Use 1 if processing input as text
-    #split_file_sequentially=0
-    split_file_sequentially=text_mode
-    
-    
-    
-
     if v==1:
         print("\nCopying data files to HDFS...",file=file_log)   
         print(data_dir)
         print(input_files)
     
+    hdfs_cmd = hadoop_dir + "bin/hdfs --config "+hadoop_conf_dir+" dfs"
     safe_status = "OFF"
     if use_lustre_plugin==0:
         os.system(hadoop_dir + "bin/hdfs --config "+hadoop_conf_dir+" dfsadmin -report|grep Safe > " + temp_log)
@@ -452,21 +731,42 @@ def copy_files_to_hdfs(replication,input_files,data_dir,data_dir_tmp,hadoop_dir,
 
     dest_dir = hdfs_data_dir
     
-    
+    # Pieces (split directly from the media files in text mode)
+    pieces = get_staging_pieces(input_files,data_dir,dest_dir,packets_per_hdfs_block,text_mode,\
+                                accumulation_time,seconds_ref)
+    if text_mode:
+        checksum_size=packets_per_hdfs_block
+    if use_lustre_plugin:
+        dest_prefix = lustre_prefix
+    else:
+        dest_prefix = ""
+    dest_files = [os.path.normpath(piece[3]) for piece in pieces]
 
 
-    # Delete all existing files in HDFS and create directory.
+    # Delete existing files in HDFS (only those that are not pieces if skipping unchanged pieces) and create directories
+    staged = {}
+    if STAGING_SKIP_UNCHANGED or bm_avoid_copy:
+        staged = get_staged_sizes(dest_dir,hdfs_cmd,temp_log,use_lustre_plugin,lustre_prefix)
+        stale_files = sorted(set(staged)-set(dest_files))
+        if stale_files!=[]:
+            if v==1:
+                print(" Deleting "+str(len(stale_files))+" file(s) from previous executions",file=file_log) 
+            if use_lustre_plugin==0:
+                os.system(hdfs_cmd+" -rm -f "+" ".join(stale_files))
+            else:
+                for stale_file in stale_files:
+                    os.remove(lustre_prefix+stale_file)
+    elif use_lustre_plugin==0:
+        os.system(hdfs_cmd+" -rm -r -f "+ dest_dir)
+    else:
+        os.system("rm -r -f "+lustre_prefix+ dest_dir)
+    dest_dirs = sorted(set([dest_dir]+[os.path.dirname(dest_file) for dest_file in dest_files]))
     if use_lustre_plugin==0:
-        os.system(hadoop_dir+"bin/hdfs --config "+hadoop_conf_dir+" dfs -rm -r -f "+ dest_dir)
-        os.system(hadoop_dir+"bin/hdfs --config "+hadoop_conf_dir+" dfs -mkdir " + dest_dir)
+        os.system(hdfs_cmd+" -mkdir -p "+" ".join(dest_dirs))
     else:
-        if bm_avoid_copy==0:
-            os.system("rm -r -f "+lustre_prefix+ dest_dir)
-        os.system("mkdir " + lustre_prefix + dest_dir)
-    
-    #if v==1:
-    #    print(" Forcing out of safe mode...",file=file_log)  
-    #os.system(hadoop_dir+"bin/hdfs dfsadmin -safemode leave")
+        for dest_dir_piece in dest_dirs:
+            if not(os.path.isdir(lustre_prefix+dest_dir_piece)):
+                os.makedirs(lustre_prefix+dest_dir_piece)
     
     
     if copy_delay>0:
@@ -475,101 +775,71 @@ def copy_files_to_hdfs(replication,input_files,data_dir,data_dir_tmp,hadoop_dir,
         time.sleep(copy_delay)
     
     
-    if v==1:
-        print(" Will wait for " + str(len(input_files)) + " HDFS interaction(s) (" + str(copy_delay) + " s)...",file=file_log) 
+    # Pieces unchanged from previous executions
+    file_manifest = data_dir_tmp+C_STAGING_MANIFEST
+    manifest = {}
+    if STAGING_SKIP_UNCHANGED:
+        manifest = read_staging_manifest(file_manifest)
     
+    piece_tasks = []
+    command_hdfs="No command executed"
+    for ([filename,offset,num_bytes,dest_file,blocksize,packet_size],dest_key) in zip(pieces,dest_files):
+        checksum_staged = None
+        if staged.get(dest_key,-1)==num_bytes:
+            if bm_avoid_copy:
+                checksum_staged = -1
+            elif manifest.get(dest_prefix+dest_key,[-1])[0]==num_bytes:
+                checksum_staged = manifest[dest_prefix+dest_key][1]
+        if use_lustre_plugin==0:
+            command_hdfs=hdfs_cmd+\
+                 " -D "+C_H_HDFS_CHECKSUM+    "="+str(checksum_size)+\
+                 " -D "+C_H_HDFS_BLOCKSIZE+   "="+str(blocksize)+\
+                 " -D "+C_H_HDFS_REPLICATION+ "="+str(replication)+\
+                 " -put -f - " + dest_file
+            piece_tasks.append([data_dir+filename,offset,num_bytes,None,command_hdfs.split(),checksum_staged])
+        else:
+            piece_tasks.append([data_dir+filename,offset,num_bytes,lustre_prefix+dest_file,None,checksum_staged])
     
+    if v==1:
+        print(" Sending "+str(len(piece_tasks))+" piece(s) with "+str(STAGING_WORKERS)+" worker(s)...",file=file_log) 
+    
+    put_t_s = time.time()
+    if STAGING_WORKERS>1 and len(piece_tasks)>1:
+        pool = multiprocessing.pool.ThreadPool(min(STAGING_WORKERS,len(piece_tasks)))
+        try:
+            results = pool.map(stage_piece,piece_tasks,chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [stage_piece(piece_task) for piece_task in piece_tasks]
+    put_t_e = time.time()
+    put_d = put_t_e - put_t_s
     
     
-    if split_file_sequentially==0:
-        put_t_s = time.time()
-        for filename in input_files:
-            vdif_stats=get_vdif_stats(data_dir+filename,packet_limit=1,offset_bytes=0,only_offset_once=0,v=0)
-            packet_size=vdif_stats[4]
-        
-            #blocksize = min(packet_size*packets_per_hdfs_block,os.path.getsize(data_dir+filename))
-            blocksize = packet_size*packets_per_hdfs_block
-            
-            command_hdfs=hadoop_dir + "bin/hdfs --config "+hadoop_conf_dir+" dfs"+\
-                      " -D "+C_H_HDFS_CHECKSUM+    "="+str(checksum_size)+\
-                      " -D "+C_H_HDFS_BLOCKSIZE+   "="+str(blocksize)+\
-                      " -D "+C_H_HDFS_REPLICATION+ "="+str(replication)+\
-                      " -put -f " + data_dir + filename + " " + dest_dir
-            os.system(command_hdfs)  
-            if copy_delay>0:
-                time.sleep(copy_delay)
-        put_t_e = time.time()
-    else:
-        put_t_s = time.time()
+    # Update manifest (only pieces sent successfully) and report per file
+    num_failed = 0
+    for (piece,dest_key,result) in zip(pieces,dest_files,results):
+        manifest.pop(dest_prefix+dest_key,None)
+        if result[2]==0 and result[1]!=-1:
+            manifest[dest_prefix+dest_key] = [piece[2],result[1]]
+        elif result[2]!=0:
+            num_failed += 1
+            print(" ERROR!: failed to send "+piece[0]+" ["+str(piece[1])+"+"+str(piece[2])+"] to "+piece[3],file=file_log)
+    if num_failed>0:
+        print(" ERROR!: "+str(num_failed)+" of "+str(len(pieces))+" piece(s) could not be staged",file=file_log)
+    if STAGING_SKIP_UNCHANGED:
+        write_staging_manifest(file_manifest,manifest)
+    if v==1:
         for filename in input_files:
-            vdif_stats=get_vdif_stats(data_dir+filename,packet_limit=1,offset_bytes=0,only_offset_once=0,v=0)
-            packet_size=vdif_stats[4]
-            checksum_size=packets_per_hdfs_block
-    
-
-            blocksize = packet_size*packets_per_hdfs_block
-            suffix_size=int(1+np.ceil(np.log10(1+os.path.getsize(data_dir+filename)//blocksize)))     
-            command_hdfs="No command executed"
-            send_tmp_folder = data_dir_tmp+filename+"_tmp_folder"
-
-            test_file_exists = lustre_prefix + dest_dir+"/0"+"/"+filename
-            if bm_avoid_copy:
-                if os.path.isfile(test_file_exists):
-                    if v==1:
-                        print("(!!) Avoiding copy of file "+filename+", already found in "+lustre_prefix + dest_dir,file=file_log)
-                    continue
-                
-            os.system("rm -r "+send_tmp_folder)
-            os.system("mkdir -p "+send_tmp_folder)
-            os.system("split --bytes="+str(blocksize)+" -d -a " + str(suffix_size) + " " +data_dir+filename+" "+send_tmp_folder+"/tmp_")
-            
-            files_to_process = os.listdir(send_tmp_folder)
-            num_iters=len(files_to_process)
-            
-            if v==1:
-                print(" Sending "+str(num_iters)+" block(s):",file=file_log) 
-                print(" "+','.join(files_to_process),file=file_log) 
-            
-
-            iteri=-1
-            
-            check_value=0
-            for fi in files_to_process:
-                iteri+=1
-                
-                if v==1:
-                    if (iteri/num_iters)>(check_value/100):
-                        print(str(check_value)+"%",file=file_log) 
-                        check_value+=10
-                
-
-                if use_lustre_plugin==0:
-                    os.system(hadoop_dir + "bin/hdfs --config "+hadoop_conf_dir+" dfs -mkdir -p " + dest_dir+"/"+str(iteri)+"/")
-                    os.system(hadoop_dir + "bin/hdfs --config "+hadoop_conf_dir+" dfs -ls " + dest_dir + " >> " + temp_log)
-                else:
-                    os.system("mkdir "+lustre_prefix+dest_dir+"/"+str(iteri)+"/"+" &> /dev/null")
-                    
-                
-                if use_lustre_plugin==0:
-                    command_hdfs=hadoop_dir + "bin/hdfs --config "+hadoop_conf_dir+" dfs"+\
-                         " -D "+C_H_HDFS_CHECKSUM+    "="+str(checksum_size)+\
-                         " -D "+C_H_HDFS_BLOCKSIZE+   "="+str(blocksize)+\
-                         " -D "+C_H_HDFS_REPLICATION+ "="+str(replication)+\
-                         " -put -f " + send_tmp_folder + "/" + fi + " " + dest_dir+str(iteri)+"/"+filename
-                    os.system(command_hdfs)
-                else:
-                    command_hdfs="mv "+ send_tmp_folder + "/" + fi + " "+ lustre_prefix + dest_dir+str(iteri)+"/"+filename
-                    os.system(command_hdfs)
-                    
-                    
-                
-            if copy_delay>0:
-                time.sleep(copy_delay)
-            os.system("rm -r "+send_tmp_folder)
-            if v==1:
-                print("100%, deleting temp files",file=file_log) 
-        put_t_e = time.time()
-    put_d = put_t_e - put_t_s
+            results_file = [result for (piece,result) in zip(pieces,results) if piece[0]==filename]
+            if results_file!=[]:
+                bytes_sent = sum([result[0] for result in results_file])
+                time_file = max([result[4] for result in results_file])-min([result[3] for result in results_file])
+                print(" "+filename+": "+str(len(results_file))+" piece(s), "+\
+                      str(sum([result[5] for result in results_file]))+" unchanged, "+\
+                      str(bytes_sent)+" B in "+"%.3f" % time_file+" s ("+\
+                      "%.2f" % (bytes_sent/max(time_file,1e-9)/1e6)+" MB/s)",file=file_log)
     
     if use_lustre_plugin==0:
         os.system(hadoop_dir + "bin/hdfs --config "+hadoop_conf_dir+" dfs -ls " + dest_dir + " >> " + temp_log)
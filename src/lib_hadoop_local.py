@@ -0,0 +1,552 @@
+# -*- coding: utf-8 -*-
+# <nbformat>3.0</nbformat>
+
+# <codecell>
+
+#!/usr/bin/env python
+#
+#The MIT CorrelX Correlator
+#
+#https://github.com/MITHaystack/CorrelX
+#Contact: correlX@haystack.mit.edu
+#Project leads: Victor Pankratius, Pedro Elosegui Project developer: A.J. Vazquez Alvarez
+#
+#Copyright 2017 MIT Haystack Observatory
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+#------------------------------
+#------------------------------
+#Project: CorrelX.
+#File: lib_hadoop_local.py.
+#Author: agent (agent@local)
+"""
+Local emulation of Hadoop streaming jobs: the job configured for run_mapreduce_sh() (lib_mapredcorr.py) is run on
+ this node with a pool of processes, without starting Hadoop nor moving the media into HDFS. Used for benchmarking
+ the Hadoop path (split sizes, partitioner and number of reducers) without a cluster.
+
+Notes
+-----
+|
+| **Procedure:**
+|
+|  1. Input: the media files are split as in lib_hadoop_hdfs.copy_files_to_hdfs() (text mode) or taken whole 
+|      (fixed-length records), and the input splits are computed as in Hadoop (see get_input_splits()).
+|  2. Map: one task per input split, with map_input_file set to the path in HDFS. The output of the mapper is 
+|      sorted and partitioned into one file per reducer (see get_partitioner()), as in the spill of a Hadoop map task.
+|  3. Reduce: every reduce task merges its partition from all the map outputs (sorted reducer input) and runs the 
+|      reducer.
+|  4. Output: the reducer outputs (part-*) are merged as with "getmerge", and sorted if sort_output.
+|
+|  Tasks are run by HADOOP_LOCAL_SLOTS processes, reduce tasks start when all map tasks have finished (as with 
+|   slowstart 1.0).
+|
+|
+| **Notes:**
+|
+|  The mappers get the raw bytes of their splits, aligned to the frames (text mode) or records (fixed-length 
+|   records), instead of the records delivered by the Hadoop input format.
+|  The start and end time of every task are reported in a timeline (see print_timeline()).
+|  See HADOOP_LOCAL* in const_performance.py for running it from mapred_cx.py, and for sweeping the number of
+|   frames per split and the number of reducers.
+
+"""
+#History:
+#initial version: 2026.10 agent
+#MIT Haystack Observatory
+
+from __future__ import print_function,division
+import sys
+import os
+import time
+import shlex
+import shutil
+import subprocess
+import multiprocessing
+import imp
+
+import const_mapred
+imp.reload(const_mapred)
+from const_mapred import *
+
+import const_hadoop
+imp.reload(const_hadoop)
+from const_hadoop import C_H_ENV_MAP_INPUT_FILE
+
+import const_performance
+imp.reload(const_performance)
+from const_performance import HADOOP_LOCAL_SLOTS
+
+import lib_mapred_io
+imp.reload(lib_mapred_io)
+from lib_mapred_io import sort_external,records_to_text,to_bytes
+
+import lib_pipeline
+imp.reload(lib_pipeline)
+from lib_pipeline import run_map_task,get_partition_fields,get_partition,write_output
+
+import lib_hadoop_hdfs
+imp.reload(lib_hadoop_hdfs)
+from lib_hadoop_hdfs import get_staging_pieces
+
+import lib_mapredcorr
+imp.reload(lib_mapredcorr)
+from lib_mapredcorr import get_num_tasks
+
+
+# Hadoop defaults: number of map tasks (mapreduce.job.maps, only used if not given), and slop for the last split
+C_HADOOP_LOCAL_DEFAULT_MAPS =  2
+C_HADOOP_LOCAL_SPLIT_SLOP =    1.1
+
+# Suffixes for the folder with the intermediate files and for the timeline file (after the output filename)
+C_HADOOP_LOCAL_DIR =           "_local/"
+C_HADOOP_LOCAL_TIMELINE =      ".timeline"
+
+
+
+
+###########################################
+#           Input
+########################################### 
+
+def get_staged_files(input_files,data_dir,hdfs_data_dir,packets_per_hdfs_block,text_mode,record_size,\
+                     accumulation_time=-1,seconds_ref=-1):
+    """
+    Get the files that would be in HDFS after lib_hadoop_hdfs.copy_files_to_hdfs().
+    
+    Parameters
+    ----------
+     input_files : list of str
+         media filenames.
+     data_dir : str
+         path to the media.
+     hdfs_data_dir : str
+         working path in HDFS.
+     packets_per_hdfs_block : int
+         number of frames per split.
+     text_mode : int
+         1 if the files are split into folders (text mode), 0 for fixed-length records (files are not split).
+     record_size : int
+         record size for fixed-length records.
+     accumulation_time : float
+         accumulation period in seconds (see copy_files_to_hdfs()).
+     seconds_ref : float
+         start of the first accumulation period (see copy_files_to_hdfs()).
+    
+    Returns
+    -------
+     staged_files : list
+         [hdfs_file,file_in,offset,num_bytes,blocksize,record_size] for each file in HDFS, with the path in HDFS,
+          the media file, the byte range of the media file, the block size and the record (or frame) size.
+    """
+    staged_files = []
+    for [filename,offset,num_bytes,dest_file,blocksize,packet_size] in \
+                get_staging_pieces(input_files,data_dir,hdfs_data_dir,packets_per_hdfs_block,text_mode,\
+                                   accumulation_time,seconds_ref):
+        staged_files.append([dest_file,data_dir+filename,offset,num_bytes,blocksize,\
+                             packet_size if text_mode else record_size])
+    return(staged_files)
+
+
+def get_input_splits(staged_files,num_maps):
+    """
+    Get the input splits for the map tasks.
+    
+    Parameters
+    ----------
+     staged_files : list
+         output of get_staged_files().
+     num_maps : int
+         requested number of map tasks.
+    
+    Returns
+    -------
+     input_splits : list
+         [hdfs_file,file_in,[offset,num_bytes]] for each map task, with the byte range in the media file.
+    
+    Notes
+    -----
+    |
+    | **Procedure:**
+    |
+    |  As in Hadoop (FileInputFormat, old API): the split size is the minimum of the block size and the total size 
+    |   divided by num_maps, and the last split of a file can be up to C_HADOOP_LOCAL_SPLIT_SLOP times the split size.
+    |  Every split is then aligned to records (frames in text mode): it starts at the first record that begins in
+    |   the split, and ends at the end of the last one (as with the fixed-length records reader).
+    |  Splits are sorted by decreasing size, which is the order in which Hadoop schedules the map tasks.
+    """
+    goal_size = sum([staged_file[3] for staged_file in staged_files])//max(1,num_maps)
+    input_splits = []
+    for [hdfs_file,file_in,offset,num_bytes,blocksize,record_size] in staged_files:
+        split_size = max(1,min(goal_size,blocksize))
+        split_bounds = list(range(0,num_bytes,split_size))
+        if len(split_bounds)>1 and (num_bytes-split_bounds[-1])<=(C_HADOOP_LOCAL_SPLIT_SLOP-1)*split_size:
+            split_bounds.pop()
+        split_bounds.append(num_bytes)
+        # Align to records
+        split_bounds = [min(num_bytes,-(-bound//record_size)*record_size) for bound in split_bounds]
+        for (split_start,split_end) in zip(split_bounds[:-1],split_bounds[1:]):
+            if split_end>split_start:
+                input_splits.append([hdfs_file,file_in,[offset+split_start,split_end-split_start]])
+    input_splits.sort(key=lambda x: -x[2][1])
+    return(input_splits)
+
+
+
+
+###########################################
+#           Partitioner
+########################################### 
+
+def get_hash_partition(key,fields,num_reducers):
+    """
+    Get reducer for a line/record with the default Hadoop partitioner (KeyFieldBasedPartitioner).
+    
+    Parameters
+    ----------
+     key : bytes
+         line (text mode) or key (binary mode).
+     fields : list
+         output of lib_pipeline.get_partition_fields().
+     num_reducers : int
+         number of reducers.
+    
+    Returns
+    -------
+     partition : int
+         reducer id.
+    
+    Notes
+    -----
+    |
+    | Same hash as in Java (31*hash+byte on signed bytes, 32-bit integers) for the key fields.
+    """
+    field = to_bytes(FIELD_SEP).join(key.split(to_bytes(FIELD_SEP))[fields[0]:fields[1]])
+    hash_value = 0
+    for byte_value in bytearray(field):
+        hash_value = (31*hash_value+byte_value-((byte_value&0x80)<<1))&0xffffffff
+    return((hash_value&0x7fffffff)%num_reducers)
+
+
+def get_partitioner(partition_str,num_reducers,use_nohash_partitioner):
+    """
+    Get function to select the reducer for a line/record.
+    
+    Parameters
+    ----------
+     partition_str : str
+         partitioner options (-kN,M), see lib_pipeline.get_partition_fields().
+     num_reducers : int
+         number of reducers.
+     use_nohash_partitioner : int
+         1 for the no-hash partitioner (see lib_pipeline.get_partition()), 0 for the default partitioner 
+          (see get_hash_partition()).
+    
+    Returns
+    -------
+     partition : function
+         function that gets the reducer id for a key (bytes), None if there is only one reducer.
+    """
+    if num_reducers<2:
+        return(None)
+    fields = get_partition_fields(partition_str)
+    if use_nohash_partitioner:
+        return(lambda key: get_partition(key,fields,num_reducers))
+    return(lambda key: get_hash_partition(key,fields,num_reducers))
+
+
+
+
+###########################################
+#           Tasks
+########################################### 
+
+def run_map_task_local(map_task):
+    """
+    Run one map task: mapper, and sort and partition of its output.
+    
+    Parameters
+    ----------
+     map_task : list
+         [map_task_pipeline,files_part,binary,partitioner] with:
+          |  map_task_pipeline: mapper task as defined in lib_pipeline.run_map_task().
+          |  files_part:        files for the partitions of the mapper output (one per reducer), [] if no reducers.
+          |  binary:            1 for binary records (INTERMEDIATE_BINARY), 0 for text lines.
+          |  partitioner:       arguments for get_partitioner().
+    
+    Returns
+    -------
+     result : list
+         [return code, start time, end time of the mapper, end time].
+    """
+    [map_task_pipeline,files_part,binary,partitioner] = map_task
+    [return_code,start_time,map_time] = run_map_task(map_task_pipeline)
+    if return_code==0 and files_part!=[]:
+        sort_external([map_task_pipeline[3]],files_part,binary,partition=get_partitioner(*partitioner))
+    return([return_code,start_time,map_time,time.time()])
+
+
+def run_reduce_task_local(reduce_task):
+    """
+    Run one reduce task: merge of its partitions of the mapper outputs, and reducer.
+    
+    Parameters
+    ----------
+     reduce_task : list
+         [command,files_part,file_red_in,file_red_out,binary] with:
+          |  command:      list with the reducer command (python executable, reducer and its parameters).
+          |  files_part:   partitions for this reducer (one per map task).
+          |  file_red_in:  reducer input (sorted).
+          |  file_red_out: reducer output.
+          |  binary:       1 for binary records (INTERMEDIATE_BINARY), 0 for text lines.
+    
+    Returns
+    -------
+     result : list
+         [return code, start time, end time of the merge, end time].
+    """
+    [command,files_part,file_red_in,file_red_out,binary] = reduce_task
+    start_time = time.time()
+    sort_external(files_part,[file_red_in],binary)
+    merge_time = time.time()
+    env = dict(os.environ)
+    env.pop(C_H_ENV_MAP_INPUT_FILE,None)
+    with open(file_red_in,'rb') as f_in:
+        with open(file_red_out,'wb') as f_out:
+            return_code = subprocess.call(command,stdin=f_in,stdout=f_out,env=env)
+    return([return_code,start_time,merge_time,time.time()])
+
+
+def run_tasks_local(task_function,tasks,slots):
+    """
+    Run tasks in a pool of slots processes, in the order of the list.
+    """
+    slots = max(1,min(slots,len(tasks)))
+    if slots==1:
+        return([task_function(task) for task in tasks])
+    pool = multiprocessing.Pool(slots)
+    try:
+        results = pool.map(task_function,tasks,chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    return(results)
+
+
+
+
+###########################################
+#           Timeline
+########################################### 
+
+def print_timeline(tasks,start_time,file_log=sys.stdout):
+    """
+    Print the timeline of the tasks of a job.
+    
+    Parameters
+    ----------
+     tasks : list
+         [task_id,start time,phase end time,end time,input bytes,input description,return code] for each task, where
+          the phase is the mapper for map tasks (before the sort of its output), and the merge for reduce tasks 
+          (before the reducer).
+     start_time : float
+         start time of the job, times are shown relative to it.
+     file_log : file handler
+         file for the timeline.
+    """
+    print(" Task".ljust(11)+"Start[s]".rjust(10)+"Phase[s]".rjust(10)+"End[s]".rjust(10)+"Input[B]".rjust(14)+\
+          "  Input",file=file_log)
+    for [task_id,task_t_s,task_t_p,task_t_e,input_bytes,input_str,return_code] in tasks:
+        print(" "+task_id.ljust(10)+("%.3f" % (task_t_s-start_time)).rjust(10)+("%.3f" % (task_t_p-start_time)).rjust(10)+\
+              ("%.3f" % (task_t_e-start_time)).rjust(10)+str(input_bytes).rjust(14)+"  "+input_str+\
+              ("" if return_code==0 else "  FAILED ("+str(return_code)+")"),file=file_log)
+    for [task_type,task_str] in [["m","Maps"],["r","Reduces"]]:
+        durations = [task[3]-task[1] for task in tasks if task[0].startswith(task_type)]
+        if durations!=[]:
+            print(" "+(task_str+": ").ljust(10)+str(len(durations))+" tasks, "+\
+                  "%.3f s mean, %.3f s max" % (sum(durations)/len(durations),max(durations)),file=file_log)
+    if tasks!=[]:
+        print(" Makespan: ".ljust(11)+"%.3f s" % (max([task[3] for task in tasks])-start_time),file=file_log)
+
+
+
+
+###########################################
+#           Job
+########################################### 
+
+def run_mapreduce_local(record_size,mapper_cmd,reducer_cmd,input_files,data_dir,hdfs_data_dir,output_hadoop,\
+                        output_dir,output_sym,text_mode,packets_per_hdfs_block,total_frames,total_partitions,\
+                        adjust_mappers,adjust_reducers,use_nohash_partitioner=1,one_baseline_per_task=True,\
+                        sort_output=1,bypass_reduce=0,accumulation_time=-1,seconds_ref=-1,slots=-1,\
+                        v=0,file_log=sys.stdout):
+    """
+    Emulate the Hadoop job of run_mapreduce_sh() (lib_mapredcorr.py) on this node.
+    
+    Parameters
+    ----------
+     record_size
+         record size for fixed-length records (text_mode 0).
+     mapper_cmd : str
+         mapper command (python executable, mapper and its parameters).
+     reducer_cmd : str
+         reducer command (python executable, reducer and its parameters).
+     input_files : list of str
+         media filenames.
+     data_dir : str
+         path to the media.
+     hdfs_data_dir : str
+         working path in HDFS (only for map_input_file).
+     output_hadoop
+         filename of the output file in a local folder (output_dir).
+     output_dir
+         output folder (local).
+     output_sym
+         path (local) for the symbolic link to the output file (typically sub-path in experiment folder).
+     slots : int
+         maximum number of tasks running at the same time, 0 for the number of cores of the node, if <0 the default 
+          value (HADOOP_LOCAL_SLOTS) is used.
+     accumulation_time : float
+         accumulation period in seconds (see lib_hadoop_hdfs.copy_files_to_hdfs()).
+     seconds_ref : float
+         start of the first accumulation period (see lib_hadoop_hdfs.copy_files_to_hdfs()).
+     Others
+         see run_mapreduce_sh().
+    
+    Returns
+    -------
+     start_time,end_time,elapsed_time
+         times for the job (map and reduce tasks).
+     ret_start_time,ret_end_time,ret_elapsed_time
+         times for merging the reducer outputs.
+     sort_start_time,sort_end_time,sort_elapsed_time
+         times for sorting the output.
+     tasks : list
+         timeline of the tasks (see print_timeline()), also written into output_dir+output_hadoop+".timeline".
+     success : int
+         1 if all the tasks succeeded, 0 otherwise (the job failed, and there is no output file).
+    
+    Notes
+    -----
+    |
+    | Intermediate files are written into output_dir+output_hadoop+"_local/", and deleted after the job.
+    """
+    if slots<0:
+        slots = HADOOP_LOCAL_SLOTS
+    if slots==0:
+        slots = multiprocessing.cpu_count()
+    [num_maps,num_reduces] = get_num_tasks(packets_per_hdfs_block,total_frames,total_partitions,adjust_mappers,\
+                                           adjust_reducers,bypass_reduce)
+    if not(text_mode):
+        # Number of mappers only forced in text mode (see run_mapreduce_sh())
+        num_maps = C_HADOOP_LOCAL_DEFAULT_MAPS
+    if one_baseline_per_task:
+        partition_str = HADOOP_PARTITION_ONE_BASELINE_PER_TASK_STR
+    else:
+        partition_str = HADOOP_PARTITION_ALL_BASELINES_PER_TASK_STR
+    mapper_cmd = shlex.split(mapper_cmd)
+    reducer_cmd = shlex.split(reducer_cmd)
+    job_dir = output_dir+output_hadoop+C_HADOOP_LOCAL_DIR
+    if os.path.isdir(job_dir):
+        shutil.rmtree(job_dir)
+    os.makedirs(job_dir)
+    
+    input_splits = get_input_splits(get_staged_files(input_files,data_dir,hdfs_data_dir,packets_per_hdfs_block,\
+                                                     text_mode,record_size,accumulation_time,seconds_ref),num_maps)
+    
+    if v==1:
+        print("\nRunning mapreduce (local emulation)...",file=file_log)
+        print(" Input splits: ".ljust(24)+str(len(input_splits))+" (requested "+str(num_maps)+")",file=file_log)
+        print(" Reducers: ".ljust(24)+str(num_reduces),file=file_log)
+        print(" Partitioner: ".ljust(24)+partition_str+(" (no hash)" if use_nohash_partitioner else ""),file=file_log)
+        print(" Slots: ".ljust(24)+str(slots),file=file_log)
+    
+    start_time = time.time() #                --------------- Execution time start
+    
+    # Map
+    map_tasks = []
+    tasks = []
+    for (i_map,[hdfs_file,file_in,input_split]) in enumerate(input_splits):
+        task_id = "m_"+str(i_map).zfill(6)
+        files_part = [job_dir+task_id+"_"+str(i_red) for i_red in range(num_reduces)]
+        map_tasks.append([[mapper_cmd,file_in,input_split,job_dir+task_id,hdfs_file],files_part,INTERMEDIATE_BINARY,\
+                          [partition_str,num_reduces,use_nohash_partitioner]])
+        tasks.append([task_id,input_split[1],hdfs_file+":"+str(input_split[0])+"+"+str(input_split[1])])
+    results = run_tasks_local(run_map_task_local,map_tasks,slots)
+    
+    # Reduce
+    files_out = [map_task[0][3] for map_task in map_tasks]
+    if num_reduces>0 and all([result[0]==0 for result in results]):
+        reduce_tasks = []
+        files_out = []
+        for i_red in range(num_reduces):
+            task_id = "r_"+str(i_red).zfill(6)
+            files_out.append(job_dir+"part-"+str(i_red).zfill(5))
+            reduce_tasks.append([reducer_cmd,[map_task[1][i_red] for map_task in map_tasks],job_dir+task_id,\
+                                 files_out[-1],INTERMEDIATE_BINARY])
+            tasks.append([task_id,0,"partition "+str(i_red)])
+        results += run_tasks_local(run_reduce_task_local,reduce_tasks,slots)
+        for (i_red,reduce_task) in enumerate(reduce_tasks):
+            tasks[len(map_tasks)+i_red][1] = os.path.getsize(reduce_task[2])
+    
+    end_time = time.time() #                  --------------- Execution time stop
+    elapsed_time = end_time - start_time
+    tasks = [[task_id]+result[1:]+[input_bytes,input_str,result[0]] \
+             for ([task_id,input_bytes,input_str],result) in zip(tasks,results)]
+    failed = [task[0] for task in tasks if task[6]!=0]
+    success = int(failed==[])
+    if not(success):
+        # Same as Hadoop: the job fails and there is no output (not even partial)
+        print("ERROR: local mapreduce tasks failed: "+", ".join(failed)+", no output written",file=file_log)
+        if os.path.isfile(output_dir+output_hadoop):
+            os.remove(output_dir+output_hadoop)
+    
+    # Merge reducer outputs (getmerge)
+    ret_start_time = time.time()
+    unsorted_suffix =  "_unsorted"
+    if success:
+        if OUTPUT_BINARY and num_reduces>0:
+            records_to_text(files_out,output_dir+output_hadoop+unsorted_suffix)
+        else:
+            with open(output_dir+output_hadoop+unsorted_suffix,'wb') as f_out:
+                for file_out in files_out:
+                    with open(file_out,'rb') as f_in:
+                        shutil.copyfileobj(f_in,f_out)
+    ret_end_time = time.time()
+    ret_elapsed_time = ret_end_time - ret_start_time
+    
+    # Sort output
+    sort_start_time = time.time()
+    if success:
+        if sort_output:
+            write_output([output_dir+output_hadoop+unsorted_suffix],output_dir+output_hadoop,1,0)
+            os.remove(output_dir+output_hadoop+unsorted_suffix)
+        else:
+            os.rename(output_dir+output_hadoop+unsorted_suffix,output_dir+output_hadoop)
+        command_mk = "mkdir "+output_sym
+        command_ln = "ln -s "+output_dir+output_hadoop+" "+output_sym+output_hadoop
+        os.system(command_mk)
+        os.system(command_ln)
+    sort_end_time = time.time()
+    sort_elapsed_time = sort_end_time - sort_start_time
+    
+    shutil.rmtree(job_dir)
+    
+    # Timeline
+    with open(output_dir+output_hadoop+C_HADOOP_LOCAL_TIMELINE,'w') as f_timeline:
+        print_timeline(tasks,start_time,f_timeline)
+    if v==1:
+        print(" Output file: ".ljust(24) + (output_dir + output_hadoop if success else "None (job failed)"),file=file_log)  
+        print(" Elapsed time = "+ str(elapsed_time)+ " s",file=file_log)
+        print(" Timeline:",file=file_log)
+        print_timeline(tasks,start_time,file_log)
+    
+    return([start_time,end_time,elapsed_time,ret_start_time,ret_end_time,ret_elapsed_time,\
+            sort_start_time,sort_end_time,sort_elapsed_time,tasks,success])
+
+
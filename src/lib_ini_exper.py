@@ -54,6 +54,8 @@ imp.reload(lib_vdif)
 import lib_acc_comp
 imp.reload(lib_acc_comp)
 
+from const_performance import VDIF_FRAME_INDEX
+
 
 ##################################################################
 #
@@ -181,7 +183,7 @@ def process_ini_media(params_array_media,data_dir,v,file_log):
      input_files : list of str
          filenames for media files. 
      total_frames : int
-         total frames considering all media files.
+         total frames considering all media files (from the frame index if VDIF_FRAME_INDEX, see lib_vdif.get_vdif_index()).
      max_packet_size : int
          maximum frame size per media file.
      error_str_v :  list of str
@@ -199,6 +201,7 @@ def process_ini_media(params_array_media,data_dir,v,file_log):
     v_stations = get_all_values_serial(params_array_media,C_INI_MEDIA_STATION)
     
     total_frames=0
+    total_samples=0
     input_files=get_val_vector(params_array_media,C_INI_MEDIA_S_FILES,C_INI_MEDIA_LIST)
     max_packet_size=0
     
@@ -233,7 +236,13 @@ def process_ini_media(params_array_media,data_dir,v,file_log):
             if num_pols>max_num_pols:
                 max_num_pols=num_pols
     
-            total_frames += os.path.getsize(data_dir+fi)//packet_size
+            if VDIF_FRAME_INDEX:
+                # Frame index (scanned only the first time)
+                [num_frames,num_samples,frames_per_second,v_threads] = lib_vdif.get_vdif_index_stats(lib_vdif.get_vdif_index(data_dir+fi))
+                total_frames += num_frames
+                total_samples += num_samples
+            else:
+                total_frames += os.path.getsize(data_dir+fi)//packet_size
         
     
         
@@ -242,6 +251,8 @@ def process_ini_media(params_array_media,data_dir,v,file_log):
         print(" Max num channels: "+str(max_num_channels),file=file_log)
         print(" Max num polarizations: "+str(max_num_pols),file=file_log)
         print(" Total frames: "+str(total_frames),file=file_log)
+        if VDIF_FRAME_INDEX:
+            print(" Total samples: "+str(total_samples),file=file_log)
         print(" Input files: \t" + str(input_files),file=file_log)
     
     
@@ -73,6 +73,11 @@ try:
 except ImportError:
     import ConfigParser as configparser
 
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
 
 
 
@@ -136,35 +141,132 @@ def serialize_config(sources_file='media.ini'):
 
 def serial_params_to_array(read_str=""):
     """
-    Converts string with serialized configuration file into array.
+    Converts string with serialized configuration file into indexed structure.
     
     Parameters
     ----------
      read_str : str
          serialized configuration [created with serialize_config()].
-     
+    
     Returns
     -------
-     files_param : list of lists
-         list of lists based on serialized configuration.
-     
+     files_param : list
+         [sections,index] with:
+          sections: list with the names of the sections (same order as in the configuration file).
+          index: dictionary {section: [params,values]}, with params the list with the names of the parameters
+           in the section (same order as in the configuration file) and values a dictionary {param: value}.
+    
     Notes
     -----
     |
+    | **Look-up:**
+    |
+    |  Parameters are looked up by exact name (see get_param_serial()).
+    |  For repeated sections or parameters the first value is kept.
+    |
+    |
     | **Example:**
     |
     |  >>> params_array=serial_params_to_array(serial_str)
     |  >>> print(params_array)
-    |   [['VF-0.vt', 'polarizations/L:R:L:R', 'station/At', 'channels/0:0:1:1'], ['VF-1.vt', 'polarizations/L:R:L:R', 'station/At', 'channels/0:0:1:1']]
+    |   [['VF-0.vt', 'VF-1.vt'], {'VF-0.vt': [['polarizations', 'station', 'channels'], {'polarizations': 'L:R:L:R', 'station': 'At', 'channels': '0:0:1:1'}], 'VF-1.vt': [...]}]
     """
     
     read_split = read_str.split(SEPARATOR_VECTOR)
-    files_param =[]
+    sections = []
+    index = {}
     for i in read_split:
-        files_param += [i.split(SEPARATOR_ELEMENTS)]
-    
+        vector = i.split(SEPARATOR_ELEMENTS)
+        section = vector[0]
+        if section not in index:
+            sections.append(section)
+            index[section] = [[],{}]
+        [params,values] = index[section]
+        for param_val in vector[1:]:
+            param_val_split = param_val.split(SEPARATOR_PARAM_VAL)
+            params.append(param_val_split[0])
+            if len(param_val_split)>1 and param_val_split[0] not in values:
+                values[param_val_split[0]] = param_val_split[1]
+    files_param = [sections,index]
     return(files_param)
 
+
+def write_config_snapshot(file_snapshot,ini_files):
+    """
+    Parse ini files and write their indexed configuration into a binary file, so that tasks can load it 
+     instead of parsing the ini files again.
+    
+    Parameters
+    ----------
+     file_snapshot : str
+         output file.
+     ini_files : list of str
+         paths to the ini files.
+    
+    Notes
+    -----
+    |
+    | **Format:**
+    |
+    |  Pickle (protocol 2) of [python_major_version, {ini_file_name: params_array}], where ini_file_name is the 
+    |   name of the file without path (tasks may get the files in a different folder).
+    """
+    snapshot = {}
+    for ini_file in ini_files:
+        snapshot[os.path.basename(ini_file)] = serial_params_to_array(serialize_config(ini_file))
+    with open(file_snapshot,'wb') as f_snapshot:
+        pickle.dump([sys.version_info[0],snapshot],f_snapshot,2)
+
+
+def load_config_snapshot(file_snapshot):
+    """
+    Load snapshot written with write_config_snapshot().
+    
+    Parameters
+    ----------
+     file_snapshot : str
+         snapshot file, C_INI_SNAPSHOT_NONE if not available.
+    
+    Returns
+    -------
+     snapshot : dict
+         {ini_file_name: params_array}, empty if the file is not available, could not be read or was written
+          by a different Python major version (strings would differ).
+    """
+    snapshot = {}
+    if file_snapshot!=C_INI_SNAPSHOT_NONE and os.path.isfile(file_snapshot):
+        try:
+            with open(file_snapshot,'rb') as f_snapshot:
+                [version,snapshot_read] = pickle.load(f_snapshot)
+            if version==sys.version_info[0]:
+                snapshot = snapshot_read
+        except Exception:
+            snapshot = {}
+    return(snapshot)
+
+
+def get_params_array(ini_file,snapshot={}):
+    """
+    Get indexed configuration for an ini file, from the snapshot if available, otherwise parsing the file.
+    
+    Parameters
+    ----------
+     ini_file : str
+         path to ini file.
+     snapshot : dict
+         snapshot from load_config_snapshot().
+    
+    Returns
+    -------
+     params_array : list
+         see serial_params_to_array().
+    """
+    ini_name = os.path.basename(ini_file)
+    if ini_name in snapshot:
+        return(snapshot[ini_name])
+    return(serial_params_to_array(serialize_config(ini_file)))
+
+
 def get_param_serial(params_array,section,param):
     """
     Retrieves value given an array with parameters, the filename and the parameter.
@@ -176,12 +278,12 @@ def get_param_serial(params_array,section,param):
      section : str
          section to be looked up.
      param : str
-         parameter to be looked up.
+         parameter to be looked up (exact name).
     
     Returns
     -------
      value : str
-         value corresponding to requested section and param.
+         value corresponding to requested section and param, "" if not found.
      
     Notes
     -----
@@ -192,25 +294,10 @@ def get_param_serial(params_array,section,param):
     |  >>> print(value)
     |   0:0:1:1
     """
-    if 1==1:
-        will_break=0
-        value=""
-        for vector in params_array:
-            if will_break==1:
-                break
-            if vector[0]==section:
-                for i in vector[1:]:
-                    if will_break==1:
-                        break
-                    if param in i:
-                        value=i.split(SEPARATOR_PARAM_VAL)[1]
-                        will_break=1
-    else:
-        value=""
-        id_section = list(zip(*params_array))[0].index(section)
-        for i in params_array[id_section][1:]:
-            if param in i:
-                value=i.split(SEPARATOR_PARAM_VAL)[1]
+    section_params = params_array[1].get(section,None)
+    if section_params is None:
+        return("")
+    value = section_params[1].get(param,"")
     return(value)
 
 
@@ -375,10 +462,8 @@ def get_all_params_serial(params_array,section):
     """
 
     values=[]
-    for vector in params_array:
-        if vector[0]==section:
-            for i in vector[1:]:
-                values+=[i.split(SEPARATOR_PARAM_VAL)[0]]
+    if section in params_array[1]:
+        values=list(params_array[1][section][0])
     return(values)
 
 def get_all_values_serial(params_array,param):
@@ -390,7 +475,7 @@ def get_all_values_serial(params_array,param):
      params_array : list
             configuration [created with serial_params_to_array()].
      param : str
-            parameter to be looked up through all sections.
+            parameter to be looked up through all sections (exact name).
                 
     Returns
     -------
@@ -399,10 +484,10 @@ def get_all_values_serial(params_array,param):
     """
 
     values=[]
-    for vector in params_array:
-        for i in vector[1:]:
-            if param in i:
-                values+=[i.split(SEPARATOR_PARAM_VAL)[1]]
+    for section in params_array[0]:
+        section_values = params_array[1][section][1]
+        if param in section_values:
+            values+=[section_values[param]]
     return(values)
 
 
@@ -421,9 +506,7 @@ def get_all_sections(params_array):
      sections
          list of strings with the names of all the sections in the ini file.
     """
-    sections=[]
-    for vector in params_array:
-        sections.append(vector[0])
+    sections=list(params_array[0])
     return(sections)
 
 
@@ -536,6 +619,42 @@ def get_vector_delay_ref(vector_params_delay):
     return(sv)
 
 
+def get_delay_vectors_serial(params_array,section,markers):
+    """
+    Get numeric vectors with the values of the delay model parameters for all the accumulation periods of a section
+     in delays.ini.
+    
+    Parameters
+    ----------
+     params_array : list
+         configuration [created with serial_params_to_array()].
+     section : str
+         section (station-source pair, see get_pair_st_so()).
+     markers : list of str
+         markers for the parameters (DELAY_MODEL_*_MARKER in const_ini_files.py).
+    
+    Returns
+    -------
+     seconds_str : list of str
+         seconds for each accumulation period, as in the names of the parameters (after DELAY_MODEL_REL_MARKER).
+     values : 2D numpy array of float
+         values for each marker (rows) and accumulation period (columns), nan if not available.
+    """
+    seconds_str=[]
+    for i in get_all_params_serial(params_array,section):
+        if DELAY_MODEL_REL_MARKER in i[:len(DELAY_MODEL_REL_MARKER)]:
+            seconds_str+=[i[len(DELAY_MODEL_REL_MARKER):]]
+    
+    values = np.full((len(markers),len(seconds_str)),np.nan)
+    for row,marker in enumerate(markers):
+        for col,seconds in enumerate(seconds_str):
+            try:
+                values[row,col] = float(get_param_serial(params_array,section,marker+seconds))
+            except ValueError:
+                pass
+    return([seconds_str,values])
+
+
 def find_nearest_seconds(vector_seconds_ref,seconds_fr):
     """
     Find second which is nearest to seconds_fr in delay param vector. In other words, find the timestamp
@@ -0,0 +1,702 @@
+# -*- coding: utf-8 -*-
+# <nbformat>3.0</nbformat>
+
+# <codecell>
+
+#!/usr/bin/env python
+#
+#The MIT CorrelX Correlator
+#
+#https://github.com/MITHaystack/CorrelX
+#Contact: correlX@haystack.mit.edu
+#Project leads: Victor Pankratius, Pedro Elosegui Project developer: A.J. Vazquez Alvarez
+#
+#Copyright 2017 MIT Haystack Observatory
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+#------------------------------
+#------------------------------
+#Project: CorrelX.
+#File: lib_mapred_io.py.
+#Author: agent (agent@local)
+#Description: 
+"""
+Input/output routines for the mapper and the reducer: binary key/value records and buffered output.
+
+Notes
+-----
+|
+| **Format:**
+|
+|  Each record is a key/value pair encoded as Hadoop typed bytes (pipeline mode only, as the key-field partitioner
+|   and comparator used in the Hadoop jobs split the keys in text fields):
+|    key:   [TB_TYPE_STRING (1 byte)][length (int32, big endian)][key (same string as in text mode)]
+|    value: [TB_TYPE_BYTES (1 byte)][length (int32, big endian)][metadata (META_BIN_FORMAT)][packed samples]
+|
+|  The packed samples are the same bytes that are encoded in base64 in text mode (see msvf.pack_samples()).
+|
+|
+| **Reducer output (OUTPUT_BINARY in const_mapred.py):**
+|
+|  Same typed bytes records, with the key of the output line:
+|    visibilities/pcal: value is [VIS_BIN_HEADER (length of metadata, dtype)][metadata (text)][raw complex values]
+|    log lines (zR):    key is the complete line, and value is empty.
+|
+|  records_to_text() converts them into the same lines that the reducer writes in text mode.
+|
+|
+| **Sorting (pipeline mode):**
+|
+|  Mapper outputs (text lines or binary records) are sorted by key through an index with the key and the position
+|   of every line/record, sorted in runs of SORT_RUN_RECORDS entries that are merged, so that the payloads are only
+|   copied once (see sort_external()).
+|
+|
+| **Buffered output:**
+|
+|  Lines (text mode) and records (binary mode) are accumulated and written in blocks of OUTPUT_BUFFER_SIZE bytes
+|   (const_performance.py) into the binary standard output. Messages printed directly (e.g. "zM" logging) are flushed
+|   before every block, so that lines are not mixed.
+
+"""
+#History:
+#initial version: 2026.10 agent
+#MIT Haystack Observatory
+
+from __future__ import print_function,division
+import sys
+import os
+import struct
+import mmap
+import heapq
+import numpy as np
+import imp
+
+import const_mapred
+imp.reload(const_mapred)
+from const_mapred import *
+
+import const_performance
+imp.reload(const_performance)
+from const_performance import OUTPUT_BUFFER_SIZE,SORT_RUN_RECORDS,SORT_MERGE_BLOCK
+
+
+C_SORT_BIN_CMD="lib_mapred_io.py sort "
+C_SORT_LINES_CMD="lib_mapred_io.py sortlines "
+C_TEXT_BIN_CMD="lib_mapred_io.py text "
+C_SORT_TEXT_BIN_CMD="lib_mapred_io.py sorttext "
+
+# Typed bytes type codes (org.apache.hadoop.typedbytes.Type)
+TB_TYPE_BYTES = 0
+TB_TYPE_STRING = 7
+
+# Type code plus length for each element of the record
+TB_HEADER = struct.Struct(">Bi")
+
+# Metadata
+META_BIN = struct.Struct(META_BIN_FORMAT)
+
+# Reducer output: length of metadata and numpy dtype of the visibilities
+VIS_BIN_HEADER = struct.Struct(">i4s")
+
+
+
+###########################################
+#           Binary streams
+###########################################
+
+def to_bytes(s):
+    """
+    Convert str into bytes (no change in Python 2).
+    """
+    if isinstance(s,bytes):
+        return(s)
+    return(s.encode())
+
+
+def to_str(b):
+    """
+    Convert bytes into str (no change in Python 2).
+    """
+    if isinstance(b,str):
+        return(b)
+    return(b.decode())
+
+
+def get_stdin_bin():
+    """
+    Get binary standard input (sys.stdin in Python 2, sys.stdin.buffer in Python 3).
+    """
+    return(getattr(sys.stdin,'buffer',sys.stdin))
+
+
+def get_stdout_bin():
+    """
+    Get binary standard output (sys.stdout in Python 2, sys.stdout.buffer in Python 3).
+    
+    Notes
+    -----
+    |
+    | The process standard output (sys.__stdout__) is used, since mapper and reducer redirect sys.stdout into 
+    |  sys.stderr when writing binary records.
+    """
+    return(getattr(sys.__stdout__,'buffer',sys.__stdout__))
+
+
+
+###########################################
+#           Records
+###########################################
+
+def pack_meta_bin(metadata_v):
+    """
+    Pack metadata into binary.
+    
+    Parameters
+    ----------
+     metadata_v : list
+         metadata as generated in msvf.get_pair_str(), following the order of INDEX_* in const_mapred.py.
+    
+    Returns
+    -------
+     meta_bin : bytes
+         metadata packed following META_BIN_FORMAT.
+    """
+    [st,pol] = str(metadata_v[INDEX_ST_POL]).split(SF_SEP)
+    meta_bin = META_BIN.pack(int(st),int(pol),\
+                             int(metadata_v[INDEX_SHIFT_DELAY]),\
+                             *([float(i) for i in metadata_v[INDEX_FRAC_DELAY:INDEX_NUM_SAMPLES]]+\
+                               [int(metadata_v[INDEX_NUM_SAMPLES]),\
+                                int(metadata_v[INDEX_FS]),\
+                                int(metadata_v[INDEX_BITS_PER_SAMPLE]),\
+                                int(metadata_v[INDEX_FIRST_SAMPLE]),\
+                                to_bytes(str(metadata_v[INDEX_DATA_TYPE])),\
+                                int(metadata_v[INDEX_NBINS_PCAL]),\
+                                int(metadata_v[INDEX_PCAL_FREQ]),\
+                                int(metadata_v[INDEX_CHANNEL_INDEX]),\
+                                float(metadata_v[INDEX_CHANNEL_FREQ]),\
+                                float(metadata_v[INDEX_ACC_TIME]),\
+                                to_bytes(str(metadata_v[INDEX_ENCODING])),\
+                                to_bytes(str(metadata_v[INDEX_SIDEBAND]))]))
+    return(meta_bin)
+
+
+def unpack_meta_bin(value):
+    """
+    Unpack metadata from the value of a binary record.
+    
+    Parameters
+    ----------
+     value : bytes
+         value of the record (metadata and packed samples).
+    
+    Returns
+    -------
+     meta : list
+         metadata following the order of INDEX_* in const_mapred.py, with numeric fields as int or float, and
+          text fields (station-polarization, data type, encoding and sideband) as str.
+    """
+    fields = META_BIN.unpack_from(value)
+    meta = [str(fields[0])+SF_SEP+str(fields[1])]+list(fields[2:])
+    meta[INDEX_DATA_TYPE] = to_str(meta[INDEX_DATA_TYPE])
+    meta[INDEX_ENCODING] = to_str(meta[INDEX_ENCODING].rstrip(b'\0'))
+    meta[INDEX_SIDEBAND] = to_str(meta[INDEX_SIDEBAND])
+    return(meta)
+
+
+def get_vector_split_bin(meta):
+    """
+    Get the list of strings that would be obtained splitting the metadata in text mode (see rsvf.split_input_line()).
+    """
+    return([str(i) for i in meta])
+
+
+def pack_vis_bin(meta_str,values):
+    """
+    Pack reducer results into the value of a binary record.
+    
+    Parameters
+    ----------
+     meta_str : str
+         metadata as in the text output line (see rsvf.get_meta_r_out()).
+     values : complex 1D numpy array
+         visibilities (or phase calibration results).
+    
+    Returns
+    -------
+     value : bytes
+         header, metadata and values (with their native type).
+    """
+    meta_bin = to_bytes(meta_str)
+    value = VIS_BIN_HEADER.pack(len(meta_bin),to_bytes(values.dtype.str))+meta_bin+np.ascontiguousarray(values).tobytes()
+    return(value)
+
+
+def unpack_vis_bin(value):
+    """
+    Unpack reducer results from the value of a binary record (see pack_vis_bin()).
+    
+    Returns
+    -------
+     meta_str : str
+         metadata.
+     values : complex 1D numpy array
+         visibilities (or phase calibration results).
+    """
+    [len_meta,dtype_str] = VIS_BIN_HEADER.unpack_from(value)
+    meta_str = to_str(value[VIS_BIN_HEADER.size:VIS_BIN_HEADER.size+len_meta])
+    values = np.frombuffer(value,dtype=np.dtype(to_str(dtype_str.rstrip(b'\0'))),offset=VIS_BIN_HEADER.size+len_meta)
+    return([meta_str,values])
+
+
+def get_line_vis_bin(key,value):
+    """
+    Get text output line (as written by the reducer in text mode) for a binary record of the reducer output.
+    """
+    if len(value)==0:
+        return(key)
+    [meta_str,values] = unpack_vis_bin(value)
+    return(key+KEY_SEP+meta_str+' '+' '.join(map(str,values)))
+
+
+def write_record_bin(f,key,value):
+    """
+    Write binary record.
+    
+    Parameters
+    ----------
+     f : file handler
+         binary output.
+     key : str
+         key.
+     value : bytes
+         value (metadata and packed samples).
+    """
+    key_bin = to_bytes(key)
+    f.write(TB_HEADER.pack(TB_TYPE_STRING,len(key_bin))+key_bin+TB_HEADER.pack(TB_TYPE_BYTES,len(value))+value)
+
+
+def check_record_header(type_code,type_expected,length,available):
+    """
+    Check the type code and length of an element of a binary record (see TB_HEADER).
+    
+    Parameters
+    ----------
+     type_code : int
+         type code read from the header.
+     type_expected : int
+         TB_TYPE_STRING for the key, TB_TYPE_BYTES for the value.
+     length : int
+         length read from the header.
+     available : int
+         number of bytes available after the header, -1 if unknown.
+    
+    Notes
+    -----
+    |
+    | Raises ValueError if the input is not a valid stream of binary records (e.g. text printed into it) or it is
+    |  truncated, instead of silently dropping the rest of the records.
+    """
+    if type_code!=type_expected:
+        raise ValueError("Invalid binary record: type code "+str(type_code)+", expected "+str(type_expected))
+    if length<0 or (available>=0 and length>available):
+        raise ValueError("Invalid binary record: length "+str(length)+" ("+str(available)+" bytes available)")
+
+
+def read_record_element(f,type_expected):
+    """
+    Read one element (key or value) of a binary record (see read_records_bin()).
+    
+    Returns
+    -------
+     data : bytes
+         contents of the element, None at the end of the input.
+    """
+    header = f.read(TB_HEADER.size)
+    if len(header)==0 and type_expected==TB_TYPE_STRING:
+        return(None)
+    if len(header)<TB_HEADER.size:
+        raise ValueError("Truncated binary record: "+str(len(header))+" bytes of header")
+    [type_code,length] = TB_HEADER.unpack(header)
+    check_record_header(type_code,type_expected,length,-1)
+    data = f.read(length)
+    if len(data)<length:
+        raise ValueError("Truncated binary record: "+str(len(data))+" of "+str(length)+" bytes")
+    return(data)
+
+
+def read_records_bin(f):
+    """
+    Read binary records until the end of the input.
+    
+    Parameters
+    ----------
+     f : file handler
+         binary input.
+    
+    Returns
+    -------
+     (generator) [key,value] where key is str and value bytes.
+    
+    Notes
+    -----
+    |
+    | Raises ValueError if a record is invalid or truncated (see check_record_header()).
+    """
+    while 1:
+        key = read_record_element(f,TB_TYPE_STRING)
+        if key is None:
+            break
+        value = read_record_element(f,TB_TYPE_BYTES)
+        yield([to_str(key),value])
+
+
+
+###########################################
+#           Buffered output
+###########################################
+
+def get_writer(f=None,buffer_size=OUTPUT_BUFFER_SIZE,records=0):
+    """
+    Get buffered writer.
+    
+    Parameters
+    ----------
+     f : file handler
+         binary output, None for standard output.
+     buffer_size : int
+         number of bytes to be accumulated before writing, 0 to write every line/record immediately.
+     records : int
+         if 1 lines are written as binary records (key is the line, value is empty), see OUTPUT_BINARY.
+    
+    Returns
+    -------
+     writer : list
+         [f,chunks,size,buffer_size,records], with chunks the list of pending bytes and size their total length.
+    """
+    if f is None:
+        f = get_stdout_bin()
+    writer = [f,[],0,buffer_size,records]
+    return(writer)
+
+
+def write_buffered(writer,data):
+    """
+    Add bytes to writer, and write them all if the buffer size is reached.
+    """
+    writer[1].append(data)
+    writer[2] += len(data)
+    if writer[2]>=writer[3]:
+        flush_writer(writer)
+
+
+def write_line_buffered(writer,line):
+    """
+    Add line (str or bytes, without end of line) to writer.
+    """
+    if writer[4]:
+        write_record_buffered(writer,line,b"")
+    else:
+        write_buffered(writer,to_bytes(line)+b"\n")
+
+
+def write_lines_buffered(writer,lines):
+    """
+    Add list of lines (str or bytes, without end of line) to writer.
+    """
+    if writer[4]:
+        for line in lines:
+            write_record_buffered(writer,line,b"")
+    elif lines!=[]:
+        write_buffered(writer,b"\n".join(map(to_bytes,lines))+b"\n")
+
+
+def write_record_buffered(writer,key,value):
+    """
+    Add binary record to writer (see write_record_bin()).
+    """
+    key_bin = to_bytes(key)
+    write_buffered(writer,TB_HEADER.pack(TB_TYPE_STRING,len(key_bin))+key_bin+TB_HEADER.pack(TB_TYPE_BYTES,len(value))+value)
+
+
+def flush_writer(writer):
+    """
+    Write all pending bytes.
+    """
+    if writer[1]!=[]:
+        # Anything printed so far goes first
+        sys.stdout.flush()
+        writer[0].write(b"".join(writer[1]))
+        writer[0].flush()
+        writer[1] = []
+        writer[2] = 0
+
+
+
+###########################################
+#           Sorting
+###########################################
+
+def get_index_dtype(key_width):
+    """
+    Get numpy dtype for the sort index (key padded to key_width bytes, source file, offset and length).
+    """
+    return(np.dtype([('key','S'+str(max(1,key_width))),('src','<i4'),('offset','<i8'),('length','<i8')]))
+
+
+def get_index_entries(data,src,binary):
+    """
+    Scan one input file (memory-mapped), getting the key and position of every line/record.
+    
+    Parameters
+    ----------
+     data : mmap
+         contents of the file.
+     src : int
+         file id.
+     binary : int
+         1 for binary records, 0 for text lines.
+    
+    Returns
+    -------
+     (generator) (key,src,offset,length) with key in bytes, and offset and length (including end of line or
+      the complete record) in bytes.
+    
+    Notes
+    -----
+    |
+    | Raises ValueError if a binary record is invalid or truncated (see check_record_header()).
+    """
+    size = len(data)
+    offset = 0
+    key_sep = to_bytes(KEY_SEP)
+    while offset<size:
+        if binary:
+            if offset+TB_HEADER.size>size:
+                raise ValueError("Truncated binary record: "+str(size-offset)+" bytes of header")
+            [type_key,len_key] = TB_HEADER.unpack_from(data,offset)
+            check_record_header(type_key,TB_TYPE_STRING,len_key,size-offset-2*TB_HEADER.size)
+            start_value = offset+TB_HEADER.size+len_key
+            key = data[offset+TB_HEADER.size:start_value]
+            [type_value,len_value] = TB_HEADER.unpack_from(data,start_value)
+            check_record_header(type_value,TB_TYPE_BYTES,len_value,size-start_value-TB_HEADER.size)
+            end = start_value+TB_HEADER.size+len_value
+        else:
+            end = data.find(b"\n",offset)
+            end = size if end<0 else end+1
+            end_key = data.find(key_sep,offset,end)
+            key = data[offset:(end if end_key<0 else end_key)].rstrip(b"\n")
+        yield((key,src,offset,end-offset))
+        offset = end
+
+
+def sort_index(entries):
+    """
+    Sort list of index entries (see get_index_entries()) by key into a numpy array (see get_index_dtype()).
+    
+    Notes
+    -----
+    |
+    | The sort is stable, entries with the same key are kept in the order of the input.
+    """
+    index = np.array(entries,dtype=get_index_dtype(max([len(entry[0]) for entry in entries]+[1])))
+    return(index[np.argsort(index['key'],kind='mergesort')])
+
+
+def write_index_run(entries,file_run):
+    """
+    Sort index entries (see sort_index()) and write them into a run file.
+    
+    Returns
+    -------
+     run : list
+         [file_run,dtype] to read the run (see read_index_run()), the sorted entries are not kept in memory.
+    """
+    index = sort_index(entries)
+    index.tofile(file_run)
+    return([file_run,index.dtype])
+
+
+def read_index_run(file_run,dtype,block_size=SORT_MERGE_BLOCK):
+    """
+    Read sorted index entries from a run file, block_size entries at a time.
+    
+    Returns
+    -------
+     (generator) (key,src,offset,length).
+    """
+    with open(file_run,'rb') as f_run:
+        while 1:
+            block = np.fromfile(f_run,dtype=dtype,count=block_size)
+            if len(block)==0:
+                break
+            for entry in block.tolist():
+                yield(entry)
+
+
+def sort_external(files_in,files_out,binary,partition=None,run_records=SORT_RUN_RECORDS):
+    """
+    Sort lines/records by key, optionally distributing them into several outputs.
+    
+    Parameters
+    ----------
+     files_in : list of str
+         input files (mapper outputs).
+     files_out : list of str
+         output files (reducer inputs).
+     binary : int
+         1 for binary records (INTERMEDIATE_BINARY), 0 for text lines.
+     partition : function
+         function that gets the index in files_out for a key, None for the first output.
+     run_records : int
+         maximum number of entries sorted in memory, larger inputs are sorted in runs that are written into
+          disk and then merged.
+    
+    Notes
+    -----
+    |
+    | **Procedure:**
+    |
+    |  1. Inputs are memory-mapped and scanned once, getting the key (up to KEY_SEP for text lines) and the position
+    |      of every line/record into an index.
+    |  2. The index (with fixed-width keys) is sorted every run_records entries. If there are more entries, each
+    |      sorted run is written into files_out[0]+"_run*" as soon as it is complete, and the runs are merged.
+    |  3. Lines/records are copied from the inputs into the outputs in the order of the index, so the payloads are
+    |      only read once and never compared.
+    |
+    |
+    | **Notes:**
+    |
+    |  Keys are compared as bytes (same order as "sort" with LC_ALL=C on the key fields COMMON_SORT_*, and as the raw 
+    |   comparison in Hadoop), as expected by rsvf.split_input_line(). The key is followed by KEY_SEP (lower than any
+    |   character in the key) in text lines, so this is also the same order as sorting the complete lines, except
+    |   for lines with the same key, that keep the order of the input.
+    """
+    data_in = []
+    for file_in in files_in:
+        with open(file_in,'rb') as f_in:
+            if os.fstat(f_in.fileno()).st_size>0:
+                data_in.append(mmap.mmap(f_in.fileno(),0,access=mmap.ACCESS_READ))
+            else:
+                data_in.append(b"")
+    
+    # Index, sorted in runs (written into disk)
+    runs = []
+    entries = []
+    for (src,data) in enumerate(data_in):
+        for entry in get_index_entries(data,src,binary):
+            entries.append(entry)
+            if len(entries)>=run_records:
+                runs.append(write_index_run(entries,files_out[0]+"_run"+str(len(runs))))
+                entries = []
+    if runs==[]:
+        index = sort_index(entries).tolist()
+    else:
+        if entries!=[]:
+            runs.append(write_index_run(entries,files_out[0]+"_run"+str(len(runs))))
+        index = heapq.merge(*[read_index_run(file_run,dtype) for [file_run,dtype] in runs])
+    entries = []
+    files_run = [file_run for [file_run,dtype] in runs]
+    
+    # Payloads
+    writers = [get_writer(open(file_out,'wb')) for file_out in files_out]
+    for (key,src,offset,length) in index:
+        writer = writers[0] if partition is None else writers[partition(key)]
+        line = data_in[src][offset:offset+length]
+        write_buffered(writer,line)
+        if not(binary) and not(line.endswith(b"\n")):
+            write_buffered(writer,b"\n")
+    for writer in writers:
+        flush_writer(writer)
+        writer[0].close()
+    for data in data_in:
+        if len(data)>0:
+            data.close()
+    for file_run in files_run:
+        os.remove(file_run)
+
+
+def sort_records_bin(files_in,file_out):
+    """
+    Sort binary records by key (equivalent to the sort in text mode, see lib_mapredcorr.pipeline_app()).
+    
+    Parameters
+    ----------
+     files_in : list of str
+         input files (mapper outputs).
+     file_out : str
+         output file (reducer input).
+    
+    Notes
+    -----
+    |
+    | See sort_external().
+    """
+    sort_external(files_in,[file_out],binary=1)
+
+
+def sort_lines(files_in,file_out):
+    """
+    Sort text lines by key (same order as "sort -t FIELD_SEP COMMON_SORT_*", see sort_external()).
+    """
+    sort_external(files_in,[file_out],binary=0)
+
+
+
+def records_to_text(files_in,file_out,sort_records=0):
+    """
+    Convert reducer output in binary records (OUTPUT_BINARY) into text lines.
+    
+    Parameters
+    ----------
+     files_in : list of str
+         input files (reducer outputs).
+     file_out : str
+         output file (same contents as the reducer output in text mode).
+     sort_records : int
+         if 1 records are sorted by key (see sort_records_bin()).
+    """
+    records = read_records_files(files_in)
+    if sort_records:
+        records = sorted(records,key=lambda x: x[0])
+    with open(file_out,'wb') as f_out:
+        for [key,value] in records:
+            f_out.write(to_bytes(get_line_vis_bin(key,value))+b"\n")
+
+
+def read_records_files(files_in):
+    """
+    Read binary records from a list of files (see read_records_bin()).
+    """
+    for file_in in files_in:
+        with open(file_in,'rb') as f_in:
+            for record in read_records_bin(f_in):
+                yield(record)
+
+
+
+################################### 
+#            Script
+###################################
+
+
+
+if __name__ == '__main__':
+    
+    # Example: python lib_mapred_io.py sort sorted_file mapper_output_1 mapper_output_2 ...
+    if sys.argv[1] == "sort":
+        sort_records_bin(sys.argv[3:],sys.argv[2])
+    
+    # Example: python lib_mapred_io.py sortlines sorted_file mapper_output_1 mapper_output_2 ...
+    elif sys.argv[1] == "sortlines":
+        sort_lines(sys.argv[3:],sys.argv[2])
+    
+    # Example: python lib_mapred_io.py [sort]text text_file reducer_output_1 reducer_output_2 ...
+    elif sys.argv[1] in ["text","sorttext"]:
+        records_to_text(sys.argv[3:],sys.argv[2],sort_records=(sys.argv[1]=="sorttext"))
@@ -49,9 +49,25 @@ import const_hadoop
 imp.reload(const_hadoop)
 from const_hadoop import *
 
+import const_ini_files
+imp.reload(const_ini_files)
+from const_ini_files import C_INI_SNAPSHOT_NONE
+
 import lib_profiling
 imp.reload(lib_profiling)
 
+import lib_mapred_io
+imp.reload(lib_mapred_io)
+from lib_mapred_io import C_SORT_BIN_CMD,C_SORT_LINES_CMD,C_TEXT_BIN_CMD,C_SORT_TEXT_BIN_CMD
+
+import lib_vdif
+imp.reload(lib_vdif)
+
+import lib_pipeline
+imp.reload(lib_pipeline)
+
+from const_performance import VDIF_FRAME_INDEX,PIPELINE_FRAMES_PER_SPLIT,PIPELINE_EXECUTOR
+
 
 
 ##################################################################
@@ -67,7 +83,7 @@ def get_mapper_params_str(stations,num_pols,fft_size,accumulation_time,signal_st
                           auto_pols,ini_stations,ini_media,ini_delays,fft_at_mapper,\
                           internal_log_mapper,ffts_per_chunk,windowing,\
                           one_baseline_per_task,phase_calibration,min_mapper_chunk,max_mapper_chunk,\
-                          task_scaling_stations,single_precision):
+                          task_scaling_stations,single_precision,ini_snapshot=C_INI_SNAPSHOT_NONE):
     """
     Returns string with all the parameters to call the mapper.
     
@@ -123,6 +139,9 @@ def get_mapper_params_str(stations,num_pols,fft_size,accumulation_time,signal_st
          0 for all-baselines-per-task mode, 1 to activate linear scaling with number of stations.
      single_precision
          [unused]
+     ini_snapshot
+         string with configuration snapshot file name (see lib_ini_files.write_config_snapshot()), 
+          C_INI_SNAPSHOT_NONE to parse the ini files.
     
     Returns
     -------
@@ -163,11 +182,13 @@ def get_mapper_params_str(stations,num_pols,fft_size,accumulation_time,signal_st
                         str(min_mapper_chunk)+ " " + \
                         str(max_mapper_chunk)+ " " + \
                         str(int(task_scaling_stations))+ " " + \
-                        str(int(single_precision))
+                        str(int(single_precision))+ " " + \
+                        "'"+ini_snapshot+"'"
     return(mapper_params_str)
 
 
-def get_reducer_params_str(codecs_serial,fft_at_mapper,internal_log_reducer,fft_size,windowing,phase_calibration,single_precision):
+def get_reducer_params_str(codecs_serial,fft_at_mapper,internal_log_reducer,fft_size,windowing,phase_calibration,single_precision,\
+                           fft_engine="",fft_threads=0,fft_wisdom_file="",reducer_threads=-1,reducer_processes=-1):
     """
     Returns string with all the parameters to call the reducer.
     
@@ -187,6 +208,16 @@ def get_reducer_params_str(codecs_serial,fft_at_mapper,internal_log_reducer,fft_
          if 1 phase calibration tones will be extracted.
      single_precision
          boolean to control data types for unpacked samples.
+     fft_engine
+         FFT engine ("" for default, see lib_fft.init_fft_engine()).
+     fft_threads
+         number of threads for the FFT engine (0 for default).
+     fft_wisdom_file
+         file to load/save FFTW wisdom ("" for none).
+     reducer_threads
+         number of threads for the reducer (0 for number of cores, -1 for default, see lib_workers.init_workers()).
+     reducer_processes
+         number of processes for the reducer (-1 for default, see lib_workers.init_workers()).
      
     Returns
     -------
@@ -206,7 +237,12 @@ def get_reducer_params_str(codecs_serial,fft_at_mapper,internal_log_reducer,fft_
                         str(fft_size)+ " " + \
                         "'"+windowing+"'"+ " " + \
                         str(int(phase_calibration))+ " " + \
-                        str(int(single_precision))
+                        str(int(single_precision))+ " " + \
+                        "'"+fft_engine+"'"+ " " + \
+                        str(int(fft_threads))+ " " + \
+                        "'"+fft_wisdom_file+"'"+ " " + \
+                        str(int(reducer_threads))+ " " + \
+                        str(int(reducer_processes))
                         
     return(reducer_params_str)
 
@@ -299,7 +335,9 @@ def pipeline_app(python_x,stations,input_files,app_dir,mapper,reducer,fft_size,f
                  file_out="vt4.txt",ini_stations="none",\
                  ini_media="none",ini_delays="none",internal_log_mapper=1,internal_log_reducer=1,ffts_per_chunk=1,\
                  windowing="square",one_baseline_per_task=True,phase_calibration=0,min_mapper_chunk=-1,\
-                 max_mapper_chunk=-1,task_scaling_stations=0,sort_output=1,single_precision=0,profile_map=0,profile_red=0,timestamp_str=""):
+                 max_mapper_chunk=-1,task_scaling_stations=0,sort_output=1,single_precision=0,profile_map=0,profile_red=0,timestamp_str="",\
+                 ini_snapshot=C_INI_SNAPSHOT_NONE,fft_engine="",fft_threads=0,fft_wisdom_file="",\
+                 reducer_threads=-1,reducer_processes=-1,pipeline_reducers=-1):
     """
     Perform correlation through pipeline execution (that is, without hadoop). All the data is passed through the mapper, 
     then the results are sorted and passed through the reducer.
@@ -310,12 +348,17 @@ def pipeline_app(python_x,stations,input_files,app_dir,mapper,reducer,fft_size,f
     
     Returns
     -------
-     list with start time, end time and duration of the execution in seconds.     
+     list with start time, end time and duration of the execution in seconds, and list with [str_id,start time,
+        end time,duration] for each stage (only with PIPELINE_EXECUTOR, see lib_pipeline.run_pipeline()).
      
     Notes
     -----
      Note that the environment variable map_input_file is modified for each processed file to emulate the hadoop behavior 
         (and thus provide access to the mapper to the name of the file currently being processed.
+     If PIPELINE_FRAMES_PER_SPLIT>0 each file is split at the beginning of accumulation periods (using its frame index,
+        see lib_vdif.get_vdif_index_splits()), and the mapper is run for every split.
+     If PIPELINE_EXECUTOR is 1 (and there is no profiling) the mappers, the sort and the reducers are run by 
+        lib_pipeline.run_pipeline() instead of a shell command.
     
     +-------------------------+----------------------------+---------------------------+
     |                         |   get_mapper_params_str()  |  get_reducer_params_str() |
@@ -350,6 +393,8 @@ def pipeline_app(python_x,stations,input_files,app_dir,mapper,reducer,fft_size,f
     +-------------------------+----------------------------+---------------------------+
     |  ini_delays:            |        x                   |                           |
     +-------------------------+----------------------------+---------------------------+
+    |  ini_snapshot:          |        x                   |                           |
+    +-------------------------+----------------------------+---------------------------+
     |  internal_log_mapper:   |        x                   |                           |
     +-------------------------+----------------------------+---------------------------+
     |  internal_log_reducer:  |                            |       x                   |
@@ -370,6 +415,19 @@ def pipeline_app(python_x,stations,input_files,app_dir,mapper,reducer,fft_size,f
     +-------------------------+----------------------------+---------------------------+
     |  single_precision:      |        x                   |       x                   |
     +-------------------------+----------------------------+---------------------------+
+    |  fft_engine:            |                            |       x                   |
+    +-------------------------+----------------------------+---------------------------+
+    |  fft_threads:           |                            |       x                   |
+    +-------------------------+----------------------------+---------------------------+
+    |  fft_wisdom_file:       |                            |       x                   |
+    +-------------------------+----------------------------+---------------------------+
+    |  reducer_threads:       |                            |       x                   |
+    +-------------------------+----------------------------+---------------------------+
+    |  reducer_processes:     |                            |       x                   |
+    +-------------------------+----------------------------+---------------------------+
+    |  pipeline_reducers:     | number of reducers (-1 for default, see                |
+    |                         |      lib_pipeline.py).                                 |
+    +-------------------------+----------------------------+---------------------------+
     |  python_x:              |  str with python executable.                           |
     +-------------------------+----------------------------+---------------------------+
     |  input_files:           | list with filenames for the media.                     |
@@ -412,6 +470,16 @@ def pipeline_app(python_x,stations,input_files,app_dir,mapper,reducer,fft_size,f
     files_str=""
     files_out_str=""
     command=""
+    map_tasks=[]
+    mapper_params_str = get_mapper_params_str(stations,num_pols,fft_size,accumulation_time,signal_start,signal_duration,\
+                                first_frame_num,num_frames,codecs_serial,\
+                                auto_stations,auto_pols,ini_stations,ini_media,ini_delays,fft_at_mapper,\
+                                internal_log_mapper,ffts_per_chunk,windowing,\
+                                one_baseline_per_task,phase_calibration,min_mapper_chunk,max_mapper_chunk,\
+                                task_scaling_stations,single_precision,ini_snapshot)
+    reducer_params_str = get_reducer_params_str(codecs_serial,fft_at_mapper,internal_log_reducer,fft_size,windowing,\
+                                           phase_calibration,single_precision,fft_engine,fft_threads,\
+                                           fft_wisdom_file,reducer_threads,reducer_processes)
     str_cprof_conv=" "
     # Map for every file, setting the environment variable map_input_file (to access the filename). This environment variable is 
     #  generated by hadoop, so we manually create it in the pipeline execution.
@@ -419,35 +487,57 @@ def pipeline_app(python_x,stations,input_files,app_dir,mapper,reducer,fft_size,f
     for input_file in input_files: #range(stations):
         i+=1
         file_str =  data_dir + input_file #prefix_files + "-" + str(i) + ".vt"
-        file_out_str = output_dir + file_out + "part" + str(i)
         files_str += " " + file_str
-        command += "export "+C_H_ENV_MAP_INPUT_FILE+"="+ file_str + " && "
-        command += "cat " + file_str + "|"
-        if profile_map==1:
-            i_args = lib_profiling.get_include_functions(str(app_dir+mapper),profile_memory=0)
-            command += "PYTHONPATH="+app_dir+":$PYTHONPATH "+lib_profiling.get_pycallgraph_str(i_args,file_out_str+"_"+input_file+"_map_prof_"+timestamp_str+".png ")
-        elif profile_map==2:
-            str_map_cprof = file_out_str+"_"+input_file+"_map_prof_"+timestamp_str+".cprof"
-            str_map_ctxt = file_out_str+"_"+input_file+"_map_prof_"+timestamp_str+".txt"
-            command += python_x+" "+lib_profiling.C_PROFILE_OPTS+" -o "+str_map_cprof+" "
-            str_cprof_conv += "&& "+python_x+" "+app_dir+lib_profiling.C_PROFILE_CONVERT_CMD+str_map_cprof+" > "+str_map_ctxt+" "
-        else: # 0
-            command += python_x+" "
-        command += str(app_dir+mapper)
-        command += " " + get_mapper_params_str(stations,num_pols,fft_size,accumulation_time,signal_start,signal_duration,\
-                            first_frame_num,num_frames,codecs_serial,\
-                            auto_stations,auto_pols,ini_stations,ini_media,ini_delays,fft_at_mapper,\
-                            internal_log_mapper,ffts_per_chunk,windowing,\
-                            one_baseline_per_task,phase_calibration,min_mapper_chunk,max_mapper_chunk,\
-                            task_scaling_stations,single_precision)
-        command+=" > " + file_out_str + " && " 
-        command+="unset "+C_H_ENV_MAP_INPUT_FILE+" && "
-        files_out_str += " " + file_out_str
+        
+        # Splits aligned with accumulation periods (one mapper per split)
+        input_splits = [None]
+        if VDIF_FRAME_INDEX and PIPELINE_FRAMES_PER_SPLIT>0:
+            input_splits = lib_vdif.get_vdif_index_splits(lib_vdif.get_vdif_index(file_str),PIPELINE_FRAMES_PER_SPLIT,\
+                                                          float(accumulation_time),float(signal_start))
+            if input_splits is None:
+                print(" Warning: unknown number of frames per second in "+input_file+", one mapper for the file",file=file_log)
+                input_splits = [None]
+            if v==1:
+                print(" "+input_file+": "+str(len(input_splits))+" split(s)",file=file_log)
+        
+        for (i_split,input_split) in enumerate(input_splits):
+            file_out_str = output_dir + file_out + "part" + str(i)
+            if input_split is None:
+                str_input_pre = ""
+                # Input redirected from file (instead of cat) to allow the mapper to memory-map it
+                str_input_post = " < " + file_str
+            else:
+                file_out_str += "_" + str(i_split)
+                [split_offset,split_bytes] = input_split
+                str_input_pre = "tail -c +"+str(split_offset+1)+" "+file_str+" | head -c "+str(split_bytes)+" | "
+                str_input_post = ""
+            command += "export "+C_H_ENV_MAP_INPUT_FILE+"="+ file_str + " && "
+            command += str_input_pre
+            if profile_map==1:
+                i_args = lib_profiling.get_include_functions(str(app_dir+mapper),profile_memory=0)
+                command += "PYTHONPATH="+app_dir+":$PYTHONPATH "+lib_profiling.get_pycallgraph_str(i_args,file_out_str+"_"+input_file+"_map_prof_"+timestamp_str+".png ")
+            elif profile_map==2:
+                str_map_cprof = file_out_str+"_"+input_file+"_map_prof_"+timestamp_str+".cprof"
+                str_map_ctxt = file_out_str+"_"+input_file+"_map_prof_"+timestamp_str+".txt"
+                command += python_x+" "+lib_profiling.C_PROFILE_OPTS+" -o "+str_map_cprof+" "
+                str_cprof_conv += "&& "+python_x+" "+app_dir+lib_profiling.C_PROFILE_CONVERT_CMD+str_map_cprof+" > "+str_map_ctxt+" "
+            else: # 0
+                command += python_x+" "
+            command += str(app_dir+mapper)
+            command += " " + mapper_params_str
+            command+=str_input_post + " > " + file_out_str + " && " 
+            command+="unset "+C_H_ENV_MAP_INPUT_FILE+" && "
+            files_out_str += " " + file_out_str
+            map_tasks.append([file_str,input_split,file_out_str])
     
     # Reduce (includes sorting and reducing)
-    command+= " cat " + files_out_str
-    #command+= "|sort -t"+FIELD_SEP+" -k1 -k2 -k3 -k4 -k5 -k6 -k7 -k8 -k9 >" + output_dir + file_out + "_tmp"
-    command+= "|sort -t"+FIELD_SEP+" "+COMMON_SORT_ALL_BASELINES_PER_TASK_STR+" >" + output_dir + file_out + "_tmp"
+    if INTERMEDIATE_BINARY:
+        # Binary records (see lib_mapred_io.py)
+        command+= " " + python_x + " " + app_dir + C_SORT_BIN_CMD + output_dir + file_out + "_tmp" + files_out_str
+    else:
+        # Same order as: cat files_out_str | sort -t FIELD_SEP COMMON_SORT_ALL_BASELINES_PER_TASK_STR, but sorting
+        #  only the keys (see lib_mapred_io.sort_external())
+        command+= " " + python_x + " " + app_dir + C_SORT_LINES_CMD + output_dir + file_out + "_tmp" + files_out_str
     command += " && cat "+ output_dir + file_out +"_tmp|"
     if profile_red==1:
         i_args = lib_profiling.get_include_functions(str(app_dir+reducer))
@@ -460,22 +550,41 @@ def pipeline_app(python_x,stations,input_files,app_dir,mapper,reducer,fft_size,f
     else:
         command += python_x
     command += " " + str(app_dir+reducer) 
-    command += " " + get_reducer_params_str(codecs_serial,fft_at_mapper,internal_log_reducer,fft_size,windowing,\
-                                           phase_calibration,single_precision) + " "
-    if sort_output:
+    command += " " + reducer_params_str + " "
+    if OUTPUT_BINARY:
+        # Binary records (see lib_mapred_io.py), converted into text
+        command+= " > " + output_dir + file_out + "_bin && " + python_x + " " + app_dir
+        command+= (C_SORT_TEXT_BIN_CMD if sort_output else C_TEXT_BIN_CMD) + output_dir + file_out + " " + output_dir + file_out + "_bin"
+    elif sort_output:
         command+= "|sort > " + output_dir + file_out
     else:
         command+= " > " + output_dir + file_out
 
     command+=str_cprof_conv
     
-    if v==1:
+    use_executor = PIPELINE_EXECUTOR and profile_map==0 and profile_red==0
+    if v==1 and not(use_executor):
         print("",command,file=file_log)
 
         
     # Execution times
     start_time = time.time()
-    os.system(command)
+    if use_executor:
+        if one_baseline_per_task:
+            partition_str = HADOOP_PARTITION_ONE_BASELINE_PER_TASK_STR
+        else:
+            partition_str = HADOOP_PARTITION_ALL_BASELINES_PER_TASK_STR
+        stage_times = lib_pipeline.run_pipeline(map_tasks=map_tasks,\
+                                                mapper_cmd=python_x+" "+app_dir+mapper+" "+mapper_params_str,\
+                                                reducer_cmd=python_x+" "+app_dir+reducer+" "+reducer_params_str,\
+                                                file_out=output_dir+file_out,\
+                                                partition_str=partition_str,\
+                                                sort_output=sort_output,\
+                                                reducers=pipeline_reducers,\
+                                                v=v,file_log=file_log)
+    else:
+        os.system(command)
+        stage_times = []
     end_time = time.time()
     elapsed_time = end_time - start_time
 
@@ -491,7 +600,7 @@ def pipeline_app(python_x,stations,input_files,app_dir,mapper,reducer,fft_size,f
 
 
 
-    return([start_time,end_time,elapsed_time])
+    return([start_time,end_time,elapsed_time,stage_times])
 
 
 
@@ -635,6 +744,34 @@ def get_options_fixed_length_records(record_size):
 
 
 
+def get_num_tasks(packets_per_hdfs_block,total_frames,total_partitions,adjust_mappers,adjust_reducers,bypass_reduce=0):
+    """
+    Get number of mappers and reducers for the job (see "Configuration" in run_mapreduce_sh()).
+    
+    Returns
+    -------
+     num_maps : int
+         number of mappers (only a hint for Hadoop, the actual number depends on the input splits).
+     num_reduces : int
+         number of reducers, 0 if the reduce phase is bypassed.
+    """
+    num_maps=max(1,total_frames//packets_per_hdfs_block)
+    num_reduces=max(1,total_partitions)
+    
+    # Adjust values for number of mappers and reducers
+    num_maps=max(1,int((num_maps*adjust_mappers)//1))
+    num_reduces=max(1,int((num_reduces*adjust_reducers)//1))
+    if adjust_mappers<0:
+        num_maps=int(-adjust_mappers//1)
+    if adjust_reducers<0:
+        num_reduces=int(-adjust_reducers//1)
+    
+    if bypass_reduce or adjust_reducers==0:
+        num_reduces=0 
+    return([num_maps,num_reduces])
+
+
+
 def run_mapreduce_sh(record_size,jobsh,mappersh,reducersh,app_dir,hadoop_dir,hadoop_conf_dir,folder_deps,files_deps,add_deps,\
                   mapper,reducer,hdfs_data_dir,hdfs_output_file,output_hadoop,text_mode,hadoop_text_delimiter,output_dir,output_sym,\
                   temp_log,packets_per_hdfs_block,total_frames,total_partitions,adjust_mappers,adjust_reducers,\
@@ -802,19 +939,8 @@ def run_mapreduce_sh(record_size,jobsh,mappersh,reducersh,app_dir,hadoop_dir,had
     # Remove output file from HDFS if it exists
     os.system(hadoop_dir+"bin/hdfs dfs -rm -r -f " + hdfs_output_file)
 
-    num_maps=max(1,total_frames//packets_per_hdfs_block)
-    num_reduces=max(1,total_partitions)
-    
-    # Adjust values for number of mappers and reducers
-    num_maps=max(1,int((num_maps*adjust_mappers)//1))
-    num_reduces=max(1,int((num_reduces*adjust_reducers)//1))
-    if adjust_mappers<0:
-        num_maps=int(-adjust_mappers//1)
-    if adjust_reducers<0:
-        num_reduces=int(-adjust_reducers//1)
-    
-    if bypass_reduce or adjust_reducers==0:
-        num_reduces=0 
+    [num_maps,num_reduces] = get_num_tasks(packets_per_hdfs_block,total_frames,total_partitions,adjust_mappers,\
+                                           adjust_reducers,bypass_reduce)
 
 
     
@@ -0,0 +1,551 @@
+# -*- coding: utf-8 -*-
+# <nbformat>3.0</nbformat>
+
+# <codecell>
+
+#!/usr/bin/env python
+#
+#The MIT CorrelX Correlator
+#
+#https://github.com/MITHaystack/CorrelX
+#Contact: correlX@haystack.mit.edu
+#Project leads: Victor Pankratius, Pedro Elosegui Project developer: A.J. Vazquez Alvarez
+#
+#Copyright 2017 MIT Haystack Observatory
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+#------------------------------
+#------------------------------
+#Project: CorrelX.
+#File: lib_pipeline.py.
+#Author: agent (agent@local)
+"""
+Local executor for pipeline mode: mappers, shuffle and reducers run from Python as concurrent processes, instead of 
+ a single shell command (cat|sort|reduce).
+
+Notes
+-----
+|
+| **Procedure:**
+|
+|  1. Map: every input (file or split, see lib_mapredcorr.pipeline_app()) is processed by a mapper process, with at most
+|      PIPELINE_MAPPERS running at the same time. Like in Hadoop, map_input_file is set in the environment of each mapper.
+|  2. Shuffle: the mapper outputs are sorted by key (see lib_mapred_io.sort_external()), and each line/record is 
+|      written into the input of its reducer, selected by band, channel and block of PIPELINE_PARTITION_ACCS
+|      accumulation periods (see get_block_partitioner()), or with the same key fields used for the Hadoop 
+|      partitioner (see get_partition()).
+|  3. Reduce: PIPELINE_REDUCERS reducer processes are run concurrently, each on its own partition.
+|  4. Output: reducer outputs are merged (or sorted if sort_output) into the output file, in the same order as the 
+|      output of a single reducer (see merge_outputs()).
+|
+|
+| **Notes:**
+|
+|  The duration of each stage is returned to be shown with the execution times (see mapred_cx.py).
+
+"""
+#History:
+#initial version: 2026.10 agent
+#MIT Haystack Observatory
+
+from __future__ import print_function,division
+import sys
+import os
+import time
+import heapq
+import zlib
+import shlex
+import subprocess
+import multiprocessing
+import multiprocessing.pool
+import imp
+
+import const_mapred
+imp.reload(const_mapred)
+from const_mapred import *
+
+import const_hadoop
+imp.reload(const_hadoop)
+from const_hadoop import C_H_ENV_MAP_INPUT_FILE
+
+import const_performance
+imp.reload(const_performance)
+from const_performance import PIPELINE_MAPPERS,PIPELINE_REDUCERS,PIPELINE_PARTITION_ACCS
+
+import lib_mapred_io
+imp.reload(lib_mapred_io)
+from lib_mapred_io import get_writer,write_line_buffered,flush_writer,records_to_text,sort_external,\
+                          read_records_files,get_line_vis_bin,to_bytes
+
+
+# Block size for feeding splits to the mappers
+C_PIPELINE_READ_BLOCK = 1<<22
+
+# Reducer log lines (see rsvf.py), and log line closing the output for one key
+C_PIPELINE_LOG =        b"zR"+to_bytes(KEY_SEP)
+C_PIPELINE_LOG_KPA =    C_PIPELINE_LOG+b"kpa="
+C_PIPELINE_LOG_SHIFTS = b",Adjusted shifts="
+
+
+
+###########################################
+#           Map
+########################################### 
+
+def run_map_task(map_task):
+    """
+    Run one mapper.
+    
+    Parameters
+    ----------
+     map_task : list
+         [command,file_in,input_split,file_out] or [command,file_in,input_split,file_out,map_input_file] with:
+          |  command:        list with the mapper command (python executable, mapper and its parameters).
+          |  file_in:        media file.
+          |  input_split:    None to process the whole file, otherwise [offset,num_bytes].
+          |  file_out:       file for the mapper output.
+          |  map_input_file: value for map_input_file in the environment of the mapper (file_in by default).
+    
+    Returns
+    -------
+     result : list
+         [return code, start time, end time].
+    """
+    [command,file_in,input_split,file_out] = map_task[:4]
+    env = dict(os.environ)
+    env[C_H_ENV_MAP_INPUT_FILE] = (map_task[4:]+[file_in])[0]
+    start_time = time.time()
+    with open(file_out,'wb') as f_out:
+        if input_split is None:
+            # Input from file, so that the mapper can memory-map it
+            with open(file_in,'rb') as f_in:
+                return_code = subprocess.call(command,stdin=f_in,stdout=f_out,env=env)
+        else:
+            [split_offset,split_bytes] = input_split
+            proc = subprocess.Popen(command,stdin=subprocess.PIPE,stdout=f_out,env=env)
+            with open(file_in,'rb') as f_in:
+                f_in.seek(split_offset)
+                while split_bytes>0:
+                    data = f_in.read(min(split_bytes,C_PIPELINE_READ_BLOCK))
+                    if len(data)==0:
+                        break
+                    proc.stdin.write(data)
+                    split_bytes -= len(data)
+            proc.stdin.close()
+            return_code = proc.wait()
+    return([return_code,start_time,time.time()])
+
+
+def run_map_tasks(map_tasks,mappers=-1):
+    """
+    Run all mappers, with at most mappers processes at the same time.
+    
+    Parameters
+    ----------
+     map_tasks : list
+         elements as defined in run_map_task().
+     mappers : int
+         maximum number of concurrent mappers, 0 for the number of cores of the node, if <0 the default value 
+          (PIPELINE_MAPPERS) is used.
+    
+    Returns
+    -------
+     results : list
+         results of run_map_task() for each task.
+    
+    Notes
+    -----
+    |
+    | Each mapper is a separate process, the pool of threads only waits for them.
+    """
+    if mappers<0:
+        mappers = PIPELINE_MAPPERS
+    if mappers==0:
+        mappers = multiprocessing.cpu_count()
+    mappers = max(1,min(mappers,len(map_tasks)))
+    if mappers==1:
+        return([run_map_task(map_task) for map_task in map_tasks])
+    pool = multiprocessing.pool.ThreadPool(mappers)
+    try:
+        results = pool.map(run_map_task,map_tasks,chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    return(results)
+
+
+
+
+###########################################
+#           Shuffle
+########################################### 
+
+def get_partition_fields(partition_str):
+    """
+    Get key fields for partitioning.
+    
+    Parameters
+    ----------
+     partition_str : str
+         partitioner options (-kN,M), e.g. HADOOP_PARTITION_ALL_BASELINES_PER_TASK_STR.
+    
+    Returns
+    -------
+     fields : list
+         [first,last+1] indices of the fields of the key (split by FIELD_SEP).
+    """
+    [first,last] = (partition_str.strip()[2:].split(",")+[""])[:2]
+    first = int(first)-1
+    if last=="":
+        last = first+1
+    return([first,int(last)])
+
+
+def get_partition(key,fields,num_reducers):
+    """
+    Get reducer for a line/record.
+    
+    Parameters
+    ----------
+     key : bytes
+         line (text mode) or key (binary mode).
+     fields : list
+         output of get_partition_fields().
+     num_reducers : int
+         number of reducers.
+    
+    Returns
+    -------
+     partition : int
+         reducer id.
+    
+    Notes
+    -----
+    |
+    | Numeric fields (k5, see msvf.get_key_value()) are assigned modulo the number of reducers, as with the no-hash 
+    |  partitioner (C_H_INLINE_NOHASH_PARITIONER). Other fields are hashed.
+    """
+    if num_reducers<2:
+        return(0)
+    field = FIELD_SEP.encode().join(key.split(FIELD_SEP.encode())[fields[0]:fields[1]])
+    if field.isdigit():
+        return(int(field)%num_reducers)
+    return((zlib.crc32(field)&0xffffffff)%num_reducers)
+
+
+def get_block_partitioner(num_reducers,partition_accs=-1):
+    """
+    Get function to select the reducer for a line/record by band, channel and block of accumulation periods.
+    
+    Parameters
+    ----------
+     num_reducers : int
+         number of reducers.
+     partition_accs : int
+         number of consecutive accumulation periods per block, if <1 the default value (PIPELINE_PARTITION_ACCS) is used.
+    
+    Returns
+    -------
+     partition : function
+         function that gets the reducer id for a key (bytes).
+    
+    Notes
+    -----
+    |
+    | Blocks are identified by the fields k1 to k4 (mode and pair, see msvf.get_pair_str()), the channel (k7) and the
+    |  accumulation period (k6) divided by partition_accs. They are assigned to the reducers in turns as they are 
+    |  found (keys are requested in sorted order), so that all reducers get (almost) the same number of blocks.
+    | All the lines/records with the same k5 (the key field used for the Hadoop partitioner) are in the same block.
+    """
+    if partition_accs<1:
+        partition_accs = PIPELINE_PARTITION_ACCS
+    field_sep = to_bytes(FIELD_SEP)
+    blocks = {}
+    def partition(key):
+        fields = key.split(field_sep)
+        block = (field_sep.join(fields[:4]),fields[6],int(fields[5])//partition_accs)
+        if block not in blocks:
+            blocks[block] = len(blocks)%num_reducers
+        return(blocks[block])
+    return(partition)
+
+
+def read_lines(file_in):
+    """
+    Read lines (bytes without end of line) from file.
+    """
+    with open(file_in,'rb') as f_in:
+        for line in f_in:
+            if line.endswith(b"\n"):
+                line = line[:-1]
+            yield(line)
+
+
+def shuffle(files_in,files_part,binary,partition_str,partition_accs=-1):
+    """
+    Sort mapper outputs and partition them into the reducer inputs.
+    
+    Parameters
+    ----------
+     files_in : list of str
+         mapper outputs.
+     files_part : list of str
+         reducer inputs (one per reducer).
+     binary : int
+         1 for binary records (INTERMEDIATE_BINARY), 0 for text lines.
+     partition_str : str
+         partitioner options (see get_partition_fields()), only used if partition_accs is 0.
+     partition_accs : int
+         accumulation periods per block (see get_block_partitioner()), 0 to use the key fields in partition_str,
+          if <0 the default value (PIPELINE_PARTITION_ACCS) is used.
+    """
+    num_reducers = len(files_part)
+    if partition_accs<0:
+        partition_accs = PIPELINE_PARTITION_ACCS
+    if num_reducers<2:
+        partition = None
+    elif partition_accs==0:
+        fields = get_partition_fields(partition_str)
+        partition = lambda key: get_partition(key,fields,num_reducers)
+    else:
+        partition = get_block_partitioner(num_reducers,partition_accs)
+    sort_external(files_in,files_part,binary,partition=partition)
+
+
+
+
+###########################################
+#           Reduce
+########################################### 
+
+def run_reducers(command,files_part,files_red_out):
+    """
+    Run one reducer for each partition, all at the same time.
+    
+    Parameters
+    ----------
+     command : list
+         reducer command (python executable, reducer and its parameters).
+     files_part : list of str
+         reducer inputs.
+     files_red_out : list of str
+         reducer outputs.
+    
+    Returns
+    -------
+     return_codes : list
+         return code of each reducer.
+    """
+    env = dict(os.environ)
+    env.pop(C_H_ENV_MAP_INPUT_FILE,None)
+    procs = []
+    for (file_part,file_red_out) in zip(files_part,files_red_out):
+        with open(file_part,'rb') as f_in:
+            with open(file_red_out,'wb') as f_out:
+                procs.append(subprocess.Popen(command,stdin=f_in,stdout=f_out,env=env))
+    return([proc.wait() for proc in procs])
+
+
+def read_output_lines(file_red_out,binary_out):
+    """
+    Read lines (bytes without end of line) from a reducer output (text, or binary records if binary_out).
+    """
+    if binary_out:
+        for [key,value] in read_records_files([file_red_out]):
+            yield(to_bytes(get_line_vis_bin(key,value)))
+    else:
+        for line in read_lines(file_red_out):
+            yield(line)
+
+
+def read_output_blocks(lines,reducer_id):
+    """
+    Group the lines of a reducer output by key.
+    
+    Parameters
+    ----------
+     lines : iterable
+         lines of the reducer output (see read_output_lines()).
+     reducer_id : int
+         reducer id.
+    
+    Returns
+    -------
+     (generator) [key,reducer_id,lines] where key is the sort key for merge_outputs().
+    
+    Notes
+    -----
+    |
+    | The output for every key (part of the key up to the accumulation period and channel, see rsvf.split_input_key())
+    |  is closed by a log line with "kpa=key,Adjusted shifts=", followed by other log lines (statistics and failed 
+    |  accumulation periods). Lines after the last key (if any) are returned with key [1].
+    """
+    block = []
+    key = None
+    for line in lines:
+        if key is not None and (not(line.startswith(C_PIPELINE_LOG)) or line.startswith(C_PIPELINE_LOG_KPA)):
+            yield([[0,key],reducer_id,block])
+            block = []
+            key = None
+        block.append(line)
+        if line.startswith(C_PIPELINE_LOG_KPA) and C_PIPELINE_LOG_SHIFTS in line:
+            key = line[len(C_PIPELINE_LOG_KPA):line.index(C_PIPELINE_LOG_SHIFTS)]
+    if key is not None:
+        yield([[0,key],reducer_id,block])
+    elif block!=[]:
+        yield([[1],reducer_id,block])
+
+
+def merge_outputs(files_red_out,file_out,binary_out):
+    """
+    Merge the outputs of several reducers into one output file.
+    
+    Parameters
+    ----------
+     files_red_out : list of str
+         reducer outputs.
+     file_out : str
+         output file.
+     binary_out : int
+         1 if the reducer outputs are binary records (OUTPUT_BINARY), converted into text lines.
+    
+    Notes
+    -----
+    |
+    | Every reducer processes its keys in sorted order, so the outputs are merged by key (see read_output_blocks()), 
+    |  giving the same output as a single reducer except for the log lines with the failed accumulation periods, 
+    |  that are counted by each reducer.
+    """
+    blocks = heapq.merge(*[read_output_blocks(read_output_lines(file_red_out,binary_out),i) \
+                           for (i,file_red_out) in enumerate(files_red_out)])
+    with open(file_out,'wb') as f_out:
+        writer = get_writer(f_out)
+        for [key,reducer_id,lines] in blocks:
+            for line in lines:
+                write_line_buffered(writer,line)
+        flush_writer(writer)
+
+
+def write_output(files_red_out,file_out,sort_output,binary_out):
+    """
+    Write reducer outputs into the output file.
+    
+    Parameters
+    ----------
+     files_red_out : list of str
+         reducer outputs.
+     file_out : str
+         output file.
+     sort_output : int
+         1 to sort the lines (same as "sort" with LC_ALL=C).
+     binary_out : int
+         1 if the reducer outputs are binary records (OUTPUT_BINARY), converted into text lines.
+    """
+    if binary_out and (sort_output or len(files_red_out)==1):
+        records_to_text(files_red_out,file_out,sort_records=sort_output)
+    elif sort_output:
+        lines = []
+        for file_red_out in files_red_out:
+            lines.extend(read_lines(file_red_out))
+        lines.sort()
+        with open(file_out,'wb') as f_out:
+            writer = get_writer(f_out)
+            for line in lines:
+                write_line_buffered(writer,line)
+            flush_writer(writer)
+    elif files_red_out!=[file_out]:
+        merge_outputs(files_red_out,file_out,binary_out)
+
+
+
+
+###########################################
+#           Execution
+########################################### 
+
+def run_pipeline(map_tasks,mapper_cmd,reducer_cmd,file_out,partition_str,sort_output=1,\
+                 mappers=-1,reducers=-1,v=0,file_log=sys.stdout):
+    """
+    Run mappers, shuffle and reducers.
+    
+    Parameters
+    ----------
+     map_tasks : list
+         [file_in,input_split,file_map_out] for each mapper (see run_map_task()).
+     mapper_cmd : str
+         mapper command (python executable, mapper and its parameters).
+     reducer_cmd : str
+         reducer command (python executable, reducer and its parameters).
+     file_out : str
+         output file (intermediate files are named after it).
+     partition_str : str
+         partitioner options (see get_partition_fields()), only used if PIPELINE_PARTITION_ACCS is 0.
+     sort_output : int
+         1 to sort the output.
+     mappers : int
+         maximum number of concurrent mappers (see run_map_tasks()).
+     reducers : int
+         number of reducers, if <1 the default value (PIPELINE_REDUCERS) is used.
+     v : int
+         1 for verbose.
+     file_log : file handler
+         file for logging.
+    
+    Returns
+    -------
+     stage_times : list
+         [str_id,start time,end time,duration] for each stage (map, shuffle, reduce and output).
+    """
+    if reducers<1:
+        reducers = PIPELINE_REDUCERS
+    mapper_cmd = shlex.split(mapper_cmd)
+    reducer_cmd = shlex.split(reducer_cmd)
+    stage_times = []
+    
+    # Map
+    start_time = time.time()
+    results = run_map_tasks([[mapper_cmd]+map_task for map_task in map_tasks],mappers)
+    stage_times.append(["Pipeline map",start_time,time.time()])
+    if v==1:
+        for (map_task,result) in zip(map_tasks,results):
+            print(" Mapper "+map_task[2]+": "+str(result[2]-result[1])+" s",file=file_log)
+    failed = [map_task[2] for (map_task,result) in zip(map_tasks,results) if result[0]!=0]
+    
+    if failed==[]:
+        # Shuffle
+        start_time = time.time()
+        if reducers==1:
+            files_part = [file_out+"_tmp"]
+        else:
+            files_part = [file_out+"_tmp"+str(i) for i in range(reducers)]
+        shuffle([map_task[2] for map_task in map_tasks],files_part,INTERMEDIATE_BINARY,partition_str)
+        stage_times.append(["Pipeline shuffle",start_time,time.time()])
+        
+        # Reduce (only partitions with data)
+        start_time = time.time()
+        files_part = [file_part for file_part in files_part if os.path.getsize(file_part)>0] or files_part[:1]
+        if len(files_part)==1 and not(sort_output) and not(OUTPUT_BINARY):
+            files_red_out = [file_out]
+        else:
+            files_red_out = [file_out+"_red"+str(i) for i in range(len(files_part))]
+        return_codes = run_reducers(reducer_cmd,files_part,files_red_out)
+        stage_times.append(["Pipeline reduce",start_time,time.time()])
+        failed = [file_part for (file_part,return_code) in zip(files_part,return_codes) if return_code!=0]
+        
+        # Output
+        start_time = time.time()
+        write_output(files_red_out,file_out,sort_output,OUTPUT_BINARY)
+        stage_times.append(["Pipeline output",start_time,time.time()])
+    
+    if failed!=[]:
+        print("ERROR: pipeline tasks failed: "+", ".join(failed),file=file_log)
+    
+    for stage_time in stage_times:
+        stage_time.append(stage_time[2]-stage_time[1])
+    return(stage_times)
@@ -86,6 +86,136 @@ def decode_samples_red(words,bits_per_sample):
     return(words_nostack)
 
 
+# Lookup tables for unpacking, indexed by (bits_per_sample,msb_first,levels,dtype)
+LUT_UNPACK_CACHE={}
+
+
+def get_quant_levels(bits_per_sample):
+    """
+    Get dequantization levels for a given number of bits per sample.
+    
+    Parameters
+    ----------
+     bits_per_sample : int
+         number of bits per sample.
+    
+    Returns
+    -------
+     levels : list
+         dequantized value for each quantized value (from 0 to 2**bits_per_sample-1).
+    
+    Notes
+    -----
+    |
+    | **Configuration:**
+    |
+    |  QUANT_LEVELS_1BIT, QUANT_LEVELS_2BIT (const_quant.py). Other numbers of bits per sample
+    |   use equispaced levels centered at zero (offset binary).
+    """
+    if bits_per_sample==1:
+        levels = QUANT_LEVELS_1BIT
+    elif bits_per_sample==2:
+        levels = QUANT_LEVELS_2BIT
+    else:
+        num_levels = 2**bits_per_sample
+        levels = (np.arange(num_levels)-(num_levels-1)/2.0).tolist()
+    return(levels)
+
+
+def get_lut_unpack(bits_per_sample,msb_first=1,levels=None,dtype=np.uint8):
+    """
+    Get lookup table for unpacking samples from bytes.
+    
+    Parameters
+    ----------
+     bits_per_sample : int
+         number of bits per sample (1, 2, 4 or 8).
+     msb_first : int
+         1 if the first sample is in the most significant bits of the byte (mapper output, see compute_range_bits()),
+          0 if the first sample is in the least significant bits (VDIF payload, see lib_vdif.compute_range()).
+     levels : list or None
+         if None, the table contains the quantized values, otherwise these values are translated into levels.
+     dtype : numpy dtype
+         data type for the table.
+    
+    Returns
+    -------
+     lut : 1D numpy array
+         256 elements (one per byte value), each one holding the 8//bits_per_sample samples of the byte. Elements are
+          unsigned integers (or raw bytes) of the size of the row, so that unpacking is a single np.take(), and the 
+          result is then viewed as dtype (see unpack_samples_lut()).
+    """
+    key_lut = (bits_per_sample,msb_first,None if levels is None else tuple(levels),np.dtype(dtype).str)
+    if key_lut not in LUT_UNPACK_CACHE:
+        byte_values = np.arange(256,dtype=np.uint8)
+        if msb_first:
+            range_offsets = compute_range_bits(bits_per_sample)
+        else:
+            range_offsets = range(0,8,bits_per_sample)
+        mask_bits = (1<<bits_per_sample)-1
+        codes = np.array([(byte_values>>i) & mask_bits for i in range_offsets]).T
+        if levels is None:
+            lut = codes.astype(dtype)
+        else:
+            lut = np.array(levels,dtype=dtype)[codes]
+        row_size = lut.shape[1]*lut.itemsize
+        if row_size in [1,2,4,8]:
+            row_type = "u"+str(row_size)
+        else:
+            row_type = np.dtype((np.void,row_size))
+        LUT_UNPACK_CACHE[key_lut] = np.ascontiguousarray(lut).view(row_type).reshape(-1)
+    return(LUT_UNPACK_CACHE[key_lut])
+
+
+def unpack_samples_lut(data,bits_per_sample,msb_first=1,levels=None,dtype=None):
+    """
+    Unpack samples from bytes using a lookup table.
+    
+    Parameters
+    ----------
+     data : numpy 1D array of np.uint8
+         packed samples.
+     bits_per_sample : int
+         number of bits per sample, any divisor of 32.
+     msb_first : int
+         see get_lut_unpack().
+     levels : list or None
+         see get_lut_unpack().
+     dtype : numpy dtype
+         data type for the output. If None, unsigned integer of the minimum size for quantized values
+          and np.float64 for dequantized values.
+    
+    Returns
+    -------
+     samples : numpy 1D array
+         quantized values (levels is None) or dequantized values.
+    
+    Notes
+    -----
+    |
+    | For 16 and 32 bits per sample each sample is read directly as an integer (big endian if msb_first, little
+    |  endian otherwise).
+    | For complex data in single (double) precision use dtype=np.float32 (np.float64) and take the .view(np.complex64)
+    |  (.view(np.complex128)) of the result, this does not copy the data.
+    """
+    if dtype is None:
+        if levels is not None:
+            dtype = np.float64
+        else:
+            dtype = "u"+str(max(1,bits_per_sample//8))
+    if bits_per_sample>8:
+        word_type = (">" if msb_first else "<")+"u"+str(bits_per_sample//8)
+        codes = data.view(word_type)
+        if levels is None:
+            samples = codes.astype(dtype)
+        else:
+            samples = np.take(np.array(levels,dtype=dtype),codes)
+    else:
+        lut = get_lut_unpack(bits_per_sample,msb_first,levels,dtype)
+        samples = np.take(lut,data).view(dtype)
+    return(samples)
+
+
 def np_take_samples(v_2bps,unpacked_samples):
     """
     Translate vector with sampled values into dequantized values.
@@ -163,7 +293,7 @@ def sub_pack_complex_samples(samples,bits_per_sample):
     return(complex_samples)
 
 
-def get_samples(samples_quant,bits_per_sample,current_data_type,num_samples=-1,single_precision=0):
+def get_samples(samples_quant,bits_per_sample,current_data_type,num_samples=-1,single_precision=0,real_samples=0):
     """
     Get dequantized samples from samples in binary format.
     
@@ -182,36 +312,38 @@ def get_samples(samples_quant,bits_per_sample,current_data_type,num_samples=-1,s
          quantization levels for 2 bit complex.
      v_2bps_real : list
          quantization levels for 2 bit real.
+     single_precision : int
+         if 1 samples are complex64 (float32 for real data if real_samples=1), otherwise complex128 (float64).
+     real_samples : int
+         if 1 real data is returned as float, otherwise as complex.
      
     Returns
     -------
      result : numpy 1D array
-         complex with dequantized samples.
+         complex with dequantized samples (float for real data if real_samples=1).
      
     Notes
     -----
     |
-    | **TO DO:**
-    | 
-    |  Currently only 2 bits per sample, generalize for different numbers of bits per sample.
+    | **Procedure:**
+    |
+    |  Samples are unpacked and dequantized in a single step with a lookup table (see unpack_samples_lut()),
+    |   and complex samples are obtained as a view of the pairs of components.
+    |  Levels given by get_quant_levels().
     """
     
-    #v_2bps_complex=np.array(QUANT_LEVELS_2BIT,dtype=np.complex64) if SINGLE_PRECISION else \
-    #                   np.array(QUANT_LEVELS_2BIT,dtype=complex)
-    v_2bps_complex=np.array(QUANT_LEVELS_2BIT,dtype=np.complex128) if single_precision else \
-                        np.array(QUANT_LEVELS_2BIT,dtype=np.complex128)
-    #v_2bps_real=np.array(QUANT_LEVELS_2BIT,dtype=np.float32) if SINGLE_PRECISION else \
-    #                    np.array(QUANT_LEVELS_2BIT,dtype=float)
-    v_2bps_real=np.array(QUANT_LEVELS_2BIT,dtype=np.complex128) if single_precision else \
-                        np.array(QUANT_LEVELS_2BIT,dtype=np.complex128)
-    
     
-    # Unpack and dequantize
-    v_all = sub_unpack_samples(samples_quant,bits_per_sample,current_data_type,v_2bps_complex,v_2bps_real)
+    # Unpack and dequantize (lookup table)
+    levels = get_quant_levels(bits_per_sample)
+    [dtype_real,dtype_complex] = [np.float32,np.complex64] if single_precision else [np.float64,np.complex128]
     if current_data_type=='c':
-        result = sub_pack_complex_samples(v_all,bits_per_sample)
+        # Pairs of components viewed as complex
+        result = unpack_samples_lut(samples_quant,bits_per_sample,msb_first=1,levels=levels,dtype=dtype_real)
+        result = result.view(dtype_complex)
+    elif real_samples:
+        result = unpack_samples_lut(samples_quant,bits_per_sample,msb_first=1,levels=levels,dtype=dtype_real)
     else:
-        result = v_all
+        result = unpack_samples_lut(samples_quant,bits_per_sample,msb_first=1,levels=levels,dtype=dtype_complex)
     if num_samples>-1:
         #if current_data_type=='c':
         #    result=result[:(num_samples//2)]
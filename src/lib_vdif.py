@@ -57,14 +57,25 @@ import select
 import array
 import os
 import sys
+import mmap
+import stat
+import hashlib
+import tempfile
 
 USE_BITARRAY=0
 if USE_BITARRAY:
     from bitarray import bitarray                   # Enable for VDIF creation functions (testing)
 import struct
+import imp
 import numpy as np
 from datetime import date,datetime,timedelta
 
+# Lookup table unpacker
+import lib_quant
+imp.reload(lib_quant)
+
+from const_performance import VDIF_INDEX_DIR,MAPPER_FRAMES_PER_BATCH
+
 # Constants for VDIF reader
 TYPE_WORD=np.uint32                              # Data type for binary file reader.
 WORD_SIZE=32                                     # 32 bits per word. This is tied to TYPE_WORD.
@@ -72,6 +83,17 @@ WORD_SIZE_BYTES=WORD_SIZE//8                     # 4 bytes per word.
 HEADER_VDIF_WORDS=8                              # 8 words (VDIF header).
 HEADER_BYTES=WORD_SIZE_BYTES*HEADER_VDIF_WORDS   # 32 bytes (VDIF header).
 
+# Constants for frame index (see get_vdif_index())
+INDEX_SUFFIX=".cxidx"                            # Index file: media file name, key and this suffix.
+INDEX_FOLDER="correlx_vdif_index"                # Folder for the index files in the temporary folder (VDIF_INDEX_DIR="").
+INDEX_DTYPE=np.dtype([('offset',np.int64),\
+                      ('seconds',np.int64),\
+                      ('frame_num',np.int32),\
+                      ('thread_id',np.int32),\
+                      ('invalid',np.uint8),\
+                      ('bits_per_sample',np.uint8),\
+                      ('frame_length',np.int32)])   # One row per frame.
+
 # Constants for bitarray implementation (used in frame writer)
 ENDIAN_STRUCT_READING = ">I"                     # Struct endian.
 ENDIAN_STRUCT = ">I"                             # < for little endian, > for big endian, I for unsigned int (4 bytes).
@@ -347,8 +369,27 @@ def read_samples_from_raw(words,bits_per_sample,word_size=32):
     |
     | **Limitations:**
     |  bits per sample should be a divisor of word_size.
+    |
+    | **Procedure:**
+    |
+    |  For 32-bit words the bytes of the words are unpacked directly with a lookup table (see lib_quant.unpack_samples_lut()),
+    |   otherwise see read_samples_from_raw_shift(). In both cases the samples are the quantized values as np.uint32.
     """
+    if word_size==32 and (word_size%bits_per_sample)==0:
+        words_bytes = np.ascontiguousarray(words,dtype='<u4').view(np.uint8)
+        return(lib_quant.unpack_samples_lut(words_bytes,bits_per_sample,msb_first=0,dtype=np.uint32))
+    else:
+        return(read_samples_from_raw_shift(words,bits_per_sample,word_size))
+
+
+def read_samples_from_raw_shift(words,bits_per_sample,word_size=32):
+    """
+    Extract samples from unit32 words into numpy array of integers, extracting each group of bits with shifts and masks.
     
+    Parameters
+    ----------
+     See read_samples_from_raw().
+    """
     range_offsets = compute_range(word_size,bits_per_sample)
     mask_bits = (1<<bits_per_sample)-1
     words_extended = [((words)>>i) & (mask_bits) for i in range_offsets]
@@ -596,6 +637,912 @@ def reshape_samples(allsamples,data_type,samples_in_frame,num_channels):
 
 
 
+# Batched reader  --------------------------
+
+def get_vdif_frame_dtype(frame_length):
+    """
+    Structured numpy dtype for a VDIF frame (header words plus payload words).
+    
+    Parameters
+    ----------
+     frame_length : int
+         number of bytes per frame (including header).
+    
+    Returns
+    -------
+     frame_dtype : numpy dtype with fields "header" (HEADER_VDIF_WORDS words) and "payload" (rest of the words).
+    """
+    n_words_samples = (frame_length-HEADER_BYTES)//(WORD_SIZE_BYTES)
+    frame_dtype = np.dtype([('header',TYPE_WORD,(HEADER_VDIF_WORDS,)),\
+                            ('payload',TYPE_WORD,(n_words_samples,)),\
+                            ('tail',np.uint8,(frame_length-HEADER_BYTES-n_words_samples*WORD_SIZE_BYTES,))])
+    return(frame_dtype)
+
+
+def decode_headers_vdif_batch(headers):
+    """
+    Decode the fields of multiple VDIF headers at once.
+    
+    Parameters
+    ----------
+     headers : 2D numpy array of np.uint32
+         one row per frame, with (at least) the first four words of each VDIF header.
+    
+    Returns
+    -------
+     fields : list of 1D numpy arrays of np.int64
+         one array per field, with the same order as the output of read_header_vdif_from_raw().
+    
+    Notes
+    -----
+    |
+    | **Procedure:**
+    |
+    |  Fields are extracted with masks for all frames at once. The conversion of the VDIF epoch into MJD is done
+    |  only once per different epoch in the batch (typically only one).
+    """
+    words = headers[:,:4].astype(np.int64)
+    # Word 0
+    invalid =            words[:,0] >> 31
+    legacy =            (words[:,0] >> 30) & MASK_1
+    tot_seconds =        words[:,0]        & MASK_30
+    # Word 1
+    epoch_six =         (words[:,1] >> 24) & MASK_6
+    frame_num =          words[:,1]        & MASK_24
+    # Word 2
+    vdif_version =      (words[:,2] >> 29) & MASK_3
+    log_2_channels =    (words[:,2] >> 24) & MASK_5
+    frame_length =   8*( words[:,2]        & MASK_24)
+    # Word 3
+    data_type =          words[:,3] >> 31
+    bits_per_sample =  ((words[:,3] >> 26) & MASK_5)+1
+    thread_id =         (words[:,3] >> 16) & MASK_10
+    station_id =         words[:,3]        & MASK_16
+    
+    # Adjust epoch and seconds according to VDIF standard (see vdif_epoch_seconds_to_epoch_seconds_datetime())
+    seconds_fr = tot_seconds%SECONDS_DAY
+    ref_epoch = tot_seconds//SECONDS_DAY
+    for epoch_i in np.unique(epoch_six):
+        [epoch_base,unused_seconds]=vdif_epoch_seconds_to_epoch_seconds_datetime(int(epoch_i),0)
+        ref_epoch[epoch_six==epoch_i]+=epoch_base
+    
+    fields = [seconds_fr,invalid,legacy,ref_epoch,frame_num,vdif_version,log_2_channels,\
+              frame_length,data_type,bits_per_sample,thread_id,station_id]
+    return(fields)
+
+
+def map_input_vdif(f):
+    """
+    Memory-map the input if it is a regular file.
+    
+    Parameters
+    ----------
+     f : file handler
+         input file handler (typically sys.stdin).
+    
+    Returns
+    -------
+     data : 1D numpy array of np.uint8
+         read-only view of the file from its current position, None if the input cannot be mapped (e.g. pipe).
+    
+    Notes
+    -----
+    |
+    | The file position is moved to the end of the file, so that any later read (e.g. msvf.py reading the rest of
+    |  the input before exiting) returns immediately.
+    """
+    data = None
+    try:
+        f_bin = getattr(f,'buffer',f)
+        file_desc = f_bin.fileno()
+        file_stat = os.fstat(file_desc)
+        if stat.S_ISREG(file_stat.st_mode):
+            offset = f_bin.tell()
+            if file_stat.st_size>offset:
+                mapped_file = mmap.mmap(file_desc,0,access=mmap.ACCESS_READ)
+                data = np.frombuffer(mapped_file,dtype=np.uint8)[offset:]
+                f_bin.seek(0,os.SEEK_END)
+    except (AttributeError,IOError,OSError,ValueError):
+        data = None
+    return(data)
+
+
+def fill_buffer_vdif(f_bin,buf,n_valid,pos,n_bytes):
+    """
+    Move the unread bytes to the beginning of the buffer and read from the input until there are n_bytes available.
+    
+    Parameters
+    ----------
+     f_bin : file handler
+         binary input (sys.stdin or sys.stdin.buffer).
+     buf : bytearray
+         reusable buffer (a new one is allocated only if n_bytes does not fit).
+     n_valid : int
+         number of valid bytes in buf.
+     pos : int
+         position of the first unread byte in buf.
+     n_bytes : int
+         minimum number of bytes requested.
+    
+    Returns
+    -------
+     buf : bytearray
+         buffer with the unread bytes starting at position 0.
+     n_valid : int
+         number of valid bytes in buf.
+     eof : int
+         1 if the end of the input was reached.
+    """
+    n_rem = n_valid-pos
+    if len(buf)<n_bytes:
+        buf_new = bytearray(n_bytes)
+        buf_new[:n_rem] = buf[pos:n_valid]
+        buf = buf_new
+    elif pos>0 and n_rem>0:
+        buf[:n_rem] = buf[pos:n_valid]
+    n_valid = n_rem
+    eof = 0
+    view_buf = memoryview(buf)
+    while n_valid<n_bytes:
+        n_read = f_bin.readinto(view_buf[n_valid:])
+        if not n_read:
+            eof = 1
+            break
+        n_valid += n_read
+    view_buf = None
+    return([buf,n_valid,eof])
+
+
+def drain_input(f,block_size=1<<24):
+    """
+    Read (and discard) the rest of the input, in blocks of block_size bytes.
+    
+    Notes
+    -----
+    |
+    | This must be done to avoid "cat: write error: Broken pipe" when the input is a pipe. The file position is moved to
+    |  the end of the file if the input is seekable.
+    """
+    f_bin = getattr(f,'buffer',f)
+    try:
+        f_bin.seek(0,os.SEEK_END)
+    except (AttributeError,IOError,OSError,ValueError):
+        while f_bin.read(block_size):
+            pass
+
+
+def get_header_seconds_from_raw(data,offset):
+    """
+    Get seconds (of the day, as in read_header_vdif_from_raw()) and frame length from the header at the offset.
+    """
+    words = np.frombuffer(data,dtype=TYPE_WORD,count=4,offset=offset).reshape((1,4))
+    fields = decode_headers_vdif_batch(words)
+    return([int(fields[0][0]),int(fields[7][0])])
+
+
+def find_vdif_frame_seconds(data,pos,n_frames,frame_length,seconds,side='left',check_length=1):
+    """
+    Bisection on the headers of memory-mapped frames with fixed length to find the first frame with seconds >= seconds
+     (side='left') or > seconds (side='right').
+    
+    Parameters
+    ----------
+     data : 1D numpy array of np.uint8
+         memory-mapped input (see map_input_vdif()).
+     pos : int
+         offset of the first frame.
+     n_frames : int
+         number of frames.
+     frame_length : int
+         number of bytes per frame.
+     seconds : int
+         seconds (of the day).
+     side : str
+         'left' or 'right'.
+     check_length : int
+         if 1 check that the frame length in the headers is frame_length.
+    
+    Returns
+    -------
+     i_frame : int
+         frame index (n_frames if not found), -1 if a frame with a different length is found.
+    
+    Notes
+    -----
+    |
+    | Frames are assumed to be sorted in time.
+    """
+    lo = 0
+    hi = n_frames
+    while lo<hi:
+        mid = (lo+hi)//2
+        [seconds_mid,frame_length_mid] = get_header_seconds_from_raw(data,pos+mid*frame_length)
+        if check_length and frame_length_mid!=frame_length:
+            return(-1)
+        if (seconds_mid<seconds) or (side=='right' and seconds_mid==seconds):
+            lo = mid+1
+        else:
+            hi = mid
+    return(lo)
+
+
+def seek_vdif_window(data,pos,n_valid,forced_frame_length,window):
+    """
+    Restrict memory-mapped input to the frames inside a time window.
+    
+    Parameters
+    ----------
+     data : 1D numpy array of np.uint8
+         memory-mapped input (see map_input_vdif()).
+     pos : int
+         offset of the first frame.
+     n_valid : int
+         number of bytes in data.
+     forced_frame_length : int
+         see iter_vdif_frames().
+     window : list
+         see iter_vdif_frames().
+    
+    Returns
+    -------
+     pos : int
+         offset of the first frame with seconds >= window[0].
+     n_valid : int
+         offset after the last frame with seconds <= window[1].
+    
+    Notes
+    -----
+    |
+    | The input is not modified if the frame length is not constant in the frames checked during bisection, or if the
+    |  seconds of the last frame are lower than those in the first frame (e.g. change of day).
+    """
+    [seconds_start,seconds_end] = window[:2]
+    if n_valid-pos<HEADER_BYTES:
+        return([pos,n_valid])
+    [seconds_first,frame_length] = get_header_seconds_from_raw(data,pos)
+    check_length = 1
+    if forced_frame_length>0:
+        frame_length = forced_frame_length
+        check_length = 0
+    if frame_length<HEADER_BYTES+WORD_SIZE_BYTES:
+        return([pos,n_valid])
+    n_frames = (n_valid-pos)//frame_length
+    if n_frames<2:
+        return([pos,n_valid])
+    [seconds_last,frame_length_last] = get_header_seconds_from_raw(data,pos+(n_frames-1)*frame_length)
+    if (seconds_last<seconds_first) or (check_length and frame_length_last!=frame_length):
+        return([pos,n_valid])
+    first_frame = find_vdif_frame_seconds(data,pos,n_frames,frame_length,seconds_start,'left',check_length)
+    last_frame = find_vdif_frame_seconds(data,pos,n_frames,frame_length,seconds_end,'right',check_length)
+    if first_frame<0 or last_frame<0:
+        return([pos,n_valid])
+    if last_frame<n_frames:
+        n_valid = pos+last_frame*frame_length
+    pos = min(n_valid,pos+first_frame*frame_length)
+    return([pos,n_valid])
+
+
+def get_window_mask(fields,window):
+    """
+    Get mask for the frames inside the time window and frame number range (see iter_vdif_frames()).
+    
+    Parameters
+    ----------
+     fields : list of 1D numpy arrays
+         decoded headers (see decode_headers_vdif_batch()).
+     window : list
+         see iter_vdif_frames().
+    
+    Returns
+    -------
+     inside : 1D numpy array of bool
+         True for the frames to be returned.
+     after_end : int
+         index of the first frame after the end of the time window, -1 if none.
+    """
+    [seconds_start,seconds_end,first_frame_num,last_frame_num] = window
+    seconds = fields[0]
+    frame_num = fields[4]
+    inside = (seconds>=seconds_start)&(seconds<=seconds_end)
+    if first_frame_num>=0 and last_frame_num>=0:
+        inside &= (frame_num>=first_frame_num)&(frame_num<last_frame_num)
+    after = np.nonzero(seconds>seconds_end)[0]
+    if len(after)>0:
+        after_end = int(after[0])
+    else:
+        after_end = -1
+    return([inside,after_end])
+
+
+def iter_vdif_frames(f,frames_per_batch=MAPPER_FRAMES_PER_BATCH,show_errors=0,forced_frame_length=0,v=0,window=None):
+    """
+    Batched reader for VDIF frames. Equivalent to calling read_vdif_frame() until the end of the input.
+    
+    Parameters
+    ----------
+     f : file handler
+         input file handler (typically sys.stdin).
+     frames_per_batch : int
+         number of frames whose headers are decoded at once.
+     show_errors : int
+         [0 by default] display information on errors if 1.
+     forced_frame_length : int
+         [0 by default] number of bytes to read including header, if 0 will take value from header (recommended).
+     v : int
+         [0 by default] verbosed mode if 1.
+     window : list
+         [None by default] [seconds_start,seconds_end,first_frame_num,last_frame_num] to return only the frames with
+          seconds (of the day, from the header) in [seconds_start,seconds_end] and frame number in 
+          [first_frame_num,last_frame_num) (-1 for no limits on frame number). None to return all frames.
+    
+    Returns
+    -------
+     (generator) [header,samples,check_size_samples] for each frame, see read_vdif_frame().
+    
+    Notes
+    -----
+    |
+    | **Procedure:**
+    |
+    |  1. If the input is a regular file it is memory-mapped, otherwise it is read in blocks of frames_per_batch frames
+    |      into a buffer that is reused for the whole input.
+    |  2. The frame length is taken from the first header in the batch, and the batch is viewed as an array of frames
+    |      (see get_vdif_frame_dtype()) with no copies.
+    |  3. The headers of all the frames are decoded at once (decode_headers_vdif_batch()). If the frame length changes
+    |      inside the batch, the batch is cut at that frame.
+    |  4. Samples are extracted frame by frame from the payload views (read_samples_from_raw()).
+    |
+    | **Time window:**
+    |
+    |  -If the input is memory-mapped, the first and last frames in the window are found by bisection on the headers
+    |    (seek_vdif_window()), so frames outside the window are not read at all.
+    |  -Otherwise (e.g. pipe), frames outside the window are dismissed after decoding their headers, without
+    |    extracting their samples. Reading stops at the first frame after the end of the window, and the rest of the
+    |    input is discarded (drain_input()).
+    |  -Frames are assumed to be sorted in time.
+    |
+    | **Configuration:**
+    |
+    |  MAPPER_FRAMES_PER_BATCH (const_performance.py), default for frames_per_batch.
+    """
+    frames_per_batch = max(1,frames_per_batch)
+    data = map_input_vdif(f)
+    if data is None:
+        f_bin = getattr(f,'buffer',f)
+        buf = bytearray(0)
+        n_valid = 0
+        eof = 0
+    else:
+        f_bin = None
+        buf = data
+        n_valid = len(data)
+        eof = 1
+    pos = 0
+    if (data is not None) and (window is not None):
+        [pos,n_valid] = seek_vdif_window(data,pos,n_valid,forced_frame_length,window)
+    
+    while 1:
+        
+        if (n_valid-pos<HEADER_BYTES) and not(eof):
+            [buf,n_valid,eof] = fill_buffer_vdif(f_bin,buf,n_valid,pos,max(len(buf),HEADER_BYTES))
+            pos = 0
+        if n_valid-pos<HEADER_BYTES:
+            if show_errors:
+                print("z-"  + "-Failed to read samples")
+            break
+        
+        # Frame length from first header in the batch
+        if forced_frame_length>0:
+            frame_length = forced_frame_length
+        else:
+            frame_length = 8*(int(np.frombuffer(buf,dtype=TYPE_WORD,count=1,offset=pos+2*WORD_SIZE_BYTES)[0]) & MASK_24)
+        if frame_length<HEADER_BYTES+WORD_SIZE_BYTES:
+            if show_errors:
+                print("z-"  + "-Failed to read samples")
+            break
+        
+        n_frames = min(frames_per_batch,(n_valid-pos)//frame_length)
+        if (n_frames<frames_per_batch) and not(eof):
+            [buf,n_valid,eof] = fill_buffer_vdif(f_bin,buf,n_valid,pos,frames_per_batch*frame_length)
+            pos = 0
+            n_frames = min(frames_per_batch,n_valid//frame_length)
+        
+        if n_frames==0:
+            # Last incomplete frame: same behavior as read_vdif_frame()
+            n_words = (n_valid-pos-HEADER_BYTES)//WORD_SIZE_BYTES
+            if n_words==0:
+                if show_errors:
+                    print("z-"  + "-Failed to read samples")
+                break
+            words = np.frombuffer(buf,dtype=TYPE_WORD,count=HEADER_VDIF_WORDS+n_words,offset=pos)
+            header = read_header_vdif_from_raw(words[:HEADER_VDIF_WORDS])
+            bits_per_sample = header[9]
+            samples = read_samples_from_raw(words=words[HEADER_VDIF_WORDS:],bits_per_sample=bits_per_sample,word_size=WORD_SIZE)
+            check_size_samples = int(int((len(samples)*bits_per_sample)//8) >= (frame_length-HEADER_BYTES))
+            yield([header,samples,check_size_samples])
+            break
+        
+        frames = np.frombuffer(buf,dtype=get_vdif_frame_dtype(frame_length),count=n_frames,offset=pos)
+        fields = decode_headers_vdif_batch(frames['header'])
+        
+        # Cut batch if different frame length
+        if forced_frame_length<=0:
+            different = np.nonzero(fields[7]!=frame_length)[0]
+            if len(different)>0:
+                n_frames = max(1,int(different[0]))
+                fields = [field[:n_frames] for field in fields]
+        
+        # Dismiss frames outside time window
+        after_end = -1
+        if window is not None:
+            [inside,after_end] = get_window_mask(fields,window)
+            if after_end>=0:
+                n_frames = after_end
+            v_frames = np.nonzero(inside[:n_frames])[0].tolist()
+        else:
+            v_frames = range(n_frames)
+        
+        headers = [list(i) for i in zip(*[field.tolist() for field in fields])]
+        payloads = frames['payload']
+        for i in v_frames:
+            header = headers[i]
+            if v==1:
+                [seconds_fr,invalid,legacy,ref_epoch,frame_num,vdif_version,log_2_channels,\
+                                 frame_length_h,data_type,bits_per_sample,thread_id,station_id] = header
+                print_header_vdif(seconds_fr, invalid, legacy,ref_epoch, frame_num,vdif_version, log_2_channels,\
+                                 frame_length_h,data_type, bits_per_sample, thread_id, station_id)
+            bits_per_sample = header[9]
+            samples = read_samples_from_raw(words=payloads[i],bits_per_sample=bits_per_sample,word_size=WORD_SIZE)
+            check_size_samples = int(int((len(samples)*bits_per_sample)//8) >= (frame_length-HEADER_BYTES))
+            yield([header,samples,check_size_samples])
+        
+        frames = None
+        payloads = None
+        pos += n_frames*frame_length
+        
+        if after_end>=0:
+            if f_bin is not None:
+                drain_input(f_bin)
+            break
+
+
+
+# Frame index  --------------------------
+
+def get_vdif_index_filename(filename,index_dir=VDIF_INDEX_DIR):
+    """
+    Get path for the index file associated to a VDIF file.
+    
+    Parameters
+    ----------
+     filename : str
+         path to VDIF file.
+     index_dir : str
+         [VDIF_INDEX_DIR by default] folder for the index files, "" for INDEX_FOLDER in the temporary folder.
+    
+    Returns
+    -------
+     file_index : str
+         path to the index file, named after the VDIF file with a key for its absolute path, size and
+          modification time (a new index is built if the file changes).
+    """
+    if index_dir=="":
+        index_dir = os.path.join(tempfile.gettempdir(),INDEX_FOLDER)
+    file_stat = os.stat(filename)
+    file_key = os.path.abspath(filename)+"|"+str(file_stat.st_size)+"|"+str(int(file_stat.st_mtime))
+    file_key = hashlib.sha1(file_key.encode("utf-8")).hexdigest()[:16]
+    return(os.path.join(index_dir,os.path.basename(filename)+"_"+file_key+INDEX_SUFFIX))
+
+
+def build_vdif_index(filename,forced_frame_length=0,frames_per_batch=max(1,MAPPER_FRAMES_PER_BATCH)*64):
+    """
+    Scan all the headers of a VDIF file and create its frame index.
+    
+    Parameters
+    ----------
+     filename : str
+         path to VDIF file.
+     forced_frame_length : int
+         [0 by default] number of bytes per frame including header, if 0 will take value from header (recommended).
+     frames_per_batch : int
+         number of headers decoded at once.
+    
+    Returns
+    -------
+     index : 1D numpy array of INDEX_DTYPE
+         one row per frame with its byte offset in the file, seconds, frame number, thread id, invalid flag,
+          bits per sample and frame length.
+    
+    Notes
+    -----
+    |
+    | **Procedure:**
+    |
+    |  The file is memory-mapped and viewed as an array of frames of the length found in the first header of every
+    |   batch (same as iter_vdif_frames()), so only the headers are decoded (decode_headers_vdif_batch()) and the
+    |   payload is not read. The offset of the last frame plus its frame length may be beyond the end of the file
+    |   if the last frame is incomplete.
+    """
+    file_size = os.path.getsize(filename)
+    index_list = []
+    if file_size>=HEADER_BYTES:
+        with open(filename,'rb') as f_read:
+            mapped_file = mmap.mmap(f_read.fileno(),0,access=mmap.ACCESS_READ)
+            data = np.frombuffer(mapped_file,dtype=np.uint8)
+            pos = 0
+            while file_size-pos>=HEADER_BYTES:
+                if forced_frame_length>0:
+                    frame_length = forced_frame_length
+                else:
+                    frame_length = 8*(int(np.frombuffer(data,dtype=TYPE_WORD,count=1,offset=pos+2*WORD_SIZE_BYTES)[0]) & MASK_24)
+                if frame_length<HEADER_BYTES+WORD_SIZE_BYTES:
+                    break
+                n_frames = min(frames_per_batch,(file_size-pos)//frame_length)
+                if n_frames==0:
+                    # Last incomplete frame (also returned by read_vdif_frame())
+                    headers = np.frombuffer(data,dtype=TYPE_WORD,count=HEADER_VDIF_WORDS,offset=pos).reshape((1,HEADER_VDIF_WORDS))
+                    n_frames = 1
+                else:
+                    headers = np.frombuffer(data,dtype=get_vdif_frame_dtype(frame_length),count=n_frames,offset=pos)['header']
+                fields = decode_headers_vdif_batch(headers)
+                headers = None
+                
+                # Cut batch if different frame length
+                if forced_frame_length<=0:
+                    different = np.nonzero(fields[7]!=frame_length)[0]
+                    if len(different)>0:
+                        n_frames = max(1,int(different[0]))
+                        fields = [field[:n_frames] for field in fields]
+                
+                index_batch = np.zeros(n_frames,dtype=INDEX_DTYPE)
+                index_batch['offset'] = pos+frame_length*np.arange(n_frames,dtype=np.int64)
+                index_batch['seconds'] = fields[0]
+                index_batch['frame_num'] = fields[4]
+                index_batch['thread_id'] = fields[10]
+                index_batch['invalid'] = fields[1]
+                index_batch['bits_per_sample'] = fields[9]
+                index_batch['frame_length'] = frame_length
+                index_list.append(index_batch)
+                pos = min(file_size,pos+n_frames*frame_length)
+            data = None
+            mapped_file.close()
+    if index_list==[]:
+        index = np.zeros(0,dtype=INDEX_DTYPE)
+    else:
+        index = np.concatenate(index_list)
+    return(index)
+
+
+def write_vdif_index(filename,index):
+    """
+    Write frame index into its index file (see get_vdif_index_filename()).
+    
+    Parameters
+    ----------
+     filename : str
+         path to VDIF file.
+     index : 1D numpy array of INDEX_DTYPE
+         frame index (see build_vdif_index()).
+    
+    Returns
+    -------
+     success : int
+         1 if the index was written, 0 otherwise (e.g. read-only index folder).
+    
+    Notes
+    -----
+    |
+    | The size and modification time of the VDIF file are stored with the index, so that it is rebuilt if the file
+    |  changes (see load_vdif_index()).
+    """
+    file_stat = os.stat(filename)
+    file_index = get_vdif_index_filename(filename)
+    try:
+        if not(os.path.isdir(os.path.dirname(file_index))):
+            os.makedirs(os.path.dirname(file_index))
+        with open(file_index,'wb') as f_index:
+            np.savez(f_index,index=index,file_info=np.array([file_stat.st_size,int(file_stat.st_mtime)],dtype=np.int64))
+        success = 1
+    except (IOError,OSError):
+        success = 0
+    return(success)
+
+
+def load_vdif_index(filename):
+    """
+    Read frame index from its index file (see get_vdif_index_filename()).
+    
+    Parameters
+    ----------
+     filename : str
+         path to VDIF file.
+    
+    Returns
+    -------
+     index : 1D numpy array of INDEX_DTYPE
+         frame index (see build_vdif_index()), None if there is no index file or if it does not correspond
+          to the current VDIF file.
+    """
+    index = None
+    file_index = get_vdif_index_filename(filename)
+    if os.path.isfile(file_index):
+        file_stat = os.stat(filename)
+        try:
+            with open(file_index,'rb') as f_index:
+                data = np.load(f_index)
+                file_info = data['file_info'].tolist()
+                if file_info==[file_stat.st_size,int(file_stat.st_mtime)]:
+                    index = data['index']
+        except (IOError,OSError,ValueError,KeyError):
+            index = None
+    return(index)
+
+
+def get_vdif_index(filename,forced_frame_length=0,write_index=1):
+    """
+    Get frame index for a VDIF file, from its index file if available and up to date, otherwise scanning the file.
+    
+    Parameters
+    ----------
+     filename : str
+         path to VDIF file.
+     forced_frame_length : int
+         [0 by default] see build_vdif_index().
+     write_index : int
+         [1 by default] if 1 store the index into the index file after scanning the file (see get_vdif_index_filename()).
+    
+    Returns
+    -------
+     index : 1D numpy array of INDEX_DTYPE
+         frame index (see build_vdif_index()).
+    """
+    index = load_vdif_index(filename)
+    if index is None:
+        index = build_vdif_index(filename,forced_frame_length)
+        if write_index:
+            write_vdif_index(filename,index)
+    return(index)
+
+
+def get_vdif_index_frames_per_second(index):
+    """
+    Get number of frames per second per thread, from the frames where the frame number is reset (new second).
+    
+    Returns
+    -------
+     frames_per_second : int
+         frame number of the last frame before a new second plus one (maximum for all threads), 0 if unknown
+          (no frame is followed by frame 0 in the next second, e.g. files with less than one second of data).
+    
+    Notes
+    -----
+    |
+    | The maximum frame number in the file is not used, as it is only the number of frames per second if the file 
+    |  contains a complete second.
+    """
+    frames_per_second = 0
+    for thread_id in np.unique(index['thread_id']).tolist():
+        index_thread = index[index['thread_id']==thread_id]
+        new_second = np.nonzero((np.diff(index_thread['seconds'])==1)&(index_thread['frame_num'][1:]==0))[0]
+        if len(new_second)>0:
+            frames_per_second = max(frames_per_second,int(np.max(index_thread['frame_num'][new_second]))+1)
+    return(frames_per_second)
+
+
+def get_vdif_index_stats(index):
+    """
+    Get number of frames and samples from the frame index.
+    
+    Parameters
+    ----------
+     index : 1D numpy array of INDEX_DTYPE
+         frame index (see build_vdif_index()).
+    
+    Returns
+    -------
+     num_frames : int
+         number of frames.
+     num_samples : int
+         number of samples (all channels) in the payload of all valid frames.
+     frames_per_second : int
+         number of frames per second per thread, 0 if unknown (see get_vdif_index_frames_per_second()).
+     v_threads : list of int
+         thread ids.
+    """
+    valid = index['invalid']==0
+    payload_bits = 8*(index['frame_length'][valid].astype(np.int64)-HEADER_BYTES)
+    num_samples = int(np.sum(payload_bits//index['bits_per_sample'][valid]))
+    v_threads = np.unique(index['thread_id']).tolist()
+    return([len(index),num_samples,get_vdif_index_frames_per_second(index),v_threads])
+
+
+def get_vdif_index_times(index,frames_per_second=-1):
+    """
+    Get time for every frame in the index.
+    
+    Parameters
+    ----------
+     index : 1D numpy array of INDEX_DTYPE
+         frame index (see build_vdif_index()).
+     frames_per_second : int
+         [-1 by default] number of frames per second per thread, if -1 it is computed from the index.
+    
+    Returns
+    -------
+     frame_times : 1D numpy array of float
+         seconds (same reference as the VDIF header) plus fraction of second for every frame, None if the number
+          of frames per second is unknown (see get_vdif_index_frames_per_second()).
+    """
+    if frames_per_second<=0:
+        frames_per_second = get_vdif_index_frames_per_second(index)
+        if frames_per_second<=0:
+            return(None)
+    frame_times = index['seconds']+index['frame_num']/float(frames_per_second)
+    return(frame_times)
+
+
+def get_vdif_index_range(index,seconds_start,seconds_end=-1,frames_per_second=-1):
+    """
+    Get byte range for the frames within a time interval.
+    
+    Parameters
+    ----------
+     index : 1D numpy array of INDEX_DTYPE
+         frame index (see build_vdif_index()).
+     seconds_start : float
+         start of the interval (same reference as the VDIF header).
+     seconds_end : float
+         [-1 by default] end of the interval (not included), if <0 until the end of the file.
+     frames_per_second : int
+         [-1 by default] see get_vdif_index_times().
+    
+    Returns
+    -------
+     offset_start : int
+         byte offset of the first frame with time >= seconds_start.
+     offset_end : int
+         byte offset after the last frame with time < seconds_end.
+         
+         ([-1,-1] if the number of frames per second is unknown, see get_vdif_index_times()).
+    
+    Notes
+    -----
+    |
+    | Frames are assumed to be sorted in time (threads may be interleaved).
+    """
+    if len(index)==0:
+        return([0,0])
+    frame_times = get_vdif_index_times(index,frames_per_second)
+    if frame_times is None:
+        return([-1,-1])
+    first_frame = int(np.searchsorted(frame_times,seconds_start,side='left'))
+    if seconds_end<0:
+        last_frame = len(index)
+    else:
+        last_frame = int(np.searchsorted(frame_times,seconds_end,side='left'))
+    last_frame = max(first_frame,last_frame)
+    if first_frame>=len(index):
+        offset_start = int(index['offset'][-1]+index['frame_length'][-1])
+    else:
+        offset_start = int(index['offset'][first_frame])
+    if last_frame>=len(index):
+        offset_end = int(index['offset'][-1]+index['frame_length'][-1])
+    else:
+        offset_end = int(index['offset'][last_frame])
+    return([offset_start,offset_end])
+
+
+def seek_vdif_index(f,index,seconds_start,frames_per_second=-1):
+    """
+    Move file position to the first frame with time >= seconds_start (see get_vdif_index_range()).
+    
+    Returns
+    -------
+     offset_start : int
+         new file position, -1 if the number of frames per second is unknown (the position is not changed).
+    """
+    [offset_start,offset_end] = get_vdif_index_range(index,seconds_start,-1,frames_per_second)
+    if offset_start>=0:
+        f.seek(offset_start)
+    return(offset_start)
+
+
+def get_vdif_index_splits(index,frames_per_split,accumulation_time=-1,seconds_ref=-1,frames_per_second=-1):
+    """
+    Get byte ranges for splitting a VDIF file, with the boundaries at the beginning of accumulation periods.
+    
+    Parameters
+    ----------
+     index : 1D numpy array of INDEX_DTYPE
+         frame index (see build_vdif_index()).
+     frames_per_split : int
+         target number of frames per split.
+     accumulation_time : float
+         [-1 by default] accumulation period in seconds, if <=0 splits have frames_per_split frames.
+     seconds_ref : float
+         [-1 by default] start of the first accumulation period, if <0 the time of the first frame is used.
+     frames_per_second : int
+         [-1 by default] see get_vdif_index_times().
+    
+    Returns
+    -------
+     splits : list of [offset,num_bytes]
+         byte offset and size of each split, None if accumulation_time>0 and the number of frames per second is
+          unknown (see get_vdif_index_times()).
+    
+    Notes
+    -----
+    |
+    | **Procedure:**
+    |
+    |  Candidate boundaries are the frames where a new accumulation period starts. Each split ends at the last candidate
+    |   boundary within frames_per_split frames, or at the next one if there is none (the split is then longer
+    |   than frames_per_split frames, as accumulation periods are never split).
+    """
+    num_frames = len(index)
+    if num_frames==0:
+        return([])
+    frames_per_split = max(1,frames_per_split)
+    if accumulation_time>0:
+        frame_times = get_vdif_index_times(index,frames_per_second)
+        if frame_times is None:
+            return(None)
+        if seconds_ref<0:
+            seconds_ref = frame_times[0]
+        acc_ids = np.floor((frame_times-seconds_ref)/accumulation_time).astype(np.int64)
+        acc_ids = np.maximum.accumulate(acc_ids)
+        boundaries = np.concatenate(([0],np.nonzero(np.diff(acc_ids))[0]+1,[num_frames]))
+    else:
+        boundaries = np.arange(0,num_frames+frames_per_split,frames_per_split)
+        boundaries[-1] = num_frames
+        boundaries = np.unique(boundaries)
+    
+    file_end = int(index['offset'][-1]+index['frame_length'][-1])
+    splits = []
+    first_frame = 0
+    while first_frame<num_frames:
+        i_boundary = int(np.searchsorted(boundaries,first_frame+frames_per_split,side='right'))-1
+        if boundaries[i_boundary]<=first_frame:
+            i_boundary = int(np.searchsorted(boundaries,first_frame,side='right'))
+        last_frame = int(boundaries[i_boundary])
+        offset_start = int(index['offset'][first_frame])
+        if last_frame>=num_frames:
+            offset_end = file_end
+        else:
+            offset_end = int(index['offset'][last_frame])
+        splits.append([offset_start,offset_end-offset_start])
+        first_frame = last_frame
+    return(splits)
+
+
+def write_vdif_split(filename,offset,num_bytes,file_out,block_size=1<<24):
+    """
+    Copy a byte range of a VDIF file into a new file.
+    
+    Parameters
+    ----------
+     filename : str
+         path to VDIF file.
+     offset : int
+         first byte.
+     num_bytes : int
+         number of bytes.
+     file_out : str
+         path to output file.
+     block_size : int
+         maximum number of bytes read at once.
+    """
+    with open(filename,'rb') as f_read:
+        with open(file_out,'wb') as f_write:
+            f_read.seek(offset)
+            while num_bytes>0:
+                data = f_read.read(min(block_size,num_bytes))
+                if not data:
+                    break
+                f_write.write(data)
+                num_bytes -= len(data)
+
+
 
 
 
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+# <nbformat>3.0</nbformat>
+
+# <codecell>
+
+#!/usr/bin/env python
+#
+#The MIT CorrelX Correlator
+#
+#https://github.com/MITHaystack/CorrelX
+#Contact: correlX@haystack.mit.edu
+#Project leads: Victor Pankratius, Pedro Elosegui Project developer: A.J. Vazquez Alvarez
+#
+#Copyright 2017 MIT Haystack Observatory
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+#------------------------------
+#------------------------------
+#Project: CorrelX.
+#File: lib_workers.py.
+#Author: agent (agent@local)
+"""
+Worker pools for the reducer: threads for numpy/FFT computations (that release the GIL), and optionally processes
+ over shared memory.
+
+"""
+#History:
+#initial version: 2026.10 agent
+#MIT Haystack Observatory
+
+from __future__ import print_function,division
+import sys
+import multiprocessing
+import multiprocessing.pool
+import numpy as np
+import imp
+
+import const_performance
+imp.reload(const_performance)
+from const_performance import *
+
+try:
+    from multiprocessing import shared_memory     # Python>=3.8
+    from multiprocessing import resource_tracker
+except ImportError:
+    shared_memory = None
+    resource_tracker = None
+
+
+# Workers used by default (see set_workers()).
+workers_current = None
+
+
+###########################################
+#           Pools initialization
+########################################### 
+
+def init_workers(threads=-1,processes=-1):
+    """
+    Initialize worker pools for the lifetime of the reducer.
+    
+    Parameters
+    ----------
+     threads : int
+         number of threads, 0 for the number of cores of the node, if <0 the default value (REDUCER_THREADS) is used.
+     processes : int
+         number of processes (shared memory, Python>=3.8), 0 for none, if <0 the default value (REDUCER_PROCESSES)
+          is used.
+    
+    Returns
+    -------
+     workers : list
+         [threads,thread_pool,processes,process_pool], with the pools None if not used (1 thread, 0 processes).
+    
+    Notes
+    -----
+    |
+    | **Notes:**
+    |
+    |  Processes are created here (before allocating the reducer data structures) and kept until close_workers().
+    |  If shared memory is not available processes are not used.
+    |  The resource tracker is started before creating the processes, so that all of them share the tracker of this
+    |   process, and the blocks of shared memory are only unlinked by this process (see release_array()).
+    """
+    if threads<0:
+        threads=REDUCER_THREADS
+    if processes<0:
+        processes=REDUCER_PROCESSES
+    if threads==0:
+        threads=multiprocessing.cpu_count()
+    if processes>0 and shared_memory is None:
+        print("zR\tWarning: reducer processes require shared memory (Python>=3.8), using only threads")
+        processes=0
+    
+    thread_pool=None
+    process_pool=None
+    if threads>1:
+        thread_pool=multiprocessing.pool.ThreadPool(threads)
+    if processes>0:
+        if resource_tracker is not None and hasattr(resource_tracker,"ensure_running"):
+            resource_tracker.ensure_running()
+        process_pool=multiprocessing.Pool(processes)
+    workers=[threads,thread_pool,processes,process_pool]
+    return(workers)
+
+
+def close_workers(workers):
+    """
+    Terminate the pools of workers.
+    """
+    [threads,thread_pool,processes,process_pool]=workers
+    for pool in [thread_pool,process_pool]:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+def set_workers(workers):
+    """
+    Set workers to be used by default.
+    """
+    global workers_current
+    workers_current=workers
+
+
+def get_workers():
+    """
+    Get workers used by default (no pools if not set previously).
+    """
+    if workers_current is None:
+        set_workers(init_workers(1,0))
+    return(workers_current)
+
+
+
+
+###########################################
+#           Work distribution
+########################################### 
+
+def split_range(n,parts,min_size=1):
+    """
+    Split range(n) into (at most) parts slices with at least min_size elements each.
+    """
+    parts=max(1,min(parts,n//max(1,min_size)))
+    bounds=[(n*i)//parts for i in range(parts+1)]
+    return([np.s_[bounds[i]:bounds[i+1]] for i in range(parts)])
+
+
+def map_threads(function,args_list,workers=None):
+    """
+    Apply function to each element of args_list with the pool of threads (serial if there is no pool or only one 
+     element).
+    
+    Returns
+    -------
+     results : list
+         results of function for each element in args_list.
+    """
+    if workers is None:
+        workers=get_workers()
+    thread_pool=workers[1]
+    if thread_pool is None or len(args_list)<2:
+        return([function(args) for args in args_list])
+    return(thread_pool.map(function,args_list))
+
+
+def map_processes(function,args_list,workers=None):
+    """
+    Apply function to each element of args_list with the pool of processes (function has to be defined at module 
+     level, and arrays should be passed with share_array()).
+    """
+    if workers is None:
+        workers=get_workers()
+    return(workers[3].map(function,args_list))
+
+
+
+
+###########################################
+#           Shared memory
+########################################### 
+
+def share_array(array):
+    """
+    Copy array into a new block of shared memory.
+    
+    Returns
+    -------
+     shm : shared_memory.SharedMemory
+         block of shared memory (to be released with release_array()).
+     shared_array : numpy array
+         view of the block with the contents of array.
+     descriptor : list
+         [name,shape,dtype] to attach the block in other processes (see attach_array()).
+    """
+    shm=shared_memory.SharedMemory(create=True,size=max(1,array.nbytes))
+    shared_array=np.ndarray(array.shape,dtype=array.dtype,buffer=shm.buf)
+    shared_array[...]=array
+    return([shm,shared_array,[shm.name,array.shape,array.dtype.str]])
+
+
+def attach_array(descriptor):
+    """
+    Attach block of shared memory created with share_array().
+    
+    Returns
+    -------
+     shm : shared_memory.SharedMemory
+         block of shared memory (to be closed after use).
+     shared_array : numpy array
+         view of the block.
+    """
+    [name,shape,dtype]=descriptor
+    # The block is owned (and unlinked) by the process that created it, the resource tracker is shared with it
+    #  (see init_workers()), so the block is not unregistered here
+    if sys.version_info>=(3,13):
+        shm=shared_memory.SharedMemory(name=name,track=False)
+    else:
+        shm=shared_memory.SharedMemory(name=name)
+    shared_array=np.ndarray(shape,dtype=np.dtype(dtype),buffer=shm.buf)
+    return([shm,shared_array])
+
+
+def release_array(shm):
+    """
+    Close and free block of shared memory created with share_array().
+    """
+    shm.close()
+    shm.unlink()
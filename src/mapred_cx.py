@@ -95,6 +95,18 @@ import lib_net_stats
 imp.reload(lib_net_stats)
 from lib_net_stats import *
 
+import lib_hadoop_local
+imp.reload(lib_hadoop_local)
+from lib_hadoop_local import run_mapreduce_local
+
+import const_performance
+imp.reload(const_performance)
+from const_performance import HADOOP_LOCAL,HADOOP_LOCAL_SWEEP_PACKETS,HADOOP_LOCAL_SWEEP_REDUCERS
+
+import const_mapred
+imp.reload(const_mapred)
+from const_mapred import INTERMEDIATE_BINARY
+
 # Vector quantization                           # VQ disabled
 #import lib_vq
 #imp.reload(lib_vq)
@@ -111,7 +123,8 @@ def print_execution_times(exec_times,io_times,bypass_print=0,v=1,file_log=sys.st
     Parameters
     ----------
      exec_times : list of [str_id , num_slaves, num_vcores, hadoop_t_s,hadoop_t_e,hadoop_d] elements where:
-                     |   str_id:       string with identifier for this run ("pipeline" or "hadoop*").
+                     |   str_id:       string with identifier for this run ("pipeline" or "hadoop*"), stages of the
+                     |                  pipeline (see lib_pipeline.run_pipeline()) are indented.
                      |   num_slaves:   number of worker nodes (requested).
                      |   num_vcores:   number of virtual CPU cores per node.
                      |   hadoop_t_s:   timing start time in seconds.
@@ -333,7 +346,8 @@ if __name__ == '__main__':
                 INTERNAL_LOG_MAPPER,INTERNAL_LOG_REDUCER,ADJUST_MAPPERS,ADJUST_REDUCERS,FFTS_PER_CHUNK,TEXT_MODE,\
                 USE_NOHASH_PARTITIONER,USE_LUSTRE_PLUGIN,LUSTRE_USER_DIR,LUSTRE_PREFIX,ONE_BASELINE_PER_TASK,\
                 MIN_MAPPER_CHUNK,MAX_MAPPER_CHUNK,TASK_SCALING_STATIONS,SORT_OUTPUT,BM_AVOID_COPY,\
-                BM_DELETE_OUTPUT,TIMEOUT_STOP,SINGLE_PRECISION,PROFILE_MAP,PROFILE_RED] = \
+                BM_DELETE_OUTPUT,TIMEOUT_STOP,SINGLE_PRECISION,PROFILE_MAP,PROFILE_RED,\
+                FFT_ENGINE,FFT_THREADS,FFT_WISDOM_FILE,REDUCER_THREADS,REDUCER_PROCESSES,PIPELINE_REDUCERS] = \
                     get_configuration(v=v,config_file=config_file,timestamp_str=timestamp_str,file_log=FILE_LOG)
     
             # Check errors in experiment .ini files
@@ -410,17 +424,27 @@ if __name__ == '__main__':
                     print("")
                     for i in error_str_v:
                         print(i)
+                
+                elif RUN_HADOOP and INTERMEDIATE_BINARY:
+                    # Key-field partitioner and comparator (and no-hash partitioner) split the keys in text fields, 
+                    #  not valid for typed bytes keys (also for HADOOP_LOCAL, same partitioning as Hadoop)
+                    init_success=0
+                    print("ERROR: Binary intermediate format (INTERMEDIATE_BINARY) only supported in pipeline mode! Exiting...")
                         
                 
                 if init_success==1:
                     
+                    # Configuration snapshot for the mapper (avoids parsing the ini files in every task)
+                    INI_SNAPSHOT = CONF_DIR + INI_DELAYS.split("/")[-1] + C_INI_SNAPSHOT_SUFFIX
+                    write_config_snapshot(INI_SNAPSHOT,[INI_STATIONS,INI_MEDIA,INI_DELAYS])
+                    
                     # Pipeline mode
     
                     print_header(header="Pipeline execution",v=v,file_log=FILE_LOG)
                     if (is_master) and (RUN_PIPELINE):
                         # Pipeline application execution
                         pipeline_output_file=PREFIX_OUTPUT + "_s" + str(0) + "_v" + str(0) + ".out"
-                        [pipeline_t_s,pipeline_t_e,pipeline_d] = pipeline_app(python_x=PYTHON_X,\
+                        [pipeline_t_s,pipeline_t_e,pipeline_d,pipeline_stages] = pipeline_app(python_x=PYTHON_X,\
                                                                      stations=STATIONS,\
                                                                      input_files=INPUT_FILES,\
                                                                      app_dir=SRC_DIR,\
@@ -459,11 +483,20 @@ if __name__ == '__main__':
                                                                      single_precision=SINGLE_PRECISION,\
                                                                      profile_map=PROFILE_MAP,\
                                                                      profile_red=PROFILE_RED,\
-                                                                     timestamp_str=timestamp_str)
+                                                                     timestamp_str=timestamp_str,\
+                                                                     ini_snapshot=INI_SNAPSHOT,\
+                                                                     fft_engine=FFT_ENGINE,\
+                                                                     fft_threads=FFT_THREADS,\
+                                                                     fft_wisdom_file=FFT_WISDOM_FILE,\
+                                                                     reducer_threads=REDUCER_THREADS,\
+                                                                     reducer_processes=REDUCER_PROCESSES,\
+                                                                     pipeline_reducers=PIPELINE_REDUCERS)
                         
             
                         
                         exec_times+=[["Pipeline", 0, 0, pipeline_t_s, pipeline_t_e, pipeline_d]]
+                        for [stage_id,stage_t_s,stage_t_e,stage_d] in pipeline_stages:
+                            exec_times+=[[" "+stage_id, 0, 0, stage_t_s, stage_t_e, stage_d]]
                         output_files_list+=[pipeline_output_file]
                     
                     
@@ -481,7 +514,68 @@ if __name__ == '__main__':
                     
                     print_header(header="MapReduce",v=v,file_log=FILE_LOG)
 
-                    if RUN_HADOOP:   
+                    if RUN_HADOOP and HADOOP_LOCAL:
+                        # Local emulation of the Hadoop job (see lib_hadoop_local.py), for every combination of
+                        #  frames per split and reducers in the sweep
+                        params_mapper=get_mapper_params_str(STATIONS,NUM_POLS,FFT_SIZE,ACCUMULATION_TIME,SIGNAL_START,SIGNAL_DURATION,\
+                                                   FIRST_FRAME_NUM,NUM_FRAMES,CODECS_SERIAL,\
+                                                   AUTO_STATIONS,AUTO_POLS,INI_STATIONS,INI_MEDIA,\
+                                                   INI_DELAYS,FFT_AT_MAPPER,INTERNAL_LOG_MAPPER,FFTS_PER_CHUNK,\
+                                                   windowing,\
+                                                   one_baseline_per_task=ONE_BASELINE_PER_TASK,\
+                                                   phase_calibration=PHASE_CALIBRATION,min_mapper_chunk=MIN_MAPPER_CHUNK,
+                                                   max_mapper_chunk=MAX_MAPPER_CHUNK,task_scaling_stations=TASK_SCALING_STATIONS,\
+                                                   single_precision=SINGLE_PRECISION,ini_snapshot=INI_SNAPSHOT)
+                        params_reducer=get_reducer_params_str(CODECS_SERIAL,FFT_AT_MAPPER,INTERNAL_LOG_REDUCER,FFT_SIZE,windowing,\
+                                                              PHASE_CALIBRATION,SINGLE_PRECISION,FFT_ENGINE,FFT_THREADS,\
+                                                              FFT_WISDOM_FILE,REDUCER_THREADS,REDUCER_PROCESSES)
+                        sweep_packets = HADOOP_LOCAL_SWEEP_PACKETS or [PACKETS_PER_HDFS_BLOCK]
+                        sweep_reducers = HADOOP_LOCAL_SWEEP_REDUCERS or [ADJUST_REDUCERS]
+                        for packets_per_hdfs_block in sweep_packets:
+                            for adjust_reducers in sweep_reducers:
+                                str_local = "p" + str(packets_per_hdfs_block) + "-r" + str(adjust_reducers)
+                                hdfs_output_file = PREFIX_OUTPUT + "_s" + str(num_slaves) + "_v" + str(num_vcores)+ suffix_log
+                                if len(sweep_packets)*len(sweep_reducers)>1:
+                                    hdfs_output_file += "_" + str_local
+                                hdfs_output_file += ".out"
+                                [hadoop_t_s,hadoop_t_e,hadoop_d,get_t_s,get_t_e,get_d,sort_t_s,sort_t_e,sort_d,local_tasks,\
+                                                                                                   local_success] = \
+                                  run_mapreduce_local(record_size=max_packet_size,\
+                                                      mapper_cmd=PYTHON_X+" "+get_mr_command(app_dir=SRC_DIR,script=MAPPER,params=params_mapper),\
+                                                      reducer_cmd=PYTHON_X+" "+get_mr_command(app_dir=SRC_DIR,script=REDUCER,params=params_reducer),\
+                                                      input_files=INPUT_FILES,\
+                                                      data_dir=DATA_DIR,\
+                                                      hdfs_data_dir=HDFS_DATA_DIR,\
+                                                      output_hadoop=hdfs_output_file,\
+                                                      output_dir=OUTPUT_DIR,\
+                                                      output_sym=OUTPUT_SYM,\
+                                                      text_mode=TEXT_MODE,\
+                                                      packets_per_hdfs_block=packets_per_hdfs_block,\
+                                                      total_frames=total_frames,\
+                                                      total_partitions=total_partitions,\
+                                                      adjust_mappers=ADJUST_MAPPERS,\
+                                                      adjust_reducers=adjust_reducers,\
+                                                      use_nohash_partitioner=USE_NOHASH_PARTITIONER,\
+                                                      one_baseline_per_task=ONE_BASELINE_PER_TASK,\
+                                                      sort_output=SORT_OUTPUT,\
+                                                      accumulation_time=float(ACCUMULATION_TIME),\
+                                                      seconds_ref=float(SIGNAL_START),\
+                                                      v=v,\
+                                                      file_log=FILE_LOG)
+                                
+                                # Logging results
+                                str_hadoop = "Hadoop-local " + str_local + " "
+                                exec_times+=[[str_hadoop , num_slaves, num_vcores, hadoop_t_s,hadoop_t_e,hadoop_d]]
+                                if local_success:
+                                    output_files_list+=[hdfs_output_file]
+                                elif v==1:
+                                    print("\nLocal mapreduce "+str_local+" failed, no output!",file=FILE_LOG)
+                                str_hdfs_get = "Local-get " + str_local + " "
+                                io_times+=[[str_hdfs_get , num_slaves, num_vcores, get_t_s,get_t_e,get_d]]
+                                str_file_sort = "File-sort " + str_local + " "
+                                io_times+=[[str_file_sort , num_slaves, num_vcores, sort_t_s,sort_t_e,sort_d]]
+                    
+                    elif RUN_HADOOP:   
                         # Process configuration files
                         [list_configurations,pairs_config] = get_list_configuration_files(config_file)
                         configuration_files = process_hadoop_config_files(list_configurations,pairs_config,\
@@ -516,10 +610,11 @@ if __name__ == '__main__':
                         
 
                         # Additional dependencies
-                        add_deps=[INI_DELAYS,INI_MEDIA,INI_STATIONS]
+                        add_deps=[INI_DELAYS,INI_MEDIA,INI_STATIONS,INI_SNAPSHOT]
                         ini_delays_dep = INI_DELAYS.split("/")[-1]
                         ini_media_dep = INI_MEDIA.split("/")[-1]
                         ini_stations_dep = INI_STATIONS.split("/")[-1]                        
+                        ini_snapshot_dep = INI_SNAPSHOT.split("/")[-1]
                         print("Additional dependencies:")
                         print(" "+','.join(add_deps))
             
@@ -534,7 +629,7 @@ if __name__ == '__main__':
                                                    one_baseline_per_task=ONE_BASELINE_PER_TASK,\
                                                    phase_calibration=PHASE_CALIBRATION,min_mapper_chunk=MIN_MAPPER_CHUNK,
                                                    max_mapper_chunk=MAX_MAPPER_CHUNK,task_scaling_stations=TASK_SCALING_STATIONS,\
-                                                   single_precision=SINGLE_PRECISION)
+                                                   single_precision=SINGLE_PRECISION,ini_snapshot=ini_snapshot_dep)
                         command_map = get_mr_command(app_dir=APP_DIR,script=MAPPER,params=params_mapper)
                         create_inter_sh(CONF_DIR+MAPPERSH,PYTHON_X,command_map,temp_log=TEMP_LOG,v=v,file_log=FILE_LOG)
                         
@@ -543,7 +638,8 @@ if __name__ == '__main__':
                         
                         # Get script for reducer
                         params_reducer=get_reducer_params_str(CODECS_SERIAL,FFT_AT_MAPPER,INTERNAL_LOG_REDUCER,FFT_SIZE,windowing,\
-                                                              PHASE_CALIBRATION,SINGLE_PRECISION)
+                                                              PHASE_CALIBRATION,SINGLE_PRECISION,FFT_ENGINE,FFT_THREADS,\
+                                                              FFT_WISDOM_FILE,REDUCER_THREADS,REDUCER_PROCESSES)
                         command_red = get_mr_command(app_dir=APP_DIR,script=REDUCER,params=params_reducer)
                         create_inter_sh(CONF_DIR+REDUCERSH,PYTHON_X,command_red,temp_log=TEMP_LOG,v=v,file_log=FILE_LOG)
             
@@ -645,6 +741,7 @@ if __name__ == '__main__':
                                     packets_per_hdfs_block=PACKETS_PER_HDFS_BLOCK,\
                                     temp_log=TEMP_LOG,copy_delay=HDFS_COPY_DELAY,checksum_size=CHECKSUM_SIZE,text_mode=TEXT_MODE,\
                                     use_lustre_plugin=USE_LUSTRE_PLUGIN,lustre_prefix=LUSTRE_PREFIX,bm_avoid_copy=BM_AVOID_COPY,\
+                                    accumulation_time=float(ACCUMULATION_TIME),seconds_ref=float(SIGNAL_START),\
                                     v=v,file_log=FILE_LOG) 
                             io_times+=[["HDFS-put " + str(num_slaves) + "s-" + str(num_vcores)+ "v" , num_slaves, num_vcores, put_t_s,put_t_e,put_d]]
     
@@ -64,6 +64,7 @@ import sys
 import base64
 import imp
 import os
+import bisect
 import numpy as np
 import scipy.fftpack
 
@@ -116,6 +117,10 @@ import lib_debug
 imp.reload(lib_debug)
 from lib_debug import *
 
+# Binary intermediate format
+import lib_mapred_io
+imp.reload(lib_mapred_io)
+
 
 
 
@@ -223,8 +228,9 @@ def get_pair_str(char_p,pair,accu_block,mod_channel,num_channels,seconds_fr,firs
     
     Returns
     -------
-     pair_str : str
-         complete header for the current set of samples being processed.
+     pair_str : str or list
+         complete header for the current set of samples being processed. If INTERMEDIATE_BINARY, list with
+          key (str) and metadata packed into binary (see lib_mapred_io.pack_meta_bin()).
     
     Notes
     -----
@@ -265,10 +271,112 @@ def get_pair_str(char_p,pair,accu_block,mod_channel,num_channels,seconds_fr,firs
 
     
     # Using this key for full control on the partitioning (one key for reducer...)
+    key_value=get_key_value(accu_block,num_channels,mod_channel,one_baseline_per_task,task_scaling_stations,\
+                            id_pair,tot_accu_blocks)
+    
+    key_suffix=get_pair_key_suffix(accu_block,mod_channel,seconds_fr,first_sample_signal,station_id,mod_polarization_id)
+    
+    pair_str=get_pair_key(char_p,pair,key_value,key_suffix)
+    
+    metadata=get_pair_metadata(first_sample_signal,station_id,\
+                               mod_polarization_id,freq_sample,bits_per_sample,data_type_char,encoding,\
+                               n_bins_pcal_val,pcal_freq,mod_channel,num_samples,abs_delay,rate_delay,\
+                               freq_channel,fractional_sample_delay,accumulation_time,shift_int,sideband)
+    
+    if INTERMEDIATE_BINARY:
+        #                                                                                Binary record (key,metadata)
+        pair_str = [pair_str,metadata]
+    else:
+        pair_str+=metadata
+    #                                                                                (Samples added outside)
+    
+    return(pair_str)
+
+
+def get_key_value(accu_block,num_channels,mod_channel,one_baseline_per_task,task_scaling_stations,id_pair,tot_accu_blocks):
+    """
+    Get value for the key field used for partitioning (k5, see get_pair_str()).
+    """
     key_value=accu_block*num_channels+mod_channel
     if (one_baseline_per_task)or(task_scaling_stations):
         key_value=id_pair*tot_accu_blocks*num_channels+key_value
+    return(key_value)
+
+
+def get_pair_key_suffix(accu_block,mod_channel,seconds_fr,first_sample_signal,station_id,mod_polarization_id):
+    """
+    Get last part of the key (from k6), which does not depend on the pair (see get_pair_str()).
     
+    Returns
+    -------
+     key_suffix : str
+         fields k6 to k9 plus separator between key and value.
+    """
+    first_sample_signal = int(first_sample_signal)
+    #                                                                               Accumulation              [k6,k7]
+    key_suffix =    FIELD_SEP+str(accu_block)+\
+                    FIELD_SEP+str(mod_channel)
+    #                                                                               First sample id.          [k8]
+    key_suffix +=   FIELD_SEP+"f"+str(seconds_fr)+\
+                       SF_SEP+str(first_sample_signal).zfill(PAD_S)+\
+                       SF_SEP+str(mod_channel)
+    #                                                                               Station id.               [k9]
+    key_suffix +=   FIELD_SEP+"s"+str(station_id)+\
+                       SF_SEP+str(mod_polarization_id)
+    #                                                                           SEPARATOR between key and value
+    key_suffix +=   FIELD_SEP+KEY_SEP
+    return(key_suffix)
+
+
+def get_pair_key(char_p,pair,key_value,key_suffix):
+    """
+    Get key (see get_pair_str()).
+    
+    Parameters
+    ----------
+     char_p : char {'x','r','y'}
+         mode of operation.
+     pair : list
+         pair identifiers.
+     key_value : int
+         value from get_key_value().
+     key_suffix : str
+         output from get_pair_key_suffix().
+    
+    Returns
+    -------
+     pair_str : str
+         key, including the separator between key and value (KEY_SEP).
+    """
+    # Generation of KEY and VALUE in the same line
+    #  FIELD_SEP: field separator
+    #  SF_SEP:    sub-field separator
+    # TO DO: define constant for hard-coded chars
+    #                                                                           KEY
+    #                                                                               Mode of operation         [k1]
+    pair_str =  "p"+char_p
+    #                                                                               Baseline (or all)         [k2,k3]
+    pair_str +=     FIELD_SEP+str(pair[0])+SF_SEP+str(pair[1])+\
+                    FIELD_SEP+str(pair[2])+SF_SEP+str(pair[3])+FIELD_SEP
+    #                                                                               Accumulation              [k4,k5]
+    pair_str += "a"+FIELD_SEP+str(key_value)
+    #                                                                               [k6,k7,k8,k9]
+    pair_str += key_suffix
+    return(pair_str)
+
+
+def get_pair_metadata(first_sample_signal,station_id,mod_polarization_id,freq_sample,bits_per_sample,data_type_char,\
+                      encoding,n_bins_pcal_val,pcal_freq,mod_channel,num_samples,abs_delay,rate_delay,\
+                      freq_channel,fractional_sample_delay,accumulation_time,shift_int,sideband):
+    """
+    Get metadata (first part of the value, see get_pair_str() for parameters).
+    
+    Returns
+    -------
+     metadata : str or bytes
+         metadata separated by spaces (with trailing space), or packed into binary if INTERMEDIATE_BINARY 
+          (see lib_mapred_io.pack_meta_bin()).
+    """
     first_sample_signal = int(first_sample_signal)
     
     # Station polarization
@@ -318,40 +426,65 @@ def get_pair_str(char_p,pair,accu_block,mod_channel,num_channels,seconds_fr,firs
                   encoding,\
                   sideband]
     
-    
-    # Generation of KEY and VALUE in the same line
-    #  FIELD_SEP: field separator
-    #  SF_SEP:    sub-field separator
-    # TO DO: define constant for hard-coded chars
-    #                                                                           KEY
-    #                                                                               Mode of operation         [k1]
-    pair_str =  "p"+char_p
-    #                                                                               Baseline (or all)         [k2,k3]
-    pair_str +=     FIELD_SEP+str(pair[0])+SF_SEP+str(pair[1])+\
-                    FIELD_SEP+str(pair[2])+SF_SEP+str(pair[3])+FIELD_SEP
-    #                                                                               Accumulation              [k4,k5,k6,k7]
-    pair_str += "a"+FIELD_SEP+str(key_value)+\
-                    FIELD_SEP+str(accu_block)+\
-                    FIELD_SEP+str(mod_channel)
-    #                                                                               First sample id.          [k8]
-    pair_str +=     FIELD_SEP+"f"+str(seconds_fr)+\
-                       SF_SEP+str(first_sample_signal).zfill(PAD_S)+\
-                       SF_SEP+str(mod_channel)
-    #                                                                               Station id.               [k9]
-    pair_str +=     FIELD_SEP+"s"+str(station_id)+\
-                       SF_SEP+str(mod_polarization_id)
-    #                                                                           SEPARATOR between key and value
-    pair_str +=     FIELD_SEP+KEY_SEP
     #                                                                           VALUE
-    pair_str+=' '.join(map(str,metadata_v))
-    #                                                                                Metadata
-    pair_str+=" "
-    #                                                                                (Samples added outside)
+    if INTERMEDIATE_BINARY:
+        metadata = lib_mapred_io.pack_meta_bin(metadata_v)
+    else:
+        #                                                                                Metadata
+        metadata = ' '.join(map(str,metadata_v))+" "
+    return(metadata)
+
+
+def print_pair(pair_str,signal_chunk_fft_out,writer=None):
+    """
+    Write key, metadata and samples to stdout.
     
-    return(pair_str)                       
-                                
+    Parameters
+    ----------
+     pair_str : str or list
+         key and metadata, see get_pair_str().
+     signal_chunk_fft_out : str or bytes
+         samples in base64 (text), or packed samples (binary).
+     writer : list
+         None to write immediately, otherwise buffered writer (see lib_mapred_io.get_writer()).
+    """
+    if INTERMEDIATE_BINARY:
+        write_pair(writer,pair_str[0],pair_str[1]+signal_chunk_fft_out)
+    else:
+        write_pair(writer,pair_str,signal_chunk_fft_out)
 
 
+def write_pair(writer,key,value):
+    """
+    Write key and value (metadata and samples) to stdout.
+    
+    Parameters
+    ----------
+     writer : list
+         None to write immediately, otherwise buffered writer (see lib_mapred_io.get_writer()).
+     key : str
+         key (see get_pair_key()).
+     value : str or bytes
+         metadata and samples.
+    
+    Notes
+    -----
+    |
+    | **Linear scaling with stations:**
+    |
+    |  The same value is written for all the pairs where the station is involved, so it is built only once.
+    """
+    if INTERMEDIATE_BINARY:
+        if writer is None:
+            lib_mapred_io.write_record_bin(lib_mapred_io.get_stdout_bin(),key,value)
+        else:
+            lib_mapred_io.write_record_buffered(writer,key,value)
+    else:
+        if writer is None:
+            print(key+lib_mapred_io.to_str(value))
+        else:
+            lib_mapred_io.write_line_buffered(writer,lib_mapred_io.to_bytes(key)+lib_mapred_io.to_bytes(value))
+
 
 def calculate_corr_pairs_one_baseline_per_task(tot_stations=3,tot_pols=1,auto_stations=0,auto_pols=1):
     """
@@ -498,7 +631,8 @@ def get_alloc_tasks_linear_scaling(num_pairs):
 ###########################################
 
 
-def read_frame(reader,show_errors,forced_frame_length=0,forced_format=C_INI_MEDIA_F_VDIF,forced_version=C_INI_MEDIA_V_CUSTOM):
+def read_frame(reader,show_errors,forced_frame_length=0,forced_format=C_INI_MEDIA_F_VDIF,forced_version=C_INI_MEDIA_V_CUSTOM,\
+               frame_iter=None):
     """
     It returns the header and samples in the frame, based on the information from the media.ini file. If this information
     is not available then it assumes that it is a vdif frame.
@@ -515,6 +649,8 @@ def read_frame(reader,show_errors,forced_frame_length=0,forced_format=C_INI_MEDI
          [leave deafult value] use only for new implementations of readers.
      forced_version
          [leave deafult value] use only for new implementations of readers.
+     frame_iter
+         [None by default] batched reader (see lib_vdif.iter_vdif_frames()), if None frames are read one by one.
     
     Returns
     -------
@@ -569,8 +705,12 @@ def read_frame(reader,show_errors,forced_frame_length=0,forced_format=C_INI_MEDI
     allsamples=[]
     
     other_cases=1
+    # Batched reader
+    if frame_iter is not None:
+        [header,allsamples,check_size_samples] = next(frame_iter,[None,None,0])
+        other_cases=0
     # VDIF
-    if forced_format == C_INI_MEDIA_F_VDIF:
+    elif forced_format == C_INI_MEDIA_F_VDIF:
         # (custom version)
         if forced_version == C_INI_MEDIA_V_CUSTOM:
             [header,allsamples,check_size_samples] = lib_vdif.read_vdif_frame(f=reader,show_errors=show_errors,forced_frame_length=forced_frame_length,v=VERBOSE_MAPPER_IO)
@@ -627,6 +767,44 @@ def get_num_samples_per_frame(allsamples,num_channels,data_type):
 
 
 
+def get_frames_window(seconds_ref,seconds_duration,first_frame_num,last_frame_num,check_frame_range):
+    """
+    Get time window and frame range for the batched reader, to skip frames that will not be processed.
+    
+    Parameters
+    ----------
+     seconds_ref
+         start of the scan [s].
+     seconds_duration
+         duration of the scan [s].
+     first_frame_num
+         first frame number to be processed.
+     last_frame_num
+         frame number after the last frame to be processed.
+     check_frame_range
+         True if the frame range applies.
+    
+    Returns
+    -------
+     window : list
+         [seconds_start,seconds_end,first_frame_num,last_frame_num], see lib_vdif.iter_vdif_frames().
+    
+    Notes
+    -----
+    |
+    | The window is extended by MAPPER_TIME_WINDOW_MARGIN seconds on both sides (plus one second at the beginning, 
+    |  since the seconds in the header correspond to the integer part of the time of the frame), so that frames that 
+    |  may be inside the scan after delay correction are still checked by check_time_frame().
+    """
+    seconds_start = int(np.floor(seconds_ref-MAPPER_TIME_WINDOW_MARGIN))-1
+    seconds_end = int(np.ceil(seconds_ref+seconds_duration+MAPPER_TIME_WINDOW_MARGIN))
+    if not(check_frame_range):
+        first_frame_num = -1
+        last_frame_num = -1
+    window = [seconds_start,seconds_end,first_frame_num,last_frame_num]
+    return(window)
+
+
 def check_time_frame(accu_block,rel_pos_frame,actual_frame_time,seconds_ref,seconds_duration):
     """
     Check if actual timestamp of this frame is inside the experiment time wnidow.
@@ -667,6 +845,106 @@ def check_time_frame(accu_block,rel_pos_frame,actual_frame_time,seconds_ref,seco
 
 
 
+def get_delay_table(params_delays,freq_sample):
+    """
+    Build table with the delay information for all the station-source pairs and all the accumulation periods
+     in the delay model ini file, to avoid look-ups in the serialized ini file for every frame.
+    
+    Parameters
+    ----------
+     params_delays
+         delay model ini file (serialized).
+     freq_sample
+         sampling frequency [Hz], used to precompute the integer and fractional shifts.
+    
+    Returns
+    -------
+     delay_table : list
+         [freq_sample,pairs] with pairs a dictionary {pair_st_so: [vector_seconds_ref,seconds_sorted,entries]}, where:
+          vector_seconds_ref is the array with seconds as returned by get_vector_delay_ref(),
+          seconds_sorted is the same as a list if it is in ascending order (for bisection), otherwise None,
+          entries is a dictionary {str(seconds): [rate_delay,ref_delay,abs_delay,delay,shift_frac]}, with
+           shift_frac the list with the outputs of get_delay_shift_frac() for real and complex data.
+    
+    Notes
+    -----
+    |
+    | **Look-up:**
+    |
+    |  Entries are indexed by the same string used to build the parameter names in the ini file
+    |   (see lib_ini_files.get_rates_cache()), and only complete entries are stored (missing parameters
+    |   give the same errors as look-ups in the ini file).
+    """
+    rate_markers = [DELAY_MODEL_RR0_MARKER,DELAY_MODEL_RR1_MARKER,DELAY_MODEL_RR2_MARKER,DELAY_MODEL_RRR_MARKER,\
+                    DELAY_MODEL_RC0_MARKER,DELAY_MODEL_RC1_MARKER,DELAY_MODEL_ZC0_MARKER,DELAY_MODEL_ZC1_MARKER,\
+                    DELAY_MODEL_RCR_MARKER,DELAY_MODEL_RCM_MARKER,DELAY_MODEL_RCC_MARKER,DELAY_MODEL_DDD_MARKER]
+    markers = [DELAY_MODEL_REL_MARKER,DELAY_MODEL_REF_MARKER,DELAY_MODEL_ABS_MARKER]+rate_markers
+    pairs = {}
+    for section in get_all_sections(params_delays):
+        
+        vector_seconds_ref = get_vector_delay_ref(get_all_params_serial(params_delays,section))
+        seconds_sorted = None
+        if np.all(np.diff(vector_seconds_ref)>=0):
+            seconds_sorted = vector_seconds_ref.tolist()
+        
+        [seconds_str,values] = get_delay_vectors_serial(params_delays,section,markers)
+        complete = ~np.any(np.isnan(values),axis=0)
+        
+        entries = {}
+        for col in np.flatnonzero(complete):
+            [delay,ref_delay,abs_delay] = values[:3,col].tolist()
+            rate_delay = values[3:,col].tolist()
+            shift_frac = [get_delay_shift_frac(delay,freq_sample,0),get_delay_shift_frac(delay,freq_sample,1)]
+            entries[seconds_str[col]] = [rate_delay,ref_delay,abs_delay,delay,shift_frac]
+        
+        pairs[section] = [vector_seconds_ref,seconds_sorted,entries]
+    
+    return([freq_sample,pairs])
+
+
+def get_delay_table_entry(delay_table,pair_st_so,seconds_frame,front_time):
+    """
+    Get delay information from delay table for the frame.
+    
+    Parameters
+    ----------
+     delay_table : list
+         see get_delay_table().
+     pair_st_so : str
+         station-source pair (see lib_ini_files.get_pair_st_so()).
+     seconds_frame
+         seconds corresponding to the frame to be processed.
+     front_time
+         frontier time (see get_seconds_fr_front()).
+    
+    Returns
+    -------
+     seconds_fr_nearest
+         seconds for the accumulation period (as in get_seconds_fr_front()), -2 if pair not found.
+     entry : list
+         [rate_delay,ref_delay,abs_delay,delay,shift_frac] (see get_delay_table()), None if not found.
+    """
+    if pair_st_so not in delay_table[1]:
+        return([-2,None])
+    [vector_seconds_ref,seconds_sorted,entries] = delay_table[1][pair_st_so]
+    
+    if (front_time is None)or(front_time==-1):
+        if seconds_sorted:
+            # Same result as find_nearest_seconds() (first element for ties)
+            i = bisect.bisect_left(seconds_sorted,seconds_frame)
+            if i==len(seconds_sorted):
+                i-=1
+            elif i>0 and abs(seconds_sorted[i-1]-seconds_frame)<=abs(seconds_sorted[i]-seconds_frame):
+                i-=1
+            seconds_fr_nearest=vector_seconds_ref[i]
+        else:
+            seconds_fr_nearest=find_nearest_seconds(vector_seconds_ref,seconds_frame)
+    else:
+        seconds_fr_nearest=front_time
+    
+    return([seconds_fr_nearest,entries.get(str(seconds_fr_nearest),None)])
+
+
 def get_seconds_fr_front(front_time,vector_seconds_ref,seconds_frame):
     """
     Find frontier seconds only if not available.
@@ -694,7 +972,7 @@ def get_seconds_fr_front(front_time,vector_seconds_ref,seconds_frame):
     
 
 def compute_shift_delay_samples(params_delays,vector_seconds_ref,freq_sample,seconds_frame,pair_st_so,data_type=0,\
-                                front_time=None,cache_rates=[],cache_delays=[]):
+                                front_time=None,cache_rates=[],cache_delays=[],delay_table=None):
     """
     Compute number of samples to shift signal (always positive since reference station is closest to source).
     
@@ -721,6 +999,8 @@ def compute_shift_delay_samples(params_delays,vector_seconds_ref,freq_sample,sec
          temporary information on delays to avoid reprocessing of the input files (see lib_ini_files.get_rates_delays()).
      cache_delays
          list with [seconds_fr_nearest,pair_st_so,delay] from previous computation.
+     delay_table
+         None by default, otherwise table from get_delay_table() (params_delays, vector_seconds_ref and caches not used).
          
     Returns
     -------
@@ -749,6 +1029,18 @@ def compute_shift_delay_samples(params_delays,vector_seconds_ref,freq_sample,sec
     
     
 
+    if delay_table is not None:
+        [seconds_fr_nearest,entry] = get_delay_table_entry(delay_table,pair_st_so,seconds_frame,front_time)
+        if entry is None:
+            print("zM\tWarning: could not get delay for pair "+pair_st_so+", "+str(seconds_fr_nearest)+", skipping frame")
+            return([-1,-1,-1,1,cache_delays])
+        delay=entry[3]
+        if freq_sample==delay_table[0]:
+            [shift_int,fractional_sample_delay]=entry[4][int(data_type==1)]
+        else:
+            [shift_int,fractional_sample_delay]=get_delay_shift_frac(delay,freq_sample,data_type)
+        return([shift_int,delay,fractional_sample_delay,0,cache_delays])
+    
     #print("ft: "+str(front_time))
     seconds_fr_nearest=get_seconds_fr_front(front_time,vector_seconds_ref,seconds_frame)
     #seconds_fr_nearest=front_time
@@ -783,7 +1075,7 @@ def compute_shift_delay_samples(params_delays,vector_seconds_ref,freq_sample,sec
 
 
 
-def get_absolute_delay(params_delays,vector_seconds_ref,seconds_frame,pair_st_so,front_time=None,cache_rates=[]):
+def get_absolute_delay(params_delays,vector_seconds_ref,seconds_frame,pair_st_so,front_time=None,cache_rates=[],delay_table=None):
     """
     Get all the delay information structures associated to the processed station, source and integration period.
     
@@ -803,6 +1095,8 @@ def get_absolute_delay(params_delays,vector_seconds_ref,seconds_frame,pair_st_so
          frontier time, that is, time corresponding to the start of the integration period (takes priority over the seconds of the frame)
      cache_rates
          temporary information on delays to avoid reprocessing of the input files (see lib_ini_files.get_rates_delays()).
+     delay_table
+         None by default, otherwise table from get_delay_table() (params_delays, vector_seconds_ref and cache_rates not used).
                          
     Returns
     -------
@@ -830,6 +1124,13 @@ def get_absolute_delay(params_delays,vector_seconds_ref,seconds_frame,pair_st_so
     |  Merge code with compute_shift_delay_samples to avoid repetition.
     """
     ref_delay=0.0
+    if delay_table is not None:
+        [seconds_fr_nearest,entry] = get_delay_table_entry(delay_table,pair_st_so,seconds_frame,front_time)
+        if entry is None:
+            return([-1,-1,ref_delay,1,cache_rates])
+        [rate_delay,ref_delay,abs_delay] = entry[:3]
+        return([abs_delay,rate_delay,ref_delay,0,cache_rates])
+    
     # station_id,source_id(0),params_delay,seconds_frame,freq_sample
     #pair_st_so = "st"+str(station_id)+"-so"+str(source_id)
     
@@ -1009,6 +1310,52 @@ def pack_samples(signal_chunk_fft,bits_per_sample):
     -------
      signal_chunk_fft_out : 1D numpy array
          bytes containing packed sample components.
+    
+    Notes
+    -----
+    |
+    | **Packing:**
+    |
+    |  First sample component in the most significant bits, last byte padded with zeros (same as np.packbits), 
+    |   as expected by lib_quant.get_samples().
+    |  For 1 bit the components are packed directly with np.packbits.
+    |  For 2, 4 and 8 bits the components are grouped in rows of one byte, and each column is shifted into place.
+    |  For 16 and 32 bits the components are written as big endian integers.
+    |  Other widths use pack_samples_bits().
+    """
+    mask = (1<<bits_per_sample)-1
+    if bits_per_sample==1:
+        signal_chunk_fft_out = np.packbits(np.asarray(signal_chunk_fft).astype(np.uint8) & mask)
+    elif (bits_per_sample<=8)and(8%bits_per_sample==0):
+        samples_per_byte = 8//bits_per_sample
+        v = np.asarray(signal_chunk_fft).astype(np.uint8) & mask
+        n_pad = (-v.shape[0])%samples_per_byte
+        if n_pad>0:
+            v = np.concatenate((v,np.zeros(n_pad,dtype=np.uint8)))
+        v = v.reshape(-1,samples_per_byte)
+        signal_chunk_fft_out = v[:,0]<<(8-bits_per_sample)
+        for i in range(1,samples_per_byte):
+            signal_chunk_fft_out |= v[:,i]<<(8-bits_per_sample*(i+1))
+    elif bits_per_sample in [16,32]:
+        v = np.asarray(signal_chunk_fft).astype(np.uint64) & mask
+        signal_chunk_fft_out = v.astype(">u"+str(bits_per_sample//8)).view(np.uint8)
+    else:
+        signal_chunk_fft_out = pack_samples_bits(signal_chunk_fft,bits_per_sample)
+    
+    return(signal_chunk_fft_out)
+
+
+def pack_samples_bits(signal_chunk_fft,bits_per_sample):
+    """
+    Pack the sample components into bytes expanding each component into bits (any number of bits per sample).
+    
+    Parameters
+    ----------
+     See pack_samples().
+     
+    Return
+    -------
+     See pack_samples().
     """
     range_offsets = range(bits_per_sample-1,-1,-1)
     bits_offset = [((signal_chunk_fft)>>i) & (1) for i in range_offsets]
@@ -1198,18 +1545,18 @@ def main():
     MAX_MAPPER_CHUNK =        int(sys.argv[23])
     TASK_SCALING_STATIONS =   int(sys.argv[24])
     SINGLE_PRECISION =        int(sys.argv[25]) # Currently not used. TO DO: use for FFT at mapper
+    ini_snapshot =                C_INI_SNAPSHOT_NONE
+    if len(sys.argv)>26:
+        ini_snapshot =            sys.argv[26]
     
     
     
     # Experiment configuration
-    # Initialization files
-    stations_serial_str=serialize_config(ini_stations)
-    media_serial_str=serialize_config(ini_media)
-    delays_serial_str=serialize_config(ini_delays)
-    # Serializations into vectors
-    params_stations=serial_params_to_array(stations_serial_str)
-    params_media=serial_params_to_array(media_serial_str)
-    params_delays=serial_params_to_array(delays_serial_str)
+    # Initialization files (from snapshot if available, otherwise parsing the files)
+    snapshot=load_config_snapshot(ini_snapshot)
+    params_stations=get_params_array(ini_stations,snapshot)
+    params_media=get_params_array(ini_media,snapshot)
+    params_delays=get_params_array(ini_delays,snapshot)
 
 
     
@@ -1256,6 +1603,7 @@ def main():
     freq_sample_in=0
     cache_rates=[]
     cache_delays=[]
+    delay_table=None
     pairs=[]
     tot_pairs=0
 
@@ -1330,6 +1678,10 @@ def main():
                                                         auto_stations=auto_stations,auto_pols=auto_pols)
             tot_pairs = len(pairs)
         
+        # Delay information for all accumulation periods
+        if MAPPER_DELAY_TABLE:
+            delay_table = get_delay_table(params_delays,freq_sample_in)
+        
         # If scaling with stations get vectors with allocation.
         tasks_pairs=np.array([])
         if TASK_SCALING_STATIONS:
@@ -1341,11 +1693,25 @@ def main():
         #   Loop for reading and processing  VDIF frames
         ######################################################
         
+        # Buffered output
+        writer = lib_mapred_io.get_writer()
+        if INTERMEDIATE_BINARY:
+            # Anything printed directly (warnings...) goes to stderr, so that the binary output is not corrupted
+            sys.stdout = sys.stderr
+        
+        # Batched reader (only for VDIF)
+        frame_iter=None
+        if MAPPER_FRAMES_PER_BATCH>0 and forced_format==C_INI_MEDIA_F_VDIF:
+            window=None
+            if MAPPER_TIME_WINDOW:
+                window = get_frames_window(seconds_ref,seconds_duration,first_frame_num,last_frame_num,check_frame_range)
+            frame_iter = lib_vdif.iter_vdif_frames(reader,MAPPER_FRAMES_PER_BATCH,SHOW_ERRORS,forced_frame_length,VERBOSE_MAPPER_IO,window)
+        
         keep_reading=1
         while keep_reading==1:
             
             # Get header and samples from frame 
-            [header,allsamples,check_size_samples] = read_frame(reader,SHOW_ERRORS,forced_frame_length,forced_format,forced_version)
+            [header,allsamples,check_size_samples] = read_frame(reader,SHOW_ERRORS,forced_frame_length,forced_format,forced_version,frame_iter)
             
             error_frame = C_M_READ_SUCCESS
             
@@ -1412,7 +1778,8 @@ def main():
                 [abs_delay,rate_delay,ref_delay,error_delay,cache_rates] = get_absolute_delay(params_delays=params_delays,\
                                                                         vector_seconds_ref=vector_seconds_ref,seconds_frame=adjusted_frame_time,\
                                                                         pair_st_so=pair_st_so,\
-                                                                        front_time=front_time,cache_rates=cache_rates)
+                                                                        front_time=front_time,cache_rates=cache_rates,\
+                                                                        delay_table=delay_table)
                 
                 # Shift
                 ref_offset=ref_delay*fs
@@ -1429,7 +1796,7 @@ def main():
                     [i_f,front_time]=get_acc_block_for_time(adjusted_frame_time,list_acc_frontiers)
                     [shift_int,delay,fractional_sample_delay,error_delay,cache_delays] = compute_shift_delay_samples(params_delays,\
                                         vector_seconds_ref,freq_sample_in,adjusted_frame_time,pair_st_so,data_type,\
-                                        front_time,cache_rates,cache_delays)
+                                        front_time,cache_rates,cache_delays,delay_table)
 
                 
                     if error_delay!=0:
@@ -1486,7 +1853,7 @@ def main():
                                 [shift_int,delay,fractional_sample_delay,\
                                  error_delay,cache_delays] = compute_shift_delay_samples(params_delays,vector_seconds_ref,\
                                                 freq_sample_in,re_adjusted_frame_time,pair_st_so,data_type,\
-                                                front_time,cache_rates,cache_delays)
+                                                front_time,cache_rates,cache_delays,delay_table)
                                 
                                 [frame_num_adjusted,frame_num_adjusted_neg,\
                                  adjusted_shift_inside_frame] = adjust_frame_num_and_seconds(fs,\
@@ -1532,7 +1899,7 @@ def main():
                                                                                     vector_seconds_ref,freq_sample_in,\
                                                                                     front_acc,pair_st_so,\
                                                                                     data_type,\
-                                                                                    front_acc,cache_rates,cache_delays)
+                                                                                    front_acc,cache_rates,cache_delays,delay_table)
 
                     
                     if frame_num_adjusted_neg<0:
@@ -1692,7 +2059,7 @@ def main():
                                 # All the data from stdin must be read
                                 try:
                                     read_rest=1
-                                    rest_reading = reader.read()
+                                    lib_vdif.drain_input(reader)
                                 except EOFError:
                                     error_reading_rest=1
                                     #print("zM"+KEY_SEP+"EOF reading rest of file "+current_file_name)
@@ -1779,7 +2146,10 @@ def main():
                                 
                                         #For each pair where the station belongs, create a line in stdout 
                                         num_samples_in_chunk=len(signal_chunk_fft)
-                                        signal_chunk_fft_out = pack_and_encode_samples(signal_chunk_fft,USE_BITARRAYS,ENCODE_B64,apply_compression,bits_per_sample)
+                                        if INTERMEDIATE_BINARY:
+                                            signal_chunk_fft_out = pack_samples(signal_chunk_fft,bits_per_sample).tobytes()
+                                        else:
+                                            signal_chunk_fft_out = pack_and_encode_samples(signal_chunk_fft,USE_BITARRAYS,ENCODE_B64,apply_compression,bits_per_sample)
                                         
                                         
                                         ###########################
@@ -1804,9 +2174,8 @@ def main():
                                                                         0,0,0,\
                                                                         num_samples_in_chunk,abs_delay,rate_delay,freq_channel,\
                                                                         fractional_sample_delay,accumulation_time,shift_int,sideband)
-                                                str_print = pair_str+signal_chunk_fft_out
                                                 if SILENT_OUTPUT==0:
-                                                    print(str_print)
+                                                    print_pair(pair_str,signal_chunk_fft_out,writer)
                                                 else:
                                                     count_print+=1
                                             else: 
@@ -1815,6 +2184,17 @@ def main():
                                                 
                                                 #tot_tasks=tot_pols*tot_stations
                                                 index_task_col=station_id*tot_pols+mod_polarization_id
+                                                
+                                                # Value and last part of the key are the same for all pairs (see get_pair_str())
+                                                key_suffix = get_pair_key_suffix(accu_block,mod_channel,accu_block,first_sample_signal,\
+                                                                                 station_id,mod_polarization_id)
+                                                metadata = get_pair_metadata(first_sample_signal,station_id,mod_polarization_id,\
+                                                                         freq_sample_in,bits_per_sample,data_type_chars[data_type],\
+                                                                         encoding,n_bins_pcal_val,pcal_freq,mod_channel,\
+                                                                         num_samples_in_chunk,abs_delay,rate_delay,freq_channel,\
+                                                                         fractional_sample_delay,accumulation_time,shift_int,sideband)
+                                                value = lib_mapred_io.to_bytes(metadata)+lib_mapred_io.to_bytes(signal_chunk_fft_out)
+                                                
                                                 for s0 in range(0,tot_stations):
                                                     for t0 in range(0,tot_pols):
                                                         index_task_row=s0*tot_pols+t0
@@ -1822,17 +2202,10 @@ def main():
                                                             pair=get_pair_linear_scaling(s0,t0)
                                                             # Char to identify mode
                                                             char_p="r"
-                                                            pair_str = get_pair_str(char_p,pair,accu_block,mod_channel,\
-                                                                         num_channels_spec,accu_block,first_sample_signal,\
-                                                                         station_id,mod_polarization_id,\
-                                                                         freq_sample_in,bits_per_sample,data_type_chars[data_type],\
-                                                                         encoding,n_bins_pcal_val,pcal_freq,\
-                                                                         ONE_BASELINE_PER_TASK,TASK_SCALING_STATIONS,\
-                                                                         index_task_row,tot_stations*tot_pols,tot_accu_blocks,\
-                                                                         num_samples_in_chunk,abs_delay,rate_delay,freq_channel,\
-                                                                         fractional_sample_delay,accumulation_time,shift_int,sideband)
-                                                            str_print = pair_str+signal_chunk_fft_out
-                                                            print(str_print)
+                                                            key_value = get_key_value(accu_block,num_channels_spec,mod_channel,\
+                                                                                      ONE_BASELINE_PER_TASK,TASK_SCALING_STATIONS,\
+                                                                                      index_task_row,tot_accu_blocks)
+                                                            write_pair(writer,get_pair_key(char_p,pair,key_value,key_suffix),value)
                                             
                                         else:
                                         
@@ -1857,8 +2230,7 @@ def main():
                                                                         id_pair,tot_pairs,tot_accu_blocks,\
                                                                         num_samples_in_chunk,abs_delay,rate_delay,freq_channel,\
                                                                         fractional_sample_delay,accumulation_time,shift_int,sideband)
-                                                    str_print = pair_str+signal_chunk_fft_out
-                                                    print(str_print)
+                                                    print_pair(pair_str,signal_chunk_fft_out,writer)
 
             else:
                 error_frame = C_M_READ_ERR_HEADER_NONE
@@ -1866,18 +2238,19 @@ def main():
                 #print("zM"+KEY_SEP+"Invalid header or data for file "+current_file_name)
                 if read_rest==0:
                     try:
-                        rest_reading = reader.read()
+                        lib_vdif.drain_input(reader)
                     except EOFError:
                         error_reading_rest=1
                         #print("zM"+KEY_SEP+"EOF reading rest of file "+current_file_name)
                 
-        
+        # Write pending output
+        lib_mapred_io.flush_writer(writer)
 
     else:
         # Read input (to avoid errors) and exit
         try:
             read_rest=1
-            rest_reading = reader.read()
+            lib_vdif.drain_input(reader)
         except EOFError:
             error_reading_rest=1
             #print("zM"+KEY_SEP+"EOF reading rest of file "+current_file_name)
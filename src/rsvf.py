@@ -55,6 +55,7 @@ Notes
 from __future__ import print_function,division
 import sys
 import base64
+import struct
 import imp
 
 import lib_quant
@@ -89,6 +90,18 @@ import const_performance
 imp.reload(const_performance)
 from const_performance import *
 
+# Binary intermediate format
+import lib_mapred_io
+imp.reload(lib_mapred_io)
+
+# FFT engines
+import lib_fft
+imp.reload(lib_fft)
+
+# Reducer threads/processes
+import lib_workers
+imp.reload(lib_workers)
+
 from const_ini_files import *
 
 #import bitarray
@@ -152,10 +165,30 @@ def split_input_line(line):
     line=line.replace(KEY_SEP+KEY_SEP,KEY_SEP)
     
     key, vector = line.split(KEY_SEP,1)
+    vector_split = vector.split(' ')
+    [key_pair_accu, key_sample, key_station, is_autocorr,key_station_pol,char_type,accu_block] = split_input_key(key)
+    
+    return([key_pair_accu, key_sample, key_station, vector_split,is_autocorr,key_station_pol,char_type,accu_block])
+
+
+def split_input_key(key):
+    """
+    Get sub-keys from key.
+    
+    Parameters
+    ----------
+     key : str
+         key (without KEY_SEP).
+    
+    Returns
+    -------
+     See split_input_line() (all but vector_split).
+    """
+    if key[-1]==FIELD_SEP:
+        key=key[:-1]
     key_pair_accu_sample, key_station_pol = key.split('s',1)
     key_station = key_station_pol.split(SF_SEP)[0]
     key_pair_accu, key_sample = key_pair_accu_sample.split('f',1)
-    vector_split = vector.split(' ')
     key_pair_accu_split = key_pair_accu.split(FIELD_SEP)
     is_autocorr=0
     if key_pair_accu_split[1]==key_pair_accu_split[2]:
@@ -163,7 +196,7 @@ def split_input_line(line):
     char_type=key[1]
     accu_block=float(key_pair_accu_split[5])
     
-    return([key_pair_accu, key_sample, key_station, vector_split,is_autocorr,key_station_pol,char_type,accu_block])
+    return([key_pair_accu, key_sample, key_station, is_autocorr,key_station_pol,char_type,accu_block])
 
 
 
@@ -266,6 +299,46 @@ def extract_params_split(vector_split):
 
 
 
+def extract_params_bin(meta):
+    """
+    Get parameters from metadata in binary record (same as extract_params_split() without parsing strings).
+    
+    Parameters
+    ----------
+     meta : list
+         metadata from lib_mapred_io.unpack_meta_bin().
+    
+    Returns
+    -------
+     See extract_params_split().
+    """
+    shift_delay=               meta[INDEX_SHIFT_DELAY]
+    fractional_sample_delay=   meta[INDEX_FRAC_DELAY]
+    abs_delay=                 meta[INDEX_ABS_DELAY]
+    rate_delay=                meta[INDEX_RATE_DELAY_0:INDEX_RATE_DIFF_FRAC+1]
+    num_samples=               meta[INDEX_NUM_SAMPLES]
+    fs=                  float(meta[INDEX_FS])
+    bits_per_sample =          meta[INDEX_BITS_PER_SAMPLE]
+    first_sample=              meta[INDEX_FIRST_SAMPLE]
+    data_type =                meta[INDEX_DATA_TYPE]
+    n_bins_pcal =              meta[INDEX_NBINS_PCAL]
+    fs_pcal=             float(meta[INDEX_PCAL_FREQ])
+    freq_channel =             meta[INDEX_CHANNEL_FREQ]
+    accumulation_time =        meta[INDEX_ACC_TIME]
+    encoding =                 meta[INDEX_ENCODING]
+    sideband=                  meta[INDEX_SIDEBAND]
+    
+    block_first_sample = str(first_sample)+SF_SEP+str(meta[INDEX_CHANNEL_INDEX])
+    
+    if data_type=='c':
+        num_samples=num_samples//2
+        shift_delay=int(shift_delay//2)
+    
+    # VQ not supported in binary mode
+    encoding_width=0
+    return([bits_per_sample,block_first_sample,data_type,encoding, encoding_width,n_bins_pcal,num_samples,abs_delay,rate_delay,fs,fs_pcal,freq_channel,first_sample,fractional_sample_delay,accumulation_time,shift_delay,sideband])
+
+
 def decode_samples_b64(vector_split_samples,vector_split_encoding):
     """
     Decode base64.
@@ -338,12 +411,19 @@ def get_str_r_out(current_key_pair_accu,count_acc,current_vector_split,current_b
      str_print : str
          output line with visibilities.
     """
+    str_print = current_key_pair_accu+'sxa'+str(count_acc)+KEY_SEP+\
+          get_meta_r_out(current_vector_split,current_block_first_sample)+' '+' '.join(map(str, accu_prod_div))
+    return(str_print)
+
+
+def get_meta_r_out(current_vector_split,current_block_first_sample):
+    """
+    Get metadata for the output lines with visibilities (see get_str_r_out()).
+    """
     current_vector_split_sub_print = current_vector_split[:(META_LEN-1)]
     current_vector_split_sub_print[INDEX_PCAL_FREQ] = str(0)
     current_vector_split_sub_print[INDEX_NBINS_PCAL] = str(0)                    
-    str_print = current_key_pair_accu+'sxa'+str(count_acc)+KEY_SEP+' '.join(current_vector_split_sub_print)+\
-          ' '+current_block_first_sample+' '+' '.join(map(str, accu_prod_div))
-    return(str_print)
+    return(' '.join(current_vector_split_sub_print)+' '+current_block_first_sample)
                         
 
 def get_str_pcal_out(acc_pcal,current_n_bins_pcal,count_acc_pcal,current_key_pair_accu,current_vector_split,current_block_first_sample):
@@ -374,40 +454,11 @@ def get_str_pcal_out(acc_pcal,current_n_bins_pcal,count_acc_pcal,current_key_pai
     str_print = "pcal"+current_key_pair_accu[2:]+'sxa'+str(count_acc_pcal)+KEY_SEP+' '.join(current_vector_split[:(META_LEN-1)])+' '+current_block_first_sample+' '+' '.join(map(str, acc_pcal))
     return(str_print)                      
 
-def get_str_pcal_out_all(sp,acc_pcal,current_n_bins_pcal,count_acc_pcal,current_key_pair_accu,current_vector_split,current_block_first_sample):
-    """
-    Get output string for phase calibration (all-baselines-per-task).
-    
-    Parameters
-    ------
-     sp
-         station-polarization
-     acc_pcal : complex 1D np.array
-         phase calibration results for one baseline, one band and one accumulation period.
-     current_n_bins_pcal
-         number of bins (number of elements in acc_pcal).
-     count_acc_pcal
-         number of accumulations performed to get pcal results.
-     current_key_pair_accu
-         part of the key with the baseline and the accumulation multi-key.
-     current_vector_split
-         metadata as in the input line.
-     current_block_first_sample
-         <first_sample>.<channel_index>.
-     
-    Returns
-    -------
-     str_print : str
-         output line with phase calibration results.
-    """
-    str_print = "pcal"+FIELD_SEP+sp+FIELD_SEP+sp+FIELD_SEP+current_key_pair_accu+FIELD_SEP+'sxa'+str(count_acc_pcal)+KEY_SEP+' '.join(current_vector_split[:(META_LEN-1)])+' '+current_block_first_sample+' '+' '.join(map(str, acc_pcal))
-    return(str_print)                      
-
 
-def get_lines_out_for_all(char_type,n_sp,F_ind,current_acc_str,count_acc,acc_mat,current_block_first_sample,current_vector_split,\
-                          acc_pcal,count_acc_pcal,scaling_pair="A.A"):
+def get_out_for_all(char_type,n_sp,F_ind,current_acc_str,count_acc,acc_mat,current_block_first_sample,current_vector_split,\
+                    acc_pcal,count_acc_pcal,scaling_pair="A.A"):
     """
-    Get output lines for all results in accumulation matrix.
+    Get output for all results in accumulation matrix.
     
     Parameters
     ----------
@@ -436,31 +487,38 @@ def get_lines_out_for_all(char_type,n_sp,F_ind,current_acc_str,count_acc,acc_mat
     
     Returns
     -------
-     lines_out
-         list of lines with output results (visibilities and phase calibration).
+     out : list
+         list of [key,meta,values] with the key, metadata (str) and results (complex 1D array) for each output line,
+          with meta and values None for log lines (key is then the complete line).
+    
+    Notes
+    -----
+    |
+    | **Output:**
+    |
+    |  The metadata is the same for all the baselines, so it is built only once. See get_lines_out_for_all() and
+    |   write_out_for_all() for text and binary output.
     """
     
     # TO DO: need more elegant solution to get key, currently hardcoded.
     current_acc_str=SF_SEP.join(current_acc_str[3:7])
-    lines_out=[]
+    out=[]
     if acc_mat is not None:
+        meta_r=get_meta_r_out(current_vector_split,current_block_first_sample)
+        count_acc_str='sxa'+str(count_acc)
         if scaling_pair=="A.A":
             for s0 in range(n_sp):
                 for s1 in range(s0,n_sp):
                     try:
                         new_key_pair_accu=get_key_all_out(char_type,F_ind[s0],F_ind[s1],current_acc_str)
-                        str_print = get_str_r_out(new_key_pair_accu,count_acc,current_vector_split,\
-                                                  current_block_first_sample,acc_mat[s0,s1])
+                        out+=[[new_key_pair_accu+count_acc_str,meta_r,acc_mat[s0,s1]]]
                     except TypeError:
-                        str_print = "zR\tError getting output data for "+str(s0)+"/"+str(s1)+" in "+str(current_acc_str)
-                    lines_out+=[str_print]
+                        out+=[["zR\tError getting output data for "+str(s0)+"/"+str(s1)+" in "+str(current_acc_str),None,None]]
         else:
             s0 = F_ind.index(scaling_pair)
             for s1 in range(n_sp):
                 new_key_pair_accu=get_key_all_out(char_type,F_ind[s0],F_ind[s1],current_acc_str)
-                str_print = get_str_r_out(new_key_pair_accu,count_acc,current_vector_split,\
-                                              current_block_first_sample,acc_mat[s1])
-                lines_out+=[str_print]
+                out+=[[new_key_pair_accu+count_acc_str,meta_r,acc_mat[s1]]]
         
         if acc_pcal!=[]:
             current_n_bins_pcal=acc_pcal.shape[1]
@@ -469,15 +527,63 @@ def get_lines_out_for_all(char_type,n_sp,F_ind,current_acc_str,count_acc,acc_mat
             # TO DO: check
             acc_pcal_div = normalize_pcal(pcal_fft,count_acc_pcal)
             
+            meta_pcal=' '.join(current_vector_split[:(META_LEN-1)])+' '+current_block_first_sample
             for sp in range(n_sp):
-                str_print = get_str_pcal_out_all(F_ind[sp],acc_pcal_div[sp][0],current_n_bins_pcal,count_acc_pcal,current_acc_str,current_vector_split,current_block_first_sample)
-                lines_out+=[str_print]
+                key_pcal="pcal"+FIELD_SEP+F_ind[sp]+FIELD_SEP+F_ind[sp]+FIELD_SEP+current_acc_str+FIELD_SEP+'sxa'+str(count_acc_pcal)
+                out+=[[key_pcal,meta_pcal,acc_pcal_div[sp][0]]]
     else:
-        str_print = "zR\tEmpty acc mat in "+str(current_acc_str)
-        lines_out+=[str_print]
+        out+=[["zR\tEmpty acc mat in "+str(current_acc_str),None,None]]
     
+    return(out)
+
+
+def get_lines_out_for_all(char_type,n_sp,F_ind,current_acc_str,count_acc,acc_mat,current_block_first_sample,current_vector_split,\
+                          acc_pcal,count_acc_pcal,scaling_pair="A.A"):
+    """
+    Get output lines for all results in accumulation matrix, see get_out_for_all() for the parameters.
+    
+    Returns
+    -------
+     lines_out
+         list of lines with output results (visibilities and phase calibration).
+    """
+    out=get_out_for_all(char_type,n_sp,F_ind,current_acc_str,count_acc,acc_mat,current_block_first_sample,\
+                        current_vector_split,acc_pcal,count_acc_pcal,scaling_pair)
+    lines_out=[key if values is None else key+KEY_SEP+meta+' '+' '.join(map(str, values)) for [key,meta,values] in out]
     return(lines_out)
 
+
+def write_out_for_all(writer,char_type,n_sp,F_ind,current_acc_str,count_acc,acc_mat,current_block_first_sample,\
+                      current_vector_split,acc_pcal,count_acc_pcal,scaling_pair="A.A"):
+    """
+    Write all results in accumulation matrix, see get_out_for_all() for the parameters.
+    
+    Parameters
+    ----------
+     writer
+         buffered writer (see lib_mapred_io.get_writer()).
+    
+    Notes
+    -----
+    |
+    | **Configuration:**
+    |
+    |  OUTPUT_BINARY in const_mapred.py: if 1 results are written as binary records with the raw complex values 
+    |   (see lib_mapred_io.pack_vis_bin()), avoiding the conversion of every value into text in the reducer.
+    """
+    if OUTPUT_BINARY:
+        out=get_out_for_all(char_type,n_sp,F_ind,current_acc_str,count_acc,acc_mat,current_block_first_sample,\
+                            current_vector_split,acc_pcal,count_acc_pcal,scaling_pair)
+        for [key,meta,values] in out:
+            if values is None:
+                lib_mapred_io.write_line_buffered(writer,key)
+            else:
+                lib_mapred_io.write_record_buffered(writer,key,lib_mapred_io.pack_vis_bin(meta,values))
+    else:
+        lines_out=get_lines_out_for_all(char_type,n_sp,F_ind,current_acc_str,count_acc,acc_mat,current_block_first_sample,\
+                                        current_vector_split,acc_pcal,count_acc_pcal,scaling_pair)
+        lib_mapred_io.write_lines_buffered(writer,lines_out)
+
     
     
 ###########################################
@@ -666,13 +772,34 @@ def main():
     WINDOWING=            sys.argv[5]
     PHASE_CALIBRATION=int(sys.argv[6])
     SINGLE_PRECISION= int(sys.argv[7])
+    FFT_ENGINE_IN=""
+    FFT_THREADS_IN=0
+    FFT_WISDOM_FILE_IN=""
+    if len(sys.argv)>10:
+        FFT_ENGINE_IN=    sys.argv[8]
+        FFT_THREADS_IN=int(sys.argv[9])
+        FFT_WISDOM_FILE_IN=sys.argv[10]
+    REDUCER_THREADS_IN=-1
+    REDUCER_PROCESSES_IN=-1
+    if len(sys.argv)>12:
+        REDUCER_THREADS_IN=int(sys.argv[11])
+        REDUCER_PROCESSES_IN=int(sys.argv[12])
+    
+    # FFT engine (see lib_fft.py)
+    fft_engine=lib_fft.init_fft_engine(FFT_ENGINE_IN,FFT_THREADS_IN,FFT_WISDOM_FILE_IN)
+    lib_fft.set_fft_engine(fft_engine)
+    
+    # Workers (see lib_workers.py), created before allocating the data structures
+    workers=lib_workers.init_workers(REDUCER_THREADS_IN,REDUCER_PROCESSES_IN)
+    lib_workers.set_workers(workers)
     
     # FFT size
     FFT_SIZE=FFT_SIZE_IN                    # For real data will use 2x fft_size, assuming all data is real xor complex
     #                                         See update_stored_samples where this is overriden
     
     # Precision (Approximation) configurable
-    # TO DO: currently always double precision, change.
+    #  Single precision: samples, rotators and FFTs in complex64 (float32 for real samples), accumulation
+    #  matrix as configured in X_ACCUMULATOR (const_performance.py).
     DTYPE_COMPLEX=np.complex64 if SINGLE_PRECISION else np.complex128
 
 
@@ -710,6 +837,18 @@ def main():
     failed_acc_count=0
     dismissed_acc_count=0
     
+    # Preallocated buffers for stored samples
+    F_buf=None
+    F_buf_pcal=None
+    if REDUCER_STREAM_BUFFER:
+        F_buf=init_stream_buffers()
+        F_buf_pcal=init_stream_buffers()
+    
+    # Kahan summation for the accumulation matrix
+    acc_comp=None
+    if SINGLE_PRECISION and X_ACCUMULATOR==X_ACCUMULATOR_KAHAN:
+        acc_comp=init_acc_compensation()
+    
     # Debugging headers
     if DEBUG_DELAYS:
         print_debug_r_delays_header()
@@ -722,6 +861,9 @@ def main():
     
     # Default: use stdin
     f_in=sys.stdin
+    if INTERMEDIATE_BINARY:
+        # Binary records [key,value]
+        f_in=lib_mapred_io.read_records_bin(lib_mapred_io.get_stdin_bin())
     
     counter_sub_acc=0
 
@@ -752,6 +894,12 @@ def main():
     codebook_list = []
     
            
+    # Buffered output
+    writer = lib_mapred_io.get_writer(records=OUTPUT_BINARY)
+    if OUTPUT_BINARY:
+        # Anything printed directly (warnings...) goes to stderr, so that the binary output is not corrupted
+        sys.stdout = sys.stderr
+    
     #For debugging, just copy lines to output file
     if DEBUGGING:
         
@@ -762,7 +910,7 @@ def main():
         # Just bypass lines into output and exit
         for line in f_in:
             line = line.strip()  
-            print("zR-Debug mode"+KEY_SEP+line)
+            lib_mapred_io.write_line_buffered(writer,"zR-Debug mode"+KEY_SEP+line)
     
     
     else:
@@ -774,6 +922,9 @@ def main():
        
         for line in f_in:
             
+            if INTERMEDIATE_BINARY:
+                # Process key, value with metadata and samples
+                [line,value] = line
             
             #########################
             #   Bypass logging
@@ -783,11 +934,11 @@ def main():
             # Checks for bypassing previous log/error lines
             if line[0]=='z':
                 # Error Message, just copy to output and keep processing
-                print(line.strip())
+                lib_mapred_io.write_line_buffered(writer,line.strip())
                 continue
             elif line[0]!='p':
                 # Ignore line
-                print("zRz"+KEY_SEP+"Ignored line:"+line.strip())
+                lib_mapred_io.write_line_buffered(writer,"zRz"+KEY_SEP+"Ignored line:"+line.strip())
                 continue
             
 
@@ -798,17 +949,27 @@ def main():
             # Decode line
             line = line.strip()
             try:
-                [key_pair_accu, key_sample, key_station, vector_split,is_autocorr,key_station_pol,char_type,accu_block] = split_input_line(line)
-                samples_quant = decode_samples_b64(vector_split[-1],vector_split[INDEX_ENCODING])
+                if INTERMEDIATE_BINARY:
+                    [key_pair_accu, key_sample, key_station,is_autocorr,key_station_pol,char_type,accu_block] = split_input_key(line)
+                    meta = lib_mapred_io.unpack_meta_bin(value)
+                    vector_split = lib_mapred_io.get_vector_split_bin(meta)+['']
+                    samples_quant = np.frombuffer(value,dtype=np.uint8,offset=lib_mapred_io.META_BIN.size)
+                else:
+                    [key_pair_accu, key_sample, key_station, vector_split,is_autocorr,key_station_pol,char_type,accu_block] = split_input_line(line)
+                    samples_quant = decode_samples_b64(vector_split[-1],vector_split[INDEX_ENCODING])
     
                 
             except ValueError:
                 # Error in key
-                print("zRz"+KEY_SEP+"Value error (kv):"+line.strip())
+                lib_mapred_io.write_line_buffered(writer,"zRz"+KEY_SEP+"Value error (kv):"+line.strip())
                 continue
             except TypeError:
                 # Error in base64 decoding
-                print("zRz"+KEY_SEP+"Type error (b64):"+line.strip())
+                lib_mapred_io.write_line_buffered(writer,"zRz"+KEY_SEP+"Type error (b64):"+line.strip())
+                continue
+            except struct.error:
+                # Error in binary metadata (short or corrupt value)
+                lib_mapred_io.write_line_buffered(writer,"zRz"+KEY_SEP+"Struct error (bin):"+line.strip())
                 continue
             
            
@@ -820,10 +981,16 @@ def main():
             #########################
 
             # Extract parameters from key
-            [bits_per_sample,block_first_sample,data_type,encoding,\
-                 encoding_width,n_bins_pcal,num_samples,abs_delay,\
-                 rate_delay,fs,fs_pcal,freq_channel,first_sample,\
-                 fractional_sample_delay,accumulation_time,shift_delay,sideband] = extract_params_split(vector_split[:-1])
+            if INTERMEDIATE_BINARY:
+                [bits_per_sample,block_first_sample,data_type,encoding,\
+                     encoding_width,n_bins_pcal,num_samples,abs_delay,\
+                     rate_delay,fs,fs_pcal,freq_channel,first_sample,\
+                     fractional_sample_delay,accumulation_time,shift_delay,sideband] = extract_params_bin(meta)
+            else:
+                [bits_per_sample,block_first_sample,data_type,encoding,\
+                     encoding_width,n_bins_pcal,num_samples,abs_delay,\
+                     rate_delay,fs,fs_pcal,freq_channel,first_sample,\
+                     fractional_sample_delay,accumulation_time,shift_delay,sideband] = extract_params_split(vector_split[:-1])
             block_time=accu_block*accumulation_time
             # Get pair associated to this line
             
@@ -883,7 +1050,7 @@ def main():
                                                                                          F_first_sample,F_first_sample_partial,\
                                                                                          F_frac,current_block_time,F_adj_shift_partial,\
                                                                                          F_stack_shift,F_adj_shift_pcal,F_stack_shift_pcal,\
-                                                                                         F_pcal_fix,F_side,F_lti)
+                                                                                         F_pcal_fix,F_side,F_lti,F_buf,F_buf_pcal,acc_comp)
 
                     
                         #########
@@ -896,12 +1063,9 @@ def main():
                         #########
                         #  Out
                         #########
-                        lines_out = get_lines_out_for_all(char_type,n_sp,last_F_ind,current_pairs,count_acc,acc_mat,\
-                                                          current_block_first_sample,current_vector_split,acc_pcal,\
-                                                          count_acc_pcal,current_scaling_pair)
-                        if lines_out!=[]:
-                            for line_out in lines_out:
-                                print(line_out)
+                        write_out_for_all(writer,char_type,n_sp,last_F_ind,current_pairs,count_acc,acc_mat,\
+                                          current_block_first_sample,current_vector_split,acc_pcal,\
+                                          count_acc_pcal,current_scaling_pair)
                         
                         
                         ##########
@@ -915,7 +1079,7 @@ def main():
                                             current_block_first_sample,dismissed_acc_count)
                         if lines_stats!=[]:
                             for line_stats in lines_stats:
-                                print(line_stats)
+                                lib_mapred_io.write_line_buffered(writer,line_stats)
                         
    
                         failed_acc_count=0
@@ -979,6 +1143,9 @@ def main():
                     #pcal
                     pre_pcal = np.array([])
                     acc_pcal = np.array([])
+                    if REDUCER_STREAM_BUFFER:
+                        reset_stream_buffers(F_buf)
+                        reset_stream_buffers(F_buf_pcal)
                     
                     # Read data
                     # TODO: VQ (vector quantization) not supported yet for all baselines in same task        
@@ -991,7 +1158,7 @@ def main():
                     ######################################
                     #
                     # No processing yet, simply store samples
-                    v_dequant = get_samples(samples_quant,bits_per_sample,data_type,num_samples,SINGLE_PRECISION)
+                    v_dequant = get_samples(samples_quant,bits_per_sample,data_type,num_samples,SINGLE_PRECISION,REAL_FFT)
                     [F1,F_ind,F_delays,F_rates,\
                         F_fs,F_fs_pcal,F_first_sample,\
                         F_frac,F_side,FFT_SIZE]=update_stored_samples(v_dequant,F1,F_ind,key_station_pol,\
@@ -1017,7 +1184,7 @@ def main():
                         #        Update data structures
                         ######################################
                         # TODO: vector quantization not supported yet for all baselines in same task        
-                        v_dequant = get_samples(samples_quant,bits_per_sample,data_type,num_samples,SINGLE_PRECISION)    
+                        v_dequant = get_samples(samples_quant,bits_per_sample,data_type,num_samples,SINGLE_PRECISION,REAL_FFT)    
                         [F1,F_ind,F_delays,F_rates,F_fs,F_fs_pcal,\
                          F_first_sample,F_frac,F_side,FFT_SIZE]=update_stored_samples(v_dequant,F1,F_ind,\
                                                                              key_station_pol,F_delays,F_rates,\
@@ -1068,7 +1235,7 @@ def main():
                                                                                          F_first_sample,F_first_sample_partial,\
                                                                                          F_frac,current_block_time,F_adj_shift_partial,\
                                                                                          F_stack_shift,F_adj_shift_pcal,\
-                                                                                         F_stack_shift_pcal,F_pcal_fix,F_side,F_lti)
+                                                                                         F_stack_shift_pcal,F_pcal_fix,F_side,F_lti,F_buf,F_buf_pcal,acc_comp)
 
 
                         
@@ -1108,7 +1275,7 @@ def main():
                         #        Update data structures
                         ######################################
                         # Read data
-                        v_dequant = get_samples(samples_quant,bits_per_sample,data_type,num_samples,SINGLE_PRECISION)
+                        v_dequant = get_samples(samples_quant,bits_per_sample,data_type,num_samples,SINGLE_PRECISION,REAL_FFT)
                         [F1,F_ind,F_delays,F_rates,F_fs,F_fs_pcal,F_first_sample,F_frac,F_side,FFT_SIZE]=update_stored_samples(v_dequant,F1,F_ind,key_station_pol,F_delays,F_rates,F_fs,F_fs_pcal,abs_delay,rate_delay,fs,fs_pcal,F_first_sample,first_sample,data_type,F_frac,fractional_sample_delay,shift_delay,F_side,sideband,FFT_SIZE_IN)
                 
 
@@ -1149,25 +1316,22 @@ def main():
                                                                                        F_first_sample,F_first_sample_partial,\
                                                                                        F_frac,current_block_time,F_adj_shift_partial,\
                                                                                        F_stack_shift,F_adj_shift_pcal,F_stack_shift_pcal,\
-                                                                                       F_pcal_fix,F_side,F_lti)
+                                                                                       F_pcal_fix,F_side,F_lti,F_buf,F_buf_pcal,acc_comp)
                                 
                                 # Adjust pcal rotation due to initial alignment with delay model
                                 if PHASE_CALIBRATION>0:
                                     acc_pcal = adjust_shift_acc_pcal(acc_pcal,F_pcal_fix,v=DEBUG_GENERAL_R)
 
                                 
-                                lines_out = get_lines_out_for_all(char_type,n_sp,last_F_ind,current_pairs,count_acc,acc_mat,\
-                                                                  current_block_first_sample,acc_pcal,count_acc_pcal,current_vector_split)
-                                if lines_out!=[]:
-                                    for line_out in lines_out:
-                                        print(line_out)
+                                write_out_for_all(writer,char_type,n_sp,last_F_ind,current_pairs,count_acc,acc_mat,\
+                                                  current_block_first_sample,acc_pcal,count_acc_pcal,current_vector_split)
                                 
 
-                                print("zR"+KEY_SEP+"kpa="+current_key_pair_accu+",Adjusted stack=["+','.join(map(str,map(int,F_stack_shift)))+"]")
-                                print("zR"+KEY_SEP+"kpa="+current_key_pair_accu+",Adjusted shifts=["+','.join(map(str,map(int,F_adj_shift_partial)))+"]")
+                                lib_mapred_io.write_line_buffered(writer,"zR"+KEY_SEP+"kpa="+current_key_pair_accu+",Adjusted stack=["+','.join(map(str,map(int,F_stack_shift)))+"]")
+                                lib_mapred_io.write_line_buffered(writer,"zR"+KEY_SEP+"kpa="+current_key_pair_accu+",Adjusted shifts=["+','.join(map(str,map(int,F_adj_shift_partial)))+"]")
                                 
                                 if (failed_acc_count>0)or(dismissed_acc_count>0):
-                                    print("zR"+KEY_SEP+"Failed accs="+str(failed_acc_count)+",dismissed accs="+str(dismissed_acc_count)+",in=a"+current_block_first_sample)
+                                    lib_mapred_io.write_line_buffered(writer,"zR"+KEY_SEP+"Failed accs="+str(failed_acc_count)+",dismissed accs="+str(dismissed_acc_count)+",in=a"+current_block_first_sample)
                                           
                                     failed_acc_count=0
                                     dismissed_acc_count=0
@@ -1178,7 +1342,7 @@ def main():
                             
                                 accu_prod_div = normalize_mat(accu_prod,count_acc)
                                 str_print = get_str_r_out(current_key_pair_accu,count_acc,current_vector_split,current_block_first_sample,accu_prod_div)
-                                print(str_print)
+                                lib_mapred_io.write_line_buffered(writer,str_print)
                                 
                                 # Print phase calibration results
                                 if acc_pcal!=[]:
@@ -1191,7 +1355,7 @@ def main():
                                     ##str_print = "pcal"+current_key_pair_accu[2:]+'sxa'+str(count_acc)+'\t'+' '.join(current_vector_split[:(META_LEN-1)])+' '+current_block_first_sample+' '+' '.join(map(str, acc_pcal_div))
                                     ##
                                     str_print = get_str_pcal_out(acc_pcal,current_n_bins_pcal,count_acc_pcal,current_key_pair_accu,current_vector_split,current_block_first_sample)
-                                    print(str_print)
+                                    lib_mapred_io.write_line_buffered(writer,str_print)
 
 
                     
@@ -1325,7 +1489,7 @@ def main():
                                                                                              F_first_sample,F_first_sample_partial,\
                                                                                              F_frac,current_block_time,F_adj_shift_partial,\
                                                                                              F_stack_shift,F_adj_shift_pcal,F_stack_shift_pcal,\
-                                                                                             F_pcal_fix,F_side,F_lti)
+                                                                                             F_pcal_fix,F_side,F_lti,F_buf,F_buf_pcal,acc_comp)
                     
                     #########
                     #  Pcal
@@ -1337,11 +1501,8 @@ def main():
                     #########
                     #  Out
                     #########
-                    lines_out = get_lines_out_for_all(char_type,n_sp,last_F_ind,current_pairs,count_acc,acc_mat,\
-                                                          current_block_first_sample,current_vector_split,acc_pcal,count_acc_pcal,current_scaling_pair)
-                    if lines_out!=[]:
-                        for line_out in lines_out:
-                            print(line_out)
+                    write_out_for_all(writer,char_type,n_sp,last_F_ind,current_pairs,count_acc,acc_mat,\
+                                      current_block_first_sample,current_vector_split,acc_pcal,count_acc_pcal,current_scaling_pair)
                     
                     
                     ##########
@@ -1352,7 +1513,7 @@ def main():
                                             current_block_first_sample,dismissed_acc_count)   
                     if lines_stats!=[]:
                         for line_stats in lines_stats:
-                            print(line_stats)
+                            lib_mapred_io.write_line_buffered(writer,line_stats)
                     
 
                     failed_acc_count=0
@@ -1362,7 +1523,7 @@ def main():
                     
                 else:
                     str_print = line
-                    print(str_print) 
+                    lib_mapred_io.write_line_buffered(writer,str_print) 
                     
 
                 
@@ -1377,17 +1538,22 @@ def main():
                 
                 else:
                     str_print = line
-                print(str_print)
+                lib_mapred_io.write_line_buffered(writer,str_print)
                 # Print phase calibration results
                 if acc_pcal!=[]:
                     str_print = get_str_pcal_out(acc_pcal,current_n_bins_pcal,count_acc_pcal,current_key_pair_accu,current_vector_split,current_block_first_sample)
-                    print(str_print)
+                    lib_mapred_io.write_line_buffered(writer,str_print)
                     acc_pcal=np.array([])
                     pre_pcal = np.array([])
 
 
     if no_data==1:
-        print("zR"+KEY_SEP+"No data")
+        lib_mapred_io.write_line_buffered(writer,"zR"+KEY_SEP+"No data")
+    
+    # Write pending output
+    lib_mapred_io.flush_writer(writer)
+    lib_fft.save_fft_wisdom(fft_engine)
+    lib_workers.close_workers(workers)
 
 
         
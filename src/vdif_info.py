@@ -58,6 +58,10 @@ def main():
     cparser.add_argument('--summary', action="store_true",\
                          dest="summary",default="0",\
                          help="Display only a summary for the whole file.")
+    
+    cparser.add_argument('--index', action="store_true",\
+                         dest="index",default="0",\
+                         help="Create (or update) frame index file and display number of frames and samples.")
 
 
     args =          cparser.parse_args()
@@ -66,8 +70,16 @@ def main():
     skip_frames =   int(args.skip_frames)
     brief =         int(args.brief)
     summary =       int(args.summary)
+    index =         int(args.index)
 
-    if summary:
+    if index:
+        [num_frames,num_samples,frames_per_second,v_threads] = lib_vdif.get_vdif_index_stats(lib_vdif.get_vdif_index(file_vdif))
+        print("Index file:         "+lib_vdif.get_vdif_index_filename(file_vdif))
+        print(" Frames:            "+str(num_frames))
+        print(" Samples:           "+str(num_samples))
+        print(" Frames per second: "+(str(frames_per_second) if frames_per_second>0 else "unknown (less than one second)"))
+        print(" Threads:           "+','.join(map(str,v_threads)))
+    elif summary:
         lib_vdif.get_vdif_stats(file_vdif,short_output=brief)
     else:
         lib_vdif.show_headers_vdif(file_vdif,limit_frames,skip_frames,brief)